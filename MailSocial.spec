@@ -7,7 +7,7 @@ a = Analysis(
         ('LICENSE.md', '.'),
         ('assets', 'assets'),
         ('.default_settings.toml', '.'),
-        ('.contributions.json', '.')
+        ('.contributions.bin', '.')
     ],
     hiddenimports=['PIL._tkinter_finder'],
     hookspath=[],
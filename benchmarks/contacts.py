@@ -0,0 +1,109 @@
+# benchmarks/contacts.py
+"""Benchmark address suggestions over a large contact directory.
+
+    python -m benchmarks.contacts --contacts 100000
+
+Builds a directory of synthetic contacts with made-up names, addresses
+and activity, then times searches for the prefixes a user types one key
+at a time, and adding new senders one by one as mail arrives. Reports
+the latencies, against a 16 ms frame, as JSON.
+"""
+
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from src.core.contacts import ContactDirectory
+from src.core.models.member import Member
+
+START = datetime(2015, 1, 1)
+FRAME_MS = 16.7
+FIRST_NAMES = [
+    "alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi", "ivan",
+    "judy", "mallory", "niaj", "olivia", "peggy", "rupert", "sybil", "trent",
+    "victor", "walter", "yolanda", "zoe", "amélie", "jürgen", "sørina",
+]  # fmt: skip
+DOMAINS = ["example.com", "example.org", "mail.example.net", "corp.example"]
+
+
+def make_contacts(count: int, seed: int = 0) -> List[Tuple[Member, int, datetime]]:
+    rng = random.Random(seed)
+    contacts = []
+    for number in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+        email = f"{first}.{last}{number}@{rng.choice(DOMAINS)}"
+        member = Member(email, "", False, f"{first.title()} {last.title()}")
+        # Most contacts are in one or two messages; a few in thousands.
+        messages = int(rng.paretovariate(1.2))
+        last_seen = START + timedelta(days=rng.uniform(0, 3650))
+        contacts.append((member, messages, last_seen))
+    return contacts
+
+
+def percentiles(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(1000 * timings[len(timings) // 2], 3),
+        "p99_ms": round(1000 * timings[int(len(timings) * 0.99)], 3),
+        "max_ms": round(1000 * timings[-1], 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--contacts", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    contacts = make_contacts(args.contacts)
+    directory = ContactDirectory()
+    start = time.perf_counter()
+    directory.update(contacts)
+    load_time = time.perf_counter() - start
+
+    rng = random.Random(1)
+    by_length: Dict[int, List[float]] = {}
+    for _ in range(args.queries):
+        member, _, _ = rng.choice(contacts)
+        word = rng.choice([member.name.split()[0], member.name.split()[1]]).lower()
+        # Every prefix, as the user types the word.
+        for length in range(1, min(len(word), 6) + 1):
+            start = time.perf_counter()
+            directory.search(word[:length])
+            by_length.setdefault(length, []).append(time.perf_counter() - start)
+
+    added = []
+    for member, _, when in make_contacts(1000, seed=2):
+        start = time.perf_counter()
+        directory.observe([member], when)
+        added.append(time.perf_counter() - start)
+
+    all_searches = [timing for timings in by_length.values() for timing in timings]
+    report = {
+        "contacts": args.contacts,
+        "index_entries": len(directory.keys),
+        "load_s": round(load_time, 2),
+        "frame_ms": FRAME_MS,
+        "search": percentiles(all_searches),
+        "search_by_prefix_length": {
+            length: percentiles(timings) for length, timings in by_length.items()
+        },
+        "add_new_contact": percentiles(added),
+    }
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
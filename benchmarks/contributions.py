@@ -0,0 +1,193 @@
+# benchmarks/contributions.py
+"""Benchmark the contributions pipeline against synthetic repositories.
+
+    python -m benchmarks.contributions --sizes 1000,10000 --output bench.json
+    python -m benchmarks.contributions --baseline bench.json
+
+Each case runs in a fresh process, so peak RSS is per case, and reports
+wall time, commits/sec, subprocess count and peak RSS as JSON.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+from unittest import mock
+
+from benchmarks.synthetic_repo import generate_repo
+
+# Metrics where a higher value is better; every other metric is lower-is-better.
+HIGHER_IS_BETTER = {"commits_per_sec"}
+COMPARED_METRICS = ["wall_time_s", "commits_per_sec", "subprocesses", "peak_rss_kb"]
+
+
+def peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else.
+    return int(peak / 1024) if sys.platform == "darwin" else int(peak)
+
+
+def run_case(
+    repo_root: str, commits: int, authors: int, signed_ratio: float, jobs: int
+) -> Dict[str, Any]:
+    """Analyze one synthetic repository with cold caches and measure it."""
+    repo = generate_repo(repo_root, commits, authors, signed_ratio)
+
+    with tempfile.TemporaryDirectory() as cache_home:
+        os.environ["XDG_CACHE_HOME"] = cache_home
+        from git import Repo
+
+        from src.core import contributions
+        from src.core.keycache import DirectoryKeySource
+
+        contributions.set_key_source(
+            DirectoryKeySource(contributions.get_gpg(), repo.keys_dir)
+        )
+
+        spawned = 0
+        execute_child = subprocess.Popen._execute_child  # type: ignore[attr-defined]
+
+        def counting_execute_child(self: Any, *args: Any, **kwargs: Any) -> Any:
+            nonlocal spawned
+            spawned += 1
+            return execute_child(self, *args, **kwargs)
+
+        with mock.patch.object(
+            subprocess.Popen, "_execute_child", counting_execute_child
+        ):
+            start = time.perf_counter()
+            result = contributions.analyze_commits(
+                Repo(repo.path), repo.path, jobs=jobs
+            )
+            final_contributors = contributions.get_final_contributors_list(result)
+            wall_time = time.perf_counter() - start
+        # Outstanding commits are spooled under the cache directory.
+        outstanding_commits = len(result["outstanding_commits"])
+
+    return {
+        "commits": commits,
+        "authors": authors,
+        "signed_ratio": signed_ratio,
+        "jobs": jobs,
+        "wall_time_s": round(wall_time, 3),
+        "commits_per_sec": round(commits / wall_time, 1) if wall_time else 0.0,
+        # Only processes started by the benchmarked process itself; with
+        # jobs > 1 the pool workers' own git and gpg calls are not counted.
+        "subprocesses": spawned,
+        "peak_rss_kb": peak_rss_kb(),
+        "identities": len(result["identities"]),
+        "outstanding_commits": outstanding_commits,
+        "contributors": len(final_contributors),
+    }
+
+
+def case_worker(queue: Any, *args: Any) -> None:
+    queue.put(run_case(*args))
+
+
+def run_isolated(*args: Any) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=case_worker, args=(queue, *args))
+    process.start()
+    result: Dict[str, Any] = queue.get()
+    process.join()
+    return result
+
+
+def compare(
+    cases: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """List the metrics that regressed by more than `tolerance` against the baseline."""
+    regressions = []
+    baseline_cases = {
+        (c["commits"], c["signed_ratio"], c["jobs"]): c for c in baseline["cases"]
+    }
+    for case in cases:
+        previous = baseline_cases.get(
+            (case["commits"], case["signed_ratio"], case["jobs"])
+        )
+        if not previous:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous[metric], case[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            case.setdefault("change_vs_baseline", {})[metric] = round(change, 3)
+            if change > tolerance:
+                regressions.append(
+                    f"{case['commits']} commits: {metric} {old} -> {new}"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default="1000",
+        help="Comma-separated commit counts, e.g. 1000,10000,100000",
+    )
+    parser.add_argument("--authors", type=int, default=5)
+    parser.add_argument("--signed-ratio", type=float, default=0.5)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument(
+        "--work-dir",
+        default=os.path.join(tempfile.gettempdir(), "mailsocial-bench"),
+        help="Where generated repositories are kept and reused between runs",
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous results file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative regression per metric before failing",
+    )
+    args = parser.parse_args(argv)
+
+    cases = []
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        repo_root = os.path.join(
+            args.work_dir, f"{size}-{args.authors}-{args.signed_ratio}"
+        )
+        cases.append(
+            run_isolated(repo_root, size, args.authors, args.signed_ratio, args.jobs)
+        )
+
+    git_version = subprocess.run(
+        ["git", "--version"], capture_output=True, text=True
+    ).stdout.strip()
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "git": git_version,
+        "cases": cases,
+    }
+
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare(cases, json.load(file), args.tolerance)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,710 @@
+# benchmarks/imap_server.py
+"""A stand-in IMAP server holding synthetic mailboxes in memory.
+
+    python -m benchmarks.imap_server --messages 100000 --port 1143
+
+Speaks enough IMAP4rev1 for the sync engine: LOGIN, CAPABILITY, LIST,
+SELECT and EXAMINE, UID SEARCH (with ESEARCH), UID FETCH (with
+BODYSTRUCTURE, headers and partial sections), NOOP, IDLE, NOTIFY, ENABLE,
+CONDSTORE and QRESYNC, and LOGOUT, over plain TCP. `latency` holds every
+response back that many seconds, as a distant server would, without slowing
+the server down, and `bandwidth` caps the bytes per second sent on each
+connection. Changes made through `ImapServer.call` are reported to idling
+clients straight away, and to the others at their next NOOP.
+"""
+
+import argparse
+import asyncio
+import base64
+import random
+import re
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from email.message import Message as MailMessage
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from benchmarks.store import make_words
+from src.core.store.importer import PARSER
+from src.core.imap.protocol import ImapError, Token, format_uid_set, quote, tokenize
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+CONTACTS = 500
+ME = "me@example.com"
+PASSWORD = "secret"
+CAPABILITIES = "IMAP4rev1 ESEARCH LITERAL+ IDLE NOTIFY ENABLE CONDSTORE QRESYNC"
+# BODY[section]<start.length>, with or without .PEEK.
+SECTION = re.compile(r"BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?$")
+
+
+@dataclass
+class ServerMessage:
+    uid: int
+    raw: bytes
+    flags: Set[str] = field(default_factory=set)
+    internal_date: datetime = START
+    modseq: int = 0
+    # Worked out when first asked for, then kept, as servers keep them in
+    # their index.
+    structure: Optional[str] = None
+    parts: Dict[str, bytes] = field(default_factory=dict)
+
+    def index(self) -> None:
+        """Work out what a header-first sync asks for ahead of time, as a
+        server does on delivery."""
+        self.body_structure()
+        self.section("1")
+
+    def body_structure(self) -> str:
+        if self.structure is None:
+            self.structure = body_structure(PARSER.parsebytes(self.raw))
+        return self.structure
+
+    def section(self, name: str) -> bytes:
+        """The bytes of a BODY[] section: "", "HEADER", "TEXT" or a part
+        number such as "1" or "2.1"."""
+        if name == "":
+            return self.raw
+        header, _, text = self.raw.partition(b"\r\n\r\n")
+        if name == "HEADER":
+            return header + b"\r\n\r\n"
+        if name == "TEXT" or (name == "1" and b"multipart/" not in header.lower()):
+            return text
+        if name not in self.parts:
+            self.parts[name] = self.find_part(name)
+        return self.parts[name]
+
+    def find_part(self, name: str) -> bytes:
+        part: Any = PARSER.parsebytes(self.raw)
+        for number in name.split("."):
+            if part.is_multipart():
+                part = part.get_payload(int(number) - 1)
+            elif number != "1":
+                return b""
+        payload = part.get_payload()
+        if isinstance(payload, list):
+            return bytes(part.as_bytes().partition(b"\n\n")[2])
+        return str(payload).encode("utf-8", "surrogateescape")
+
+
+@dataclass
+class ServerMailbox:
+    name: str
+    uidvalidity: int = 1
+    messages: List[ServerMessage] = field(default_factory=list)
+    uidnext: int = 1
+    # LIST attributes, such as \Noselect.
+    attributes: Tuple[str, ...] = ()
+    highestmodseq: int = 1
+    # Expunged UIDs and when, for QRESYNC.
+    vanished: List[Tuple[int, int]] = field(default_factory=list)
+
+    def change(self) -> int:
+        self.highestmodseq += 1
+        return self.highestmodseq
+
+    def append(
+        self,
+        raw: bytes,
+        flags: Iterable[str] = (),
+        internal_date: datetime = START,
+    ) -> ServerMessage:
+        message = ServerMessage(
+            self.uidnext, raw, set(flags), internal_date, self.change()
+        )
+        self.uidnext += 1
+        self.messages.append(message)
+        return message
+
+    def expunge(self, uids: Iterable[int]) -> None:
+        gone = set(uids)
+        modseq = self.change()
+        self.vanished.extend(
+            (message.uid, modseq) for message in self.messages if message.uid in gone
+        )
+        self.messages = [
+            message for message in self.messages if message.uid not in gone
+        ]
+
+    def set_flags(self, uid: int, flags: Iterable[str]) -> None:
+        index = bisect_left(self.messages, uid, key=lambda message: message.uid)
+        if index < len(self.messages) and self.messages[index].uid == uid:
+            self.messages[index].flags = set(flags)
+            self.messages[index].modseq = self.change()
+
+    def reset(self, uidvalidity: int) -> None:
+        """Renumber every message, as a server that lost its UIDs would."""
+        self.uidvalidity = uidvalidity
+        messages, self.messages, self.uidnext = self.messages, [], 1
+        self.vanished = []
+        for message in messages:
+            self.append(message.raw, message.flags, message.internal_date)
+
+    def select(self, uid_set: str) -> List[Tuple[int, ServerMessage]]:
+        """The (sequence number, message) pairs for a UID set, in order."""
+        uids = [message.uid for message in self.messages]
+        largest = uids[-1] if uids else 0
+        selected: Dict[int, ServerMessage] = {}
+        for part in uid_set.split(","):
+            first, _, last = part.partition(":")
+            start = largest if first == "*" else int(first)
+            end = start if not last else largest if last == "*" else int(last)
+            start, end = min(start, end), max(start, end)
+            for index in range(bisect_left(uids, start), bisect_right(uids, end)):
+                selected[index + 1] = self.messages[index]
+        return sorted(selected.items())
+
+
+def body_structure(part: MailMessage) -> str:
+    """A part's BODYSTRUCTURE, without the extension data."""
+    if part.is_multipart():
+        parts = "".join(
+            body_structure(sub)
+            for sub in part.get_payload()
+            if isinstance(sub, MailMessage)
+        )
+        return f"({parts} {quote(part.get_content_subtype().upper())})"
+    maintype, subtype = part.get_content_maintype(), part.get_content_subtype()
+    parameters = [
+        f"{quote(name.upper())} {quote(value)}"
+        for name, value in (part.get_params() or [])[1:]
+    ]
+    if maintype == "text" and not part.get_param("charset"):
+        parameters.append('"CHARSET" "US-ASCII"')
+    payload = str(part.get_payload())
+    encoding = str(part.get("content-transfer-encoding", "7bit")).upper()
+    fields = [
+        quote(maintype.upper()),
+        quote(subtype.upper()),
+        f"({' '.join(parameters)})" if parameters else "NIL",
+        "NIL",
+        "NIL",
+        quote(encoding),
+        str(len(payload)),
+    ]
+    if maintype == "text":
+        fields.append(str(payload.count("\n")))
+    return f"({' '.join(fields)})"
+
+
+def make_message(number: int, rng: random.Random, attachment: str = "") -> bytes:
+    """A plain or multipart message between the user and one of their contacts,
+    with `attachment`, base64 encoded, attached if given."""
+    contact = rng.randrange(CONTACTS)
+    sender, to = f"Contact {contact} <contact{contact}@example.com>", ME
+    if rng.random() < 0.3:
+        sender, to = f"Me <{ME}>", f"contact{contact}@example.com"
+    timestamp = START + timedelta(seconds=number * 60)
+    body = " ".join(make_words(rng, rng.randint(20, 200)))
+    headers = (
+        f"From: {sender}\r\nTo: {to}\r\n"
+        f"Subject: {' '.join(make_words(rng, 4))}\r\n"
+        f"Date: {timestamp:%a, %d %b %Y %H:%M:%S} +0000\r\n"
+        f"Message-ID: <{number}@example.com>\r\n"
+    )
+    if attachment:
+        return (
+            f"{headers}MIME-Version: 1.0\r\n"
+            'Content-Type: multipart/mixed; boundary="m"\r\n\r\n'
+            f"--m\r\nContent-Type: text/plain\r\n\r\n{body}\r\n"
+            "--m\r\nContent-Type: application/octet-stream\r\n"
+            'Content-Disposition: attachment; filename="data.bin"\r\n'
+            f"Content-Transfer-Encoding: base64\r\n\r\n{attachment}\r\n--m--\r\n"
+        ).encode()
+    if number % 4:
+        return f"{headers}\r\n{body}\r\n".encode()
+    return (
+        f"{headers}MIME-Version: 1.0\r\n"
+        'Content-Type: multipart/alternative; boundary="b"\r\n\r\n'
+        f"--b\r\nContent-Type: text/plain\r\n\r\n{body}\r\n"
+        f"--b\r\nContent-Type: text/html\r\n\r\n<p>{body}</p>\r\n--b--\r\n"
+    ).encode()
+
+
+def fill_mailbox(
+    mailbox: ServerMailbox, count: int, first: int = 0, attachment_kb: int = 0
+) -> None:
+    """Add `count` synthetic messages, numbered from `first`; a third are
+    unread, and with `attachment_kb` one in ten has an attachment that size."""
+    rng = random.Random(first)
+    data = rng.randbytes(attachment_kb * 1024)
+    attachment = "\r\n".join(
+        base64.b64encode(data[start : start + 57]).decode()
+        for start in range(0, len(data), 57)
+    )
+    for number in range(first, first + count):
+        mailbox.append(
+            make_message(number, rng, attachment if number % 10 == 9 else ""),
+            () if number % 3 == 0 else ["\\Seen"],
+            START + timedelta(seconds=number * 60),
+        )
+
+
+def text(token: Token) -> str:
+    return token.decode() if isinstance(token, bytes) else str(token or "")
+
+
+class Session:
+    """One client's connection to the server."""
+
+    def __init__(
+        self,
+        server: "ImapServer",
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        # When what has been written so far will have gone out, at `bandwidth`.
+        self.sent_by = 0.0
+        self.authenticated = False
+        self.mailbox: Optional[ServerMailbox] = None
+        self.enabled: Set[str] = set()
+        # The open mailbox as this client last heard of it: (UID, flags).
+        self.view: List[Tuple[int, frozenset]] = []
+        # The tag of the IDLE command in progress.
+        self.idling: Optional[str] = None
+        # Whether to report changes to the open mailbox as they happen.
+        self.notify_selected = False
+        # Mailboxes to send STATUS for when they change, and what was sent.
+        self.notifying: Dict[str, Tuple[int, int, int]] = {}
+        self.commands: Dict[str, Callable[[str, List[Token]], Awaitable[None]]] = {
+            "CAPABILITY": self.capability,
+            "LOGIN": self.login,
+            "LIST": self.list,
+            "SELECT": self.select,
+            "EXAMINE": self.select,
+            "UID": self.uid,
+            "NOOP": self.noop,
+            "IDLE": self.idle,
+            "NOTIFY": self.notify,
+            "ENABLE": self.enable,
+            "LOGOUT": self.logout,
+        }
+
+    def write(self, data: bytes) -> None:
+        delay = self.server.latency
+        if self.server.bandwidth:
+            now = self.loop.time()
+            self.sent_by = max(self.sent_by, now) + len(data) / self.server.bandwidth
+            delay += self.sent_by - now
+        if delay:
+            self.loop.call_later(delay, self.writer.write, data)
+        else:
+            self.writer.write(data)
+
+    def send(self, line: str) -> None:
+        self.write(line.encode() + b"\r\n")
+
+    async def run(self) -> None:
+        self.send(
+            f"* OK [CAPABILITY {self.server.capabilities}] Stand-in IMAP server ready"
+        )
+        try:
+            while not self.writer.is_closing():
+                line = await self.reader.readline()
+                if not line:
+                    break
+                if self.idling is not None:
+                    if line.strip().upper() == b"DONE":
+                        self.send(f"{self.idling} OK IDLE terminated")
+                        self.idling = None
+                    else:
+                        self.send("* BAD Expected DONE")
+                    await self.writer.drain()
+                    continue
+                tag, _, rest = line.rstrip(b"\r\n").partition(b" ")
+                name, _, arguments = rest.partition(b" ")
+                command = self.commands.get(name.decode().upper())
+                if command is None:
+                    self.send(f"{tag.decode()} BAD Unknown command")
+                    continue
+                try:
+                    await command(tag.decode(), tokenize([arguments], []))
+                except (ImapError, ValueError, IndexError) as e:
+                    self.send(f"{tag.decode()} BAD {e}")
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.server.clients.discard(self)
+            self.writer.close()
+
+    def changed(self) -> None:
+        """Tell the client what changed, if it is listening."""
+        if self.idling is not None or self.notify_selected:
+            self.report()
+        for name, sent in list(self.notifying.items()):
+            mailbox = self.server.mailboxes.get(name)
+            if mailbox is None:
+                continue
+            status = (len(mailbox.messages), mailbox.uidnext, mailbox.uidvalidity)
+            if status != sent:
+                self.notifying[name] = status
+                self.send(
+                    f"* STATUS {quote(name)} (MESSAGES {status[0]} "
+                    f"UIDNEXT {status[1]} UIDVALIDITY {status[2]})"
+                )
+
+    def report(self) -> None:
+        """Send EXPUNGE, FETCH and EXISTS for what changed in the open
+        mailbox since the client last heard."""
+        if self.mailbox is None:
+            return
+        current = {message.uid: message for message in self.mailbox.messages}
+        # From the end, so earlier sequence numbers stay put.
+        for number in range(len(self.view), 0, -1):
+            if self.view[number - 1][0] not in current:
+                self.send(f"* {number} EXPUNGE")
+                del self.view[number - 1]
+        for number, (uid, flags) in enumerate(self.view, 1):
+            if current[uid].flags != flags:
+                flags = frozenset(current[uid].flags)
+                self.view[number - 1] = (uid, flags)
+                self.send(
+                    f"* {number} FETCH (UID {uid} FLAGS ({' '.join(sorted(flags))}))"
+                )
+        last = self.view[-1][0] if self.view else 0
+        added = [message for message in self.mailbox.messages if message.uid > last]
+        if added:
+            self.view.extend(
+                (message.uid, frozenset(message.flags)) for message in added
+            )
+            self.send(f"* {len(self.view)} EXISTS")
+
+    async def capability(self, tag: str, arguments: List[Token]) -> None:
+        self.send(f"* CAPABILITY {self.server.capabilities}")
+        self.send(f"{tag} OK CAPABILITY completed")
+
+    async def login(self, tag: str, arguments: List[Token]) -> None:
+        username, password = (text(argument) for argument in arguments[:2])
+        if (username, password) != (self.server.username, self.server.password):
+            self.send(f"{tag} NO [AUTHENTICATIONFAILED] Invalid credentials")
+            return
+        self.authenticated = True
+        self.server.logins += 1
+        self.send(f"{tag} OK LOGIN completed")
+
+    async def list(self, tag: str, arguments: List[Token]) -> None:
+        if not self.authenticated:
+            self.send(f"{tag} NO Log in first")
+            return
+        for mailbox in self.server.mailboxes.values():
+            attributes = " ".join(mailbox.attributes)
+            self.send(f'* LIST ({attributes}) "/" {quote(mailbox.name)}')
+        self.send(f"{tag} OK LIST completed")
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.server.capabilities.split()
+
+    async def enable(self, tag: str, arguments: List[Token]) -> None:
+        enabled = [
+            name
+            for name in (text(argument).upper() for argument in arguments)
+            if name in ("CONDSTORE", "QRESYNC") and self.supports(name)
+        ]
+        self.enabled.update(enabled)
+        self.send(f"* ENABLED {' '.join(enabled)}".rstrip())
+        self.send(f"{tag} OK ENABLE completed")
+
+    async def select(self, tag: str, arguments: List[Token]) -> None:
+        mailbox = self.server.mailboxes.get(text(arguments[0]))
+        if not self.authenticated or mailbox is None or mailbox.attributes:
+            self.send(f"{tag} NO No such mailbox")
+            return
+        # (CONDSTORE) or (QRESYNC (uidvalidity modseq)), if anything.
+        parameters = arguments[1] if len(arguments) > 1 else []
+        qresync = None
+        if isinstance(parameters, list) and len(parameters) > 1:
+            if text(parameters[0]).upper() == "QRESYNC":
+                if "QRESYNC" not in self.enabled:
+                    self.send(f"{tag} BAD ENABLE QRESYNC first")
+                    return
+                qresync = parameters[1]
+        self.mailbox = mailbox
+        self.view = [
+            (message.uid, frozenset(message.flags)) for message in mailbox.messages
+        ]
+        self.send("* FLAGS (\\Seen \\Answered \\Flagged \\Deleted \\Draft)")
+        self.send(f"* {len(mailbox.messages)} EXISTS")
+        self.send(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid")
+        self.send(f"* OK [UIDNEXT {mailbox.uidnext}] Predicted next UID")
+        if self.supports("CONDSTORE"):
+            self.send(f"* OK [HIGHESTMODSEQ {mailbox.highestmodseq}] Highest")
+        if isinstance(qresync, list) and int(text(qresync[0])) == mailbox.uidvalidity:
+            since = int(text(qresync[1]))
+            vanished = sorted(uid for uid, modseq in mailbox.vanished if modseq > since)
+            if vanished:
+                self.send(f"* VANISHED (EARLIER) {format_uid_set(vanished)}")
+            for number, message in enumerate(mailbox.messages, 1):
+                if message.modseq > since:
+                    flags = " ".join(sorted(message.flags))
+                    self.send(
+                        f"* {number} FETCH (UID {message.uid} FLAGS ({flags}) "
+                        f"MODSEQ ({message.modseq}))"
+                    )
+        self.send(f"{tag} OK [READ-ONLY] EXAMINE completed")
+
+    async def uid(self, tag: str, arguments: List[Token]) -> None:
+        if self.mailbox is None:
+            self.send(f"{tag} NO Select a mailbox first")
+            return
+        name = text(arguments[0]).upper()
+        if name == "SEARCH":
+            await self.search(tag, arguments[1:])
+        elif name == "FETCH":
+            # (CHANGEDSINCE modseq), if anything.
+            modifiers = arguments[3] if len(arguments) > 3 else []
+            since = None
+            if isinstance(modifiers, list) and len(modifiers) > 1:
+                since = int(text(modifiers[1]))
+            await self.fetch(tag, text(arguments[1]), arguments[2], since)
+        else:
+            self.send(f"{tag} BAD Unknown UID command")
+
+    async def search(self, tag: str, arguments: List[Token]) -> None:
+        assert self.mailbox is not None
+        extended = bool(arguments) and text(arguments[0]).upper() == "RETURN"
+        if extended:
+            arguments = arguments[2:]
+        if arguments and text(arguments[0]).upper() == "UID":
+            found = self.mailbox.select(text(arguments[1]))
+        elif arguments and text(arguments[0]).upper() == "UNSEEN":
+            found = [
+                (number, message)
+                for number, message in enumerate(self.mailbox.messages, 1)
+                if "\\Seen" not in message.flags
+            ]
+        else:
+            found = list(enumerate(self.mailbox.messages, 1))
+        uids = [message.uid for _, message in found]
+        if extended:
+            all_uids = format_uid_set(uids)
+            self.send(
+                f'* ESEARCH (TAG "{tag}") UID' + (f" ALL {all_uids}" if uids else "")
+            )
+        else:
+            self.send("* SEARCH " + " ".join(map(str, uids)))
+        self.send(f"{tag} OK SEARCH completed")
+
+    async def fetch(
+        self, tag: str, uid_set: str, items: Token, since: Optional[int] = None
+    ) -> None:
+        assert self.mailbox is not None
+        self.server.fetches += 1
+        names = [
+            text(item).upper()
+            for item in (items if isinstance(items, list) else [items])
+        ]
+        selected = self.mailbox.select(uid_set)
+        if since is not None:
+            selected = [
+                (number, message)
+                for number, message in selected
+                if message.modseq > since
+            ]
+        for count, (number, message) in enumerate(selected):
+            parts = [f"UID {message.uid}"]
+            if since is not None or self.enabled:
+                parts.append(f"MODSEQ ({message.modseq})")
+            literals: List[Tuple[str, bytes]] = []
+            for name in names:
+                section = SECTION.match(name)
+                if name == "FLAGS":
+                    parts.append(f"FLAGS ({' '.join(sorted(message.flags))})")
+                elif name == "INTERNALDATE":
+                    date = message.internal_date.strftime("%d-%b-%Y %H:%M:%S %z")
+                    parts.append(f'INTERNALDATE "{date}"')
+                elif name == "RFC822.SIZE":
+                    parts.append(f"RFC822.SIZE {len(message.raw)}")
+                elif name == "BODYSTRUCTURE":
+                    parts.append(f"BODYSTRUCTURE {message.body_structure()}")
+                elif name == "RFC822":
+                    literals.append(("BODY[]", message.raw))
+                elif section:
+                    data = message.section(section[1])
+                    item = f"BODY[{section[1]}]"
+                    if section[2] is not None:
+                        start = int(section[2])
+                        data = data[start : start + int(section[3])]
+                        item += f"<{start}>"
+                    literals.append((item, data))
+                if name in ("BODY[]", "BODY.PEEK[]", "RFC822"):
+                    self.server.bodies += 1
+            data = f"* {number} FETCH ({' '.join(parts)}".encode()
+            for item, literal in literals:
+                data += f" {item} {{{len(literal)}}}\r\n".encode() + literal
+            self.write(data + b")\r\n")
+            if count % 64 == 63:
+                await self.writer.drain()
+        self.send(f"{tag} OK FETCH completed")
+
+    async def noop(self, tag: str, arguments: List[Token]) -> None:
+        self.report()
+        self.send(f"{tag} OK NOOP completed")
+
+    async def idle(self, tag: str, arguments: List[Token]) -> None:
+        if not self.supports("IDLE"):
+            self.send(f"{tag} BAD Unknown command")
+            return
+        self.idling = tag
+        self.send("+ idling")
+        self.report()
+
+    async def notify(self, tag: str, arguments: List[Token]) -> None:
+        # NOTIFY SET (SELECTED (events)) (MAILBOXES (name ...) (events)),
+        # whatever the events, is all that's spoken.
+        if not self.supports("NOTIFY"):
+            self.send(f"{tag} BAD Unknown command")
+            return
+        self.notify_selected = False
+        names: List[Token] = []
+        for spec in arguments[1:]:
+            if not isinstance(spec, list) or not spec:
+                self.send(f"{tag} BAD Unsupported NOTIFY")
+                return
+            kind = text(spec[0]).upper()
+            if kind == "SELECTED":
+                self.notify_selected = True
+            elif kind == "MAILBOXES" and isinstance(spec[1], list):
+                names.extend(spec[1])
+        self.notifying = {}
+        for name in names:
+            mailbox = self.server.mailboxes.get(text(name))
+            if mailbox is not None:
+                self.notifying[mailbox.name] = (
+                    len(mailbox.messages),
+                    mailbox.uidnext,
+                    mailbox.uidvalidity,
+                )
+        self.send(f"{tag} OK NOTIFY completed")
+
+    async def logout(self, tag: str, arguments: List[Token]) -> None:
+        self.send("* BYE Logging out")
+        self.send(f"{tag} OK LOGOUT completed")
+        await self.writer.drain()
+        self.writer.close()
+
+
+class ImapServer:
+    """Serves in-memory mailboxes to any client that logs in as `username`."""
+
+    def __init__(
+        self,
+        username: str = ME,
+        password: str = PASSWORD,
+        latency: float = 0.0,
+        capabilities: str = CAPABILITIES,
+        bandwidth: float = 0.0,
+    ) -> None:
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.capabilities = capabilities
+        self.mailboxes: Dict[str, ServerMailbox] = {}
+        # For tests: how many times anyone logged in, UID FETCH commands, and
+        # whole messages fetched.
+        self.logins = 0
+        self.fetches = 0
+        self.bodies = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.sessions: Set["asyncio.Task[None]"] = set()
+        self.clients: Set[Session] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def add_mailbox(self, name: str, *attributes: str) -> ServerMailbox:
+        mailbox = ServerMailbox(name, attributes=attributes)
+        self.mailboxes[name] = mailbox
+        return mailbox
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self.sessions.add(task)
+        session = Session(self, reader, writer)
+        self.clients.add(session)
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(task)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening; returns the port."""
+        self.server = await asyncio.start_server(self.handle, host, port, limit=1 << 20)
+        return int(self.server.sockets[0].getsockname()[1])
+
+    def start_thread(self) -> int:
+        """Serve from a thread of its own, for tests; returns the port."""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="imap-server", daemon=True
+        )
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.start(), self.loop)
+        return future.result(10)
+
+    def call(self, function: Callable[[], None]) -> None:
+        """Run `function` on the server's thread, such as to change a mailbox,
+        then tell the clients listening what changed."""
+        assert self.loop is not None
+
+        async def run() -> None:
+            function()
+            for client in list(self.clients):
+                client.changed()
+
+        asyncio.run_coroutine_threadsafe(run(), self.loop).result(10)
+
+    def stop(self) -> None:
+        if self.loop is None or self.server is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=10)
+        self.loop.close()
+
+    async def close(self) -> None:
+        """Stop listening and drop every client."""
+        assert self.server is not None
+        self.server.close()
+        for task in self.sessions:
+            task.cancel()
+        await asyncio.gather(*self.sessions, return_exceptions=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument(
+        "--bandwidth", type=float, default=0.0, help="Bytes/s on each connection"
+    )
+    parser.add_argument("--attachment-kb", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = ImapServer(latency=args.latency, bandwidth=args.bandwidth)
+    fill_mailbox(
+        server.add_mailbox("INBOX"), args.messages, attachment_kb=args.attachment_kb
+    )
+    print(f"Serving {args.messages} messages to {ME} / {PASSWORD} on {args.port}")
+
+    async def serve() -> None:
+        await server.start(port=args.port)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# benchmarks/imap_sync.py
+"""Benchmark syncing a large mailbox from the stand-in IMAP server.
+
+    python -m benchmarks.imap_sync --messages 100000 --latency 0.05
+
+Fills the stand-in server with synthetic mail, then syncs it into an empty
+store, headers first unless `--full-bodies` is given. While the sync runs,
+a stand-in for the UI asks the store for something trivial every frame, as
+the chat list does, to show how long the UI would wait on it. The sync's
+time is how long until the inbox is usable. After a header-first sync the
+bodies are backfilled, with a chat opened part way through, to time how
+long its bodies take to arrive. Then some messages are expunged and some
+marked read or unread on the server, and a fresh engine, as after a
+restart, resyncs. Reports messages synced per second, the UI's waits, the
+backfill, the time the resync took and peak memory, as JSON.
+`--capabilities` leaves out CONDSTORE and QRESYNC, say, to time the
+fallback.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.contacts import FRAME_MS, percentiles
+from benchmarks.imap_server import (
+    CAPABILITIES,
+    ME,
+    PASSWORD,
+    ImapServer,
+    ServerMailbox,
+    fill_mailbox,
+)
+from src.core.account import Account
+from src.core.imap.bodies import OPEN_CHAT, BodyFetcher
+from src.core.imap.pool import ConnectionPool
+from src.core.imap.sync import BATCH_SIZE, WINDOW, SyncEngine
+from src.core.store.bodies import pending_bodies, pending_in_chats
+from src.core.store.deltas import StoreDelta
+from src.core.store.runner import StoreRunner
+from src.core.store.timeline import CHUNK_SIZE
+from src.core.store.tables import MessageRecord
+
+
+async def oldest_chat() -> int:
+    """The chat of the first message stored, which backfill reaches last."""
+    record = await MessageRecord.all().order_by("id").first()
+    assert record is not None
+    return int(record.chat_id)  # type: ignore[attr-defined]
+
+
+def backfill(store: StoreRunner, engine: SyncEngine) -> Dict[str, float]:
+    """Fetch every pending body, opening a chat once a second has passed;
+    returns how long the chat's and everyone's bodies took."""
+    fetcher = BodyFetcher(engine)
+    start = time.perf_counter()
+    fetcher.start()
+    time.sleep(1.0)
+    chat_id = store.call(oldest_chat())
+    opened = time.perf_counter()
+    fetcher.want_chats([chat_id], OPEN_CHAT)
+    while store.call(pending_in_chats([chat_id], CHUNK_SIZE)):
+        time.sleep(0.005)
+    open_time = time.perf_counter() - opened
+    while store.call(pending_bodies(1)):
+        time.sleep(0.05)
+    backfill_time = time.perf_counter() - start
+    fetcher.stop()
+    return {"open_chat_s": round(open_time, 3), "time_s": round(backfill_time, 1)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--mailboxes", type=int, default=2)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--window", type=int, default=WINDOW)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to each response"
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        default=0.0,
+        help="Bytes/s the server sends on each connection",
+    )
+    parser.add_argument(
+        "--attachment-kb",
+        type=int,
+        default=0,
+        help="Size of the attachment one message in ten has",
+    )
+    parser.add_argument(
+        "--changes",
+        type=float,
+        default=0.01,
+        help="Share of messages expunged, and again flagged, before the resync",
+    )
+    parser.add_argument("--capabilities", default=CAPABILITIES)
+    parser.add_argument(
+        "--full-bodies",
+        action="store_true",
+        help="Fetch whole messages in the sync rather than headers first",
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    server = ImapServer(
+        latency=args.latency,
+        capabilities=args.capabilities,
+        bandwidth=args.bandwidth,
+    )
+    per_mailbox = args.messages // args.mailboxes
+    mailboxes: List[ServerMailbox] = []
+    for number in range(args.mailboxes):
+        name = "INBOX" if number == 0 else f"Archive/{number}"
+        mailboxes.append(server.add_mailbox(name))
+        fill_mailbox(
+            mailboxes[-1], per_mailbox, number * per_mailbox, args.attachment_kb
+        )
+        for message in mailboxes[-1].messages:
+            message.index()
+    port = server.start_thread()
+    account = Account(
+        ME,
+        imap_host="127.0.0.1",
+        imap_port=port,
+        imap_username=ME,
+        imap_password=PASSWORD,
+        imap_security="none",
+    )
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = StoreRunner(os.path.join(work_dir, "store.sqlite3"))
+        engine = SyncEngine(
+            store,
+            account,
+            pool=ConnectionPool(account, args.pool_size),
+            batch_size=args.batch_size,
+            window=args.window,
+            headers_first=not args.full_bodies,
+        )
+        waits: List[float] = []
+        syncing = threading.Event()
+        syncing.set()
+
+        def poll_store() -> None:
+            while syncing.is_set():
+                start = time.perf_counter()
+                store.call(asyncio.sleep(0))
+                waits.append(time.perf_counter() - start)
+                time.sleep(FRAME_MS / 1000)
+
+        poller = threading.Thread(target=poll_store)
+        poller.start()
+        start = time.perf_counter()
+        progress = store.call(engine.sync())
+        sync_time = time.perf_counter() - start
+        syncing.clear()
+        poller.join()
+        bodies, sync_fetches = server.bodies, server.fetches
+        backfilled = None if args.full_bodies else backfill(store, engine)
+        store.call(engine.pool.close())
+
+        changed = int(per_mailbox * args.changes)
+
+        def change() -> None:
+            rng = random.Random(0)
+            for mailbox in mailboxes:
+                picked = rng.sample(mailbox.messages, 2 * changed)
+                mailbox.expunge(message.uid for message in picked[:changed])
+                for message in picked[changed:]:
+                    mailbox.set_flags(message.uid, message.flags ^ {"\\Seen"})
+
+        server.call(change)
+        fetches = server.fetches
+        deltas: List[StoreDelta] = []
+        engine = SyncEngine(
+            store,
+            account,
+            pool=ConnectionPool(account, args.pool_size),
+            on_delta=deltas.append,
+        )
+        start = time.perf_counter()
+        store.call(engine.sync())
+        resync_time = time.perf_counter() - start
+        store.call(engine.pool.close())
+        store.close()
+    server.stop()
+
+    report = {
+        "messages": args.messages,
+        "mailboxes": args.mailboxes,
+        "pool_size": args.pool_size,
+        "batch_size": args.batch_size,
+        "window": args.window,
+        "latency_s": args.latency,
+        "bandwidth_bytes_per_s": args.bandwidth,
+        "attachment_kb": args.attachment_kb,
+        "synced": progress.imported,
+        "headers_first": not args.full_bodies,
+        "bodies_fetched_in_sync": bodies,
+        "fetch_commands": sync_fetches,
+        "sync_time_s": round(sync_time, 1),
+        "messages_per_s": round(progress.imported / sync_time),
+        "frame_ms": FRAME_MS,
+        "store_wait_during_sync": percentiles(waits),
+        "backfill": backfilled,
+        "capabilities": args.capabilities,
+        "resync": {
+            "expunged": changed * args.mailboxes,
+            "flags_changed": changed * args.mailboxes,
+            "removed": sum(
+                len(ids) for delta in deltas for ids in delta.removed.values()
+            ),
+            "statuses_changed": sum(
+                len(statuses)
+                for delta in deltas
+                for statuses in delta.statuses.values()
+            ),
+            "fetch_commands": server.fetches - fetches,
+            "time_s": round(resync_time, 2),
+        },
+        # Linux reports kilobytes; the server's mailboxes are included.
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1
+        ),
+    }
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# benchmarks/importer.py
+"""Benchmark importing a large synthetic mbox into an empty store.
+
+    python -m benchmarks.importer --messages 100000 --jobs 0
+
+Reports messages imported per second and the importer's peak memory, as JSON.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from benchmarks.store import make_words
+from src.core.store.importer import import_mail
+from src.core.store.runner import StoreRunner
+
+START = datetime(2020, 1, 1)
+CONTACTS = 500
+ME = "me@example.com"
+
+
+def write_mbox(path: str, messages: int, seed: int = 0) -> None:
+    """Write an mbox of plain and multipart messages between the user and contacts."""
+    rng = random.Random(seed)
+    with open(path, "w") as file:
+        for i in range(messages):
+            contact = rng.randrange(CONTACTS)
+            sender = f"Contact {contact} <contact{contact}@example.com>"
+            to = ME
+            if rng.random() < 0.3:
+                sender, to = f"Me <{ME}>", f"contact{contact}@example.com"
+            timestamp = START + timedelta(seconds=i * 60)
+            body = " ".join(make_words(rng, rng.randint(20, 200)))
+            file.write(
+                f"From sender {timestamp:%a %b %d %H:%M:%S %Y}\n"
+                f"From: {sender}\nTo: {to}\n"
+                f"Subject: {' '.join(make_words(rng, 4))}\n"
+                f"Date: {timestamp:%a, %d %b %Y %H:%M:%S} +0000\n"
+                f"Message-ID: <{i}@example.com>\n"
+            )
+            if i % 4:
+                file.write(f"\n{body}\n\n")
+            else:
+                file.write(
+                    'MIME-Version: 1.0\nContent-Type: multipart/alternative; boundary="b"'
+                    f"\n\n--b\nContent-Type: text/plain\n\n{body}\n"
+                    f"--b\nContent-Type: text/html\n\n<p>{body}</p>\n--b--\n\n"
+                )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--jobs", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        mbox = os.path.join(work_dir, "archive.mbox")
+        write_mbox(mbox, args.messages)
+        store = StoreRunner(os.path.join(work_dir, "store.sqlite3"))
+        start = time.perf_counter()
+        progress = import_mail(store, [mbox], me=[ME], jobs=jobs)
+        import_time = time.perf_counter() - start
+        store.close()
+        report = {
+            "messages": args.messages,
+            "jobs": jobs,
+            "mbox_mb": round(os.path.getsize(mbox) / 1e6, 1),
+            "imported": progress.imported,
+            "import_time_s": round(import_time, 1),
+            "messages_per_s": round(progress.imported / import_time),
+            # Linux reports kilobytes.
+            "peak_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1
+            ),
+            "peak_worker_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1e3, 1
+            ),
+        }
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
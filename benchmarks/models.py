@@ -0,0 +1,199 @@
+# benchmarks/models.py
+"""Measure how much memory loaded messages take, before and after compaction.
+
+    python -m benchmarks.models --sizes 100000 1000000
+
+Messages are built from SQLite rows the way the store loads them, once
+with the original dataclass models and once with the current ones, and
+the bytes allocated per message are reported as JSON.
+"""
+
+import argparse
+import gc
+import json
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+
+START = datetime(2020, 1, 1)
+MEMBERS = 2000
+
+Row = Tuple[Any, ...]
+
+
+@dataclass
+class DataclassMember:
+    """`Member` as it was before compaction."""
+
+    email: str
+    pgp_key_id: str
+    is_pgp_verified: bool
+    name: str
+
+
+@dataclass
+class DataclassMessage:
+    """`Message` as it was before compaction."""
+
+    recipients: List[DataclassMember]
+    sender: DataclassMember
+    content: str
+    timestamp: datetime
+    status: MessageStatus
+    id: Optional[int] = None
+    subject: str = ""
+
+
+def make_rows(messages: int, seed: int = 0) -> sqlite3.Connection:
+    """Create an in-memory table of messages, about half with a recipient."""
+    rng = random.Random(seed)
+    statuses = [status.value for status in MessageStatus]
+    db = sqlite3.connect(":memory:")
+    db.execute(
+        "CREATE TABLE message (id INTEGER PRIMARY KEY, sender_email, sender_name, "
+        "recipient_email, recipient_name, content, timestamp, status)"
+    )
+    rows = []
+    for i in range(messages):
+        sender, recipient = rng.randrange(MEMBERS), rng.randrange(MEMBERS)
+        has_recipient = rng.random() < 0.5
+        rows.append(
+            (
+                f"member{sender}@example.com",
+                f"Member {sender}",
+                f"member{recipient}@example.com" if has_recipient else None,
+                f"Member {recipient}" if has_recipient else None,
+                f"Message {i} " + "lorem ipsum " * rng.randint(1, 8),
+                (START + timedelta(seconds=i * 30)).isoformat(sep=" "),
+                rng.choice(statuses),
+            )
+        )
+    db.executemany(
+        "INSERT INTO message (sender_email, sender_name, recipient_email, "
+        "recipient_name, content, timestamp, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    return db
+
+
+def iter_rows(db: sqlite3.Connection) -> Iterator[Row]:
+    yield from db.execute("SELECT * FROM message ORDER BY id")
+
+
+def load_dataclasses(db: sqlite3.Connection) -> List[Any]:
+    return [
+        DataclassMessage(
+            recipients=(
+                [DataclassMember(recipient_email, "", False, recipient_name)]
+                if recipient_email
+                else []
+            ),
+            sender=DataclassMember(sender_email, "", False, sender_name),
+            content=content,
+            timestamp=datetime.fromisoformat(timestamp),
+            status=MessageStatus(status),
+            id=message_id,
+        )
+        for (
+            message_id,
+            sender_email,
+            sender_name,
+            recipient_email,
+            recipient_name,
+            content,
+            timestamp,
+            status,
+        ) in iter_rows(db)
+    ]
+
+
+def load_models(db: sqlite3.Connection) -> List[Any]:
+    return [
+        Message(
+            recipients=(
+                [Member.intern(recipient_email, "", False, recipient_name)]
+                if recipient_email
+                else []
+            ),
+            sender=Member.intern(sender_email, "", False, sender_name),
+            content=content,
+            timestamp=datetime.fromisoformat(timestamp),
+            status=MessageStatus(status),
+            id=message_id,
+        )
+        for (
+            message_id,
+            sender_email,
+            sender_name,
+            recipient_email,
+            recipient_name,
+            content,
+            timestamp,
+            status,
+        ) in iter_rows(db)
+    ]
+
+
+def measure(
+    db: sqlite3.Connection, load: Callable[[sqlite3.Connection], List[Any]]
+) -> Dict[str, float]:
+    gc.collect()
+    start = time.perf_counter()
+    tracemalloc.start()
+    messages = load(db)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    load_time = time.perf_counter() - start
+    content_bytes = sum(sys.getsizeof(message.content) for message in messages)
+    count = len(messages)
+    del messages
+    return {
+        "bytes_per_message": round(allocated / count, 1),
+        "model_bytes_per_message": round((allocated - content_bytes) / count, 1),
+        "load_time_s": round(load_time, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = []
+    for size in args.sizes:
+        db = make_rows(size)
+        before = measure(db, load_dataclasses)
+        after = measure(db, load_models)
+        db.close()
+        report.append(
+            {
+                "messages": size,
+                "before": before,
+                "after": after,
+                "saved_percent": round(
+                    100
+                    * (1 - after["bytes_per_message"] / before["bytes_per_message"]),
+                    1,
+                ),
+            }
+        )
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
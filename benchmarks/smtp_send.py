@@ -0,0 +1,149 @@
+# benchmarks/smtp_send.py
+"""Benchmark draining the outbox through the stand-in SMTP server.
+
+    python -m benchmarks.smtp_send --messages 200 --recipients 3 --latency 0.05
+
+Queues messages to chats of a few people each, then sends them three ways:
+as before, a connection of its own per message through smtplib; over the
+pooled transport with the server's PIPELINING turned off; and over the
+pooled transport with PIPELINING. `--latency` holds back every reply, as a
+distant server would, which is where the round trips saved show. Reports,
+for each, the time taken, messages per second, and the connections,
+logins and commands the server saw, as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import smtplib
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+
+from benchmarks.smtp_server import ME, PASSWORD, SmtpServer
+from src.core.account import Account
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.smtp import POOL_SIZE, SmtpTransport, build_email
+from src.core.store.outbox import OutboxSender, OutgoingMail
+from src.core.store.runner import StoreRunner
+
+START = datetime(2024, 1, 1, 9)
+
+
+class OneShotTransport:
+    """How messages were sent before the pool: smtplib on a worker thread,
+    logging in afresh for every message."""
+
+    def __init__(self, account: Account) -> None:
+        self.account = account
+
+    async def send(self, mail: OutgoingMail) -> None:
+        await asyncio.to_thread(self.send_now, mail)
+
+    def send_now(self, mail: OutgoingMail) -> None:
+        account = self.account
+        with smtplib.SMTP(account.smtp_host, account.smtp_port) as smtp:
+            smtp.login(account.smtp_username, account.smtp_password)
+            smtp.send_message(
+                build_email(mail),
+                from_addr=mail.message.sender.email,
+                to_addrs=[member.email for member in mail.unsettled],
+            )
+
+
+def queue(store: StoreRunner, sender: OutboxSender, count: int, size: int) -> None:
+    me = Member.intern(ME, name="Me")
+
+    async def enqueue() -> None:
+        for number in range(count):
+            recipients = [
+                Member.intern(f"contact{(number + offset) % 50}@example.com")
+                for offset in range(size)
+            ]
+            await sender.outbox.enqueue(
+                Message(
+                    recipients,
+                    me,
+                    f"Message {number}\n" * 20,
+                    START + timedelta(minutes=number),
+                    MessageStatus.DRAFT,
+                    subject=f"Note {number}",
+                )
+            )
+
+    store.call(enqueue())
+
+
+def run(
+    args: argparse.Namespace, mode: str, pipelining: bool
+) -> Dict[str, Union[int, float]]:
+    server = SmtpServer(latency=args.latency, pipelining=pipelining)
+    port = server.start_thread()
+    account = Account(
+        ME,
+        smtp_host="127.0.0.1",
+        smtp_port=port,
+        smtp_username=ME,
+        smtp_password=PASSWORD,
+        smtp_security="none",
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        store = StoreRunner(os.path.join(directory, "store.sqlite3"))
+        pool: Optional[SmtpTransport] = None
+        if mode == "one_shot":
+            sender = OutboxSender(store, OneShotTransport(account))
+        else:
+            pool = SmtpTransport(account, size=args.pool_size)
+            sender = OutboxSender(store, pool, concurrency=args.pool_size)
+        queue(store, sender, args.messages, args.recipients)
+        start = time.perf_counter()
+        sent = store.call(sender.send_due())
+        elapsed = time.perf_counter() - start
+        if pool is not None:
+            store.call(pool.close())
+        store.close()
+    server.stop()
+    assert len(server.messages) == sent == args.messages
+    return {
+        "time_s": round(elapsed, 2),
+        "messages_per_s": round(sent / elapsed, 1),
+        "connections": server.connections,
+        "logins": server.logins,
+        "commands": server.commands,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--recipients", type=int, default=3)
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to each reply"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = {
+        "messages": args.messages,
+        "recipients": args.recipients,
+        "pool_size": args.pool_size,
+        "latency_s": args.latency,
+        "one_shot": run(args, "one_shot", pipelining=True),
+        "pooled": run(args, "pooled", pipelining=False),
+        "pooled_pipelined": run(args, "pooled", pipelining=True),
+    }
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+# benchmarks/smtp_server.py
+"""A stand-in SMTP submission server, for tests and benchmarks.
+
+    python -m benchmarks.smtp_server --port 1587 --latency 0.05
+
+Speaks enough ESMTP for the outbox, in the manner of aiosmtpd's
+Controller: EHLO and HELO, AUTH PLAIN and LOGIN, MAIL (with SIZE and
+BODY), RCPT, DATA, RSET, NOOP and QUIT, with PIPELINING and 8BITMIME, over
+plain TCP. `latency` holds every reply back that many seconds, as a
+distant server would, without slowing the server down. Accepted messages
+are kept in `messages`; recipients in `refuse` are refused with the reply
+given.
+"""
+
+import argparse
+import asyncio
+import base64
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+ME = "me@example.com"
+PASSWORD = "secret"
+EXTENSIONS = ("PIPELINING", "8BITMIME", "SIZE 52428800", "AUTH PLAIN LOGIN")
+
+
+@dataclass
+class Delivery:
+    """A message the server accepted."""
+
+    sender: str
+    recipients: List[str]
+    data: bytes
+
+
+def address(argument: str) -> str:
+    """The address in "FROM:<a@example.com> SIZE=12"."""
+    _, _, rest = argument.partition(":")
+    return rest.strip().split(" ", 1)[0].strip("<>")
+
+
+class Session:
+    """One client's connection to the server."""
+
+    def __init__(
+        self,
+        server: "SmtpServer",
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.authenticated = False
+        self.sender: Optional[str] = None
+        self.recipients: List[str] = []
+
+    def send(self, line: str) -> None:
+        data = line.encode() + b"\r\n"
+        if self.server.latency:
+            self.loop.call_later(self.server.latency, self.writer.write, data)
+        else:
+            self.writer.write(data)
+
+    async def run(self) -> None:
+        self.server.connections += 1
+        self.send("220 Stand-in SMTP server ready")
+        try:
+            while not self.writer.is_closing():
+                line = await self.reader.readline()
+                if not line:
+                    break
+                name, _, argument = line.decode().rstrip("\r\n").partition(" ")
+                self.server.commands += 1
+                if not await self.command(name.upper(), argument):
+                    # Once the goodbye has gone out.
+                    await asyncio.sleep(self.server.latency)
+                    await self.writer.drain()
+                    break
+                await self.writer.drain()
+        finally:
+            self.writer.close()
+
+    async def command(self, name: str, argument: str) -> bool:
+        """Reply to one command; False once the session is over."""
+        if name == "EHLO":
+            self.reset()
+            extensions = [
+                extension
+                for extension in EXTENSIONS
+                if self.server.pipelining or extension != "PIPELINING"
+            ]
+            lines = ["Stand-in SMTP server", *extensions]
+            for line in lines[:-1]:
+                self.send(f"250-{line}")
+            self.send(f"250 {lines[-1]}")
+        elif name == "HELO":
+            self.reset()
+            self.send("250 Stand-in SMTP server")
+        elif name == "AUTH":
+            await self.auth(argument)
+        elif name == "NOOP":
+            self.send("250 OK")
+        elif name == "RSET":
+            self.reset()
+            self.send("250 OK")
+        elif name == "QUIT":
+            self.send("221 Bye")
+            return False
+        elif not self.authenticated:
+            self.send("530 Authentication required")
+        elif name == "MAIL":
+            if self.sender is not None:
+                self.send("503 Sender already given")
+            else:
+                self.sender = address(argument)
+                self.send("250 OK")
+        elif name == "RCPT":
+            recipient = address(argument)
+            if self.sender is None:
+                self.send("503 Need MAIL first")
+            elif recipient in self.server.refuse:
+                code, text = self.server.refuse[recipient]
+                self.send(f"{code} {text}")
+            else:
+                self.recipients.append(recipient)
+                self.send("250 OK")
+        elif name == "DATA":
+            await self.data()
+        else:
+            self.send("502 Unknown command")
+        return True
+
+    async def auth(self, argument: str) -> None:
+        mechanism, _, initial = argument.partition(" ")
+        if mechanism.upper() == "PLAIN":
+            if not initial:
+                initial = await self.challenge("")
+            _, username, password = base64.b64decode(initial).decode().split("\0")
+        elif mechanism.upper() == "LOGIN":
+            username = base64.b64decode(
+                await self.challenge(base64.b64encode(b"Username:").decode())
+            ).decode()
+            password = base64.b64decode(
+                await self.challenge(base64.b64encode(b"Password:").decode())
+            ).decode()
+        else:
+            self.send("504 Unrecognized authentication type")
+            return
+        if (username, password) != (self.server.username, self.server.password):
+            self.send("535 Authentication credentials invalid")
+            return
+        self.authenticated = True
+        self.server.logins += 1
+        self.send("235 Authentication successful")
+
+    async def challenge(self, text: str) -> str:
+        self.send(f"334 {text}")
+        await self.writer.drain()
+        return (await self.reader.readline()).decode().strip()
+
+    async def data(self) -> None:
+        if self.sender is None or not self.recipients:
+            self.send("554 No valid recipients")
+            return
+        self.send("354 End data with <CR><LF>.<CR><LF>")
+        await self.writer.drain()
+        lines = []
+        while True:
+            line = await self.reader.readline()
+            if not line or line == b".\r\n":
+                break
+            lines.append(line[1:] if line.startswith(b".") else line)
+        self.server.messages.append(
+            Delivery(self.sender, self.recipients, b"".join(lines))
+        )
+        self.send("250 OK: queued")
+        self.reset()
+
+    def reset(self) -> None:
+        self.sender = None
+        self.recipients = []
+
+
+class SmtpServer:
+    """Accepts mail from any client that logs in as `username`."""
+
+    def __init__(
+        self,
+        username: str = ME,
+        password: str = PASSWORD,
+        latency: float = 0.0,
+        pipelining: bool = True,
+    ) -> None:
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.pipelining = pipelining
+        # Recipients to refuse, with the code and text to refuse them with.
+        self.refuse: Dict[str, Tuple[int, str]] = {}
+        self.messages: List[Delivery] = []
+        # For tests: connections accepted, logins and commands received.
+        self.connections = 0
+        self.logins = 0
+        self.commands = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.sessions: Set["asyncio.Task[None]"] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self.sessions.add(task)
+        try:
+            await Session(self, reader, writer).run()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(task)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening; returns the port."""
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return int(self.server.sockets[0].getsockname()[1])
+
+    def start_thread(self) -> int:
+        """Serve from a thread of its own, for tests; returns the port."""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="smtp-server", daemon=True
+        )
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.start(), self.loop)
+        return future.result(10)
+
+    def drop_clients(self) -> None:
+        """Close every connection, as a server does to idle sessions."""
+        assert self.loop is not None
+        asyncio.run_coroutine_threadsafe(self.drop(), self.loop).result(10)
+
+    async def drop(self) -> None:
+        for task in self.sessions:
+            task.cancel()
+        await asyncio.gather(*self.sessions, return_exceptions=True)
+
+    def stop(self) -> None:
+        if self.loop is None or self.server is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=10)
+        self.loop.close()
+
+    async def close(self) -> None:
+        """Stop listening and drop every client."""
+        assert self.server is not None
+        self.server.close()
+        await self.drop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--port", type=int, default=1587)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--no-pipelining", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = SmtpServer(latency=args.latency, pipelining=not args.no_pipelining)
+    print(f"Accepting mail from {ME} / {PASSWORD} on {args.port}")
+
+    async def serve() -> None:
+        await server.start(port=args.port)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
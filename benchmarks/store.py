@@ -0,0 +1,206 @@
+# benchmarks/store.py
+"""Benchmark message store paging and search on a large synthetic mailbox.
+
+    python -m benchmarks.store --chats 10000 --messages 1000000
+
+Reports the latency of the queries the UI makes, as JSON.
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+from src.core.store.search import MessageSearch
+from src.core.store.timeline import Timeline
+
+START = datetime(2020, 1, 1)
+MEMBERS = 2000
+BATCH_SIZE = 50_000
+VOCABULARY = 20_000
+SEARCH_QUERIES = {
+    "search_rare_word": "w19999",
+    "search_common_prefix": "w1",
+    "search_two_words": "w3 w42",
+    "search_sender": "member12",
+}
+
+
+# Word frequencies fall off with rank, as they do in real mail text.
+WORDS = [f"w{rank}" for rank in range(VOCABULARY)]
+WORD_WEIGHTS = list(accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+
+
+def make_words(rng: random.Random, count: int) -> List[str]:
+    return rng.choices(WORDS, cum_weights=WORD_WEIGHTS, k=count)
+
+
+def fill_store(
+    path: str, chats: int, messages: int, large_chat: int = 0, seed: int = 0
+) -> None:
+    """Bulk-load a store created by `StoreRunner` straight through sqlite3.
+
+    Only the reads are benchmarked; loading through the ORM would make
+    setting up a million messages take minutes. The search index and chat
+    summaries are kept up to date by their triggers as rows go in. The first `large_chat`
+    messages all go to chat 1.
+    """
+    rng = random.Random(seed)
+    statuses = [status.value for status in MessageStatus]
+    with sqlite3.connect(path) as db:
+        db.executemany(
+            "INSERT INTO member (email, name, pgp_key_id, is_pgp_verified) "
+            "VALUES (?, ?, '', 0)",
+            ((f"member{i}@example.com", f"Member {i}") for i in range(MEMBERS)),
+        )
+        db.executemany(
+            "INSERT INTO chat (title, initials, preview, unread_count) "
+            "VALUES (?, ?, '', 0)",
+            ((f"Chat {i}", f"C{i % 10}") for i in range(chats)),
+        )
+        db.executemany(
+            "INSERT INTO chat_member (chat_id, member_id) VALUES (?, ?)",
+            ((i + 1, rng.randrange(MEMBERS) + 1) for i in range(chats)),
+        )
+        for batch_start in range(0, messages, BATCH_SIZE):
+            rows = []
+            for i in range(batch_start, min(batch_start + BATCH_SIZE, messages)):
+                timestamp = START + timedelta(seconds=i * 30)
+                rows.append(
+                    (
+                        1 if i < large_chat else rng.randrange(chats) + 1,
+                        rng.randrange(MEMBERS) + 1,
+                        " ".join(make_words(rng, 3)),
+                        " ".join(make_words(rng, rng.randint(5, 60))),
+                        timestamp.isoformat(sep=" "),
+                        rng.choice(statuses),
+                    )
+                )
+            db.executemany(
+                "INSERT INTO message "
+                "(chat_id, sender_id, subject, content, timestamp, status) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+def measure(
+    store: StoreRunner, make_query: Callable[[], Awaitable[Any]], repeat: int
+) -> Dict[str, float]:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        store.call(make_query())
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "median_ms": round(timings[len(timings) // 2], 2),
+        "max_ms": round(timings[-1], 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--chats", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument(
+        "--large-chat",
+        type=int,
+        default=200_000,
+        help="Messages in one chat, to time opening a long history",
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "store.sqlite3")
+        store = StoreRunner(path)
+        start = time.perf_counter()
+        fill_store(path, args.chats, args.messages, args.large_chat)
+        fill_time = time.perf_counter() - start
+        chats = ChatRepository()
+        message_search = MessageSearch()
+
+        first_chats = store.call(chats.page_chats())
+        busiest = first_chats.items[0].id
+        assert busiest is not None
+        deep_cursor = None
+        for _ in range(5):
+            deep_cursor = store.call(
+                chats.page_messages(busiest, before=deep_cursor)
+            ).next_cursor
+
+        queries = {
+            "page_summaries": measure(store, chats.page_summaries, args.repeat),
+            "page_chats": measure(store, chats.page_chats, args.repeat),
+            "page_chats_next": measure(
+                store,
+                lambda: chats.page_chats(before=first_chats.next_cursor),
+                args.repeat,
+            ),
+            "page_messages": measure(
+                store, lambda: chats.page_messages(busiest), args.repeat
+            ),
+            "page_messages_deep": measure(
+                store,
+                lambda: chats.page_messages(busiest, before=deep_cursor),
+                args.repeat,
+            ),
+            "count_outbox": measure(
+                store,
+                lambda: chats.count_messages(status=MessageStatus.OUTBOX),
+                args.repeat,
+            ),
+        }
+        small_chat = store.call(chats.add_chat("Small", [Member.intern("a@b.c")]))
+        assert small_chat.id is not None
+        for i in range(10):
+            store.call(
+                chats.add_message(
+                    small_chat.id,
+                    Message(
+                        [], Member.intern("a@b.c"), f"{i}", START, MessageStatus.SENT
+                    ),
+                )
+            )
+        for name, chat_id in (("open_chat_10", small_chat.id), ("open_chat_large", 1)):
+            # A fresh timeline each time, as when a chat is opened.
+            queries[name] = measure(
+                store, lambda: Timeline(chat_id, chats).newest(), args.repeat
+            )
+        for name, text in SEARCH_QUERIES.items():
+            queries[name] = measure(
+                store, lambda: message_search.search(text), args.repeat
+            )
+        report = {
+            "chats": args.chats,
+            "messages": args.messages,
+            "large_chat_messages": args.large_chat,
+            "fill_time_s": round(fill_time, 1),
+            "database_mb": round(os.path.getsize(path) / 1e6, 1),
+            "queries": queries,
+        }
+        store.close()
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+# benchmarks/synthetic_repo.py
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import zlib
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import gnupg
+
+START_TIMESTAMP = 1600000000
+FILES = 50
+MANIFEST = "synthetic.json"
+
+
+@dataclass
+class SyntheticAuthor:
+    name: str
+    email: str
+    fingerprint: Optional[str] = None
+
+
+@dataclass
+class SyntheticRepo:
+    """A generated repository under `root`, with its keys next to it."""
+
+    root: str
+    commits: int
+    signed_ratio: float
+    seed: int
+    authors: List[SyntheticAuthor] = field(default_factory=list)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.root, "repo")
+
+    @property
+    def keys_dir(self) -> str:
+        """Exported public keys, for use with `DirectoryKeySource`."""
+        return os.path.join(self.root, "keys")
+
+    @property
+    def gnupg_home(self) -> str:
+        """The keyring holding the secret keys the commits were signed with."""
+        return os.path.join(self.root, "gnupg")
+
+
+def write_object(objects_dir: str, kind: bytes, body: bytes) -> str:
+    """Write a loose object the way git does and return its hash."""
+    data = kind + b" " + str(len(body)).encode() + b"\0" + body
+    hexsha = hashlib.sha1(data, usedforsecurity=False).hexdigest()
+    path = os.path.join(objects_dir, hexsha[:2], hexsha[2:])
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as object_file:
+            object_file.write(zlib.compress(data, 1))
+    return hexsha
+
+
+def tree_body(entries: Dict[str, str]) -> bytes:
+    return b"".join(
+        b"100644 " + name.encode() + b"\0" + bytes.fromhex(entries[name])
+        for name in sorted(entries)
+    )
+
+
+def commit_body(
+    tree: str,
+    parent: Optional[str],
+    author: SyntheticAuthor,
+    timestamp: int,
+    message: str,
+    signature: Optional[str] = None,
+) -> bytes:
+    person = f"{author.name} <{author.email}> {timestamp} +0000"
+    lines = [f"tree {tree}"]
+    if parent:
+        lines.append(f"parent {parent}")
+    lines += [f"author {person}", f"committer {person}"]
+    if signature:
+        signature_lines = signature.rstrip("\n").split("\n")
+        lines.append("gpgsig " + "\n ".join(signature_lines))
+    return ("\n".join(lines) + f"\n\n{message}\n").encode()
+
+
+def create_keys(
+    gnupg_home: str, keys_dir: str, authors: List[SyntheticAuthor]
+) -> gnupg.GPG:
+    """Give every author a throwaway, passphrase-less ed25519 signing key."""
+    os.makedirs(gnupg_home, mode=0o700, exist_ok=True)
+    os.makedirs(keys_dir, exist_ok=True)
+    gpg = gnupg.GPG(gnupghome=gnupg_home)
+    for author in authors:
+        key = gpg.gen_key(
+            gpg.gen_key_input(
+                key_type="EDDSA",
+                key_curve="ed25519",
+                key_usage="sign",
+                name_real=author.name,
+                name_email=author.email,
+                no_protection=True,
+                expire_date=0,
+            )
+        )
+        author.fingerprint = str(key.fingerprint)
+        with open(os.path.join(keys_dir, f"{author.fingerprint}.asc"), "w") as f:
+            f.write(gpg.export_keys(author.fingerprint))
+    return gpg
+
+
+def load_repo(root: str) -> Optional[SyntheticRepo]:
+    try:
+        with open(os.path.join(root, MANIFEST), "r") as file:
+            raw = json.load(file)
+    except FileNotFoundError:
+        return None
+    raw["authors"] = [SyntheticAuthor(**author) for author in raw["authors"]]
+    return SyntheticRepo(**raw)
+
+
+def generate_repo(
+    root: str,
+    commits: int,
+    authors: int = 5,
+    signed_ratio: float = 0.5,
+    seed: int = 0,
+) -> SyntheticRepo:
+    """Generate a linear history of `commits` commits, or reuse a matching one.
+
+    Objects are written directly as loose objects and packed once at the
+    end, so even 100k commits only cost one gpg call per signed commit.
+    Signing can't be parallelised: each commit hash covers its parent's
+    signature.
+    """
+    existing = load_repo(root)
+    if existing and (
+        existing.commits,
+        len(existing.authors),
+        existing.signed_ratio,
+        existing.seed,
+    ) == (commits, authors, signed_ratio, seed):
+        return existing
+    shutil.rmtree(root, ignore_errors=True)
+
+    rng = random.Random(seed)
+    repo = SyntheticRepo(
+        root=root,
+        commits=commits,
+        signed_ratio=signed_ratio,
+        seed=seed,
+        authors=[
+            SyntheticAuthor(f"Author {i}", f"author{i}@example.com")
+            for i in range(authors)
+        ],
+    )
+    os.makedirs(root)
+    subprocess.run(["git", "init", "-q", "--bare", repo.path], check=True)
+    subprocess.run(
+        ["git", "-C", repo.path, "symbolic-ref", "HEAD", "refs/heads/main"],
+        check=True,
+    )
+    gpg = create_keys(repo.gnupg_home, repo.keys_dir, repo.authors)
+    objects_dir = os.path.join(repo.path, "objects")
+
+    files: Dict[str, str] = {}
+    parent: Optional[str] = None
+    for i in range(commits):
+        name = f"file{rng.randrange(FILES)}.txt"
+        content = "".join(
+            f"line {rng.random()}\n" for _ in range(rng.randint(1, 40))
+        ).encode()
+        files[name] = write_object(objects_dir, b"blob", content)
+        tree = write_object(objects_dir, b"tree", tree_body(files))
+        author = rng.choice(repo.authors)
+        timestamp = START_TIMESTAMP + i * 60
+        message = f"Change {name} ({i})"
+
+        signature = None
+        if rng.random() < signed_ratio:
+            payload = commit_body(tree, parent, author, timestamp, message)
+            signature = str(gpg.sign(payload, keyid=author.fingerprint, detach=True))
+        body = commit_body(tree, parent, author, timestamp, message, signature)
+        parent = write_object(objects_dir, b"commit", body)
+
+    if parent:
+        subprocess.run(
+            ["git", "-C", repo.path, "update-ref", "refs/heads/main", parent],
+            check=True,
+        )
+    subprocess.run(["git", "-C", repo.path, "repack", "-adq"], check=True)
+
+    with open(os.path.join(root, MANIFEST), "w") as file:
+        json.dump(asdict(repo), file, indent=4)
+    return repo
+
+
+def signed_commit_counts(repo: SyntheticRepo) -> Tuple[int, int]:
+    """Count signed and unsigned commits, for sanity checks."""
+    output = subprocess.run(
+        ["git", "-C", repo.path, "log", "--format=%G?"],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, GNUPGHOME=repo.gnupg_home),
+    ).stdout.split()
+    signed = sum(1 for status in output if status != "N")
+    return signed, len(output) - signed
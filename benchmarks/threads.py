@@ -0,0 +1,172 @@
+# benchmarks/threads.py
+"""Benchmark threading a large synthetic mailbox into chats.
+
+    python -m benchmarks.threads --messages 500000
+
+Messages are stored in batches as the importer stores them, arriving
+mostly in order, with some replies ahead of what they reply to and some
+without In-Reply-To or References. Reports how long threading takes per
+batch as the mailbox grows, and how well the chats match the real
+threads, as JSON.
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.core.store.importer import Batch, MailImporter, ParsedMessage
+from src.core.store.runner import StoreRunner
+from src.core.store.threads import ThreadIndex
+
+START = datetime(2020, 1, 1)
+CONTACTS = 2000
+ME = ("me@example.com", "Me")
+BATCH_SIZE = 1000
+WINDOW = 50_000
+
+
+def make_corpus(messages: int, seed: int = 0) -> Iterator[Tuple[int, ParsedMessage]]:
+    """Yield (thread, message) in arrival order.
+
+    Threads get a few messages each, with a long tail. Replies carry full
+    References, except that 10% only say what they reply to in their
+    subject and 5% arrive up to a few hundred messages early.
+    """
+    rng = random.Random(seed)
+    threads: List[Tuple[str, Tuple[str, str], List[str]]] = []
+    early: List[Tuple[int, int, ParsedMessage]] = []
+    for number in range(messages):
+        if not threads or rng.random() < 0.25:
+            person = rng.randrange(CONTACTS)
+            subject = f"Topic {len(threads)} for contact {person}"
+            threads.append(
+                (subject, (f"contact{person}@example.com", f"Contact {person}"), [])
+            )
+            thread = len(threads) - 1
+        else:
+            # Recent threads are the most likely to get replies.
+            thread = max(0, len(threads) - 1 - int(rng.expovariate(1 / 200)))
+        subject, contact, ancestors = threads[thread]
+        from_me = rng.random() < 0.4
+        message = ParsedMessage(
+            message_id=f"<{number}@example.com>",
+            references=[] if rng.random() < 0.1 else ancestors[-30:],
+            sender=ME if from_me else contact,
+            recipients=[contact if from_me else ME],
+            subject=("Re: " if ancestors else "") + subject,
+            content=f"Message {number} in thread {thread}",
+            timestamp=START + timedelta(seconds=number * 30),
+            seen=rng.random() < 0.8,
+        )
+        ancestors.append(message.message_id)
+        if ancestors[:-1] and rng.random() < 0.05:
+            # Delivered before the message before it in the thread.
+            early.append((number - rng.randint(1, 300), thread, message))
+            continue
+        while early and min(early, key=lambda item: item[0])[0] <= number:
+            item = min(early, key=lambda item: item[0])
+            early.remove(item)
+            yield item[1], item[2]
+        yield thread, message
+    for _, thread, message in sorted(early, key=lambda item: item[0]):
+        yield thread, message
+
+
+class TimedThreadIndex(ThreadIndex):
+    def __init__(self) -> None:
+        self.timings: List[float] = []
+
+    async def assign(self, *args: Any, **kwargs: Any) -> List[int]:
+        start = time.perf_counter()
+        chat_ids = await super().assign(*args, **kwargs)
+        self.timings.append(time.perf_counter() - start)
+        return chat_ids
+
+
+def score(path: str, threads: Dict[str, int]) -> Dict[str, int]:
+    """Compare the chats with the threads the messages were written in."""
+    chats_by_thread: Dict[int, Set[int]] = defaultdict(set)
+    threads_by_chat: Dict[int, Set[int]] = defaultdict(set)
+    with sqlite3.connect(path) as db:
+        for message_id, chat_id in db.execute(
+            "SELECT message_id, chat_id FROM message"
+        ):
+            thread = threads[message_id]
+            chats_by_thread[thread].add(chat_id)
+            threads_by_chat[chat_id].add(thread)
+    return {
+        "threads": len(chats_by_thread),
+        "chats": len(threads_by_chat),
+        "threads_split": sum(len(chats) > 1 for chats in chats_by_thread.values()),
+        "chats_mixing_threads": sum(len(t) > 1 for t in threads_by_chat.values()),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=500_000)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "store.sqlite3")
+        store = StoreRunner(path)
+        importer = MailImporter([ME[0]])
+        index = TimedThreadIndex()
+        importer.threads = index
+        threads: Dict[str, int] = {}
+        windows = []
+        batch: List[ParsedMessage] = []
+        window_start = time.perf_counter()
+        start = window_start
+        for number, (thread, message) in enumerate(make_corpus(args.messages), 1):
+            threads[message.message_id] = thread
+            batch.append(message)
+            if len(batch) == BATCH_SIZE or number == args.messages:
+                store.call(importer.store(Batch("synthetic", number), batch))
+                batch = []
+            if number % WINDOW == 0 or number == args.messages:
+                timings = index.timings
+                windows.append(
+                    {
+                        "messages": number,
+                        "stored_per_s": round(
+                            len(timings)
+                            * BATCH_SIZE
+                            / (time.perf_counter() - window_start)
+                        ),
+                        "thread_ms_per_batch": round(
+                            1000 * sum(timings) / len(timings), 2
+                        ),
+                    }
+                )
+                index.timings = []
+                window_start = time.perf_counter()
+        total_time = time.perf_counter() - start
+        store.close()
+        report = {
+            "messages": args.messages,
+            "batch_size": BATCH_SIZE,
+            "total_time_s": round(total_time, 1),
+            "accuracy": score(path, threads),
+            "windows": windows,
+        }
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
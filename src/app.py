@@ -1,20 +1,45 @@
 import os
 import tkinter as tk
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
 import customtkinter as ctk
 from dotenv import load_dotenv
 from multiprocessing import Queue as MPQueue
 from src.components.chat.widget import ChatInterface
 from src.components.chat_list import ChatList
 from src.components.compose.window import ComposeWindow
+from src.components.search_box import SearchBox
 from src.components.settings.window import SettingsWindow
 from src.components.utility_bar import UtilityBar
+from src.core.account import Account
+from src.core.contacts import ContactDirectory
+from src.core.imap.bodies import OPEN_CHAT, VISIBLE, BodyFetcher
+from src.core.imap.push import PushMonitor
+from src.core.imap.sync import SyncEngine
 from src.core.logging import TRACE, logger
+from src.core.models.chat import Chat
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.smtp import SmtpTransport
+from src.core.store.contacts import ContactActivity, load_contacts, load_directory
+from src.core.store.deltas import DeltaQueue
+from src.core.store.outbox import Outbox, OutboxSender
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner, when_done
+from src.core.store.sample import ME, seed_sample_chats
+from src.core.store.timeline import Timeline
 from src.utils import get_default_button_color, get_theme_colors
 from src.testdriver import testdriveable_tk
 
 # Load environment variables from .env if present
 load_dotenv()
 
+# How often contacts from newly stored mail are added to the directory.
+CONTACT_REFRESH_MS = 30_000
+# How often changes from synced mail are applied to the UI: once a frame.
+FRAME_MS = 16
+
+
 @testdriveable_tk
 class MailSocialApp(ctk.CTk):
     def __init__(self) -> None:
@@ -30,35 +55,137 @@ class MailSocialApp(ctk.CTk):
         self.update_colors()
         self.font_size = tk.IntVar(value=12)
 
+        self.store = StoreRunner()
+        self.chats = ChatRepository()
+
+        self.account = Account.from_environment()
+        self.me = self.account.member if self.account else ME
+        # Sample chats are only for trying the app out; with an account, they
+        # would be stored among its real mail for good.
+        if self.account is None:
+            self.store.call(seed_sample_chats(self.chats))
+        self.outbox = Outbox(self.chats)
+        self.outbox_sender: Optional[OutboxSender] = None
+        self.smtp: Optional[SmtpTransport] = None
+        if self.account and self.account.smtp_host:
+            self.smtp = SmtpTransport(self.account)
+            self.outbox_sender = OutboxSender(
+                self.store, self.smtp, self.outbox, concurrency=self.smtp.size
+            )
+            self.outbox_sender.start()
+        else:
+            logger.warning("No SMTP server configured; messages wait in the outbox")
+        self.deltas = DeltaQueue()
+        self.mail_sync: Optional[SyncEngine] = None
+        self.mail_push: Optional[PushMonitor] = None
+        self.mail_bodies: Optional[BodyFetcher] = None
+        if self.account and self.account.imap_host:
+            self.mail_sync = SyncEngine(
+                self.store, self.account, on_delta=self.deltas.post
+            )
+            self.mail_sync.start()
+            self.mail_push = PushMonitor(self.mail_sync)
+            self.mail_push.start()
+            self.mail_bodies = BodyFetcher(self.mail_sync)
+            self.mail_bodies.start()
+
+        self.contacts = ContactDirectory()
+        self.contacts_loaded_through = 0
+        when_done(self, self.store.submit(load_directory()), self.directory_loaded)
+
         self.sidebar_frame = ctk.CTkFrame(
             self, corner_radius=0, fg_color=self.colors["primary"], width=300
         )
         self.sidebar_frame.grid(row=0, column=0, sticky="nsew", padx=0, pady=0)
-        self.sidebar_frame.grid_rowconfigure(0, weight=1)
+        self.sidebar_frame.grid_rowconfigure(1, weight=1)
         self.sidebar_frame.grid_columnconfigure(0, weight=1)
         self.sidebar_frame.grid_propagate(False)
 
+        self.search_box = SearchBox(self.sidebar_frame, self.colors, self)
+        self.search_box.grid(row=0, column=0, sticky="ew", padx=10, pady=(10, 0))
+
         self.chat_list = ChatList(self.sidebar_frame, self.colors, self.font_size, self)
-        self.chat_list.grid(row=0, column=0, sticky="nsew", padx=10, pady=(10, 0))
+        self.chat_list.grid(row=1, column=0, sticky="nsew", padx=10, pady=(10, 0))
 
         self.utility_bar = UtilityBar(
             self.sidebar_frame, self.colors, self.open_settings
         )
-        self.utility_bar.grid(row=1, column=0, sticky="ew", padx=10, pady=10)
+        self.utility_bar.grid(row=2, column=0, sticky="ew", padx=10, pady=10)
 
         self.main_frame = ChatInterface(self, self.colors)
         self.main_frame.grid(row=0, column=1, sticky="nsew", padx=(1, 0), pady=0)
+        self.after(FRAME_MS, self.apply_deltas)
 
     def send_message(self) -> None:
         try:
-            message = self.main_frame.message_frame.get_message()
-            if message:
-                self.main_frame.display_message(message, "You", True)
-                self.main_frame.message_frame.clear_message()
-                logger.info(f"Message sent: {message}")
+            content = self.main_frame.message_frame.get_message()
+            chat = self.main_frame.chat
+            if not content.strip() or chat is None:
+                return
+            message = Message(
+                recipients=[m for m in chat.members if m.email != self.me.email],
+                sender=self.me,
+                content=content,
+                timestamp=datetime.now(),
+                status=MessageStatus.OUTBOX,
+                subject=chat.title,
+            )
+            self.queue_message(message, chat.id, on_queued=self.message_queued)
         except AttributeError as e:
             logger.error(f"Error in send_message: {str(e)}")
 
+    def queue_message(
+        self,
+        message: Message,
+        chat_id: Optional[int] = None,
+        cc: Iterable[Member] = (),
+        bcc: Iterable[Member] = (),
+        on_queued: Optional[Callable[[Message], None]] = None,
+    ) -> None:
+        """Put a message in the outbox; `on_queued` runs once it is safely stored."""
+        future = self.store.submit(self.outbox.enqueue(message, chat_id, cc, bcc))
+
+        def queued(message: Message) -> None:
+            logger.info(f"Message queued: {message.id}")
+            self.contacts.observe(message.recipients, message.timestamp)
+            if self.outbox_sender:
+                self.outbox_sender.wake()
+            if chat_id is not None:
+                summary = self.store.submit(self.chats.get_summary(chat_id))
+                when_done(self, summary, self.chat_list.update_summary)
+            if on_queued:
+                on_queued(message)
+
+        when_done(self, future, queued)
+
+    def directory_loaded(self, loaded: Tuple[ContactDirectory, int]) -> None:
+        self.contacts, self.contacts_loaded_through = loaded
+        self.after(CONTACT_REFRESH_MS, self.refresh_contacts)
+
+    def refresh_contacts(self) -> None:
+        """Add the people in mail stored since the last refresh to the directory."""
+        future = self.store.submit(load_contacts(self.contacts_loaded_through))
+        when_done(self, future, self.contacts_loaded)
+        self.after(CONTACT_REFRESH_MS, self.refresh_contacts)
+
+    def contacts_loaded(self, loaded: Tuple[List[ContactActivity], int]) -> None:
+        activity, self.contacts_loaded_through = loaded
+        self.contacts.update(activity)
+
+    def apply_deltas(self) -> None:
+        """Show what synced mail changed since the last frame, all at once."""
+        delta = self.deltas.take()
+        if delta:
+            self.main_frame.apply_delta(delta)
+            future = self.store.submit(self.chats.get_summaries(delta.chats))
+            when_done(self, future, self.chat_list.update_summaries)
+        self.after(FRAME_MS, self.apply_deltas)
+
+    def message_queued(self, message: Message) -> None:
+        # Only cleared now, so nothing typed is lost if it couldn't be stored.
+        self.main_frame.message_frame.clear_message()
+        self.main_frame.display_message(message.content, "You", True)
+
     def open_settings(self) -> None:
         settings_window = SettingsWindow(self)
         settings_window.grab_set()
@@ -71,6 +198,8 @@ class MailSocialApp(ctk.CTk):
         self.apply_colors()
 
     def apply_colors(self) -> None:
+        if hasattr(self, "search_box"):
+            self.search_box.update_colors(self.colors)
         if hasattr(self, "chat_list"):
             self.chat_list.update_colors(self.colors)
         if hasattr(self, "main_frame"):
@@ -90,11 +219,42 @@ class MailSocialApp(ctk.CTk):
         self.update_colors()
         logger.info(f"Updated accent color to: {color}")
 
-    def display_chat(self, chat) -> None:
-        self.main_frame.display_chat(chat)
+    def display_chat(self, chat: Chat) -> None:
+        assert chat.id is not None
+        self.main_frame.display_chat(chat, Timeline(chat.id, self.chats))
+        if self.mail_bodies:
+            self.mail_bodies.want_chats([chat.id], OPEN_CHAT)
+        self.warm_smtp()
+        future = self.store.submit(self.chats.mark_read(chat.id))
+        when_done(self, future, self.chat_list.update_summary)
+
+    def want_bodies(self, chat_ids: List[int]) -> None:
+        """Fetch the bodies of the chats in the chat list's view first."""
+        if self.mail_bodies and chat_ids:
+            self.mail_bodies.want_chats(chat_ids, VISIBLE)
+
+    def warm_smtp(self) -> None:
+        """Log in to the SMTP server ahead of a message being sent."""
+        if self.smtp:
+            self.store.submit(self.smtp.warm())
+
+    def destroy(self) -> None:
+        if self.outbox_sender:
+            self.outbox_sender.stop()
+        if self.smtp:
+            self.store.submit(self.smtp.close())
+        if self.mail_bodies:
+            self.mail_bodies.stop()
+        if self.mail_push:
+            self.mail_push.stop()
+        if self.mail_sync:
+            self.mail_sync.stop()
+        self.store.close()
+        super().destroy()
 
     def open_compose_window(self) -> None:
         compose_window = ComposeWindow(self)
+        self.warm_smtp()
         self.wait_visibility(compose_window)  # Ensure window is viewable before grabbing
         compose_window.grab_set()
 
@@ -2,14 +2,25 @@ import json
 import os
 from typing import List, Dict, Any
 
-from src.core.contributions import get_final_contributors_list
+from src.core.contributions_file import CONTRIBUTIONS_FILE, open_contributions
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 
 def get_contributors() -> List[Dict[str, Any]]:
-    contributions_file = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))),
-        ".contributions.json",
-    )
+    # Only the header of the compact file is read; it already holds the
+    # ranked, sorted contributor list.
+    contributions = open_contributions(os.path.join(ROOT_DIR, CONTRIBUTIONS_FILE))
+    if contributions is not None:
+        return contributions.contributors
+    return get_contributors_from_json()
+
+
+def get_contributors_from_json() -> List[Dict[str, Any]]:
+    """Fall back to an exported `.contributions.json`."""
+    from src.core.contributions import get_contributor_summary
+
+    contributions_file = os.path.join(ROOT_DIR, ".contributions.json")
     try:
         with open(contributions_file, "r") as f:
             contributions_data = json.load(f)
@@ -17,14 +28,4 @@ def get_contributors() -> List[Dict[str, Any]]:
         print(f"Contributions file not found: {contributions_file}")
         return []
 
-    contributors = get_final_contributors_list(contributions_data)
-
-    for contributor in contributors:
-        contributor["last_used_timestamp"] = max(
-            contributions_data["identities"][email]["last_used_timestamp"]
-            for email in contributor["emails"]
-        )
-
-    contributors.sort(key=lambda x: x["last_used_timestamp"], reverse=True)
-
-    return contributors
+    return get_contributor_summary(contributions_data)
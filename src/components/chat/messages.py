@@ -1,7 +1,13 @@
 import tkinter as tk
 from datetime import datetime
 import customtkinter as ctk
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional
+
+from src.core.models.message import Message
+
+
+def sender_name(message: Message) -> str:
+    return message.sender.name if message.sender.name else message.sender.email
 
 
 class ChatMessages(ctk.CTkFrame):
@@ -22,8 +28,88 @@ class ChatMessages(ctk.CTkFrame):
         self.message_frame.grid_columnconfigure(0, weight=1)
 
         self.message_widgets: List[ctk.CTkFrame] = []
+        # One frame of messages per timeline chunk shown, by chunk index.
+        self.chunk_frames: Dict[int, ctk.CTkFrame] = {}
+        self.on_scroll: Optional[Callable[[float, float], None]] = None
+
+        # Follow the scroll position to load and drop chunks as the view moves.
+        scrollbar = self.message_frame._scrollbar
+        self.message_frame._parent_canvas.configure(
+            yscrollcommand=lambda first, last: self.scrolled(scrollbar, first, last)
+        )
+
+    def scrolled(self, scrollbar: Any, first: str, last: str) -> None:
+        scrollbar.set(first, last)
+        if self.on_scroll is not None:
+            self.on_scroll(float(first), float(last))
+
+    def chunk_frame(self, index: int) -> ctk.CTkFrame:
+        if index not in self.chunk_frames:
+            frame = ctk.CTkFrame(self.message_frame, fg_color="transparent")
+            frame.grid_columnconfigure(0, weight=1)
+            self.chunk_frames[index] = frame
+            self.grid_chunks()
+        return self.chunk_frames[index]
+
+    def grid_chunks(self) -> None:
+        # Higher indexes are older, so they go above.
+        for row, index in enumerate(sorted(self.chunk_frames, reverse=True)):
+            self.chunk_frames[index].grid(row=row, column=0, sticky="ew")
 
-    def display_message(self, message: str, sender: str, is_user: bool) -> None:
+    def show_chunk(self, index: int, messages: List[Message]) -> None:
+        """Show a timeline chunk, keeping the messages already in view in place."""
+        canvas = self.message_frame._parent_canvas
+        above = [i for i in self.chunk_frames if i > index]
+        top, _ = canvas.yview()
+        height = self.message_frame.winfo_height()
+        frame = self.chunk_frame(index)
+        for message in messages:
+            sender = sender_name(message)
+            self.display_message(
+                message.content, sender, sender == "You", message.timestamp, frame
+            )
+        if not above:
+            self.update_idletasks()
+            added = frame.winfo_reqheight()
+            new_height = self.message_frame.winfo_reqheight()
+            if height > 1 and new_height:
+                canvas.yview_moveto((top * height + added) / new_height)
+
+    def drop_chunk(self, index: int) -> None:
+        frame = self.chunk_frames.pop(index, None)
+        if frame is None:
+            return
+        canvas = self.message_frame._parent_canvas
+        top, _ = canvas.yview()
+        height = self.message_frame.winfo_height()
+        removed = frame.winfo_height()
+        is_top = not any(i > index for i in self.chunk_frames)
+        self.message_widgets = [
+            widget for widget in self.message_widgets if widget.master is not frame
+        ]
+        frame.destroy()
+        self.grid_chunks()
+        if is_top:
+            self.update_idletasks()
+            new_height = self.message_frame.winfo_reqheight()
+            if new_height:
+                canvas.yview_moveto(max(0.0, top * height - removed) / new_height)
+
+    def scroll_to_bottom(self) -> None:
+        self.update_idletasks()
+        self.message_frame._parent_canvas.yview_moveto(1.0)
+
+    def display_message(
+        self,
+        message: str,
+        sender: str,
+        is_user: bool,
+        timestamp: Optional[datetime] = None,
+        container: Optional[ctk.CTkFrame] = None,
+    ) -> None:
+        # New messages go at the bottom, in the newest chunk.
+        container = container if container is not None else self.chunk_frame(0)
+        row = sum(1 for widget in self.message_widgets if widget.master is container)
         bubble_color = self.colors["button"] if is_user else self.colors["primary"]
         anchor = "e" if is_user else "w"
         justify = "right" if is_user else "left"
@@ -32,13 +118,9 @@ class ChatMessages(ctk.CTkFrame):
         sender_name = sender if sender != "You" else ""
         sender_color = "#007AFF" if is_user else "#34C759"
 
-        message_frame = ctk.CTkFrame(
-            self.message_frame, fg_color=bubble_color, corner_radius=10
-        )
+        message_frame = ctk.CTkFrame(container, fg_color=bubble_color, corner_radius=10)
         message_frame.grid_columnconfigure(0, weight=1)
-        message_frame.grid(
-            row=len(self.message_widgets), column=0, sticky="ew", padx=10, pady=5
-        )
+        message_frame.grid(row=row, column=0, sticky="ew", padx=10, pady=5)
 
         if sender_name:
             sender_label = ctk.CTkLabel(
@@ -70,7 +152,7 @@ class ChatMessages(ctk.CTkFrame):
 
         timestamp_label = ctk.CTkLabel(
             message_frame,
-            text=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            text=(timestamp or datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
             anchor=anchor,
             justify=justify,
             text_color=text_color,
@@ -87,8 +169,9 @@ class ChatMessages(ctk.CTkFrame):
         self.message_widgets.append(message_frame)
 
     def clear_messages(self) -> None:
-        for widget in self.message_widgets:
-            widget.destroy()
+        for frame in self.chunk_frames.values():
+            frame.destroy()
+        self.chunk_frames = {}
         self.message_widgets = []
 
     def update_colors(self, colors: Dict[str, str]) -> None:
@@ -1,8 +1,14 @@
 import customtkinter as ctk
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from src.components.chat.input import MessageInput
-from src.components.chat.messages import ChatMessages
+from src.components.chat.messages import ChatMessages, sender_name
 from src.core.models.chat import Chat
+from src.core.store.deltas import StoreDelta
+from src.core.store.runner import when_done
+from src.core.store.timeline import CHUNK_SIZE, Chunk, Timeline
+
+# Chunks kept on screen; further ones are dropped as the view moves away.
+MAX_SHOWN_CHUNKS = 4
 
 
 class ChatInterface(ctk.CTkFrame):
@@ -11,11 +17,17 @@ class ChatInterface(ctk.CTkFrame):
     ) -> None:
         super().__init__(master, fg_color="transparent", *args, **kwargs)
         self.colors = colors
+        self.app_instance = master
+        self.chat: Optional[Chat] = None
+        self.timeline: Optional[Timeline] = None
+        self.shown: Dict[int, Chunk] = {}
+        self.loading = False
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
         self.chat_display = ChatMessages(self, colors=self.colors)
         self.chat_display.grid(row=0, column=0, sticky="nsew", padx=0, pady=0)
+        self.chat_display.on_scroll = self.on_scroll
 
         self.message_frame = MessageInput(
             self, colors=self.colors, send_command=master.send_message
@@ -32,11 +44,76 @@ class ChatInterface(ctk.CTkFrame):
         self.chat_display.update_colors(colors)
         self.message_frame.update_colors(colors)
 
-    def display_chat(self, chat: Chat) -> None:
+    def display_chat(self, chat: Chat, timeline: Timeline) -> None:
+        """Show the newest chunk of a chat; the rest loads as the view scrolls."""
+        self.chat = chat
+        self.timeline = timeline
+        self.shown = {}
+        self.loading = False
         self.chat_display.clear_messages()
-        for message in chat.messages:
-            sender = (
-                message.sender.name if message.sender.name else message.sender.email
+        self.load_chunk(0)
+
+    def apply_delta(self, delta: StoreDelta) -> None:
+        """Catch up with changes to the open chat's messages."""
+        chat, timeline = self.chat, self.timeline
+        if chat is None or timeline is None or chat.id not in delta.chats:
+            return
+        added = delta.added.get(chat.id, [])
+        shown = {
+            message.id for chunk in self.shown.values() for message in chunk.messages
+        }
+        if (
+            delta.removed.get(chat.id)
+            or len(added) > CHUNK_SIZE
+            # Bodies that arrived for messages shown with only a preview.
+            or delta.filled.get(chat.id, set()) & shown
+        ):
+            # Cheaper to read the newest chunk again than to patch it.
+            self.display_chat(chat, Timeline(timeline.chat_id, timeline.repository))
+            return
+        # The timeline takes every new message, so the newest chunk is up to
+        # date when the view scrolls back to it or it finishes loading; only
+        # drawing them waits for it to be shown.
+        new = [message for message in added if timeline.add(message)]
+        if not new or 0 not in self.shown:
+            return
+        for message in new:
+            sender = sender_name(message)
+            self.chat_display.display_message(
+                message.content, sender, sender == "You", message.timestamp
             )
-            is_user = sender == "You"
-            self.chat_display.display_message(message.content, sender, is_user)
+        self.chat_display.scroll_to_bottom()
+
+    def load_chunk(self, index: int) -> None:
+        timeline = self.timeline
+        if timeline is None or self.loading:
+            return
+        self.loading = True
+        future = self.app_instance.store.submit(timeline.chunk(index))
+        when_done(self, future, lambda chunk: self.show_chunk(timeline, chunk))
+
+    def show_chunk(self, timeline: Timeline, chunk: Chunk) -> None:
+        if timeline is not self.timeline:
+            return
+        self.loading = False
+        if chunk.index in self.shown:
+            return
+        self.shown[chunk.index] = chunk
+        self.chat_display.show_chunk(chunk.index, chunk.messages)
+        if len(self.shown) > MAX_SHOWN_CHUNKS:
+            # Drop whichever end is furthest from the chunk just shown.
+            newest, oldest = min(self.shown), max(self.shown)
+            far_end = newest if chunk.index == oldest else oldest
+            del self.shown[far_end]
+            self.chat_display.drop_chunk(far_end)
+        if chunk.index == 0 and len(self.shown) == 1:
+            self.chat_display.scroll_to_bottom()
+
+    def on_scroll(self, first: float, last: float) -> None:
+        if not self.shown or self.loading:
+            return
+        oldest = self.shown[max(self.shown)]
+        if first <= 0.0 and oldest.has_older:
+            self.load_chunk(oldest.index + 1)
+        elif last >= 1.0 and min(self.shown) > 0:
+            self.load_chunk(min(self.shown) - 1)
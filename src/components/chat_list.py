@@ -1,14 +1,28 @@
 # ./src/components/chat_list.py
 import tkinter as tk
 from datetime import datetime
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Optional, Union
 
 import customtkinter as ctk
 from PIL import Image, ImageDraw, ImageFont, ImageTk
 
 from src.core.models.chat import Chat
-from src.core.models.member import Member
-from src.core.models.message import Message, MessageStatus
+from src.core.models.chat_summary import ChatSummary
+from src.core.store.repository import Cursor, Page
+from src.core.store.runner import when_done
+from src.core.store.search import SearchHit, SearchPage
+
+# How long the chat list has to stay put before the chats in view count as
+# seen, and their bodies are fetched.
+VISIBLE_SETTLE_MS = 200
+
+
+def format_activity(timestamp: Optional[datetime]) -> str:
+    if timestamp is None:
+        return ""
+    if timestamp.date() == datetime.now().date():
+        return timestamp.strftime("%H:%M")
+    return timestamp.strftime("%d %b")
 
 
 class ChatItem(ctk.CTkButton):
@@ -17,14 +31,14 @@ class ChatItem(ctk.CTkButton):
     def __init__(
         self,
         master: Any,
-        chat: Chat,
+        summary: ChatSummary,
         font_size: tk.IntVar,
         app_instance: Any,
         *args: Any,
         **kwargs: Any,
     ) -> None:
         super().__init__(master, fg_color=master.colors["secondary"], *args, **kwargs)
-        self.chat = chat
+        self.summary = summary
         self.font_size = font_size.get()
         self.colors = master.colors
         self.app_instance = app_instance
@@ -48,7 +62,7 @@ class ChatItem(ctk.CTkButton):
 
         draw.text(
             (size // 2, size // 2),
-            chat.title[0].upper(),
+            self.avatar_text(),
             fill=self.colors["button_text"],
             anchor="mm",
             font=font,
@@ -56,7 +70,7 @@ class ChatItem(ctk.CTkButton):
 
         # Store image in the class-level dictionary to avoid garbage collection
         self.photo = ImageTk.PhotoImage(image)
-        ChatItem.image_cache[self.chat.title] = self.photo
+        ChatItem.image_cache[self.summary.chat_id] = self.photo
 
         self.image_label = tk.Label(self, bg=self.colors["secondary"], image=self.photo)
         self.image_label.image = self.photo  # Keep a reference to the image
@@ -64,25 +78,54 @@ class ChatItem(ctk.CTkButton):
 
         self.text_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.text_frame.grid(row=0, column=1, sticky="nsew", padx=(0, 10), pady=10)
+        self.text_frame.grid_columnconfigure(0, weight=1)
 
         self.name_label = ctk.CTkLabel(
             self.text_frame,
-            text=chat.title,
+            text=summary.title,
             anchor="w",
             font=("Arial", int(self.font_size * 1.2), "bold"),
         )
         self.name_label.grid(row=0, column=0, sticky="w")
 
+        self.time_label = ctk.CTkLabel(
+            self.text_frame, anchor="e", font=("Arial", int(self.font_size * 0.9))
+        )
+        self.time_label.grid(row=0, column=1, sticky="e")
+
         self.message_label = ctk.CTkLabel(
-            self.text_frame,
-            text=self.truncate_message(chat.messages[-1].content),
-            anchor="w",
-            font=("Arial", self.font_size),
+            self.text_frame, anchor="w", font=("Arial", self.font_size)
         )
         self.message_label.grid(row=1, column=0, sticky="w")
 
+        self.unread_label = ctk.CTkLabel(
+            self.text_frame,
+            fg_color=self.colors["button"],
+            text_color=self.colors["button_text"],
+            corner_radius=8,
+            font=("Arial", int(self.font_size * 0.9), "bold"),
+        )
+        self.update_summary(summary)
+
         self.configure(command=self.on_click)
 
+    def avatar_text(self) -> str:
+        return self.summary.initials or self.summary.title[:1].upper()
+
+    def latest_content(self) -> str:
+        return self.summary.preview
+
+    def update_summary(self, summary: ChatSummary) -> None:
+        self.summary = summary
+        self.name_label.configure(text=summary.title)
+        self.message_label.configure(text=self.truncate_message(self.latest_content()))
+        self.time_label.configure(text=format_activity(summary.last_message_at))
+        if summary.unread_count:
+            self.unread_label.configure(text=f" {summary.unread_count} ")
+            self.unread_label.grid(row=1, column=1, sticky="e")
+        else:
+            self.unread_label.grid_remove()
+
     def truncate_message(self, message: str) -> str:
         max_chars = int(200 / self.font_size * 10)
         return message[:max_chars] + "..." if len(message) > max_chars else message
@@ -92,7 +135,7 @@ class ChatItem(ctk.CTkButton):
         self.name_label.configure(font=("Arial", int(self.font_size * 1.2), "bold"))
         self.message_label.configure(
             font=("Arial", self.font_size),
-            text=self.truncate_message(self.chat.messages[-1].content),
+            text=self.truncate_message(self.latest_content()),
         )
 
     def update_colors(self, colors: Dict[str, str]) -> None:
@@ -111,7 +154,7 @@ class ChatItem(ctk.CTkButton):
             font = ImageFont.load_default()
         draw.text(
             (size // 2, size // 2),
-            self.chat.title[0].upper(),
+            self.avatar_text(),
             fill=colors["button_text"],
             anchor="mm",
             font=font,
@@ -119,15 +162,51 @@ class ChatItem(ctk.CTkButton):
 
         # Store updated image in the class-level dictionary to avoid garbage collection
         self.photo = ImageTk.PhotoImage(image)
-        ChatItem.image_cache[self.chat.title] = self.photo
+        ChatItem.image_cache[self.summary.chat_id] = self.photo
 
         self.image_label.configure(image=self.photo)
         self.image_label.image = self.photo  # Keep a reference to the image
         self.name_label.configure(text_color=colors["text"])
         self.message_label.configure(text_color=colors["text"])
+        self.time_label.configure(text_color=colors["text"])
+        self.unread_label.configure(
+            fg_color=colors["button"], text_color=colors["button_text"]
+        )
+
+    def on_click(self) -> None:
+        summary = self.summary
+        self.app_instance.display_chat(Chat(summary.title, [], [], id=summary.chat_id))
+
+
+class SearchResultItem(ctk.CTkButton):
+    def __init__(
+        self,
+        master: Any,
+        hit: SearchHit,
+        font_size: tk.IntVar,
+        app_instance: Any,
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        sender = hit.sender_name or hit.sender_email
+        super().__init__(
+            master,
+            text=f"{hit.chat_title} — {sender}\n{hit.snippet}",
+            anchor="w",
+            fg_color=master.colors["secondary"],
+            text_color=master.colors["text"],
+            font=("Arial", font_size.get()),
+            command=self.on_click,
+            *args,
+            **kwargs,
+        )
+        self.hit = hit
+        self.app_instance = app_instance
 
     def on_click(self) -> None:
-        self.app_instance.display_chat(self.chat)
+        self.app_instance.display_chat(
+            Chat(self.hit.chat_title, [], [], id=self.hit.chat_id)
+        )
 
 
 class ChatList(ctk.CTkScrollableFrame):
@@ -144,6 +223,7 @@ class ChatList(ctk.CTkScrollableFrame):
         self.colors = colors
         self.font_size = font_size
         self.chat_items: List[ChatItem] = []
+        self.items_by_chat: Dict[int, ChatItem] = {}
         self.app_instance = app_instance
 
         self.compose_button = ctk.CTkButton(
@@ -156,116 +236,164 @@ class ChatList(ctk.CTkScrollableFrame):
         )
         self.compose_button.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
 
-        sample_chats = [
-            Chat(
-                "General",
-                [Member("general@example.com", "123", True, "General")],
-                [
-                    Message(
-                        [],
-                        Member("general@example.com", "123", True, "General"),
-                        "Welcome to the general chat!",
-                        datetime.now(),
-                        MessageStatus.DRAFT,
-                    ),
-                    Message(
-                        [],
-                        Member("johndoe@example.com", "456", True, "John Doe"),
-                        "Got it, thanks!",
-                        datetime.now(),
-                        MessageStatus.SENT,
-                    ),
-                    Message(
-                        [],
-                        Member("me@example.com", "789", True, "You"),
-                        "Hello everyone!",
-                        datetime.now(),
-                        MessageStatus.READ,
-                    ),
-                    Message(
-                        [],
-                        Member("unknown@example.com", "000", True, "Unknown"),
-                        "Who is this?",
-                        datetime.now(),
-                        MessageStatus.LOCAL_ONLY,
-                    ),
-                ],
-            ),
-            Chat(
-                "Work",
-                [Member("work@example.com", "123", True, "Work")],
-                [
-                    Message(
-                        [],
-                        Member("work@example.com", "123", True, "Work"),
-                        "Don't forget the meeting at 2 PM",
-                        datetime.now(),
-                        MessageStatus.DRAFT,
-                    ),
-                    Message(
-                        [],
-                        Member("johndoe@example.com", "456", True, "John Doe"),
-                        "Got it, thanks!",
-                        datetime.now(),
-                        MessageStatus.SENT,
-                    ),
-                    Message(
-                        [],
-                        Member("me@example.com", "789", True, "You"),
-                        "I'll be there!",
-                        datetime.now(),
-                        MessageStatus.READ,
-                    ),
-                ],
-            ),
-            Chat(
-                "Family",
-                [Member("family@example.com", "123", True, "Family")],
-                [
-                    Message(
-                        [],
-                        Member("mom@example.com", "123", True, "Mom"),
-                        "Are you coming for dinner?",
-                        datetime.now(),
-                        MessageStatus.DRAFT,
-                    ),
-                    Message(
-                        [],
-                        Member("me@example.com", "789", True, "You"),
-                        "Yes, I'll be there at 7 PM.",
-                        datetime.now(),
-                        MessageStatus.SENT,
-                    ),
-                ],
-            ),
-            Chat(
-                "Friends",
-                [Member("friends@example.com", "123", True, "Friends")],
-                [
-                    Message(
-                        [],
-                        Member("friend@example.com", "123", True, "Friend"),
-                        "Hey, want to grab coffee later?",
-                        datetime.now(),
-                        MessageStatus.DRAFT,
-                    ),
-                    Message(
-                        [],
-                        Member("me@example.com", "789", True, "You"),
-                        "Sure, see you at 5!",
-                        datetime.now(),
-                        MessageStatus.SENT,
-                    ),
-                ],
-            ),
+        self.next_cursor: Optional[Cursor] = None
+        self.load_more_button = ctk.CTkButton(
+            self,
+            text="Load more",
+            command=self.load_chats,
+            fg_color=self.colors["secondary"],
+            text_color=self.colors["text"],
+            corner_radius=5,
+        )
+        self.search_items: List[SearchResultItem] = []
+        # Whether search results stand in for the chats, even if there are none.
+        self.searching = False
+        self.more_results_button = ctk.CTkButton(
+            self,
+            text="More results",
+            fg_color=self.colors["secondary"],
+            text_color=self.colors["text"],
+            corner_radius=5,
+        )
+        self.visible_job: Optional[str] = None
+        scrollbar = self._scrollbar
+        self._parent_canvas.configure(
+            yscrollcommand=lambda first, last: self.scrolled(scrollbar, first, last)
+        )
+        self.load_chats()
+
+    def scrolled(self, scrollbar: Any, first: str, last: str) -> None:
+        scrollbar.set(first, last)
+        # Also called when entries are added or moved.
+        if self.visible_job is None:
+            self.visible_job = self.after(VISIBLE_SETTLE_MS, self.view_settled)
+
+    def view_settled(self) -> None:
+        self.visible_job = None
+        if not self.searching:
+            self.app_instance.want_bodies(self.visible_chats())
+
+    def visible_chats(self) -> List[int]:
+        """The chats whose entries are in view, top first."""
+        canvas = self._parent_canvas
+        top = canvas.canvasy(0)
+        bottom = top + canvas.winfo_height()
+        return [
+            item.summary.chat_id
+            for item in self.chat_items
+            if item.winfo_ismapped()
+            and item.winfo_y() < bottom
+            and item.winfo_y() + item.winfo_height() > top
         ]
 
-        for chat in sample_chats:
-            chat_item = ChatItem(self, chat, self.font_size, self.app_instance)
+    def load_chats(self) -> None:
+        """Fetch the next page of chat summaries from the store and append it."""
+        self.load_more_button.grid_remove()
+        future = self.app_instance.store.submit(
+            self.app_instance.chats.page_summaries(before=self.next_cursor)
+        )
+        when_done(self, future, self.add_chats)
+
+    def add_chats(self, page: Page[ChatSummary]) -> None:
+        for summary in page.items:
+            if summary.chat_id in self.items_by_chat:
+                self.items_by_chat[summary.chat_id].update_summary(summary)
+                continue
+            chat_item = ChatItem(self, summary, self.font_size, self.app_instance)
             chat_item.grid(
                 row=len(self.chat_items) + 1, column=0, sticky="ew", padx=5, pady=2
             )
             self.chat_items.append(chat_item)
+            self.items_by_chat[summary.chat_id] = chat_item
+        self.next_cursor = page.next_cursor
+        if self.next_cursor is not None:
+            self.load_more_button.grid(
+                row=len(self.chat_items) + 1, column=0, padx=5, pady=5, sticky="ew"
+            )
+
+    def update_summary(self, summary: ChatSummary) -> None:
+        """Refresh a chat's entry, moving it to the top if it has new activity."""
+        chat_item = self.items_by_chat.get(summary.chat_id)
+        if chat_item is None:
+            return
+        chat_item.update_summary(summary)
+        self.sort_items()
+
+    def update_summaries(self, summaries: List[ChatSummary]) -> None:
+        """Refresh many chats' entries at once, adding chats new mail started,
+        then sort and lay out the list once."""
+        for summary in summaries:
+            chat_item = self.items_by_chat.get(summary.chat_id)
+            if chat_item is not None:
+                chat_item.update_summary(summary)
+                continue
+            chat_item = ChatItem(self, summary, self.font_size, self.app_instance)
+            chat_item.grid(column=0, sticky="ew", padx=5, pady=2)
+            if self.searching:
+                chat_item.grid_remove()
+            self.chat_items.append(chat_item)
+            self.items_by_chat[summary.chat_id] = chat_item
+        if not summaries:
+            return
+        self.sort_items()
+        if self.next_cursor is not None and not self.searching:
+            self.load_more_button.grid(
+                row=len(self.chat_items) + 1, column=0, padx=5, pady=5, sticky="ew"
+            )
+
+    def sort_items(self) -> None:
+        self.chat_items.sort(
+            key=lambda item: (
+                item.summary.last_message_at or datetime.min,
+                item.summary.chat_id,
+            ),
+            reverse=True,
+        )
+        # Under search results the new order waits for the search to clear;
+        # gridding the chats now would show them over the hits.
+        if not self.searching:
+            for row, item in enumerate(self.chat_items, start=1):
+                item.grid_configure(row=row)
+
+    def show_search_results(self, page: SearchPage, append: bool = False) -> None:
+        """Replace the chats with search hits until the search is cleared."""
+        self.searching = True
+        if not append:
+            self.remove_search_items()
+            for chat_item in self.chat_items:
+                chat_item.grid_remove()
+            self.load_more_button.grid_remove()
+        self.more_results_button.grid_remove()
+        for hit in page.items:
+            search_item = SearchResultItem(self, hit, self.font_size, self.app_instance)
+            search_item.grid(
+                row=len(self.search_items) + 1, column=0, sticky="ew", padx=5, pady=2
+            )
+            self.search_items.append(search_item)
+        if page.next_offset is not None:
+            next_offset = page.next_offset
+            self.more_results_button.configure(
+                command=lambda: self.app_instance.search_box.load_more(next_offset)
+            )
+            self.more_results_button.grid(
+                row=len(self.search_items) + 1, column=0, padx=5, pady=5, sticky="ew"
+            )
+
+    def clear_search(self) -> None:
+        self.searching = False
+        self.remove_search_items()
+        self.more_results_button.grid_remove()
+        for row, chat_item in enumerate(self.chat_items, start=1):
+            chat_item.grid(row=row)
+        if self.next_cursor is not None:
+            self.load_more_button.grid(
+                row=len(self.chat_items) + 1, column=0, padx=5, pady=5, sticky="ew"
+            )
+
+    def remove_search_items(self) -> None:
+        for search_item in self.search_items:
+            search_item.destroy()
+        self.search_items = []
 
     def update_font_size(self, new_size: int) -> None:
         for chat_item in self.chat_items:
@@ -0,0 +1,128 @@
+# src/components/compose/autocomplete.py
+
+import tkinter as tk
+from email.utils import formataddr, getaddresses
+from typing import Any, Callable, List, Optional, Tuple
+
+import customtkinter as ctk
+
+from src.core.contacts import MAX_SUGGESTIONS, ContactDirectory
+from src.core.models.member import Member
+
+# Keys that move through or pick a suggestion, rather than edit the text.
+NAVIGATION_KEYS = {"Up", "Down", "Return", "Tab", "Escape"}
+
+
+class AddressAutocomplete:
+    """Suggests contacts below an address field as the user types.
+
+    The address being typed is the text after the last comma; each
+    keystroke looks it up in the contact directory, leaving out the
+    addresses already in the field. Up and Down move through the
+    suggestions, Return or Tab picks one and Escape closes them.
+    """
+
+    def __init__(
+        self, entry: ctk.CTkEntry, directory: Callable[[], ContactDirectory]
+    ) -> None:
+        self.entry = entry
+        # Looked up on each keystroke, as the app swaps in the full
+        # directory once it has loaded.
+        self.directory = directory
+        self.suggestions: List[Member] = []
+        self.popup: Optional[tk.Toplevel] = None
+        self.listbox: Optional[tk.Listbox] = None
+
+        entry.bind("<KeyRelease>", self.on_key_release)
+        entry.bind("<Down>", lambda event: self.move(1))
+        entry.bind("<Up>", lambda event: self.move(-1))
+        entry.bind("<Return>", self.on_accept)
+        entry.bind("<Tab>", self.on_accept)
+        entry.bind("<Escape>", lambda event: self.hide())
+        entry.bind("<FocusOut>", lambda event: self.entry.after(150, self.hide))
+
+    def split_text(self) -> Tuple[str, str]:
+        """The field's text as (finished addresses, address being typed)."""
+        text = str(self.entry.get())
+        head, comma, typed = text.rpartition(",")
+        return head + comma, typed.strip()
+
+    def on_key_release(self, event: Any) -> None:
+        if event.keysym in NAVIGATION_KEYS:
+            return
+        head, typed = self.split_text()
+        if not typed:
+            self.hide()
+            return
+        entered = [email.lower() for _, email in getaddresses([head]) if email]
+        self.suggestions = self.directory().search(
+            typed, MAX_SUGGESTIONS, exclude=entered
+        )
+        if self.suggestions:
+            self.show()
+        else:
+            self.hide()
+
+    def show(self) -> None:
+        if self.popup is None:
+            self.popup = tk.Toplevel(self.entry)
+            self.popup.overrideredirect(True)
+            self.listbox = tk.Listbox(
+                self.popup, activestyle="none", exportselection=False
+            )
+            self.listbox.pack(fill="both", expand=True)
+            self.listbox.bind("<ButtonRelease-1>", self.on_click)
+        assert self.listbox is not None
+        self.listbox.delete(0, "end")
+        for member in self.suggestions:
+            self.listbox.insert("end", formataddr((member.name, member.email)))
+        self.listbox.configure(height=len(self.suggestions))
+        self.listbox.selection_set(0)
+        self.popup.geometry(
+            f"{self.entry.winfo_width()}x{self.listbox.winfo_reqheight()}"
+            f"+{self.entry.winfo_rootx()}"
+            f"+{self.entry.winfo_rooty() + self.entry.winfo_height()}"
+        )
+        self.popup.deiconify()
+        self.popup.lift()
+
+    def hide(self) -> None:
+        self.suggestions = []
+        if self.popup is not None:
+            self.popup.withdraw()
+
+    def selected(self) -> int:
+        if self.listbox is None:
+            return 0
+        selection = self.listbox.curselection()  # type: ignore[no-untyped-call]
+        return int(selection[0]) if selection else 0
+
+    def move(self, step: int) -> Optional[str]:
+        if not self.suggestions or self.listbox is None:
+            return None
+        index = (self.selected() + step) % len(self.suggestions)
+        self.listbox.selection_clear(0, "end")
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return "break"
+
+    def on_accept(self, event: Any) -> Optional[str]:
+        if not self.suggestions:
+            return None
+        self.accept(self.suggestions[self.selected()])
+        return "break"
+
+    def on_click(self, event: Any) -> None:
+        if self.suggestions and self.listbox is not None:
+            index = self.listbox.nearest(event.y)  # type: ignore[no-untyped-call]
+            self.accept(self.suggestions[index])
+
+    def accept(self, member: Member) -> None:
+        head, _ = self.split_text()
+        address = formataddr((member.name, member.email))
+        text = f"{head} {address}, " if head else f"{address}, "
+        self.entry.delete(0, "end")
+        self.entry.insert(0, text)
+        self.entry.icursor("end")
+        self.hide()
+        self.entry.focus_set()
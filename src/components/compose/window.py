@@ -2,8 +2,13 @@
 
 import tkinter as tk
 import tkinter.messagebox as messagebox
+from datetime import datetime
 import customtkinter as ctk
 
+from src.components.compose.autocomplete import AddressAutocomplete
+from src.core.account import parse_addresses
+from src.core.models.message import Message, MessageStatus
+
 
 class ComposeWindow(ctk.CTkToplevel):
     def __init__(self, parent: ctk.CTk) -> None:
@@ -104,6 +109,10 @@ class ComposeWindow(ctk.CTkToplevel):
         self.cancel_button.grid(row=0, column=2, padx=(5, 0), pady=5, sticky="e")
 
         self.advanced_options_visible = False
+        self.autocompletes = [
+            AddressAutocomplete(entry, lambda: parent.contacts)
+            for entry in (self.to_entry, self.cc_entry, self.bcc_entry)
+        ]
 
     def toggle_advanced_options(self) -> None:
         if self.advanced_options_visible:
@@ -161,8 +170,31 @@ class ComposeWindow(ctk.CTkToplevel):
             self.focus_force()
 
     def send_message(self) -> None:
-        # Implement send message functionality here
-        pass
+        try:
+            to = parse_addresses(self.to_entry.get())
+            cc = parse_addresses(self.cc_entry.get())
+            bcc = parse_addresses(self.bcc_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            self.focus_force()
+            return
+        if not (to or cc or bcc):
+            messagebox.showerror("Error", "Add at least one recipient.")
+            self.focus_force()
+            return
+        message = Message(
+            recipients=to,
+            sender=self.parent.me,
+            content=self.message_textbox.get("1.0", "end-1c"),
+            timestamp=datetime.now(),
+            status=MessageStatus.OUTBOX,
+            subject=self.subject_entry.get().strip(),
+        )
+        # The window stays open until the message is safely in the outbox.
+        self.send_button.configure(state="disabled")
+        self.parent.queue_message(
+            message, cc=cc, bcc=bcc, on_queued=lambda message: self.destroy()
+        )
 
     def save_message(self) -> None:
         # Implement save message functionality here
@@ -0,0 +1,83 @@
+# ./src/components/search_box.py
+from typing import Any, Dict, Optional
+
+import customtkinter as ctk
+
+from src.core.store.runner import when_done
+from src.core.store.search import MessageSearch, SearchPage
+
+DEBOUNCE_MS = 150
+
+
+class SearchBox(ctk.CTkEntry):
+    """Search field above the chat list.
+
+    Searches run on the store thread once typing pauses; results for a
+    query that has since been edited are dropped.
+    """
+
+    def __init__(
+        self,
+        master: Any,
+        colors: Dict[str, str],
+        app_instance: Any,
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(
+            master,
+            placeholder_text="🔍 Search messages",
+            fg_color=colors["secondary"],
+            text_color=colors["text"],
+            *args,
+            **kwargs,
+        )
+        self.colors = colors
+        self.app_instance = app_instance
+        self.message_search = MessageSearch()
+        self.pending: Optional[str] = None
+        self.query = ""
+        self.generation = 0
+
+        self.bind("<KeyRelease>", self.on_key_release)
+        self.bind("<Escape>", lambda event: self.clear())
+
+    def on_key_release(self, event: Any) -> None:
+        if self.pending is not None:
+            self.after_cancel(self.pending)
+        self.pending = self.after(DEBOUNCE_MS, self.run_search)
+
+    def run_search(self, offset: int = 0) -> None:
+        self.pending = None
+        query = self.get().strip()
+        if offset == 0:
+            if query == self.query:
+                return
+            self.query = query
+        self.generation += 1
+        generation = self.generation
+        if not query:
+            self.app_instance.chat_list.clear_search()
+            return
+        future = self.app_instance.store.submit(
+            self.message_search.search(query, offset=offset)
+        )
+        when_done(
+            self, future, lambda page: self.show_results(generation, page, offset > 0)
+        )
+
+    def show_results(self, generation: int, page: SearchPage, append: bool) -> None:
+        if generation != self.generation:
+            return
+        self.app_instance.chat_list.show_search_results(page, append)
+
+    def load_more(self, offset: int) -> None:
+        self.run_search(offset)
+
+    def clear(self) -> None:
+        self.delete(0, "end")
+        self.run_search()
+
+    def update_colors(self, colors: Dict[str, str]) -> None:
+        self.colors = colors
+        self.configure(fg_color=colors["secondary"], text_color=colors["text"])
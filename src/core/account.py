@@ -0,0 +1,88 @@
+# src/core/account.py
+import os
+from dataclasses import dataclass
+from email.utils import getaddresses
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from src.core.models.member import Member
+
+# Load environment variables
+load_dotenv()
+
+SMTP_SECURITY = ("starttls", "ssl", "none")
+IMAP_SECURITY = SMTP_SECURITY
+
+
+@dataclass(frozen=True)
+class Account:
+    """The user's mail account: who they send as, the server to send through
+    and the server their mail is kept on."""
+
+    email: str
+    name: str = ""
+    smtp_host: str = ""
+    smtp_port: int = 587
+    smtp_username: str = ""
+    smtp_password: str = ""
+    # "starttls", "ssl" (implicit TLS, usually port 465) or "none".
+    smtp_security: str = "starttls"
+    imap_host: str = ""
+    imap_port: int = 993
+    imap_username: str = ""
+    imap_password: str = ""
+    # "ssl" (implicit TLS, usually port 993), "starttls" or "none".
+    imap_security: str = "ssl"
+
+    @classmethod
+    def from_environment(cls) -> Optional["Account"]:
+        """The account configured in MAILSOCIAL_* variables, or None."""
+        email = os.getenv("MAILSOCIAL_EMAIL", "").strip().lower()
+        if not email:
+            return None
+        security = os.getenv("MAILSOCIAL_SMTP_SECURITY", "starttls").lower()
+        if security not in SMTP_SECURITY:
+            raise ValueError(f"MAILSOCIAL_SMTP_SECURITY must be one of {SMTP_SECURITY}")
+        imap_security = os.getenv("MAILSOCIAL_IMAP_SECURITY", "ssl").lower()
+        if imap_security not in IMAP_SECURITY:
+            raise ValueError(f"MAILSOCIAL_IMAP_SECURITY must be one of {IMAP_SECURITY}")
+        return cls(
+            email=email,
+            name=os.getenv("MAILSOCIAL_NAME", ""),
+            smtp_host=os.getenv("MAILSOCIAL_SMTP_HOST", ""),
+            smtp_port=int(
+                os.getenv("MAILSOCIAL_SMTP_PORT", "465" if security == "ssl" else "587")
+            ),
+            smtp_username=os.getenv("MAILSOCIAL_SMTP_USERNAME", email),
+            smtp_password=os.getenv("MAILSOCIAL_SMTP_PASSWORD", ""),
+            smtp_security=security,
+            imap_host=os.getenv("MAILSOCIAL_IMAP_HOST", ""),
+            imap_port=int(
+                os.getenv(
+                    "MAILSOCIAL_IMAP_PORT", "993" if imap_security == "ssl" else "143"
+                )
+            ),
+            imap_username=os.getenv("MAILSOCIAL_IMAP_USERNAME", email),
+            imap_password=os.getenv("MAILSOCIAL_IMAP_PASSWORD", ""),
+            imap_security=imap_security,
+        )
+
+    @property
+    def member(self) -> Member:
+        return Member.intern(self.email, name=self.name)
+
+
+def parse_addresses(text: str) -> List[Member]:
+    """The members in a comma separated list of addresses, such as a To field.
+
+    Raises ValueError naming the first entry that isn't an email address.
+    """
+    members = []
+    for name, email in getaddresses([text]):
+        if not email and not name:
+            continue
+        if "@" not in email or email.startswith("@") or email.endswith("@"):
+            raise ValueError(f"{name or email} is not an email address")
+        members.append(Member.intern(email.lower(), name=name))
+    return members
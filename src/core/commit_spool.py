@@ -0,0 +1,175 @@
+# src/core/commit_spool.py
+import json
+import os
+import shutil
+import struct
+import tempfile
+import weakref
+from bisect import bisect_left
+from typing import (
+    BinaryIO,
+    Iterable,
+    Iterator,
+    ItemsView,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from src.core.commit_stream import CommitInfo
+
+# One fixed-size index entry per spooled commit: binary SHA-1, then the
+# offset and length of its line in the spool.
+INDEX_ENTRY = struct.Struct(">20sQI")
+SHA_SIZE = 20
+READ_CHUNK_ENTRIES = 4096
+
+
+def remove_spool(path: str) -> None:
+    for spool_file in (path, f"{path}.idx"):
+        try:
+            os.remove(spool_file)
+        except FileNotFoundError:
+            pass
+
+
+class SpoolItems(ItemsView[str, CommitInfo]):
+    """Items view that streams the spool instead of looking every key up."""
+
+    _mapping: "CommitSpool"
+
+    def __iter__(self) -> Iterator[Tuple[str, CommitInfo]]:
+        return self._mapping.iter_items()
+
+
+class CommitSpool(Mapping[str, CommitInfo]):
+    """Append-only JSONL file of outstanding commits with an on-disk index by SHA.
+
+    Commits are written out as they are found, so memory use doesn't grow
+    with the length of the history. Iterating keeps the order they were
+    appended in; looking a commit up sorts the index once and bisects it.
+    """
+
+    def __init__(self, path: str, temporary: bool = False) -> None:
+        self.path = path
+        self.data_file: Optional[BinaryIO] = None
+        self.index_file: Optional[BinaryIO] = None
+        self.lookup: Optional[bytes] = None
+        self.finalizer = (
+            weakref.finalize(self, remove_spool, path) if temporary else None
+        )
+
+    @classmethod
+    def temporary(cls, directory: str) -> "CommitSpool":
+        """Create an empty spool in `directory` that is removed unless persisted."""
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".jsonl", dir=directory)
+        os.close(fd)
+        open(f"{path}.idx", "wb").close()
+        return cls(path, temporary=True)
+
+    @property
+    def index_path(self) -> str:
+        return f"{self.path}.idx"
+
+    def append(self, commit_info: CommitInfo) -> None:
+        if self.data_file is None or self.index_file is None:
+            self.data_file = open(self.path, "ab")
+            self.index_file = open(self.index_path, "ab")
+        line = json.dumps(commit_info, separators=(",", ":")).encode() + b"\n"
+        offset = self.data_file.tell()
+        self.data_file.write(line)
+        self.index_file.write(
+            INDEX_ENTRY.pack(
+                bytes.fromhex(str(commit_info["hexsha"])), offset, len(line)
+            )
+        )
+        self.lookup = None
+
+    def extend(
+        self, items: Iterable[Tuple[str, CommitInfo]], skip: Optional[Set[str]] = None
+    ) -> None:
+        for commit_sha, commit_info in items:
+            if not skip or commit_sha not in skip:
+                self.append(commit_info)
+
+    def close(self) -> None:
+        for spool_file in (self.data_file, self.index_file):
+            if spool_file is not None:
+                spool_file.close()
+        self.data_file = self.index_file = None
+
+    def flush(self) -> None:
+        for spool_file in (self.data_file, self.index_file):
+            if spool_file is not None:
+                spool_file.flush()
+
+    def persist(self, path: str) -> None:
+        """Move the spool to `path`, replacing any spool there, and keep it."""
+        self.close()
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            shutil.move(self.index_path, f"{path}.idx")
+            shutil.move(self.path, path)
+            self.path = path
+        if self.finalizer is not None:
+            self.finalizer.detach()
+            self.finalizer = None
+
+    def iter_index(self) -> Iterator[Tuple[bytes, int, int]]:
+        self.flush()
+        try:
+            with open(self.index_path, "rb") as index_file:
+                while chunk := index_file.read(INDEX_ENTRY.size * READ_CHUNK_ENTRIES):
+                    yield from INDEX_ENTRY.iter_unpack(chunk)
+        except FileNotFoundError:
+            return
+
+    def iter_items(self) -> Iterator[Tuple[str, CommitInfo]]:
+        self.flush()
+        try:
+            with open(self.path, "rb") as data_file:
+                for line in data_file:
+                    commit_info: CommitInfo = json.loads(line)
+                    yield str(commit_info["hexsha"]), commit_info
+        except FileNotFoundError:
+            return
+
+    def items(self) -> SpoolItems:
+        return SpoolItems(self)
+
+    def __iter__(self) -> Iterator[str]:
+        for sha, _, _ in self.iter_index():
+            yield sha.hex()
+
+    def __len__(self) -> int:
+        self.flush()
+        try:
+            return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def __getitem__(self, commit_sha: str) -> CommitInfo:
+        try:
+            key = bytes.fromhex(commit_sha)
+        except (TypeError, ValueError):
+            raise KeyError(commit_sha) from None
+        if self.lookup is None:
+            entries = sorted(INDEX_ENTRY.pack(*entry) for entry in self.iter_index())
+            self.lookup = b"".join(entries)
+        lookup = self.lookup
+        count = len(lookup) // INDEX_ENTRY.size
+
+        def sha_at(i: int) -> bytes:
+            start = i * INDEX_ENTRY.size
+            return lookup[start : start + SHA_SIZE]
+
+        i = bisect_left(range(count), key, key=sha_at)
+        if i == count or sha_at(i) != key:
+            raise KeyError(commit_sha)
+        _, offset, length = INDEX_ENTRY.unpack_from(lookup, i * INDEX_ENTRY.size)
+        with open(self.path, "rb") as data_file:
+            data_file.seek(offset)
+            commit_info: CommitInfo = json.loads(data_file.read(length))
+        return commit_info
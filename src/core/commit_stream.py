@@ -0,0 +1,206 @@
+# src/core/commit_stream.py
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from git import Repo
+
+from src.core.logging import TRACE, logger
+from src.core.signatures import SignatureDetails
+
+# Control characters used to frame each commit header in the `git log` stream.
+# They cannot appear in names, emails or hashes and are vanishingly rare in
+# commit messages, so the parser never has to buffer more than one commit.
+RECORD_START = "\x1e"
+FIELD_SEP = "\x1f"
+HEADER_END = "\x1d"
+
+LOG_FIELDS = [
+    "%H",  # commit hash
+    "%T",  # tree hash
+    "%P",  # parent hashes
+    "%an",  # author name
+    "%ae",  # author email
+    "%ad",  # author date (raw)
+    "%cn",  # committer name
+    "%ce",  # committer email
+    "%cd",  # committer date (raw)
+    "%B",  # raw body
+]
+# Signatures are deliberately not requested here: any %G placeholder makes git
+# run gpg once per signed commit. They are read from the raw commit objects
+# instead, see src/core/signatures.py.
+LOG_FORMAT = "%x1e" + "%x1f".join(LOG_FIELDS) + "%x1d"
+
+CommitInfo = Dict[str, Union[str, int, bool, float]]
+NumstatEntry = Tuple[Optional[int], Optional[int], str]
+
+
+def parse_raw_date(raw: str) -> Tuple[int, int]:
+    """Parse a `--date=raw` value into a timestamp and a GitPython style offset.
+
+    GitPython stores timezone offsets as seconds *west* of UTC, so `+0100`
+    becomes `-3600`.
+    """
+    timestamp, _, tz = raw.strip().partition(" ")
+    offset = 0
+    if len(tz) == 5:
+        sign = -1 if tz[0] == "+" else 1
+        offset = sign * (int(tz[1:3]) * 3600 + int(tz[3:5]) * 60)
+    return int(timestamp), offset
+
+
+def parse_numstat_line(line: str) -> Optional[NumstatEntry]:
+    """Parse one `--numstat` line; binary files report `-` for both counts."""
+    parts = line.split("\t", 2)
+    if len(parts) != 3:
+        return None
+    added, removed, path = parts
+    return (
+        int(added) if added.isdigit() else None,
+        int(removed) if removed.isdigit() else None,
+        path,
+    )
+
+
+@dataclass
+class CommitRecord:
+    hexsha: str
+    tree: str
+    parents: List[str]
+    author_name: str
+    author_email: str
+    authored_date: int
+    author_tz_offset: int
+    committer_name: str
+    committer_email: str
+    committed_date: int
+    committer_tz_offset: int
+    message: str
+    numstat: List[NumstatEntry] = field(default_factory=list)
+    signature: Optional[SignatureDetails] = None
+
+    @property
+    def summary(self) -> str:
+        return self.message.split("\n", 1)[0]
+
+    @property
+    def is_signed(self) -> bool:
+        """True if the commit carries a signature, whether or not it could be verified."""
+        return self.signature is not None and self.signature.is_signed
+
+    @property
+    def lines_added(self) -> int:
+        return sum(added for added, _, _ in self.numstat if added is not None)
+
+    def to_commit_info(self) -> CommitInfo:
+        """Describe the commit with the fixed set of fields kept for outstanding commits."""
+        return {
+            "hexsha": self.hexsha,
+            "type": "commit",
+            "authored_date": self.authored_date,
+            "author_tz_offset": self.author_tz_offset,
+            "committed_date": self.committed_date,
+            "committer_tz_offset": self.committer_tz_offset,
+            "message": self.message,
+            "summary": self.summary,
+            "parents": str(tuple(self.parents)),
+        }
+
+
+def parse_header(header: str) -> CommitRecord:
+    fields = header.split(FIELD_SEP)
+    if len(fields) != len(LOG_FIELDS):
+        raise ValueError(f"Malformed commit header: {header[:80]!r}")
+    (
+        hexsha,
+        tree,
+        parents,
+        author_name,
+        author_email,
+        author_date,
+        committer_name,
+        committer_email,
+        committer_date,
+        message,
+    ) = fields
+    authored_date, author_tz_offset = parse_raw_date(author_date)
+    committed_date, committer_tz_offset = parse_raw_date(committer_date)
+    return CommitRecord(
+        hexsha=hexsha,
+        tree=tree,
+        parents=parents.split(),
+        author_name=author_name,
+        author_email=author_email,
+        authored_date=authored_date,
+        author_tz_offset=author_tz_offset,
+        committer_name=committer_name,
+        committer_email=committer_email,
+        committed_date=committed_date,
+        committer_tz_offset=committer_tz_offset,
+        message=message,
+    )
+
+
+def parse_log_stream(lines: Iterator[str]) -> Iterator[CommitRecord]:
+    """Turn the lines of a framed `git log --numstat` stream into records.
+
+    Only the commit currently being parsed is held in memory.
+    """
+    header_parts: List[str] = []
+    in_header = False
+    record: Optional[CommitRecord] = None
+
+    for line in lines:
+        if line.startswith(RECORD_START):
+            if record is not None:
+                yield record
+                record = None
+            line = line[len(RECORD_START) :]
+            in_header = True
+            header_parts = []
+
+        if in_header:
+            end = line.find(HEADER_END)
+            if end == -1:
+                header_parts.append(line)
+                continue
+            header_parts.append(line[:end])
+            record = parse_header("".join(header_parts))
+            header_parts = []
+            in_header = False
+            line = line[end + len(HEADER_END) :]
+
+        line = line.rstrip("\n")
+        if line and record is not None:
+            entry = parse_numstat_line(line)
+            if entry is not None:
+                record.numstat.append(entry)
+
+    if in_header:
+        raise ValueError("Commit stream ended inside a commit header")
+    if record is not None:
+        yield record
+
+
+def iter_commit_records(
+    repo: Repo, rev: Optional[str] = None, numstat: bool = True
+) -> Iterator[CommitRecord]:
+    """Walk history with a single `git log` process and yield one record per commit.
+
+    Merge commits are diffed against their first parent and root commits
+    against the empty tree, matching what `analyze_commits` used to compute
+    with one `git diff` per commit. With `numstat=False` no diffs are
+    computed at all and records come back with an empty `numstat`.
+    """
+    args: List[Any] = [f"--format={LOG_FORMAT}", "--date=raw", "--no-color"]
+    if numstat:
+        args += ["--numstat", "--no-renames", "--diff-merges=first-parent", "--root"]
+    if rev:
+        args.append(rev)
+    logger.log(TRACE, f"Streaming commits with git log {args}")
+    process = repo.git.log(*args, as_process=True)
+    lines = (raw.decode("utf-8", errors="replace") for raw in process.stdout)
+    yield from parse_log_stream(lines)
+    # Only reached once the stream is exhausted; if the caller stops early the
+    # process wrapper terminates git when it goes out of scope.
+    process.wait()
@@ -0,0 +1,237 @@
+# src/core/contacts.py
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.core.models.member import Member
+from src.core.models.message import EPOCH
+
+MAX_SUGGESTIONS = 8
+# Ranking trades frequency against recency: twice as many messages is
+# worth as much as having last been in touch this many days later.
+HALF_LIFE_DAYS = 30.0
+# Past this many changes at once, the index is re-sorted rather than
+# updated entry by entry.
+REBUILD_THRESHOLD = 1000
+# Prefixes matching more index entries than this keep their best ranked
+# contacts at hand, so the first letters typed don't scan a large run.
+CACHED_RUN = 2000
+CACHED_TOP = 32
+# Sorts after any key that starts with the same prefix.
+PREFIX_END = "\U0010ffff"
+
+WORD = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Text folded for matching: case and accents removed, so "jose" finds José."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def contact_keys(member: Member) -> Tuple[str, ...]:
+    """What a contact can be found by: its address, and each word of its
+    name and of the part of its address before the @."""
+    email = normalize(member.email)
+    words = WORD.findall(email.partition("@")[0]) + WORD.findall(normalize(member.name))
+    return tuple(dict.fromkeys([email, *words]))
+
+
+def frecency(message_count: int, last_seen_at: Optional[datetime]) -> float:
+    days = 0.0
+    if last_seen_at is not None:
+        days = (last_seen_at - EPOCH).total_seconds() / 86400
+    return math.log2(1 + message_count) + days / HALF_LIFE_DAYS
+
+
+@dataclass(slots=True)
+class Contact:
+    member: Member
+    message_count: int = 0
+    last_seen_at: Optional[datetime] = None
+    keys: Tuple[str, ...] = ()
+
+
+class ContactDirectory:
+    """Everyone the user has mail with, found by prefix as they type an address.
+
+    Every key of every contact is held in one sorted list (with the
+    contact each belongs to in a parallel list), so the contacts matching
+    a prefix are one contiguous run found by bisection. They are ranked
+    by frecency: the more messages, and the more recent the last, the
+    higher. Runs too long to rank on every keystroke, as for the first
+    letter or two, have their best contacts cached, and the cache is
+    kept up to date as contacts are added and updated in place.
+    """
+
+    def __init__(self) -> None:
+        self.contacts: List[Contact] = []
+        # Parallel to `contacts`, so ranking is a C-level lookup.
+        self.ranks: List[float] = []
+        self.by_email: Dict[str, int] = {}
+        self.keys: List[str] = []
+        self.owners: List[int] = []
+        # Best ranked contacts first, for prefixes with long runs.
+        self.top: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.contacts)
+
+    def get(self, email: str) -> Optional[Contact]:
+        index = self.by_email.get(email)
+        return None if index is None else self.contacts[index]
+
+    def update(
+        self,
+        activity: Iterable[Tuple[Member, int, Optional[datetime]]],
+    ) -> None:
+        """Set the message count and last message time of contacts, adding
+        the ones not seen before."""
+        changes = list(activity)
+        rebuild = len(changes) > REBUILD_THRESHOLD
+        for member, message_count, last_seen_at in changes:
+            index = self.by_email.get(member.email)
+            if index is None:
+                index = len(self.contacts)
+                self.contacts.append(Contact(member))
+                self.ranks.append(0.0)
+                self.by_email[member.email] = index
+            contact = self.contacts[index]
+            old_keys, old_rank = contact.keys, self.ranks[index]
+            contact.message_count = message_count
+            contact.last_seen_at = last_seen_at
+            self.ranks[index] = frecency(message_count, last_seen_at)
+            self.set_member(index, member, index_keys=not rebuild)
+            if not rebuild:
+                self.update_top(index, old_keys, old_rank)
+        if rebuild:
+            self.rebuild()
+
+    def observe(self, members: Iterable[Member], when: datetime) -> None:
+        """Count one more message with each of `members`, sent or received `when`."""
+        activity = []
+        for member in {member.email: member for member in members}.values():
+            contact = self.get(member.email)
+            if contact is None or contact.last_seen_at is None:
+                activity.append((member, 1, when))
+            else:
+                activity.append(
+                    (member, contact.message_count + 1, max(contact.last_seen_at, when))
+                )
+        self.update(activity)
+
+    def set_member(self, index: int, member: Member, index_keys: bool = True) -> None:
+        contact = self.contacts[index]
+        # A message without a display name doesn't make a contact lose theirs.
+        if contact.keys and not member.name and contact.member.name:
+            member = contact.member
+        keys = contact_keys(member)
+        contact.member = member
+        if keys == contact.keys:
+            return
+        if index_keys:
+            for key in contact.keys:
+                position = bisect_left(self.keys, key)
+                end = bisect_right(self.keys, key, position)
+                position += self.owners[position:end].index(index)
+                del self.keys[position]
+                del self.owners[position]
+            for key in keys:
+                position = bisect_right(self.keys, key)
+                self.keys.insert(position, key)
+                self.owners.insert(position, index)
+        contact.keys = keys
+
+    def update_top(
+        self, index: int, old_keys: Tuple[str, ...], old_rank: float
+    ) -> None:
+        """Bring the cached best contacts of the prefixes of a changed
+        contact's keys up to date."""
+        if not self.top:
+            return
+        keys = self.contacts[index].keys
+        rank = self.ranks[index]
+        prefixes = {
+            key[:length]
+            for key in (*old_keys, *keys)
+            for length in range(1, len(key) + 1)
+        }
+        for prefix in prefixes & self.top.keys():
+            top = self.top[prefix]
+            matches = any(key.startswith(prefix) for key in keys)
+            if index in top:
+                top.remove(index)
+                if not matches or rank < old_rank:
+                    # Whoever comes next isn't known without a scan.
+                    del self.top[prefix]
+                    continue
+            if matches and rank > self.ranks[top[-1]]:
+                ranks = [-self.ranks[other] for other in top]
+                top.insert(bisect_right(ranks, -rank), index)
+                del top[CACHED_TOP:]
+
+    def rebuild(self) -> None:
+        entries = sorted(
+            (key, index)
+            for index, contact in enumerate(self.contacts)
+            for key in contact.keys
+        )
+        self.keys = [key for key, _ in entries]
+        self.owners = [index for _, index in entries]
+        self.top = {}
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect_left(self.keys, prefix)
+        return start, bisect_left(self.keys, prefix + PREFIX_END, start)
+
+    def best(self, prefix: str, start: int, end: int, limit: int) -> List[int]:
+        """The `limit` best ranked contacts in a run of the index."""
+        if end - start <= CACHED_RUN or limit > CACHED_TOP:
+            candidates = set(self.owners[start:end])
+            return heapq.nlargest(limit, candidates, key=self.ranks.__getitem__)
+        top = self.top.get(prefix)
+        if top is None:
+            candidates = set(self.owners[start:end])
+            top = heapq.nlargest(CACHED_TOP, candidates, key=self.ranks.__getitem__)
+            self.top[prefix] = top
+        return top[:limit]
+
+    def search(
+        self,
+        text: str,
+        limit: int = MAX_SUGGESTIONS,
+        exclude: Iterable[str] = (),
+    ) -> List[Member]:
+        """The best ranked contacts with a key starting with each word of `text`."""
+        terms = list(dict.fromkeys(normalize(text).split()))
+        if not terms:
+            return []
+        ranges = [self.prefix_range(term) for term in terms]
+        # Candidates come from the narrowest run; the other terms filter them.
+        narrowest = min(range(len(terms)), key=lambda i: ranges[i][1] - ranges[i][0])
+        start, end = ranges[narrowest]
+        others = terms[:narrowest] + terms[narrowest + 1 :]
+        excluded = set(exclude)
+        if others:
+            candidates = [
+                index
+                for index in set(self.owners[start:end])
+                if all(
+                    any(key.startswith(term) for key in self.contacts[index].keys)
+                    for term in others
+                )
+            ]
+            best = heapq.nlargest(
+                limit + len(excluded), candidates, key=self.ranks.__getitem__
+            )
+        else:
+            best = self.best(terms[0], start, end, limit + len(excluded))
+        members = [self.contacts[index].member for index in best]
+        return [member for member in members if member.email not in excluded][:limit]
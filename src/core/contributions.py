@@ -4,10 +4,14 @@ import json
 import os
 import re
 import tempfile
+import time
 import uuid
-from datetime import datetime
 from importlib import metadata
-from typing import Any, Dict, List, Optional, Union
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import replace
+from itertools import islice
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
 import shlex
 
 import gnupg
@@ -16,32 +20,56 @@ from dotenv import load_dotenv
 from git import GitCommandError, Repo
 from github import Github
 
+from src.core.commit_spool import CommitSpool
+from src.core.commit_stream import CommitRecord, iter_commit_records
+from src.core.contributions_file import (
+    CONTRIBUTIONS_FILE,
+    export_json,
+    write_contributions,
+)
+from src.core.keycache import (
+    DirectoryKeySource,
+    CachedKey,
+    KeyCache,
+    KeyserverSource,
+    KeySource,
+    extract_emails,
+    get_gnupg_home,
+    get_key_cache_path,
+)
 from src.core.logging import TRACE, logger
+from src.core.numstat_cache import NumstatCache, fill_numstat, get_numstat_cache_path
+from src.core.signatures import (
+    SignatureDetails,
+    iter_signatures,
+    read_raw_commit,
+    split_signature,
+    verify_signature,
+)
 
 # Load environment variables
 load_dotenv()
 
-# Initialize GPG
-gpg = gnupg.GPG()
+# GPG and the caches are created on first use so that importing this module
+# doesn't touch the filesystem; GPG uses a keyring separate from the user's.
+gpg: Optional[gnupg.GPG] = None
+key_cache: Optional[KeyCache] = None
+numstat_cache: Optional[NumstatCache] = None
+
+STATE_VERSION = 2
+PARTIAL_CLONE_FILTERS = {"blobless": "blob:none", "treeless": "tree:0"}
+VERIFY_BATCH_SIZE = 256
+
+# What gpg reported about a commit and the key ID it was verified with, if any.
+VerifiedSignature = Tuple[SignatureDetails, Optional[str]]
+# A batch verified in a worker, and the keys it looked up.
+VerifiedBatch = Tuple[List[VerifiedSignature], Dict[str, CachedKey]]
 
 GITHUB_API_KEY = os.getenv("GITHUB_API_KEY")
 if not GITHUB_API_KEY:
     logger.error("GITHUB_API_KEY not set in environment variables")
 
 
-def get_commit_info(commit: Any) -> Dict[str, Union[str, int, bool, float]]:
-    """Extract relevant information from a commit object."""
-    commit_info: Dict[str, Union[str, int, bool, float]] = {}
-    for attr in dir(commit):
-        if not attr.startswith("_") and not callable(getattr(commit, attr)):
-            value = getattr(commit, attr)
-            if isinstance(value, (str, int, bool, float)):
-                commit_info[attr] = value
-            elif isinstance(value, (list, tuple)):
-                commit_info[attr] = str(value)
-    return commit_info
-
-
 def get_repo_url() -> Optional[str]:
     """Get the repository URL from the project metadata."""
     try:
@@ -59,15 +87,31 @@ def get_repo_url() -> Optional[str]:
         return None
 
 
-def get_repo_path() -> str:
-    """Get the path to the local repository."""
+def get_repo_path(clone_filter: Optional[str] = None) -> str:
+    """Get the path to the local repository.
+
+    Partial clones are bare and live next to the full clone, so switching
+    modes never mixes the two.
+    """
     cache_dir = user_cache_dir("mailsocial")
+    if clone_filter:
+        return os.path.join(cache_dir, f"repo-{clone_filter.replace(':', '-')}.git")
     repo_path = os.path.join(cache_dir, "repo")
     return repo_path
 
 
-def clone_or_pull_repo(repo_url: str, repo_path: str) -> Repo:
-    """Clone the repository if it doesn't exist, or pull if it does."""
+def clone_or_pull_repo(
+    repo_url: str, repo_path: str, clone_filter: Optional[str] = None
+) -> Repo:
+    """Clone the repository if it doesn't exist, or pull if it does.
+
+    With a `clone_filter` such as `blob:none` the repository is a bare partial
+    clone: only commits (and trees, unless filtered too) are downloaded up
+    front, missing objects are fetched by git when a diff needs them, and
+    updates are plain fetches since there is no working tree to merge into.
+    """
+    if clone_filter:
+        return clone_or_fetch_partial(repo_url, repo_path, clone_filter)
     if os.path.exists(repo_path):
         logger.info("Repository already exists. Pulling latest changes...")
         repo = Repo(repo_path)
@@ -80,68 +124,78 @@ def clone_or_pull_repo(repo_url: str, repo_path: str) -> Repo:
     return Repo(repo_path)
 
 
-def extract_signature_details(
-    commit_sha: str, repo_path: str
-) -> Optional[Dict[str, Any]]:
-    """Extract the PGP signature details of a commit and convert to JSON."""
-    try:
-        # Use GitPython instead of subprocess
+def clone_or_fetch_partial(repo_url: str, repo_path: str, clone_filter: str) -> Repo:
+    if os.path.exists(repo_path):
+        logger.info("Partial clone already exists. Fetching latest changes...")
         repo = Repo(repo_path)
-        commit = repo.commit(commit_sha)
-        output = repo.git.show(commit, show_signature=True)
+    else:
+        logger.info(f"Cloning repository with --filter={clone_filter}...")
+        os.makedirs(os.path.dirname(repo_path), exist_ok=True)
+        repo = Repo.clone_from(repo_url, repo_path, bare=True, filter=clone_filter)
+        # Bare clones don't track the remote, so map its branches onto ours;
+        # forced updates let force-pushes through for analyze_commits to detect.
+        repo.git.config("remote.origin.fetch", "+refs/heads/*:refs/heads/*")
+    repo.git.fetch("--prune", "origin")
+    return repo
 
-        logger.debug(f"Git command output:\n{output}")
 
-        commit_info: Dict[str, Any] = {}
-        commit_info["commit"] = commit_sha
+def check_signature(signature: bytes, payload: bytes) -> SignatureDetails:
+    """Verify a commit signature, fetching its key first if the keyring
+    doesn't have it yet, since gpg can't tell a bad signature from a good
+    one without the key."""
+    details = verify_signature(get_gpg(), signature, payload)
+    if details.status == "E" and details.key_id:
+        if get_key_cache().import_key(details.key_id):
+            details = verify_signature(get_gpg(), signature, payload)
+    return details
+
+
+def get_gpg() -> gnupg.GPG:
+    """Get the GPG instance bound to the dedicated mailsocial keyring."""
+    global gpg
+    if gpg is None:
+        gpg = gnupg.GPG(gnupghome=get_gnupg_home())
+    return gpg
+
+
+def get_key_cache() -> KeyCache:
+    """Get the key cache, backed by the keyserver unless another source was set."""
+    global key_cache
+    if key_cache is None:
+        key_cache = KeyCache(get_key_cache_path(), KeyserverSource(get_gpg()))
+    return key_cache
+
+
+def get_numstat_cache() -> NumstatCache:
+    """Get the numstat cache persisted in the mailsocial cache dir."""
+    global numstat_cache
+    if numstat_cache is None:
+        numstat_cache = NumstatCache(get_numstat_cache_path())
+    return numstat_cache
 
-        # Extract GPG signature information
-        signature_match = re.search(
-            r"gpg: Signature made (.*)\ngpg:.*using (.*) key ([\w]+)", output
-        )
-        if signature_match:
-            commit_info["signature_date"] = signature_match.group(1).strip()
-            commit_info["key_type"] = signature_match.group(2).strip()
-            commit_info["key_id"] = signature_match.group(3).strip()
-        else:
-            logger.error("GPG signature details not found.")
-            return None
-
-        # Extract author information
-        author_match = re.search(r"Author:\s+(.*)", output)
-        if author_match:
-            commit_info["author"] = author_match.group(1).strip()
-
-        # Extract all email addresses
-        emails = re.findall(r"<([^>]+)>", output)
-        commit_info["emails"] = emails
-
-        # Convert the commit info to JSON
-        commit_info_json = json.dumps(commit_info, indent=4)
-        logger.info(f"Commit Info JSON:\n{commit_info_json}")
-        return commit_info
-    except Exception as e:
-        logger.error(f"Error extracting signature details: {e}")
-        return None
+
+def set_key_source(source: KeySource, cache_path: Optional[str] = None) -> None:
+    """Look keys up in `source` instead of the keyserver, e.g. a key directory."""
+    global key_cache
+    key_cache = KeyCache(cache_path, source)
 
 
 def compare_with_keyserver(key_id: str, emails: List[str]) -> bool:
-    """Compare the extracted emails with the PGP key on the keyserver."""
+    """Check that the extracted emails are all UIDs of the PGP key."""
     try:
-        # Lookup the PGP key on the key server
-        key_data = gpg.recv_keys("keyserver.ubuntu.com", key_id)
-
-        # List the keys and extract UIDs
-        key = gpg.list_keys(keys=key_id)[0]
-        key_emails = []
-        for uid in key["uids"]:
-            email_match = re.search(r"<([^>]+)>", uid)
-            if email_match:
-                key_emails.append(email_match.group(1).strip())
+        # Lookup the PGP key through the cache
+        uids = get_key_cache().get_uids(key_id)
+        if uids is None:
+            logger.error(f"PGP key {key_id} not found")
+            return False
+
+        key_emails = extract_emails(uids)
         logger.info(f"Emails from key server: {key_emails}")
 
-        # Compare the emails
-        emails_match = set(emails) == set(key_emails)
+        # Every address the commit claims must belong to the key
+        emails_match = bool(emails) and {e.lower() for e in emails} <= {
+            e.lower() for e in key_emails
+        }
         logger.info(f"Emails match: {emails_match}")
         return emails_match
     except Exception as e:
@@ -149,101 +203,371 @@ def compare_with_keyserver(key_id: str, emails: List[str]) -> bool:
         return False
 
 
-def verify_pgp_signature(commit: Any, repo_path: str) -> Optional[str]:
-    """Verify the PGP signature of a commit and extract the key ID."""
-    try:
-        if hasattr(commit, "gpgsig"):
-            commit_info = extract_signature_details(commit.hexsha, repo_path)
-            if not commit_info:
-                return None
+def unique_emails(emails: List[str]) -> List[str]:
+    unique: List[str] = []
+    for email in emails:
+        if email and email.lower() not in unique:
+            unique.append(email.lower())
+    return unique
 
-            emails_match = compare_with_keyserver(
-                commit_info["key_id"], commit_info["emails"]
-            )
-            if emails_match:
-                logger.info(f"Emails match for PGP key ID: {commit_info['key_id']}")
-            else:
-                logger.warning(
-                    f"Emails do not match for PGP key ID: {commit_info['key_id']}"
-                )
-
-            return commit_info["key_id"] if emails_match else None
-        else:
-            logger.info(f"No PGP signature found for commit {commit.hexsha}")
+
+def signature_emails(record: CommitRecord) -> List[str]:
+    """Collect the email addresses a signed commit claims to belong to."""
+    return unique_emails([record.author_email, record.committer_email])
+
+
+def verify_commit_record(record: CommitRecord) -> Optional[str]:
+    """Check a streamed commit's verified signature and return its key ID."""
+    if record.signature is None or not record.is_signed:
+        logger.info(f"No PGP signature found for commit {record.hexsha}")
         return None
-    except Exception as e:
-        logger.error(f"Error verifying PGP signature for commit {commit.hexsha}: {e}")
+    if not record.signature.key_id:
+        logger.error(f"GPG signature details not found for commit {record.hexsha}")
+        return None
+    if record.signature.status != "G":
+        logger.warning(
+            f"PGP signature on commit {record.hexsha} is not good: "
+            f"{record.signature.status}"
+        )
         return None
 
+    key_id = record.signature.key_id
+    emails_match = compare_with_keyserver(key_id, signature_emails(record))
+    if emails_match:
+        logger.info(f"Emails match for PGP key ID: {key_id}")
+    else:
+        logger.warning(f"Emails do not match for PGP key ID: {key_id}")
+    return key_id if emails_match else None
+
+
+def identity_id(email: str) -> str:
+    """Derive a stable identity ID, so reruns and parallel runs produce the same file."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"mailto:{email}"))
+
+
+def init_verify_worker(
+    entries: Dict[str, CachedKey], source: KeySource, worker_gpg: gnupg.GPG
+) -> None:
+    """Give a verification worker the parent's keyring and a copy of its key
+    cache. The copy isn't saved; what the worker looks up goes back to the
+    parent with each batch, which saves the cache once."""
+    global gpg, key_cache
+    gpg = worker_gpg
+    key_cache = KeyCache(None, source, entries=entries)
+
+
+def verify_records(repo: Repo, records: List[CommitRecord]) -> List[VerifiedSignature]:
+    """Verify a batch of commits from their raw objects."""
+    signatures = iter_signatures(repo, get_gpg(), [record.hexsha for record in records])
+    results: List[VerifiedSignature] = []
+    for record, (_, signature) in zip(records, signatures):
+        if signature.status == "E" and signature.key_id:
+            # Most likely the key isn't in the keyring yet.
+            raw, payload = split_signature(read_raw_commit(repo, record.hexsha))
+            assert raw is not None
+            signature = check_signature(raw, payload)
+        record.signature = signature
+        results.append((signature, verify_commit_record(record)))
+    return results
+
+
+def verify_batch(git_dir: str, records: List[CommitRecord]) -> VerifiedBatch:
+    """Verify a batch of commits in a pool worker; also returns the keys it
+    looked up."""
+    results = verify_records(Repo(git_dir), records)
+    return results, get_key_cache().take_fetched()
+
+
+def iter_batches(
+    records: Iterator[CommitRecord],
+) -> Iterator[List[CommitRecord]]:
+    while batch := list(islice(records, VERIFY_BATCH_SIZE)):
+        yield batch
+
+
+def verify_serially(
+    repo: Repo, records: Iterator[CommitRecord]
+) -> Iterator[Tuple[CommitRecord, Optional[str]]]:
+    for batch in iter_batches(records):
+        for record, (_, key_id) in zip(batch, verify_records(repo, batch)):
+            yield record, key_id
+
+
+def verify_in_pool(
+    repo: Repo, records: Iterator[CommitRecord], jobs: int
+) -> Iterator[Tuple[CommitRecord, Optional[str]]]:
+    """Verify streamed commits in a process pool, yielding them in their original order.
+
+    Batches are collected strictly in submission order and only a few are in
+    flight at once, so the tally is built exactly as in a serial run and memory
+    stays bounded by `jobs * VERIFY_BATCH_SIZE` commits.
+    """
+    cache = get_key_cache()
+    pending: Deque[Tuple[List[CommitRecord], Future[VerifiedBatch]]] = deque()
+    batches = iter_batches(records)
+    fetched = False
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_verify_worker,
+        initargs=(cache.entries, cache.source, get_gpg()),
+    ) as executor:
+        while True:
+            batch = next(batches, None)
+            if batch:
+                # Workers only need the commit identity, not the diff or message.
+                stripped = [replace(record, numstat=[], message="") for record in batch]
+                future = executor.submit(verify_batch, str(repo.git_dir), stripped)
+                pending.append((batch, future))
+            if pending and (not batch or len(pending) >= jobs * 2):
+                batch_records, done = pending.popleft()
+                results, entries = done.result()
+                cache.merge(entries)
+                fetched = fetched or bool(entries)
+                for record, (signature, key_id) in zip(batch_records, results):
+                    record.signature = signature
+                    yield record, key_id
+            if not batch and not pending:
+                break
+    if fetched:
+        cache.save()
+
+
+def attach_numstat(
+    repo: Repo,
+    verified: Iterator[Tuple[CommitRecord, Optional[str]]],
+    cache: NumstatCache,
+) -> Iterator[Tuple[CommitRecord, Optional[str]]]:
+    """Fill in line counts for verified commits a batch at a time, keeping order."""
+    while batch := list(islice(verified, VERIFY_BATCH_SIZE)):
+        fill_numstat(repo, [record for record, key_id in batch if key_id], cache)
+        yield from batch
+
+
+def walk_commits(
+    repo: Repo, rev: Optional[str] = None, jobs: int = 1
+) -> Dict[str, Any]:
+    """Walk `rev` (all of HEAD by default) and tally raw lines of code per identity.
+
+    The tally keeps absolute line counts under `loc` so that tallies from
+    different ranges of history can be merged before percentages are computed.
+    With `jobs` > 1 signatures are verified in a process pool; the result is
+    identical to a serial walk.
+    """
+    # Lines of code are only needed for verified commits, so diffs are left
+    # out of the history stream and looked up per tree pair afterwards.
+    records = iter_commit_records(repo, rev, numstat=False)
+    verified = (
+        verify_in_pool(repo, records, jobs)
+        if jobs > 1
+        else verify_serially(repo, records)
+    )
+    cache = get_numstat_cache()
+    verified = attach_numstat(repo, verified, cache)
 
-def analyze_commits(repo: Repo, repo_path: str) -> Dict[str, Any]:
-    """Analyze commits and calculate contribution percentages."""
     identities: Dict[str, Dict[str, Any]] = {}
-    outstanding_commits: Dict[str, Dict[str, Any]] = {}
+    outstanding_commits = CommitSpool.temporary(get_spool_dir())
     total_loc = 0
-    for commit in repo.iter_commits():
-        commit_info = get_commit_info(commit)
-        logger.log(TRACE, f"Commit info: {commit_info}")
-        key_id = verify_pgp_signature(commit, repo_path)
+    commit_count = 0
+    start_time = time.perf_counter()
+    for record, key_id in verified:
+        commit_count += 1
+        logger.log(TRACE, f"Commit record: {record}")
         if key_id:
-            author_email = commit.author.email
-            if author_email is not None:
-                author_email = author_email.lower()
-                if author_email not in identities:
-                    identities[author_email] = {
-                        "id": str(uuid.uuid4()),
-                        "email": author_email,
-                        "name": commit.author.name,
-                        "pgp_key_id": key_id,
-                        "github_username": None,
-                        "verified": True,
-                        "contribution_percentage": 0.0,
-                        "last_used_timestamp": commit.committed_date,
-                    }
-                # Update the lines of code count
-                if commit.parents:
-                    diff = repo.git.diff(
-                        commit.parents[0], commit, "--numstat", "--no-renames"
-                    ).strip()
-                    for line in diff.split("\n"):
-                        if line:
-                            parts = line.split()
-                            if len(parts) >= 2 and parts[0].isdigit():
-                                loc = int(parts[0])
-                                identities[author_email][
-                                    "contribution_percentage"
-                                ] += loc
-                                total_loc += loc
-                else:
-                    # Handle the initial commit (no parents)
-                    diff = repo.git.diff_tree(
-                        "--numstat", "--no-renames", "--root", commit.hexsha
-                    ).strip()
-                    for line in diff.split("\n"):
-                        if line:
-                            parts = line.split()
-                            if len(parts) >= 2 and parts[0].isdigit():
-                                loc = int(parts[0])
-                                identities[author_email][
-                                    "contribution_percentage"
-                                ] += loc
-                                total_loc += loc
+            author_email = record.author_email.lower()
+            if author_email not in identities:
+                identities[author_email] = {
+                    "id": identity_id(author_email),
+                    "email": author_email,
+                    "name": record.author_name,
+                    "pgp_key_id": key_id,
+                    "github_username": None,
+                    "verified": True,
+                    "loc": 0,
+                    "last_used_timestamp": record.committed_date,
+                }
+            # Update the lines of code count
+            loc = record.lines_added
+            identities[author_email]["loc"] += loc
+            total_loc += loc
         else:
-            outstanding_commits[commit.hexsha] = commit_info
+            outstanding_commits.append(record.to_commit_info())
+
+    elapsed = time.perf_counter() - start_time
+    rate = commit_count / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Analyzed {commit_count} commits in {elapsed:.2f}s ({rate:.1f} commits/sec)"
+    )
+    if key_cache is not None:
+        logger.info(f"PGP key cache: {key_cache.hits} hits, {key_cache.misses} misses")
+    logger.info(
+        f"Numstat cache: {cache.hits} hits, {cache.misses} misses "
+        f"({cache.hit_rate:.0%} hit rate)"
+    )
+    cache.save()
+    outstanding_commits.flush()
+
+    return {
+        "identities": identities,
+        "outstanding_commits": outstanding_commits,
+        "total_loc": total_loc,
+    }
+
+
+def merge_tallies(newer: Dict[str, Any], older: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the tally of newer commits into the tally of the history before them.
+
+    The result is ordered exactly as a single walk over both ranges would be:
+    identities and commits seen in the newer range come first, and an
+    identity's name, key and timestamp come from its newest commit. The
+    older outstanding commits are appended to the newer tally's spool.
+    """
+    identities: Dict[str, Dict[str, Any]] = {}
+    for email, identity in newer["identities"].items():
+        merged = dict(identity)
+        previous = older["identities"].get(email)
+        if previous:
+            merged["id"] = previous["id"]
+            merged["loc"] += previous["loc"]
+        identities[email] = merged
+    for email, identity in older["identities"].items():
+        if email not in identities:
+            identities[email] = identity
+
+    outstanding_commits: CommitSpool = newer["outstanding_commits"]
+    outstanding_commits.extend(
+        older["outstanding_commits"].items(), skip=set(outstanding_commits)
+    )
+
+    return {
+        "identities": identities,
+        "outstanding_commits": outstanding_commits,
+        "total_loc": newer["total_loc"] + older["total_loc"],
+    }
+
 
-    # Calculate the contribution percentages
-    for identity in identities.values():
+def finalize_tally(tally: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a raw tally into the contributions format with percentages."""
+    total_loc = tally["total_loc"]
+    identities: Dict[str, Dict[str, Any]] = {}
+    for email, raw_identity in tally["identities"].items():
+        identity = {k: v for k, v in raw_identity.items() if k != "loc"}
+        # Calculate the contribution percentages
         identity["contribution_percentage"] = (
-            (identity["contribution_percentage"] / total_loc) * 100
-            if total_loc > 0
-            else 0
+            (raw_identity["loc"] / total_loc) * 100 if total_loc > 0 else 0
         )
+        identities[email] = identity
 
-    contributions = {
+    return {
         "identities": identities,
-        "outstanding_commits": outstanding_commits,
+        "outstanding_commits": tally["outstanding_commits"],
+    }
+
+
+def get_state_path() -> str:
+    """Get the path to the incremental analysis state."""
+    cache_dir = user_cache_dir("mailsocial")
+    return os.path.join(cache_dir, "contributions_state.json")
+
+
+def get_spool_dir() -> str:
+    """Get the directory outstanding commits are spooled to during a walk."""
+    return os.path.join(user_cache_dir("mailsocial"), "spool")
+
+
+def get_spool_path(state_file: str) -> str:
+    """Get the path of the outstanding-commit spool kept next to a state file."""
+    return f"{os.path.splitext(state_file)[0]}.outstanding.jsonl"
+
+
+def load_state(state_file: str) -> Optional[Dict[str, Any]]:
+    """Load the last analyzed tip and its tally, if a usable one exists."""
+    try:
+        with open(state_file, "r") as file:
+            state: Dict[str, Any] = json.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error loading analysis state from {state_file}: {e}")
+        return None
+    if state.get("version") != STATE_VERSION:
+        logger.info("Analysis state is from an older version, ignoring it")
+        return None
+    spool = CommitSpool(get_spool_path(state_file))
+    if len(spool) != state["outstanding_count"]:
+        logger.warning("Outstanding commit spool doesn't match the state, ignoring it")
+        return None
+    state["tally"]["outstanding_commits"] = spool
+    return state
+
+
+def save_state(state_file: str, tip: str, tally: Dict[str, Any]) -> None:
+    """Persist the analyzed tip and its tally, replacing the old state atomically.
+
+    The outstanding commits stay in their spool, which is moved next to the
+    state file; the state records how many there are so a spool left over
+    from an interrupted save is detected.
+    """
+    spool: CommitSpool = tally["outstanding_commits"]
+    state = {
+        "version": STATE_VERSION,
+        "tip": tip,
+        "tally": {k: v for k, v in tally.items() if k != "outstanding_commits"},
+        "outstanding_count": len(spool),
     }
-    return contributions
+    try:
+        os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+        spool.persist(get_spool_path(state_file))
+        temp_file = f"{state_file}.tmp"
+        with open(temp_file, "w") as file:
+            json.dump(state, file)
+        os.replace(temp_file, state_file)
+        logger.info(f"Analysis state saved to {state_file}")
+    except Exception as e:
+        logger.error(f"Error saving analysis state to {state_file}: {e}")
+
+
+def is_ancestor(repo: Repo, ancestor: str, descendant: str) -> bool:
+    """Check ancestry, treating commits missing after a force-push as unrelated."""
+    try:
+        repo.git.merge_base("--is-ancestor", ancestor, descendant)
+        return True
+    except GitCommandError:
+        return False
+
+
+def analyze_commits(
+    repo: Repo, repo_path: str, state_file: Optional[str] = None, jobs: int = 1
+) -> Dict[str, Any]:
+    """Analyze commits and calculate contribution percentages.
+
+    History is read from a single streamed `git log` process rather than
+    spawning `git show` and `git diff` for every commit. When `state_file` is
+    given, only commits since the last analyzed tip are walked and merged into
+    the stored tally; if that tip is no longer an ancestor of HEAD (for example
+    after a force-push) the whole history is analyzed again.
+    """
+    tip = repo.head.commit.hexsha
+    state = load_state(state_file) if state_file else None
+
+    if state and state["tip"] == tip:
+        logger.info(f"No new commits since {tip}")
+        tally = state["tally"]
+    elif state and is_ancestor(repo, state["tip"], tip):
+        logger.info(f"Analyzing new commits in {state['tip']}..{tip}")
+        tally = merge_tallies(
+            walk_commits(repo, f"{state['tip']}..{tip}", jobs), state["tally"]
+        )
+    else:
+        if state:
+            logger.warning(
+                f"Last analyzed commit {state['tip']} is no longer in history, "
+                "rebuilding from scratch"
+            )
+        tally = walk_commits(repo, tip, jobs)
+
+    if state_file:
+        save_state(state_file, tip, tally)
+    return finalize_tally(tally)
 
 
 def get_final_contributors_list(contributions: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -282,6 +606,18 @@ def get_final_contributors_list(contributions: Dict[str, Any]) -> List[Dict[str,
     return final_contributors
 
 
+def get_contributor_summary(contributions: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The final contributors list as the About window shows it, most recent first."""
+    contributors = get_final_contributors_list(contributions)
+    for contributor in contributors:
+        contributor["last_used_timestamp"] = max(
+            contributions["identities"][email]["last_used_timestamp"]
+            for email in contributor["emails"]
+        )
+    contributors.sort(key=lambda x: x["last_used_timestamp"], reverse=True)
+    return contributors
+
+
 def calculate_rank(percentage: float) -> str:
     if percentage < 1:
         return "Newbie"
@@ -310,23 +646,63 @@ def load_contributions(file_path: str) -> Optional[Dict[str, Any]]:
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description=f"Regenerate {CONTRIBUTIONS_FILE}")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the saved analysis state and walk the whole history",
+    )
+    parser.add_argument(
+        "--keys-dir",
+        help="Look PGP keys up in a directory of exported keys instead of the keyserver",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to verify signatures (0 for one per CPU)",
+    )
+    parser.add_argument(
+        "--partial",
+        choices=sorted(PARTIAL_CLONE_FILTERS),
+        help=(
+            "Keep a partial clone instead of a full one. Blobless is the best fit; "
+            "treeless saves more space but fetches trees one by one when diffing"
+        ),
+    )
+    parser.add_argument(
+        "--json",
+        metavar="PATH",
+        help="Also export the contributions in the JSON format to PATH",
+    )
+    args = parser.parse_args()
+    if args.keys_dir:
+        set_key_source(DirectoryKeySource(get_gpg(), args.keys_dir))
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+
     repo_url = get_repo_url()
     if not repo_url:
         logger.error("Repository URL not found")
         return
 
-    repo_path = get_repo_path()
-    repo = clone_or_pull_repo(repo_url, repo_path)
-    contributions = analyze_commits(repo, repo_path)
+    clone_filter = PARTIAL_CLONE_FILTERS[args.partial] if args.partial else None
+    repo_path = get_repo_path(clone_filter)
+    repo = clone_or_pull_repo(repo_url, repo_path, clone_filter)
+    state_file = get_state_path()
+    if args.full and os.path.exists(state_file):
+        os.remove(state_file)
+    contributions = analyze_commits(repo, repo_path, state_file, jobs)
 
-    # Save the contributions to a JSON file
-    contributions_file = ".contributions.json"
+    # Save the contributions in the compact format the About window reads
+    final_contributors = get_contributor_summary(contributions)
     try:
-        with open(contributions_file, "w") as file:
-            json.dump(contributions, file, indent=4)
-        logger.info(f"Contributions saved to {contributions_file}")
+        write_contributions(CONTRIBUTIONS_FILE, contributions, final_contributors)
+        logger.info(f"Contributions saved to {CONTRIBUTIONS_FILE}")
     except Exception as e:
-        logger.error(f"Error saving contributions to {contributions_file}: {e}")
+        logger.error(f"Error saving contributions to {CONTRIBUTIONS_FILE}: {e}")
+    if args.json:
+        export_json(CONTRIBUTIONS_FILE, args.json)
 
     # Print out the final contribution statistics
     for email, identity in contributions["identities"].items():
@@ -343,15 +719,11 @@ def main() -> None:
         for commit_sha, commit_info in contributions["outstanding_commits"].items():
             logger.warning(f"Commit {commit_sha}: {commit_info}")
 
-    # Get the final contributors list
-    loaded_contributions = load_contributions(contributions_file)
-    if loaded_contributions:
-        final_contributors = get_final_contributors_list(loaded_contributions)
-        logger.info("Final Contributors List:")
-        for contributor in final_contributors:
-            logger.info(
-                f"Name: {contributor['name']}, Emails: {contributor['emails']}, Rank: {contributor['rank']}"
-            )
+    logger.info("Final Contributors List:")
+    for contributor in final_contributors:
+        logger.info(
+            f"Name: {contributor['name']}, Emails: {contributor['emails']}, Rank: {contributor['rank']}"
+        )
 
 
 if __name__ == "__main__":
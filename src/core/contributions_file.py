@@ -0,0 +1,175 @@
+# src/core/contributions_file.py
+import argparse
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.core.logging import logger
+
+CONTRIBUTIONS_FILE = ".contributions.bin"
+MAGIC = b"MSCONTRB"
+FORMAT_VERSION = 2
+HEADER_POINTER = struct.Struct(">QI")
+SECTIONS = ("identities", "outstanding_commits")
+
+Section = Tuple[int, int]
+
+
+def encode_section(data: Any) -> bytes:
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 6)
+
+
+def iter_json_object(items: Iterable[Tuple[str, Any]]) -> Iterator[bytes]:
+    """Serialize a mapping to compact JSON one entry at a time."""
+    yield b"{"
+    for i, (key, value) in enumerate(items):
+        yield b"," if i else b""
+        yield json.dumps(key).encode() + b":"
+        yield json.dumps(value, separators=(",", ":")).encode()
+    yield b"}"
+
+
+def write_section(file: BinaryIO, chunks: Iterable[bytes]) -> Section:
+    start = file.tell()
+    compressor = zlib.compressobj(6)
+    for chunk in chunks:
+        file.write(compressor.compress(chunk))
+    file.write(compressor.flush())
+    return start, file.tell() - start
+
+
+def decode_section(raw: bytes) -> Any:
+    return json.loads(zlib.decompress(raw))
+
+
+def write_contributions(
+    path: str, contributions: Dict[str, Any], contributors: List[Dict[str, Any]]
+) -> None:
+    """Write contributions in the compact format, atomically.
+
+    Layout: magic, a pointer to the header, the sections as zlib-compressed
+    JSON, then the header itself, which holds the final contributor list
+    and where each section is. Sections are streamed, so outstanding
+    commits go from their spool to the file without being held in memory.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(HEADER_POINTER.pack(0, 0))
+        sections = {
+            name: write_section(file, iter_json_object(contributions[name].items()))
+            for name in SECTIONS
+        }
+        header = encode_section(
+            {
+                "version": FORMAT_VERSION,
+                "contributors": contributors,
+                "outstanding_count": len(contributions["outstanding_commits"]),
+                "sections": sections,
+            }
+        )
+        header_offset = file.tell()
+        file.write(header)
+        file.seek(len(MAGIC))
+        file.write(HEADER_POINTER.pack(header_offset, len(header)))
+    os.replace(temp_path, path)
+
+
+@dataclass
+class ContributionsFile:
+    """A compact contributions file whose sections are only read on demand.
+
+    Opening it reads the header alone, which is all the About window needs;
+    identities and outstanding commits are decompressed the first time they
+    are asked for.
+    """
+
+    path: str
+    contributors: List[Dict[str, Any]]
+    outstanding_count: int
+    sections: Dict[str, Section]
+    loaded: Dict[str, Any] = field(default_factory=dict)
+
+    def read_section(self, name: str) -> Any:
+        if name not in self.loaded:
+            offset, length = self.sections[name]
+            with open(self.path, "rb") as file:
+                file.seek(offset)
+                self.loaded[name] = decode_section(file.read(length))
+        return self.loaded[name]
+
+    @property
+    def identities(self) -> Dict[str, Dict[str, Any]]:
+        identities: Dict[str, Dict[str, Any]] = self.read_section("identities")
+        return identities
+
+    @property
+    def outstanding_commits(self) -> Dict[str, Dict[str, Any]]:
+        commits: Dict[str, Dict[str, Any]] = self.read_section("outstanding_commits")
+        return commits
+
+    def to_json(self) -> Dict[str, Any]:
+        """Rebuild the `.contributions.json` structure."""
+        return {name: self.read_section(name) for name in SECTIONS}
+
+
+def read_header(file: BinaryIO) -> Dict[str, Any]:
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a contributions file")
+    offset, length = HEADER_POINTER.unpack(file.read(HEADER_POINTER.size))
+    file.seek(offset)
+    header: Dict[str, Any] = decode_section(file.read(length))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported version {header.get('version')}")
+    return header
+
+
+def open_contributions(path: str) -> Optional[ContributionsFile]:
+    """Read the header of a compact contributions file."""
+    try:
+        with open(path, "rb") as file:
+            header = read_header(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error reading contributions from {path}: {e}")
+        return None
+    return ContributionsFile(
+        path=path,
+        contributors=header["contributors"],
+        outstanding_count=header["outstanding_count"],
+        sections={name: (s[0], s[1]) for name, s in header["sections"].items()},
+    )
+
+
+def export_json(path: str, json_path: str) -> bool:
+    """Export a compact contributions file to the `.contributions.json` format."""
+    contributions = open_contributions(path)
+    if contributions is None:
+        return False
+    try:
+        with open(json_path, "w") as file:
+            json.dump(contributions.to_json(), file, indent=4)
+        logger.info(f"Contributions exported to {json_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Error exporting contributions to {json_path}: {e}")
+        return False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=f"Export {CONTRIBUTIONS_FILE} to the .contributions.json format"
+    )
+    parser.add_argument("source", nargs="?", default=CONTRIBUTIONS_FILE)
+    parser.add_argument("destination", nargs="?", default=".contributions.json")
+    args = parser.parse_args()
+    if not export_json(args.source, args.destination):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
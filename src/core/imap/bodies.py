@@ -0,0 +1,249 @@
+# src/core/imap/bodies.py
+import asyncio
+import heapq
+import itertools
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.core.imap.client import ImapConnection, text_of
+from src.core.imap.protocol import ImapError, Response, fetch_items
+from src.core.imap.sync import SyncEngine, mailbox_source, source_mailbox
+from src.core.logging import logger
+from src.core.store.attachments import BlobStore
+from src.core.store.bodies import (
+    BodyLocation,
+    fill_bodies,
+    locate_bodies,
+    pending_bodies,
+    pending_in_chats,
+)
+from src.core.store.importer import ParsedMessage, parse_message
+from src.core.store.outbox import Backoff
+from src.core.store.timeline import CHUNK_SIZE
+
+# What a body is wanted for, most pressing first.
+OPEN_CHAT, VISIBLE, BACKFILL = range(3)
+# Bodies fetched with one UID FETCH. A chat's newest chunk fits in one, so
+# opening a chat redraws it once.
+BATCH_SIZE = CHUNK_SIZE
+# With nothing left to fetch, how often to look for bodies synced since
+# (and keep the connection alive).
+RECHECK_INTERVAL = 60.0
+RECONNECT = Backoff(first=5, longest=300)
+
+# (priority, the request's order, newest first, place in the request, id)
+Entry = Tuple[int, int, int, int]
+
+
+class BodyQueue:
+    """Ids of messages waiting for their bodies, most pressing first.
+
+    Among ids of the same priority the latest request comes first, so the
+    chat opened last is fetched before one opened before it. Asking again
+    at a higher priority moves an id up; the entry it leaves behind is
+    skipped.
+    """
+
+    def __init__(self) -> None:
+        self.heap: List[Entry] = []
+        self.priorities: Dict[int, int] = {}
+        self.requests = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.priorities)
+
+    def add(self, message_ids: Iterable[int], priority: int) -> None:
+        request = -next(self.requests)
+        for place, message_id in enumerate(message_ids):
+            if priority < self.priorities.get(message_id, BACKFILL + 1):
+                self.priorities[message_id] = priority
+                heapq.heappush(self.heap, (priority, request, place, message_id))
+
+    def take(self, limit: int) -> List[int]:
+        """Up to `limit` of the most pressing ids, all of one priority."""
+        taken: List[int] = []
+        first = None
+        while self.heap and len(taken) < limit:
+            priority, _, _, message_id = self.heap[0]
+            if first is not None and priority != first:
+                break
+            heapq.heappop(self.heap)
+            if self.priorities.get(message_id) == priority:
+                del self.priorities[message_id]
+                taken.append(message_id)
+                first = priority
+        return taken
+
+
+def parse_bodies(
+    fetched: List[Tuple[BodyLocation, bytes]], blobs: Optional[BlobStore] = None
+) -> List[Tuple[BodyLocation, ParsedMessage]]:
+    parsed = []
+    for location, raw in fetched:
+        try:
+            message = parse_message(raw, None, None, blobs)
+        except Exception as e:
+            logger.debug(f"Error parsing message {location.uid}: {e}")
+            continue
+        if message is not None:
+            parsed.append((location, message))
+    return parsed
+
+
+class BodyFetcher:
+    """Fetches the bodies and attachments that a header-first sync left on
+    the server.
+
+    The chat that is open comes first, then the chats visible in the chat
+    list, then, with nothing asked for, the rest of the pending messages,
+    newest first. It keeps a connection of its own, so an open chat's
+    bodies never wait behind a sync for one of the pool's. Filled messages
+    are posted through the engine as deltas.
+    """
+
+    def __init__(self, engine: SyncEngine, batch_size: int = BATCH_SIZE) -> None:
+        self.engine = engine
+        self.batch_size = batch_size
+        self.queue = BodyQueue()
+        self.wanted = asyncio.Event()
+        self.future: Optional["Future[None]"] = None
+        # The mailbox open on the connection, and its UIDVALIDITY.
+        self.mailbox: Optional[Tuple[str, int]] = None
+
+    def start(self) -> None:
+        if self.future is None:
+            self.future = self.engine.store.submit(self.run())
+
+    def stop(self) -> None:
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    def want_chats(self, chat_ids: Iterable[int], priority: int) -> None:
+        """Fetch the bodies of the chats' newest chunks ahead of the rest.
+        Safe to call from any thread."""
+        self.engine.store.submit(self.request(list(chat_ids), priority))
+
+    async def request(self, chat_ids: List[int], priority: int) -> None:
+        self.queue.add(await pending_in_chats(chat_ids, CHUNK_SIZE), priority)
+        self.wanted.set()
+
+    async def run(self) -> None:
+        attempts = 0
+        while True:
+            try:
+                await self.serve()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempts += 1
+                delay = RECONNECT.delay(attempts)
+                logger.error(
+                    f"Lost the IMAP server fetching bodies ({e}); "
+                    f"reconnecting in {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+            else:
+                attempts = 0
+
+    async def serve(self) -> None:
+        connection = await ImapConnection.open(self.engine.account)
+        self.mailbox = None
+        try:
+            while True:
+                self.wanted.clear()
+                idle = self.engine.idle.is_set()
+                message_ids = self.queue.take(self.batch_size)
+                if not message_ids and idle:
+                    self.queue.add(await pending_bodies(self.batch_size), BACKFILL)
+                    message_ids = self.queue.take(self.batch_size)
+                # A batch none of which could be fetched waits to be retried,
+                # rather than being taken again straight away.
+                if message_ids and await self.fetch(connection, message_ids):
+                    continue
+                await self.wait(connection, idle)
+        finally:
+            connection.close()
+
+    async def wait(self, connection: ImapConnection, idle: bool) -> None:
+        """Wait to be asked for bodies and, unless `idle`, for the sync that
+        holds back backfill to finish, keeping the connection alive."""
+        events = [self.wanted] if idle else [self.wanted, self.engine.idle]
+        waits = [asyncio.ensure_future(event.wait()) for event in events]
+        try:
+            done, _ = await asyncio.wait(
+                waits, timeout=RECHECK_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for wait in waits:
+                wait.cancel()
+        if not done:
+            await connection.noop()
+
+    async def fetch(self, connection: ImapConnection, message_ids: List[int]) -> bool:
+        """Fetch and store the bodies of pending messages, a mailbox at a time.
+        Those in a mailbox that can't be opened stay pending; returns whether
+        any messages stopped being."""
+        by_source: Dict[str, List[BodyLocation]] = {}
+        for location in await locate_bodies(message_ids):
+            by_source.setdefault(location.source, []).append(location)
+        # Messages in no mailbox now are not waited on, nor, once their
+        # mailbox has been fetched, are those gone from it.
+        done = set(message_ids).difference(
+            location.message_id
+            for locations in by_source.values()
+            for location in locations
+        )
+        fetched: List[Tuple[BodyLocation, bytes]] = []
+        for source, locations in by_source.items():
+            name, uidvalidity = source_mailbox(source)
+            if self.mailbox is None or self.mailbox[0] != name:
+                self.mailbox = None
+                try:
+                    status = await connection.examine(name)
+                except ImapError as e:
+                    if connection.closed:
+                        raise
+                    logger.error(f"Can't open {name} to fetch bodies: {e}")
+                    continue
+                self.mailbox = (name, status.uidvalidity)
+            done.update(location.message_id for location in locations)
+            if self.mailbox[1] != uidvalidity:
+                # The server renumbered the mailbox; syncing it again maps
+                # the messages to their new UIDs.
+                await self.engine.sync_mailbox(name)
+                renumbered = mailbox_source(self.engine.account, name, self.mailbox[1])
+                locations = [
+                    location
+                    for location in await locate_bodies(
+                        location.message_id for location in locations
+                    )
+                    if location.source == renumbered
+                ]
+            fetched.extend(await self.fetch_mailbox(connection, locations))
+        parsed = await asyncio.to_thread(parse_bodies, fetched, self.engine.store.blobs)
+        self.engine.post(await fill_bodies(parsed, done))
+        return bool(done)
+
+    async def fetch_mailbox(
+        self, connection: ImapConnection, locations: List[BodyLocation]
+    ) -> List[Tuple[BodyLocation, bytes]]:
+        by_uid = {location.uid: location for location in locations}
+        fetched: List[Tuple[BodyLocation, bytes]] = []
+        if not by_uid:
+            return fetched
+
+        def on_fetch(response: Response) -> None:
+            items = fetch_items(response)
+            body = items.get("BODY[]")
+            if "UID" not in items or not isinstance(body, bytes):
+                return
+            location = by_uid.get(int(text_of(items["UID"])))
+            if location is not None:
+                fetched.append((location, body))
+
+        connection.handlers["FETCH"] = on_fetch
+        command = connection.uid_fetch(sorted(by_uid), "(UID BODY.PEEK[])")
+        await connection.writer.drain()
+        await command.done
+        return fetched
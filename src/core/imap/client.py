@@ -0,0 +1,418 @@
+# src/core/imap/client.py
+import asyncio
+import ssl
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from src.core.account import Account
+from src.core.imap.protocol import (
+    ImapError,
+    Response,
+    Token,
+    fetch_items,
+    format_uid_set,
+    parse_uid_set,
+    quote,
+    read_response,
+)
+from src.core.logging import logger
+
+TIMEOUT = 60.0
+# The longest line the reader accepts, such as a SEARCH result listing
+# every UID in a large mailbox. Literals are read separately.
+LINE_LIMIT = 1 << 24
+# Untagged responses no command asked for, kept until someone looks.
+UNSOLICITED_LIMIT = 10_000
+
+
+@dataclass
+class Command:
+    tag: str
+    text: str
+    # Untagged responses of these kinds, while this is the oldest command
+    # waiting for them, are collected into `untagged`.
+    collect: FrozenSet[str]
+    done: "asyncio.Future[Response]"
+    untagged: List[Response] = field(default_factory=list)
+
+
+@dataclass
+class MailboxInfo:
+    name: str
+    flags: FrozenSet[str]
+    delimiter: str = "/"
+
+    @property
+    def selectable(self) -> bool:
+        return not self.flags & {"\\NOSELECT", "\\NONEXISTENT"}
+
+
+@dataclass
+class MailboxStatus:
+    """What EXAMINE or SELECT says about a mailbox."""
+
+    name: str
+    exists: int = 0
+    uidvalidity: int = 0
+    uidnext: int = 0
+    # Zero unless the server supports CONDSTORE.
+    highestmodseq: int = 0
+    # What a QRESYNC EXAMINE says changed since the state it was given:
+    # UIDs expunged, and \Seen by UID for messages whose flags changed.
+    vanished: List[int] = field(default_factory=list)
+    seen: Dict[int, bool] = field(default_factory=dict)
+
+
+def text_of(token: Token) -> str:
+    if isinstance(token, bytes):
+        return token.decode("utf-8", "replace")
+    return "" if token is None else str(token)
+
+
+def is_seen(flags: Token) -> bool:
+    """Whether a FLAGS list includes \\Seen."""
+    return isinstance(flags, list) and any(
+        text_of(flag).upper() == "\\SEEN" for flag in flags
+    )
+
+
+class ImapConnection:
+    """One authenticated connection to an IMAP server.
+
+    Commands can be pipelined: `command` writes a command straight away and
+    its future completes when the tagged response arrives, however many are
+    waiting. A reader task parses responses as they come in, literals and
+    all, and hands untagged ones to the handler registered for their kind
+    (such as "FETCH"), or else to the oldest command collecting that kind,
+    or else to `unsolicited`.
+    """
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.capabilities: FrozenSet[str] = frozenset()
+        # Extensions turned on with ENABLE.
+        self.enabled: FrozenSet[str] = frozenset()
+        self.handlers: Dict[str, Callable[[Response], None]] = {}
+        self.unsolicited: Deque[Response] = deque(maxlen=UNSOLICITED_LIMIT)
+        self.pending: "OrderedDict[str, Command]" = OrderedDict()
+        self.continuation: Optional["asyncio.Future[Response]"] = None
+        self.counter = 0
+        self.closed = False
+        self.reading: Optional["asyncio.Task[None]"] = None
+
+    @classmethod
+    async def open(cls, account: Account, timeout: float = TIMEOUT) -> "ImapConnection":
+        """Connect to the account's IMAP server and log in."""
+        context = ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                account.imap_host,
+                account.imap_port,
+                ssl=context if account.imap_security == "ssl" else None,
+                limit=LINE_LIMIT,
+            ),
+            timeout,
+        )
+        connection = cls(reader, writer)
+        try:
+            await asyncio.wait_for(connection.start(), timeout)
+            if account.imap_security == "starttls":
+                await asyncio.wait_for(connection.starttls(context), timeout)
+            await asyncio.wait_for(
+                connection.login(account.imap_username, account.imap_password),
+                timeout,
+            )
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    async def start(self) -> None:
+        """Read the greeting and start reading responses."""
+        greeting = await read_response(self.reader)
+        if greeting.kind not in ("OK", "PREAUTH"):
+            raise ImapError(f"Server refused the connection: {greeting.text}")
+        self.read_capabilities(greeting.code)
+        self.reading = asyncio.ensure_future(self.read_responses())
+
+    async def starttls(self, context: ssl.SSLContext) -> None:
+        await self.command("STARTTLS")
+        # Nothing may be read past the tagged OK until TLS is up.
+        assert self.reading is not None
+        self.reading.cancel()
+        await self.writer.start_tls(context)
+        self.reading = asyncio.ensure_future(self.read_responses())
+        await self.capability()
+
+    def read_capabilities(self, code: str) -> None:
+        name, _, values = code.partition(" ")
+        if name.upper() == "CAPABILITY":
+            self.capabilities = frozenset(values.upper().split())
+
+    async def read_responses(self) -> None:
+        error: Exception = ImapError("Connection closed")
+        try:
+            while True:
+                self.dispatch(await read_response(self.reader))
+        except asyncio.CancelledError:
+            if not self.closed:
+                return
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = ImapError(f"Connection lost: {e}")
+        except Exception as e:
+            logger.error(f"Error reading from the IMAP server: {e}")
+            error = e
+        self.closed = True
+        for command in self.pending.values():
+            if not command.done.done():
+                command.done.set_exception(error)
+        self.pending.clear()
+        if self.continuation and not self.continuation.done():
+            self.continuation.set_exception(error)
+
+    def dispatch(self, response: Response) -> None:
+        if response.tag == "+":
+            if self.continuation and not self.continuation.done():
+                self.continuation.set_result(response)
+            else:
+                logger.debug(f"Unexpected continuation: {response.text}")
+            return
+        if response.tag != "*":
+            command = self.pending.pop(response.tag, None)
+            if command is None:
+                logger.debug(f"Response to an unknown command: {response}")
+            elif response.ok:
+                command.done.set_result(response)
+            else:
+                command.done.set_exception(
+                    ImapError(
+                        f"{command.text.split(' ', 1)[0]} failed: "
+                        f"{response.kind} {response.text}"
+                    )
+                )
+            return
+        if response.kind in ("OK", "PREAUTH"):
+            self.read_capabilities(response.code)
+        elif response.kind == "CAPABILITY":
+            self.capabilities = frozenset(
+                text_of(value).upper() for value in response.data
+            )
+        handler = self.handlers.get(response.kind)
+        if handler is not None:
+            try:
+                handler(response)
+            except Exception as e:
+                logger.error(f"Error handling {response.kind} response: {e}")
+            return
+        for command in self.pending.values():
+            if response.kind in command.collect:
+                command.untagged.append(response)
+                return
+        self.unsolicited.append(response)
+
+    def send(self, text: str, collect: Iterable[str] = ()) -> Command:
+        """Write a command without waiting for its response."""
+        if self.closed:
+            raise ImapError("Connection closed")
+        self.counter += 1
+        tag = f"A{self.counter}"
+        command = Command(
+            tag,
+            text,
+            frozenset(collect),
+            asyncio.get_running_loop().create_future(),
+        )
+        self.pending[tag] = command
+        self.writer.write(f"{tag} {text}\r\n".encode())
+        return command
+
+    async def command(self, text: str, collect: Iterable[str] = ()) -> Command:
+        """Run a command; returns it once it succeeded, with the untagged
+        responses of the kinds in `collect`. Raises ImapError if it failed."""
+        command = self.send(text, collect)
+        await self.writer.drain()
+        await command.done
+        return command
+
+    async def login(self, username: str, password: str) -> None:
+        await self.command(f"LOGIN {quote(username)} {quote(password)}")
+        if not self.capabilities or "IMAP4REV1" not in self.capabilities:
+            await self.capability()
+
+    async def capability(self) -> FrozenSet[str]:
+        await self.command("CAPABILITY")
+        return self.capabilities
+
+    async def enable(self, *extensions: str) -> FrozenSet[str]:
+        """Turn on extensions such as QRESYNC (RFC 5161); returns those on."""
+        command = await self.command(
+            f"ENABLE {' '.join(extensions)}", collect=["ENABLED"]
+        )
+        self.enabled |= {
+            text_of(value).upper()
+            for response in command.untagged
+            for value in response.data
+        }
+        return self.enabled
+
+    async def list_mailboxes(self) -> List[MailboxInfo]:
+        command = await self.command('LIST "" "*"', collect=["LIST"])
+        mailboxes = []
+        for response in command.untagged:
+            if len(response.data) < 3:
+                continue
+            flags, delimiter, name = response.data[:3]
+            mailboxes.append(
+                MailboxInfo(
+                    text_of(name),
+                    frozenset(
+                        text_of(flag).upper()
+                        for flag in (flags if isinstance(flags, list) else [])
+                    ),
+                    text_of(delimiter),
+                )
+            )
+        return mailboxes
+
+    async def examine(
+        self,
+        name: str,
+        readonly: bool = True,
+        qresync: Optional[Tuple[int, int]] = None,
+    ) -> MailboxStatus:
+        """Open a mailbox, read only unless `readonly` is False.
+
+        Where the server supports CONDSTORE its HIGHESTMODSEQ is asked for.
+        With QRESYNC enabled, `qresync` is the (UIDVALIDITY, HIGHESTMODSEQ)
+        last seen, and what changed since comes back in the status.
+        """
+        text = f"{'EXAMINE' if readonly else 'SELECT'} {quote(name)}"
+        if qresync and "QRESYNC" in self.enabled:
+            text += f" (QRESYNC ({qresync[0]} {qresync[1]}))"
+        elif "CONDSTORE" in self.capabilities:
+            text += " (CONDSTORE)"
+        command = await self.command(
+            text, collect=["EXISTS", "OK", "FLAGS", "RECENT", "VANISHED", "FETCH"]
+        )
+        status = MailboxStatus(name)
+        for response in command.untagged:
+            if response.kind == "EXISTS" and response.number is not None:
+                status.exists = response.number
+            elif response.kind == "VANISHED" and response.data:
+                status.vanished.extend(parse_uid_set(text_of(response.data[-1])))
+            elif response.kind == "FETCH":
+                items = fetch_items(response)
+                if "UID" in items and "FLAGS" in items:
+                    status.seen[int(text_of(items["UID"]))] = is_seen(items["FLAGS"])
+            code, _, value = response.code.partition(" ")
+            if value.isdigit() and code.upper() in (
+                "UIDVALIDITY",
+                "UIDNEXT",
+                "HIGHESTMODSEQ",
+            ):
+                setattr(status, code.lower(), int(value))
+        return status
+
+    async def uid_search(self, criteria: str) -> List[int]:
+        """The UIDs of the messages matching `criteria`, in ascending order."""
+        if "ESEARCH" in self.capabilities:
+            # A compact sequence set rather than every UID spelled out.
+            command = await self.command(
+                f"UID SEARCH RETURN (ALL) {criteria}", collect=["ESEARCH"]
+            )
+            uids: List[int] = []
+            for response in command.untagged:
+                values = response.data
+                for name, value in zip(values, values[1:]):
+                    if text_of(name).upper() == "ALL":
+                        uids.extend(parse_uid_set(text_of(value)))
+            return sorted(set(uids))
+        command = await self.command(f"UID SEARCH {criteria}", collect=["SEARCH"])
+        return sorted(
+            {
+                int(text_of(value))
+                for response in command.untagged
+                for value in response.data
+                if text_of(value).isdigit()
+            }
+        )
+
+    def uid_fetch(self, uids: Iterable[int], items: str) -> Command:
+        """Pipeline a UID FETCH. Its FETCH responses go to `handlers["FETCH"]`;
+        await the command's `done` to know they have all arrived."""
+        return self.send(f"UID FETCH {format_uid_set(uids)} {items}")
+
+    async def changed_flags(self, since: int) -> Dict[int, bool]:
+        """\\Seen by UID for the messages whose flags changed after the
+        modification sequence `since` (CONDSTORE, RFC 7162)."""
+        command = await self.command(
+            f"UID FETCH 1:* (UID FLAGS) (CHANGEDSINCE {since})", collect=["FETCH"]
+        )
+        seen = {}
+        for response in command.untagged:
+            items = fetch_items(response)
+            if "UID" in items:
+                seen[int(text_of(items["UID"]))] = is_seen(items.get("FLAGS"))
+        return seen
+
+    async def noop(self) -> None:
+        await self.command("NOOP")
+
+    async def start_idle(self) -> Command:
+        """Start IDLE, returning once the server is listening; changes to the
+        open mailbox then arrive as untagged responses until `stop_idle`."""
+        loop = asyncio.get_running_loop()
+        self.continuation = loop.create_future()
+        command = self.send("IDLE")
+        await self.writer.drain()
+        await asyncio.wait(
+            [self.continuation, command.done], return_when=asyncio.FIRST_COMPLETED
+        )
+        self.continuation = None
+        if command.done.done():
+            # Refused, so this raises.
+            await command.done
+        return command
+
+    async def stop_idle(self, command: Command) -> None:
+        if not self.closed:
+            self.writer.write(b"DONE\r\n")
+            await self.writer.drain()
+        await command.done
+
+    async def notify(self, mailboxes: Iterable[str] = ()) -> None:
+        """Ask to be told about changes to the open mailbox as they happen,
+        as during IDLE, and about new and expunged messages in `mailboxes`,
+        which arrive as STATUS responses (RFC 5465)."""
+        text = "NOTIFY SET (SELECTED (MessageNew MessageExpunge FlagChange))"
+        names = " ".join(quote(name) for name in mailboxes)
+        if names:
+            text += f" (MAILBOXES ({names}) (MessageNew MessageExpunge))"
+        await self.command(text)
+
+    async def logout(self) -> None:
+        try:
+            await asyncio.wait_for(self.command("LOGOUT"), TIMEOUT)
+        except Exception as e:
+            logger.debug(f"Error logging out: {e}")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.closed = True
+        if self.reading is not None:
+            self.reading.cancel()
+        self.writer.close()
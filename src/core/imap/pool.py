@@ -0,0 +1,71 @@
+# src/core/imap/pool.py
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from src.core.account import Account
+from src.core.imap.client import ImapConnection
+from src.core.logging import logger
+
+POOL_SIZE = 3
+
+Connect = Callable[[Account], Awaitable[ImapConnection]]
+
+
+class ConnectionPool:
+    """A few authenticated connections to one account, shared by its syncs.
+
+    Connections are opened as they are first needed, at most `size` at
+    once, and kept logged in between uses. One that fails while in use is
+    closed rather than handed out again, as its state is unknown.
+    """
+
+    def __init__(
+        self,
+        account: Account,
+        size: int = POOL_SIZE,
+        connect: Connect = ImapConnection.open,
+    ) -> None:
+        self.account = account
+        self.size = size
+        self.connect = connect
+        self.slots = asyncio.Semaphore(size)
+        self.idle: List[ImapConnection] = []
+
+    async def acquire(self) -> ImapConnection:
+        await self.slots.acquire()
+        try:
+            while self.idle:
+                connection = self.idle.pop()
+                if not connection.closed:
+                    return connection
+            return await self.connect(self.account)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, connection: ImapConnection, broken: bool = False) -> None:
+        connection.handlers.clear()
+        if broken or connection.closed or connection.pending:
+            connection.close()
+        else:
+            self.idle.append(connection)
+        self.slots.release()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[ImapConnection]:
+        connection = await self.acquire()
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, broken=True)
+            raise
+        self.release(connection)
+
+    async def close(self) -> None:
+        idle, self.idle = self.idle, []
+        for connection in idle:
+            try:
+                await connection.logout()
+            except Exception as e:
+                logger.debug(f"Error closing an IMAP connection: {e}")
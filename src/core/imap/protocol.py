@@ -0,0 +1,247 @@
+# src/core/imap/protocol.py
+import asyncio
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# An IMAP value: an atom or string, a literal's bytes, NIL, or a list.
+Token = Union[str, bytes, None, List["Token"]]
+
+STATUS = frozenset({"OK", "NO", "BAD", "BYE", "PREAUTH"})
+# Ends a line that is followed by a literal of this many bytes.
+LITERAL = re.compile(rb"\{(\d+)\+?\}\r\n$")
+TOKEN = re.compile(
+    rb"""[ ]*(?:
+        (?P<open>\()
+      | (?P<close>\))
+      | "(?P<quoted>(?:[^"\\]|\\.)*)"
+      | (?P<atom>[^\s()"\[\]]*(?:\[[^\]]*\][^\s()"]*)?)
+    )""",
+    re.VERBOSE,
+)
+QUOTED_ESCAPE = re.compile(rb"\\(.)")
+CODE = re.compile(r"\[([^\]]*)\]\s*")
+MONTHS = {
+    month: number
+    for number, month in enumerate(
+        "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split(), 1
+    )
+}
+
+
+class ImapError(Exception):
+    """A command failed, or the server said something that makes no sense."""
+
+
+@dataclass
+class Response:
+    """One response from the server, with any literals it carried.
+
+    `tag` is the command's tag, "*" for untagged data or "+" for a
+    continuation request. `kind` is the response's name (OK, FETCH,
+    EXISTS...) and `number` the message number or count before it, as in
+    "* 12 FETCH". Status responses keep their code ("UIDVALIDITY 7") and
+    human readable text; the rest have their tokens in `data`.
+    """
+
+    tag: str
+    kind: str
+    number: Optional[int] = None
+    data: List[Token] = field(default_factory=list)
+    code: str = ""
+    text: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.kind == "OK"
+
+
+@dataclass
+class TextPart:
+    """Where a message's text is, from its BODYSTRUCTURE."""
+
+    # Its section number, such as "1" or "2.1".
+    section: str
+    # "plain" or "html".
+    subtype: str
+    charset: str
+    # Content-Transfer-Encoding, lower case.
+    encoding: str
+
+
+def tokenize(segments: Sequence[bytes], literals: Sequence[bytes]) -> List[Token]:
+    """Parse response text into tokens. The text comes in segments with
+    `literals[i]` following `segments[i]`."""
+    stack: List[List[Token]] = [[]]
+    for index, segment in enumerate(segments):
+        position, end = 0, len(segment)
+        while position < end:
+            match = TOKEN.match(segment, position)
+            if match is None or match.end() == position:
+                raise ImapError(f"Can't parse {segment[position:position + 40]!r}")
+            position = match.end()
+            if match["open"]:
+                stack.append([])
+            elif match["close"]:
+                if len(stack) == 1:
+                    raise ImapError("Unbalanced parenthesis in response")
+                closed = stack.pop()
+                stack[-1].append(closed)
+            elif match["quoted"] is not None:
+                value = QUOTED_ESCAPE.sub(rb"\1", match["quoted"])
+                stack[-1].append(value.decode("utf-8", "replace"))
+            elif match["atom"]:
+                atom = match["atom"].decode("utf-8", "replace")
+                stack[-1].append(None if atom.upper() == "NIL" else atom)
+        if index < len(literals):
+            stack[-1].append(literals[index])
+    if len(stack) != 1:
+        raise ImapError("Unbalanced parenthesis in response")
+    return stack[0]
+
+
+async def read_response(reader: asyncio.StreamReader) -> Response:
+    """Read the next complete response, literals and all."""
+    segments: List[bytes] = []
+    literals: List[bytes] = []
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        literal = LITERAL.search(line)
+        if literal is None:
+            segments.append(line[:-2])
+            break
+        segments.append(line[: literal.start()])
+        literals.append(await reader.readexactly(int(literal[1])))
+    return parse_response(segments, literals)
+
+
+def parse_response(segments: List[bytes], literals: List[bytes]) -> Response:
+    first = segments[0]
+    tag, _, rest = first.partition(b" ")
+    if tag == b"+":
+        return Response("+", "", text=rest.decode("utf-8", "replace"))
+    word, _, rest = rest.partition(b" ")
+    number = None
+    if tag == b"*" and word.isdigit():
+        number = int(word)
+        word, _, rest = rest.partition(b" ")
+    kind = word.decode("ascii", "replace").upper()
+    response = Response(tag.decode("ascii", "replace"), kind, number)
+    if kind in STATUS and number is None and not literals:
+        text = rest.decode("utf-8", "replace")
+        code = CODE.match(text)
+        if code:
+            response.code = code[1]
+            text = text[code.end() :]
+        response.text = text
+    else:
+        response.data = tokenize([rest, *segments[1:]], literals)
+    return response
+
+
+def quote(value: str) -> str:
+    """An IMAP quoted string."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def fetch_items(response: Response) -> Dict[str, Token]:
+    """The items of a FETCH response by name, such as "UID" and "BODY[]"."""
+    items = response.data[0] if response.data else []
+    if not isinstance(items, list):
+        raise ImapError(f"Malformed FETCH response: {response.data!r}")
+    return {str(name).upper(): value for name, value in zip(items[::2], items[1::2])}
+
+
+def structure_parts(structure: Token, prefix: str = "") -> Iterator[Tuple[str, list]]:
+    """Every single-part body in a BODYSTRUCTURE, with its section number.
+
+    A message that isn't multipart has its body in section 1.
+    """
+    if not isinstance(structure, list) or not structure:
+        return
+    if not isinstance(structure[0], list):
+        yield prefix or "1", structure
+        return
+    for number, part in enumerate(structure, 1):
+        if not isinstance(part, list):
+            # The multipart subtype follows the parts.
+            break
+        yield from structure_parts(
+            part, f"{prefix}.{number}" if prefix else str(number)
+        )
+
+
+def text_part(structure: Token) -> Optional[TextPart]:
+    """The first plain text part of a message, or its first HTML part, as
+    `body_part` in the importer picks it."""
+    html_part = None
+    for section, body in structure_parts(structure):
+        if len(body) < 7:
+            continue
+        kind, subtype = (str(value or "").lower() for value in body[:2])
+        parameters = body[2] if isinstance(body[2], list) else []
+        names = [str(name or "").lower() for name in parameters[::2]]
+        # Text has its line count after its size, then MD5 and disposition.
+        disposition = body[9] if len(body) > 9 and isinstance(body[9], list) else []
+        if (
+            kind != "text"
+            or subtype not in ("plain", "html")
+            or "name" in names
+            or (bool(disposition) and str(disposition[0]).lower() == "attachment")
+        ):
+            continue
+        charset = dict(zip(names, parameters[1::2])).get("charset")
+        part = TextPart(
+            section, subtype, str(charset or ""), str(body[5] or "").lower()
+        )
+        if subtype == "plain":
+            return part
+        if html_part is None:
+            html_part = part
+    return html_part
+
+
+def parse_internal_date(value: str) -> Optional[datetime]:
+    """An INTERNALDATE such as " 7-Jul-2024 09:30:00 +0200", or None."""
+    try:
+        date, clock, zone = value.split()
+        day, month, year = date.split("-")
+        hour, minute, second = (int(part) for part in clock.split(":"))
+        sign = -1 if zone.startswith("-") else 1
+        offset = sign * (int(zone[1:3]) * 60 + int(zone[3:5]))
+        return datetime(
+            int(year),
+            MONTHS[month.title()],
+            int(day),
+            hour,
+            minute,
+            second,
+            tzinfo=timezone(timedelta(minutes=offset)),
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+def format_uid_set(uids: Iterable[int]) -> str:
+    """A compact sequence set for sorted UIDs, such as "1:5,8,10:12"."""
+    ranges: List[Tuple[int, int]] = []
+    for uid in uids:
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], uid)
+        else:
+            ranges.append((uid, uid))
+    return ",".join(
+        str(first) if first == last else f"{first}:{last}" for first, last in ranges
+    )
+
+
+def parse_uid_set(text: str, largest: int = 0) -> List[int]:
+    """The UIDs in a sequence set; "*" stands for `largest`."""
+    uids: List[int] = []
+    for part in text.split(","):
+        first, _, last = part.partition(":")
+        start = largest if first == "*" else int(first)
+        end = start if not last else largest if last == "*" else int(last)
+        uids.extend(range(min(start, end), max(start, end) + 1))
+    return uids
@@ -0,0 +1,254 @@
+# src/core/imap/push.py
+import asyncio
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set
+
+from src.core.imap.client import ImapConnection, MailboxInfo, is_seen, text_of
+from src.core.imap.protocol import Response, fetch_items
+from src.core.imap.sync import SyncEngine, mailbox_source
+from src.core.logging import logger
+from src.core.store.deltas import StoreDelta
+from src.core.store.mailboxes import remove_uids, set_seen
+from src.core.store.outbox import Backoff
+
+# Mailboxes watched with a connection of their own, beyond INBOX, by their
+# special-use attributes (RFC 6154, RFC 8457).
+IMPORTANT = frozenset({"\\IMPORTANT", "\\FLAGGED", "\\SENT"})
+# Connections held IDLE at once; servers limit connections per account.
+MAX_IDLE = 2
+# IDLE is renewed before the server's 30 minute inactivity timeout.
+IDLE_TIMEOUT = 25 * 60.0
+# Without IDLE, how often to ask the server for news.
+POLL_INTERVAL = 60.0
+# Once the server starts reporting changes, how long to wait for the rest
+# of the burst before acting on them.
+SETTLE = 0.05
+RECONNECT = Backoff(first=5, longest=300)
+
+
+def important_mailboxes(mailboxes: List[MailboxInfo]) -> List[str]:
+    """INBOX, then the mailboxes marked important, flagged or sent."""
+    return [
+        mailbox.name
+        for mailbox in mailboxes
+        if mailbox.selectable
+        and (mailbox.name.upper() == "INBOX" or mailbox.flags & IMPORTANT)
+    ]
+
+
+@dataclass
+class Changes:
+    """What the server reported about a mailbox since it was last acted on."""
+
+    # UIDs of expunged messages.
+    expunged: List[int] = field(default_factory=list)
+    # \Seen by UID, for messages whose flags changed.
+    seen: Dict[int, bool] = field(default_factory=dict)
+    # Whether messages were added.
+    exists: bool = False
+    # Other mailboxes with new or expunged messages.
+    mailboxes: Set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.expunged or self.seen or self.exists or self.mailboxes)
+
+
+class MailboxWatch:
+    """Holds a connection on one mailbox, turning what the server says
+    happened into store deltas.
+
+    The connection sits in IDLE where the server supports it. Where it
+    supports NOTIFY (RFC 5465), changes to the mailbox are pushed without
+    IDLE too, and so are new and expunged messages in `others`, as STATUS
+    responses. Failing both it asks with NOOP every `POLL_INTERVAL`.
+    EXISTS, EXPUNGE, FETCH and STATUS responses are gathered for `SETTLE`
+    seconds after the first, then acted on together, so a burst of new
+    mail is stored, and posted, as one delta.
+    """
+
+    def __init__(
+        self, engine: SyncEngine, name: str, others: Sequence[str] = ()
+    ) -> None:
+        self.engine = engine
+        self.name = name
+        self.others = list(others)
+        self.changes = Changes()
+        self.changed = asyncio.Event()
+        self.notified = False
+        # The UID of each message in the mailbox, by sequence number - 1,
+        # as EXPUNGE and FETCH responses give sequence numbers.
+        self.uids: List[int] = []
+
+    async def run(self) -> None:
+        attempts = 0
+        while True:
+            try:
+                await self.watch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempts += 1
+                delay = RECONNECT.delay(attempts)
+                logger.error(
+                    f"Lost {self.name} on the IMAP server ({e}); "
+                    f"reconnecting in {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+            else:
+                attempts = 0
+
+    async def watch(self) -> None:
+        connection = await ImapConnection.open(self.engine.account)
+        try:
+            status = await connection.examine(self.name)
+            source = mailbox_source(self.engine.account, self.name, status.uidvalidity)
+            self.uids = await connection.uid_search("ALL")
+            connection.handlers.update(
+                EXISTS=self.on_exists,
+                EXPUNGE=self.on_expunge,
+                FETCH=self.on_fetch,
+                STATUS=self.on_status,
+            )
+            capabilities = connection.capabilities
+            self.notified = "NOTIFY" in capabilities and bool(
+                self.others or "IDLE" not in capabilities
+            )
+            if self.notified:
+                await connection.notify(self.others)
+            # Whatever happened while nobody was watching.
+            self.changes = Changes(mailboxes={self.name, *self.others})
+            while True:
+                if self.changes:
+                    await self.apply(connection, source)
+                await self.wait(connection)
+        finally:
+            connection.close()
+
+    def on_exists(self, response: Response) -> None:
+        if response.number is not None and response.number > len(self.uids):
+            self.changes.exists = True
+            self.changed.set()
+
+    def on_expunge(self, response: Response) -> None:
+        if response.number is not None and 0 < response.number <= len(self.uids):
+            self.changes.expunged.append(self.uids.pop(response.number - 1))
+            self.changed.set()
+
+    def on_fetch(self, response: Response) -> None:
+        items = fetch_items(response)
+        flags = items.get("FLAGS")
+        if not isinstance(flags, list):
+            return
+        if "UID" in items:
+            uid = int(text_of(items["UID"]))
+        elif response.number is not None and 0 < response.number <= len(self.uids):
+            uid = self.uids[response.number - 1]
+        else:
+            return
+        self.changes.seen[uid] = is_seen(flags)
+        self.changed.set()
+
+    def on_status(self, response: Response) -> None:
+        if response.data:
+            self.changes.mailboxes.add(text_of(response.data[0]))
+            self.changed.set()
+
+    async def wait(self, connection: ImapConnection) -> None:
+        """Wait for the server to report a change."""
+        if "IDLE" in connection.capabilities:
+            command = await connection.start_idle()
+            try:
+                await asyncio.wait_for(self.changed.wait(), IDLE_TIMEOUT)
+                await asyncio.sleep(SETTLE)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                await connection.stop_idle(command)
+            return
+        try:
+            await asyncio.wait_for(
+                self.changed.wait(), IDLE_TIMEOUT if self.notified else POLL_INTERVAL
+            )
+            await asyncio.sleep(SETTLE)
+        except asyncio.TimeoutError:
+            # Asks for news, or with NOTIFY keeps the connection alive.
+            await connection.noop()
+
+    async def apply(self, connection: ImapConnection, source: str) -> None:
+        changes, self.changes = self.changes, Changes()
+        self.changed.clear()
+        delta = StoreDelta()
+        if changes.expunged:
+            delta.merge(await remove_uids(source, changes.expunged))
+        if changes.seen:
+            delta.merge(await set_seen(source, changes.seen, self.engine.importer.me))
+        if changes.exists:
+            after = self.uids[-1] if self.uids else 0
+            self.uids.extend(
+                uid
+                for uid in await connection.uid_search(f"UID {after + 1}:*")
+                if uid > after
+            )
+            await self.engine.sync_mailbox(self.name, delta=delta, resync=False)
+        for name in sorted(changes.mailboxes):
+            try:
+                await self.engine.sync_mailbox(name, delta=delta)
+            except Exception as e:
+                logger.error(f"Error syncing {name}: {e}")
+        self.engine.post(delta)
+
+
+class PushMonitor:
+    """Keeps the store up to date as mail arrives, rather than on a timer.
+
+    INBOX and the other important mailboxes each get a `MailboxWatch`, up
+    to `max_idle` of them. Where the server supports NOTIFY, the first of
+    them is told about the rest as well; otherwise they are left to the
+    sync engine's periodic sync.
+    """
+
+    def __init__(self, engine: SyncEngine, max_idle: int = MAX_IDLE) -> None:
+        self.engine = engine
+        self.max_idle = max_idle
+        self.future: Optional["Future[None]"] = None
+
+    def start(self) -> None:
+        if self.future is None:
+            self.future = self.engine.store.submit(self.run())
+
+    def stop(self) -> None:
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    async def run(self) -> None:
+        attempts = 0
+        while True:
+            try:
+                async with self.engine.pool.connection() as connection:
+                    mailboxes = await connection.list_mailboxes()
+                    capabilities = connection.capabilities
+                break
+            except Exception as e:
+                attempts += 1
+                delay = RECONNECT.delay(attempts)
+                logger.error(f"Can't list mailboxes ({e}); retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+        watches = self.plan(mailboxes, capabilities)
+        await asyncio.gather(*(watch.run() for watch in watches))
+
+    def plan(
+        self, mailboxes: List[MailboxInfo], capabilities: FrozenSet[str]
+    ) -> List[MailboxWatch]:
+        selectable = [mailbox.name for mailbox in mailboxes if mailbox.selectable]
+        watched = (important_mailboxes(mailboxes) or selectable)[: self.max_idle]
+        if not watched:
+            return []
+        others = [name for name in selectable if name not in watched]
+        if "NOTIFY" not in capabilities:
+            others = []
+        return [
+            MailboxWatch(self.engine, name, others if index == 0 else ())
+            for index, name in enumerate(watched)
+        ]
@@ -0,0 +1,549 @@
+# src/core/imap/sync.py
+import argparse
+import asyncio
+import binascii
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from src.core.account import Account
+from src.core.imap.client import (
+    Command,
+    ImapConnection,
+    MailboxStatus,
+    is_seen,
+    text_of,
+)
+from src.core.imap.pool import POOL_SIZE, ConnectionPool
+from src.core.imap.protocol import (
+    Response,
+    TextPart,
+    fetch_items,
+    parse_internal_date,
+    text_part,
+)
+from src.core.logging import logger
+from src.core.store.attachments import BlobStore
+from src.core.store.deltas import StoreDelta
+from src.core.store.importer import (
+    Batch,
+    ImportProgress,
+    MailImporter,
+    ParsedMessage,
+    decode_text,
+    log_progress,
+    parse_message,
+)
+from src.core.store.mailboxes import (
+    MailboxState,
+    count_uids,
+    known_uids,
+    load_state,
+    remove_uids,
+    save_state,
+    set_seen,
+    unread_uids,
+)
+from src.core.store.runner import StoreRunner
+
+# Small enough that storing a batch never holds up the store thread for
+# more than a frame or so.
+BATCH_SIZE = 100
+# UID FETCH commands in flight on a connection at once.
+WINDOW = 4
+# Seconds between syncs, unless `wake` asks for one sooner.
+SYNC_INTERVAL = 300.0
+FETCH_ITEMS = "(UID FLAGS INTERNALDATE BODY.PEEK[])"
+# Bytes of a message's text fetched with its header, for its preview.
+PREVIEW_BYTES = 1024
+# Section 1 is the text of most messages; where it isn't, the text part
+# BODYSTRUCTURE points at is fetched after.
+FETCH_HEADERS = (
+    "(UID FLAGS INTERNALDATE BODYSTRUCTURE BODY.PEEK[HEADER] "
+    f"BODY.PEEK[1]<0.{PREVIEW_BYTES}>)"
+)
+
+
+@dataclass
+class Fetched:
+    """A fetched message, or only its header when fetching headers first."""
+
+    uid: int
+    raw: bytes
+    internal_date: Optional[datetime]
+    seen: bool
+    partial: bool = False
+    # With only the header: where the text is, and the start of it.
+    text_part: Optional[TextPart] = None
+    text: bytes = b""
+
+
+@dataclass
+class Writing:
+    """A batch being stored."""
+
+    batch: Batch
+    fetched: int
+    parsed: int
+    # Its new messages, once stored.
+    delta: StoreDelta
+    write: "asyncio.Future[int]"
+
+
+def mailbox_url(account: Account, mailbox: str) -> str:
+    """The URL a mailbox's sync state is kept under."""
+    return f"imap://{account.imap_username}@{account.imap_host}/{mailbox}"
+
+
+def mailbox_source(account: Account, mailbox: str, uidvalidity: int) -> str:
+    """The import source a mailbox's progress is kept under.
+
+    UIDs only mean something for one UIDVALIDITY, so when the server resets
+    it the mailbox becomes a new source, synced from the start. Messages
+    already stored are recognised by their Message-ID and left alone.
+    """
+    return f"{mailbox_url(account, mailbox)};UIDVALIDITY={uidvalidity}"
+
+
+def source_mailbox(source: str) -> Tuple[str, int]:
+    """The mailbox name and UIDVALIDITY in a `mailbox_source`."""
+    url, _, uidvalidity = source.rpartition(";UIDVALIDITY=")
+    # imap://user@host/name
+    return url.split("/", 3)[3], int(uidvalidity)
+
+
+def preview_text(part: TextPart, data: bytes) -> str:
+    """The start of a message's text, from the first bytes of its text part
+    as they are on the server."""
+    cut_short = len(data) >= PREVIEW_BYTES
+    try:
+        if part.encoding == "base64":
+            data = b"".join(data.split())
+            data = binascii.a2b_base64(data[: len(data) - len(data) % 4])
+        elif part.encoding == "quoted-printable":
+            if cut_short and b"=" in data[-2:]:
+                data = data[: data.rindex(b"=", len(data) - 2)]
+            data = binascii.a2b_qp(data)
+    except (binascii.Error, ValueError):
+        return ""
+    if cut_short:
+        # Leave out the word, or character, or tag, that was cut off.
+        data = data[: max(data.rfind(b" "), data.rfind(b"\n"), 0)]
+        if part.subtype == "html" and data.rfind(b"<") > data.rfind(b">"):
+            data = data[: data.rfind(b"<")]
+    return decode_text(data, part.charset, part.subtype == "html")
+
+
+def parse_fetched(
+    messages: List[Fetched], blobs: Optional[BlobStore] = None
+) -> List[ParsedMessage]:
+    """Parse fetched messages, leaving out those that can't be imported."""
+    parsed = []
+    for fetched in messages:
+        try:
+            message = parse_message(
+                fetched.raw, fetched.internal_date, fetched.seen, blobs, fetched.partial
+            )
+        except Exception as e:
+            logger.debug(f"Error parsing message {fetched.uid}: {e}")
+            continue
+        if message is None:
+            continue
+        message.uid = fetched.uid
+        if fetched.partial:
+            message.partial = True
+            message.content = (
+                preview_text(fetched.text_part, fetched.text)
+                if fetched.text_part
+                else ""
+            )
+        parsed.append(message)
+    return parsed
+
+
+class SyncEngine:
+    """Copies new mail from the account's IMAP server into the store.
+
+    It runs on the store thread, so the Tk thread never waits on the
+    network. Mailboxes are synced side by side over a small pool of
+    connections. Each one's new UIDs are fetched in batches, with `window`
+    UID FETCH commands pipelined so the server never waits on a round trip;
+    responses are parsed as they stream in, each batch's messages on a
+    worker thread once it is complete, and stored a batch per transaction
+    with the last UID stored, while the next batches download.
+
+    Messages already stored are kept in step with the server by `resync`,
+    from the state each mailbox was last synced to. What each stored batch
+    and resync changes is passed to `on_delta`, for the UI.
+
+    With `headers_first`, only each message's header, BODYSTRUCTURE and
+    the start of its text are fetched, so a large mailbox is usable in
+    seconds; the messages are marked pending, for `BodyFetcher` to fetch
+    the rest.
+    """
+
+    def __init__(
+        self,
+        store: StoreRunner,
+        account: Account,
+        me: Iterable[str] = (),
+        pool: Optional[ConnectionPool] = None,
+        batch_size: int = BATCH_SIZE,
+        window: int = WINDOW,
+        interval: float = SYNC_INTERVAL,
+        on_delta: Optional[Callable[[StoreDelta], None]] = None,
+        headers_first: bool = True,
+    ) -> None:
+        self.store = store
+        self.account = account
+        self.pool = pool or ConnectionPool(account, POOL_SIZE)
+        self.importer = MailImporter([account.email, *me])
+        self.batch_size = batch_size
+        self.window = window
+        self.interval = interval
+        self.on_delta = on_delta
+        self.headers_first = headers_first
+        self.positions: Dict[str, int] = {}
+        # Held while a mailbox syncs, so it is never synced twice at once.
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.wakeup = asyncio.Event()
+        # Clear while `run` syncs every mailbox.
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.future: Optional["Future[None]"] = None
+
+    def start(self) -> None:
+        if self.future is None:
+            self.future = self.store.submit(self.run())
+
+    def wake(self) -> None:
+        """Sync now rather than at the next interval."""
+        self.store.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def stop(self) -> None:
+        """Stop syncing. A batch being stored is rolled back, to be fetched
+        again next time."""
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+        self.store.submit(self.pool.close())
+
+    async def run(self) -> None:
+        while True:
+            self.wakeup.clear()
+            self.idle.clear()
+            try:
+                progress = await self.sync()
+                if progress.imported:
+                    logger.info(f"Synced {progress.imported} new messages")
+            except Exception as e:
+                logger.error(f"Error syncing mail: {e}")
+            finally:
+                self.idle.set()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def sync(
+        self, on_progress: Optional[Callable[[ImportProgress], None]] = None
+    ) -> ImportProgress:
+        """Fetch and store the new messages in every mailbox.
+
+        A mailbox that fails is logged and skipped; the others carry on.
+        `on_progress` is called after every stored batch.
+        """
+        self.positions = await self.importer.positions()
+        async with self.pool.connection() as connection:
+            mailboxes = await connection.list_mailboxes()
+        names = sorted(
+            (mailbox.name for mailbox in mailboxes if mailbox.selectable),
+            key=lambda name: (name.upper() != "INBOX", name),
+        )
+        progress = ImportProgress()
+        results = await asyncio.gather(
+            *(self.sync_mailbox(name, progress, on_progress) for name in names),
+            return_exceptions=True,
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error syncing {name}: {result}")
+        return progress
+
+    def post(self, delta: StoreDelta) -> None:
+        if self.on_delta and delta:
+            self.on_delta(delta)
+
+    async def sync_mailbox(
+        self,
+        name: str,
+        progress: Optional[ImportProgress] = None,
+        on_progress: Optional[Callable[[ImportProgress], None]] = None,
+        delta: Optional[StoreDelta] = None,
+        resync: bool = True,
+    ) -> ImportProgress:
+        """Fetch and store a mailbox's new messages and, unless `resync` is
+        False, catch up with flag changes and expunges since the last sync.
+
+        Each stored batch's delta is posted as it is stored, unless `delta`
+        is given to gather them all, to be posted together.
+        """
+        progress = progress or ImportProgress()
+        url = mailbox_url(self.account, name)
+        lock = self.locks.setdefault(name, asyncio.Lock())
+        async with lock, self.pool.connection() as connection:
+            state = await load_state(url) if resync else None
+            if resync and "QRESYNC" in connection.capabilities - connection.enabled:
+                await connection.enable("QRESYNC")
+            status = await connection.examine(
+                name,
+                qresync=(
+                    (state.uidvalidity, state.highestmodseq)
+                    if state and state.highestmodseq
+                    else None
+                ),
+            )
+            source = mailbox_source(self.account, name, status.uidvalidity)
+            if source not in self.positions:
+                self.positions.update(await self.importer.positions())
+            last = self.positions.get(source, 0)
+            uids: List[int] = []
+            if status.exists and not 0 < status.uidnext <= last + 1:
+                # "last+1:*" still matches the newest message when there is
+                # nothing after `last`.
+                uids = [
+                    uid
+                    for uid in await connection.uid_search(f"UID {last + 1}:*")
+                    if uid > last
+                ]
+            if state and state.source == source:
+                changed = await self.resync(connection, source, state, status, uids)
+                if delta is None:
+                    self.post(changed)
+                else:
+                    delta.merge(changed)
+            if uids:
+                await self.fetch(connection, source, uids, progress, on_progress, delta)
+            if resync and (
+                state is None
+                or (state.source, state.highestmodseq) != (source, status.highestmodseq)
+            ):
+                await save_state(
+                    url, MailboxState(source, status.uidvalidity, status.highestmodseq)
+                )
+        return progress
+
+    async def resync(
+        self,
+        connection: ImapConnection,
+        source: str,
+        state: MailboxState,
+        status: MailboxStatus,
+        new: List[int],
+    ) -> StoreDelta:
+        """Catch up with what changed in a mailbox's stored messages since
+        `state`, without fetching anything about those that didn't.
+
+        With QRESYNC the server said what changed when the mailbox was
+        opened. With CONDSTORE, an unchanged HIGHESTMODSEQ means nothing
+        did; otherwise only the flags changed since are fetched. Without
+        either, the UIDs of unseen messages are compared with the unread
+        ones stored. Expunges are found by comparing the UIDs on the server
+        with those fetched before, stored or not, as compact UID sets, and
+        only if the number of messages says some are missing.
+        """
+        if status.highestmodseq and status.highestmodseq == state.highestmodseq:
+            return StoreDelta()
+        if "QRESYNC" in connection.enabled and state.highestmodseq:
+            vanished, seen = status.vanished, status.seen
+        else:
+            vanished = []
+            if status.exists - len(new) != await count_uids(source):
+                on_server = set(await connection.uid_search("ALL"))
+                vanished = [
+                    uid for uid in await known_uids(source) if uid not in on_server
+                ]
+            if status.highestmodseq and state.highestmodseq:
+                seen = await connection.changed_flags(state.highestmodseq)
+            else:
+                # UIDs the server doesn't know are left out by `set_seen`.
+                unseen = set(await connection.uid_search("UNSEEN"))
+                unread = set(await unread_uids(source))
+                seen = {uid: False for uid in unseen - unread}
+                seen.update((uid, True) for uid in unread - unseen)
+        delta = StoreDelta()
+        if vanished:
+            delta.merge(await remove_uids(source, vanished))
+        if seen:
+            delta.merge(await set_seen(source, seen, self.importer.me))
+        return delta
+
+    async def fetch(
+        self,
+        connection: ImapConnection,
+        source: str,
+        uids: List[int],
+        progress: ImportProgress,
+        on_progress: Optional[Callable[[ImportProgress], None]],
+        delta: Optional[StoreDelta] = None,
+    ) -> None:
+        fetched: Dict[int, Fetched] = {}
+        headers_first = self.headers_first
+
+        def on_fetch(response: Response) -> None:
+            items = fetch_items(response)
+            if "UID" not in items:
+                return
+            uid = int(text_of(items["UID"]))
+            body = items.get("BODY[HEADER]" if headers_first else "BODY[]")
+            if isinstance(body, bytes):
+                fetched[uid] = Fetched(
+                    uid,
+                    body,
+                    parse_internal_date(text_of(items.get("INTERNALDATE"))),
+                    is_seen(items.get("FLAGS")),
+                    headers_first,
+                    text_part(items.get("BODYSTRUCTURE")) if headers_first else None,
+                )
+            message = fetched.get(uid)
+            if message is None or message.text_part is None:
+                # A flag change, say, rather than one of ours.
+                return
+            text = items.get(f"BODY[{message.text_part.section}]<0>")
+            if isinstance(text, str):
+                text = text.encode()
+            if isinstance(text, bytes):
+                message.text = text
+
+        connection.handlers["FETCH"] = on_fetch
+        items = FETCH_HEADERS if headers_first else FETCH_ITEMS
+        batches: Deque[List[int]] = deque(
+            uids[start : start + self.batch_size]
+            for start in range(0, len(uids), self.batch_size)
+        )
+        fetching: Deque[Tuple[List[int], Command]] = deque()
+        # One batch is stored at a time, in order, so the stored position
+        # never runs ahead of the stored messages.
+        writing: Optional[Writing] = None
+        try:
+            while batches or fetching:
+                while batches and len(fetching) < self.window:
+                    batch_uids = batches.popleft()
+                    fetching.append(
+                        (batch_uids, connection.uid_fetch(batch_uids, items))
+                    )
+                await connection.writer.drain()
+                batch_uids, command = fetching.popleft()
+                await command.done
+                if headers_first:
+                    await self.fetch_previews(
+                        connection,
+                        [fetched[uid] for uid in batch_uids if uid in fetched],
+                    )
+                messages = [fetched.pop(uid) for uid in batch_uids if uid in fetched]
+                parsed = await asyncio.to_thread(
+                    parse_fetched, messages, self.store.blobs
+                )
+                if writing:
+                    await self.finish(writing, progress, on_progress, delta is not None)
+                batch = Batch(
+                    source, batch_uids[-1], uids=[message.uid for message in messages]
+                )
+                batch_delta = StoreDelta() if delta is None else delta
+                writing = Writing(
+                    batch,
+                    len(messages),
+                    len(parsed),
+                    batch_delta,
+                    asyncio.ensure_future(
+                        self.importer.store(batch, parsed, batch_delta)
+                    ),
+                )
+            if writing:
+                await self.finish(writing, progress, on_progress, delta is not None)
+        finally:
+            if writing and not writing.write.done():
+                writing.write.cancel()
+
+    async def fetch_previews(
+        self, connection: ImapConnection, messages: List[Fetched]
+    ) -> None:
+        """Fetch the start of the text of messages whose text isn't in
+        section 1, by the section it is in."""
+        sections: Dict[str, List[int]] = {}
+        for message in messages:
+            if message.text_part and message.text_part.section != "1":
+                sections.setdefault(message.text_part.section, []).append(message.uid)
+        commands = [
+            connection.uid_fetch(uids, f"(UID BODY.PEEK[{section}]<0.{PREVIEW_BYTES}>)")
+            for section, uids in sections.items()
+        ]
+        if commands:
+            await connection.writer.drain()
+        for command in commands:
+            await command.done
+
+    async def finish(
+        self,
+        writing: Writing,
+        progress: ImportProgress,
+        on_progress: Optional[Callable[[ImportProgress], None]],
+        gathering: bool,
+    ) -> None:
+        batch = writing.batch
+        progress.add(batch, writing.fetched, writing.parsed, await writing.write)
+        self.positions[batch.source] = batch.position
+        if not gathering:
+            self.post(writing.delta)
+        if on_progress:
+            on_progress(progress)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Sync new mail from the IMAP server in MAILSOCIAL_IMAP_*"
+    )
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--window", type=int, default=WINDOW)
+    parser.add_argument(
+        "--headers-first",
+        action="store_true",
+        help="Fetch only headers and previews; the app fetches the rest",
+    )
+    parser.add_argument("--database", help="Sync into this store instead")
+    args = parser.parse_args(argv)
+    account = Account.from_environment()
+    if account is None or not account.imap_host:
+        logger.error("Set MAILSOCIAL_EMAIL and MAILSOCIAL_IMAP_HOST to sync mail")
+        return 1
+
+    store = StoreRunner(args.database)
+    engine = SyncEngine(
+        store,
+        account,
+        pool=ConnectionPool(account, args.pool_size),
+        batch_size=args.batch_size,
+        window=args.window,
+        headers_first=args.headers_first,
+    )
+    try:
+        progress = store.call(engine.sync(log_progress()))
+        store.call(engine.pool.close())
+    except Exception as e:
+        logger.error(f"Sync stopped: {e}; run it again to carry on")
+        return 1
+    finally:
+        store.close()
+    logger.info(
+        f"Fetched {progress.messages} messages ({progress.rate:.0f}/s): "
+        f"{progress.imported} new, {progress.duplicates} already stored, "
+        f"{progress.failed} could not be read"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,235 @@
+# src/core/keycache.py
+import json
+import os
+import re
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import gnupg
+from appdirs import user_cache_dir
+
+from src.core.logging import logger
+
+DEFAULT_KEYSERVER = "keyserver.ubuntu.com"
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_NEGATIVE_TTL = 24 * 60 * 60
+KEY_FILE_EXTENSIONS = (".asc", ".gpg", ".pgp", ".key")
+# The status line gpg writes when receiving keys fails, with the error code.
+RECV_FAILURE = re.compile(r"^\[GNUPG:\] FAILURE recv-keys (\d+)", re.MULTILINE)
+# The error code's low bits when the keyserver doesn't have the key.
+GPG_ERR_NO_DATA = 58
+
+
+class KeyLookupError(Exception):
+    """The keyserver couldn't be asked for a key, as opposed to not having it."""
+
+
+def get_gnupg_home() -> str:
+    """Get the GnuPG home used for contribution checks, separate from the user's."""
+    gnupg_home = os.path.join(user_cache_dir("mailsocial"), "gnupg")
+    os.makedirs(gnupg_home, mode=0o700, exist_ok=True)
+    return gnupg_home
+
+
+def get_key_cache_path() -> str:
+    """Get the path to the persisted PGP key cache."""
+    return os.path.join(user_cache_dir("mailsocial"), "pgp_keys.json")
+
+
+def normalize_key_id(key_id: str) -> str:
+    return key_id.strip().upper().removeprefix("0X")
+
+
+def extract_emails(uids: List[str]) -> List[str]:
+    """Pull the addresses out of `Name <email>` style key UIDs."""
+    emails = []
+    for uid in uids:
+        email_match = re.search(r"<([^>]+)>", uid)
+        if email_match:
+            emails.append(email_match.group(1).strip())
+    return emails
+
+
+class KeySource(ABC):
+    """Somewhere PGP keys can be looked up by key ID."""
+
+    @abstractmethod
+    def fetch_uids(self, key_id: str) -> Optional[List[str]]:
+        """Return the UIDs of the key, or None if the source does not have it."""
+
+
+class KeyserverSource(KeySource):
+    """Fetch keys from a keyserver into a dedicated keyring."""
+
+    def __init__(self, gpg: gnupg.GPG, keyserver: str = DEFAULT_KEYSERVER) -> None:
+        self.gpg = gpg
+        self.keyserver = keyserver
+
+    def fetch_uids(self, key_id: str) -> Optional[List[str]]:
+        result = self.gpg.recv_keys(self.keyserver, key_id)
+        if not result.count:
+            stderr = result.stderr or ""
+            failure = RECV_FAILURE.search(stderr)
+            if failure and int(failure.group(1)) & 0xFFFF == GPG_ERR_NO_DATA:
+                return None
+            # A timeout or network error says nothing about the key, so it
+            # mustn't be cached as missing.
+            reason = stderr.strip().splitlines()[-1] if stderr.strip() else "no reply"
+            raise KeyLookupError(
+                f"Couldn't ask {self.keyserver} for {key_id}: {reason}"
+            )
+        keys = self.gpg.list_keys(keys=key_id)
+        return list(keys[0]["uids"]) if keys else None
+
+
+class DirectoryKeySource(KeySource):
+    """Look keys up in a directory of exported key files, e.g. for tests."""
+
+    def __init__(self, gpg: gnupg.GPG, directory: str) -> None:
+        self.gpg = gpg
+        self.directory = directory
+        self.imported = False
+
+    def import_directory(self) -> None:
+        for name in sorted(os.listdir(self.directory)):
+            if name.lower().endswith(KEY_FILE_EXTENSIONS):
+                with open(os.path.join(self.directory, name), "rb") as key_file:
+                    self.gpg.import_keys(key_file.read())
+        self.imported = True
+
+    def fetch_uids(self, key_id: str) -> Optional[List[str]]:
+        if not self.imported:
+            self.import_directory()
+        keys = self.gpg.list_keys(keys=key_id)
+        return list(keys[0]["uids"]) if keys else None
+
+
+@dataclass
+class CachedKey:
+    key_id: str
+    uids: List[str]
+    fetched_at: float
+    found: bool
+
+
+@dataclass
+class KeyCache:
+    """Persistent cache of key UIDs by key ID in front of a `KeySource`.
+
+    Keys that were found are kept for `ttl` seconds and keys the source did
+    not know about for `negative_ttl` seconds, so a contributor with thousands
+    of signed commits costs one lookup instead of thousands.
+    """
+
+    path: Optional[str]
+    source: KeySource
+    ttl: float = DEFAULT_TTL
+    negative_ttl: float = DEFAULT_NEGATIVE_TTL
+    clock: Callable[[], float] = time.time
+    entries: Dict[str, CachedKey] = field(default_factory=dict)
+    hits: int = 0
+    misses: int = 0
+    # Entries looked up since `take_fetched` was last called.
+    fetched: Dict[str, CachedKey] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        if self.path:
+            self.entries = self.read()
+
+    def read(self) -> Dict[str, CachedKey]:
+        assert self.path is not None
+        try:
+            with open(self.path, "r") as file:
+                raw_entries = json.load(file)
+            return {key_id: CachedKey(**entry) for key_id, entry in raw_entries.items()}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Error loading PGP key cache from {self.path}: {e}")
+            return {}
+
+    def merge(self, entries: Dict[str, CachedKey]) -> None:
+        """Take in entries looked up elsewhere, keeping the newer of two."""
+        for key_id, entry in entries.items():
+            current = self.entries.get(key_id)
+            if current is None or entry.fetched_at > current.fetched_at:
+                self.entries[key_id] = entry
+
+    def take_fetched(self) -> Dict[str, CachedKey]:
+        fetched, self.fetched = self.fetched, {}
+        return fetched
+
+    def save(self) -> None:
+        """Write the cache out, keeping entries another run saved since."""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.merge(self.read())
+            fd, temp_path = tempfile.mkstemp(
+                dir=directory, prefix=os.path.basename(self.path), suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w") as file:
+                    json.dump(
+                        {
+                            key_id: asdict(entry)
+                            for key_id, entry in self.entries.items()
+                        },
+                        file,
+                    )
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except Exception as e:
+            logger.error(f"Error saving PGP key cache to {self.path}: {e}")
+
+    def is_fresh(self, entry: CachedKey) -> bool:
+        ttl = self.ttl if entry.found else self.negative_ttl
+        return self.clock() - entry.fetched_at < ttl
+
+    def get_uids(self, key_id: str) -> Optional[List[str]]:
+        """Return the UIDs of a key, asking the source only on a miss or expiry."""
+        key_id = normalize_key_id(key_id)
+        entry = self.entries.get(key_id)
+        if entry and self.is_fresh(entry):
+            self.hits += 1
+            return entry.uids if entry.found else None
+
+        self.misses += 1
+        try:
+            uids = self.source.fetch_uids(key_id)
+        except Exception as e:
+            # Don't cache transient failures such as the keyserver being down.
+            logger.error(f"Error fetching PGP key {key_id}: {e}")
+            return None
+
+        self.entries[key_id] = self.fetched[key_id] = CachedKey(
+            key_id=key_id,
+            uids=uids or [],
+            fetched_at=self.clock(),
+            found=uids is not None,
+        )
+        self.save()
+        return uids
+
+    def import_key(self, key_id: str) -> bool:
+        """Have the source bring a key into its keyring, so signatures made
+        with it can be checked; returns whether it was found.
+
+        A key known to be missing isn't asked for again until the entry
+        expires. One known to exist is fetched again, since the keyring may
+        not have it even when the cache does.
+        """
+        key_id = normalize_key_id(key_id)
+        entry = self.entries.get(key_id)
+        if entry and self.is_fresh(entry) and not entry.found:
+            self.hits += 1
+            return False
+        self.entries.pop(key_id, None)
+        return self.get_uids(key_id) is not None
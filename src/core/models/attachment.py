@@ -0,0 +1,31 @@
+# src/models/attachment.py
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional, Protocol
+
+
+class BlobSource(Protocol):
+    def open_blob(self, digest: str) -> BinaryIO: ...
+
+
+@dataclass(frozen=True, slots=True)
+class Attachment:
+    """A file attached to a message.
+
+    Only a handle: the bytes stay in the blob store, under the SHA-256 of
+    their content, until `open` or `read` is called.
+    """
+
+    digest: str
+    filename: str
+    content_type: str
+    size: int
+    source: Optional[BlobSource] = field(default=None, compare=False, repr=False)
+
+    def open(self) -> BinaryIO:
+        if self.source is None:
+            raise LookupError(f"{self.filename or self.digest} has no blob store")
+        return self.source.open_blob(self.digest)
+
+    def read(self) -> bytes:
+        with self.open() as file:
+            return file.read()
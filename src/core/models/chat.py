@@ -1,13 +1,20 @@
 # src/models/chat.py
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 from src.core.models.member import Member
 from src.core.models.message import Message
 
 
-@dataclass
+@dataclass(slots=True)
 class Chat:
     title: str
     members: List[Member]
+    # Only the messages loaded along with the chat, not its whole history;
+    # a `Timeline` reads the history in chunks.
     messages: List[Message]
+    id: Optional[int] = None
+
+    @property
+    def latest_message(self) -> Optional[Message]:
+        return self.messages[-1] if self.messages else None
@@ -0,0 +1,33 @@
+# src/models/chat_summary.py
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+
+from src.core.models.member import Member
+
+
+@dataclass(slots=True)
+class ChatSummary:
+    """What the chat list shows for a chat, kept up to date by the store."""
+
+    chat_id: int
+    title: str
+    initials: str
+    preview: str
+    last_message_at: Optional[datetime]
+    # Messages still marked Sent, i.e. delivered but not read yet.
+    unread_count: int
+
+
+def chat_initials(title: str, members: Iterable[Member]) -> str:
+    """Up to two initials for a chat's avatar.
+
+    A chat with one member gets that member's initials, such as "JD" for
+    John Doe; a group gets the first initial of its first two members.
+    """
+    names = [member.name or member.email for member in members][:2]
+    if len(names) == 1:
+        words = names[0].split()[:2]
+    else:
+        words = names or [title]
+    return "".join(word[0] for word in words if word).upper()
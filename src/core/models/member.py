@@ -1,10 +1,39 @@
 # src/models/member.py
 from dataclasses import dataclass
+from typing import ClassVar, Tuple
+from weakref import WeakValueDictionary
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class Member:
     email: str
     pgp_key_id: str
     is_pgp_verified: bool
     name: str
+
+    # One shared Member per address for as long as anything refers to it.
+    pool: ClassVar["WeakValueDictionary[str, Member]"] = WeakValueDictionary()
+
+    @classmethod
+    def intern(
+        cls,
+        email: str,
+        pgp_key_id: str = "",
+        is_pgp_verified: bool = False,
+        name: str = "",
+    ) -> "Member":
+        """Get the shared Member for `email`, replacing it if its details changed.
+
+        Messages refer to the same few senders over and over, so loading them
+        through here keeps one object per address instead of one per message.
+        """
+        member = cls.pool.get(email)
+        details = (pgp_key_id, is_pgp_verified, name)
+        if member is None or member.details != details:
+            member = cls(email, *details)
+            cls.pool[email] = member
+        return member
+
+    @property
+    def details(self) -> Tuple[str, bool, str]:
+        return self.pgp_key_id, self.is_pgp_verified, self.name
@@ -0,0 +1,162 @@
+# src/core/numstat_cache.py
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from appdirs import user_cache_dir
+from git import Repo
+
+from src.core.commit_stream import CommitRecord, NumstatEntry, parse_numstat_line
+from src.core.logging import logger
+from src.core.signatures import read_raw_commit
+
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+DEFAULT_MAX_ENTRIES = 50_000
+
+TreePair = Tuple[str, str]
+
+
+def get_numstat_cache_path() -> str:
+    """Get the path to the persisted per-tree-pair numstat cache."""
+    return os.path.join(user_cache_dir("mailsocial"), "numstat_cache.json")
+
+
+def tree_pair_key(pair: TreePair) -> str:
+    return f"{pair[0]}:{pair[1]}"
+
+
+@dataclass
+class NumstatCache:
+    """Content-addressed cache of per-file line counts between two trees.
+
+    A diff only depends on the two trees being compared, so reruns, rebased
+    branches and cherry-picks that recreate a tree pair we've already seen
+    cost a dictionary lookup. The least recently used pairs are evicted once
+    more than `max_entries` are held.
+    """
+
+    path: Optional[str]
+    max_entries: int = DEFAULT_MAX_ENTRIES
+    entries: "OrderedDict[str, List[NumstatEntry]]" = field(default_factory=OrderedDict)
+    hits: int = 0
+    misses: int = 0
+
+    def __post_init__(self) -> None:
+        if self.path:
+            self.load()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def load(self) -> None:
+        assert self.path is not None
+        try:
+            with open(self.path, "r") as file:
+                raw_entries = json.load(file)
+            self.entries = OrderedDict(
+                (key, [tuple(entry) for entry in numstat])
+                for key, numstat in raw_entries.items()
+            )
+        except FileNotFoundError:
+            self.entries = OrderedDict()
+        except Exception as e:
+            logger.error(f"Error loading numstat cache from {self.path}: {e}")
+            self.entries = OrderedDict()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(self.entries, file)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving numstat cache to {self.path}: {e}")
+
+    def get(self, pair: TreePair) -> Optional[List[NumstatEntry]]:
+        key = tree_pair_key(pair)
+        numstat = self.entries.get(key)
+        if numstat is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return numstat
+
+    def put(self, pair: TreePair, numstat: List[NumstatEntry]) -> None:
+        key = tree_pair_key(pair)
+        self.entries[key] = numstat
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+def read_commit_tree(repo: Repo, sha: str) -> str:
+    """Read the tree of a commit from its raw object header."""
+    header = read_raw_commit(repo, sha).split(b"\n", 1)[0]
+    return header.split(b" ", 1)[1].decode()
+
+
+def diff_tree_pairs(
+    repo: Repo, pairs: List[TreePair]
+) -> Dict[TreePair, List[NumstatEntry]]:
+    """Diff many tree pairs with a single `git diff-tree --stdin` process."""
+    results: Dict[TreePair, List[NumstatEntry]] = {pair: [] for pair in pairs}
+    if not pairs:
+        return results
+    with tempfile.TemporaryFile() as pair_file:
+        pair_file.write("".join(f"{a} {b}\n" for a, b in pairs).encode())
+        pair_file.seek(0)
+        output = repo.git.diff_tree(
+            "--stdin", "--numstat", "--no-renames", "-r", istream=pair_file
+        )
+
+    current: Optional[List[NumstatEntry]] = None
+    for line in output.splitlines():
+        if "\t" not in line:
+            # diff-tree echoes each input pair before its numstat lines
+            parts = line.split()
+            current = results.get((parts[0], parts[1])) if len(parts) == 2 else None
+            continue
+        entry = parse_numstat_line(line)
+        if entry is not None and current is not None:
+            current.append(entry)
+    return results
+
+
+def fill_numstat(repo: Repo, records: List[CommitRecord], cache: NumstatCache) -> None:
+    """Attach per-file line counts to records, diffing only pairs not in the cache.
+
+    Like `git log --diff-merges=first-parent --root`, merges are compared with
+    their first parent and root commits with the empty tree.
+    """
+    pairs: Dict[str, TreePair] = {}
+    resolved: Dict[TreePair, List[NumstatEntry]] = {}
+    misses: Set[TreePair] = set()
+    for record in records:
+        parent_tree = (
+            read_commit_tree(repo, record.parents[0]) if record.parents else EMPTY_TREE
+        )
+        pair = (parent_tree, record.tree)
+        pairs[record.hexsha] = pair
+        if pair in resolved or pair in misses:
+            continue
+        cached = cache.get(pair)
+        if cached is None:
+            misses.add(pair)
+        else:
+            resolved[pair] = cached
+
+    for pair, numstat in diff_tree_pairs(repo, sorted(misses)).items():
+        cache.put(pair, numstat)
+        resolved[pair] = numstat
+
+    for record in records:
+        record.numstat = list(resolved[pairs[record.hexsha]])
@@ -0,0 +1,360 @@
+# src/core/smtp.py
+import asyncio
+import base64
+import re
+import ssl
+from dataclasses import dataclass
+from email.message import EmailMessage
+from email.utils import format_datetime, formataddr
+from typing import Awaitable, Callable, Dict, Iterable, List, Sequence
+
+from src.core.account import Account
+from src.core.logging import logger
+from src.core.models.member import Member
+from src.core.store.outbox import OutgoingMail, PermanentSendError, Refused
+
+TIMEOUT = 60.0
+POOL_SIZE = 2
+# Servers drop a session left idle for a few minutes (RFC 5321 asks them to
+# wait at least five); one idle longer than this is closed, not reused.
+IDLE_LIMIT = 240.0
+# A line starting with a dot, which is doubled in DATA.
+DOT = re.compile(rb"^\.", re.MULTILINE)
+
+
+class SmtpError(Exception):
+    """The server refused a command, or the connection was lost."""
+
+    def __init__(self, message: str, code: int = 0) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class Reply:
+    code: int
+    lines: List[str]
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.lines)
+
+
+def format_members(members: Iterable[Member]) -> str:
+    return ", ".join(formataddr((member.name, member.email)) for member in members)
+
+
+def build_email(mail: OutgoingMail) -> EmailMessage:
+    """The RFC 5322 message for a queued message, without its Bcc recipients."""
+    message = mail.message
+    email = EmailMessage()
+    email["From"] = formataddr((message.sender.name, message.sender.email))
+    if mail.to:
+        email["To"] = format_members(mail.to)
+    if mail.cc:
+        email["Cc"] = format_members(mail.cc)
+    email["Subject"] = message.subject
+    # Timestamps are naive local time.
+    email["Date"] = format_datetime(message.timestamp.astimezone())
+    email["Message-ID"] = mail.message_id
+    email.set_content(message.content)
+    for attachment in message.attachments:
+        maintype, _, subtype = attachment.content_type.partition("/")
+        email.add_attachment(
+            attachment.read(),
+            maintype=maintype,
+            subtype=subtype or "octet-stream",
+            filename=attachment.filename or None,
+        )
+    return email
+
+
+def message_data(mail: OutgoingMail) -> bytes:
+    """A queued message as DATA sends it: CRLF line endings, dots doubled at
+    the start of lines, and the closing dot."""
+    email = build_email(mail)
+    data = DOT.sub(b"..", email.as_bytes(policy=email.policy.clone(linesep="\r\n")))
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+    return data + b".\r\n"
+
+
+class SmtpConnection:
+    """One authenticated connection to an SMTP submission server.
+
+    `send_mail` runs a whole transaction. Where the server supports
+    PIPELINING (RFC 2920), MAIL, every RCPT and DATA go in one write, so
+    the envelope costs one round trip however many recipients it has, and
+    the message one more. The connection can send again straight after.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        timeout: float = TIMEOUT,
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        # How long to wait for each reply.
+        self.timeout = timeout
+        # EHLO keywords, upper case, with their parameters.
+        self.extensions: Dict[str, str] = {}
+        self.closed = False
+        # Whether the message data has gone out in the current transaction,
+        # after which it may have been delivered whatever happens next.
+        self.sent_data = False
+        self.last_used = asyncio.get_running_loop().time()
+
+    @classmethod
+    async def open(cls, account: Account, timeout: float = TIMEOUT) -> "SmtpConnection":
+        """Connect to the account's SMTP server and log in."""
+        context = ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                account.smtp_host,
+                account.smtp_port,
+                ssl=context if account.smtp_security == "ssl" else None,
+            ),
+            timeout,
+        )
+        connection = cls(reader, writer, timeout)
+        try:
+            await connection.start(account, context)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    async def start(self, account: Account, context: ssl.SSLContext) -> None:
+        greeting = await self.reply()
+        if greeting.code != 220:
+            raise SmtpError(f"Server refused the connection: {greeting.text}")
+        await self.ehlo(account.email)
+        if account.smtp_security == "starttls":
+            await self.command("STARTTLS", 220)
+            await self.writer.start_tls(context)
+            await self.ehlo(account.email)
+        if account.smtp_password:
+            await self.login(account.smtp_username, account.smtp_password)
+
+    async def reply(self) -> Reply:
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(
+                    self.reader.readuntil(b"\r\n"), self.timeout
+                )
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                self.close()
+                raise SmtpError(f"Connection lost: {e}") from e
+            except asyncio.TimeoutError as e:
+                self.close()
+                raise SmtpError("The server stopped answering") from e
+            text = line[4:].decode("utf-8", "replace").rstrip("\r\n")
+            lines.append(text)
+            if line[3:4] != b"-":
+                break
+        if not line[:3].isdigit():
+            raise SmtpError(f"Malformed reply: {line!r}")
+        return Reply(int(line[:3]), lines)
+
+    async def command(self, text: str, *expect: int) -> Reply:
+        """Send a command and read its reply, raising SmtpError unless its
+        code is one of `expect` (any 2xx by default)."""
+        self.writer.write(text.encode() + b"\r\n")
+        await self.writer.drain()
+        reply = await self.reply()
+        if (reply.code not in expect) if expect else (reply.code // 100 != 2):
+            verb = text.split(" ", 1)[0]
+            raise SmtpError(f"{verb} failed: {reply.code} {reply.text}", reply.code)
+        return reply
+
+    async def ehlo(self, email: str) -> None:
+        domain = email.rpartition("@")[2] or "localhost"
+        reply = await self.command(f"EHLO {domain}")
+        self.extensions = {}
+        for line in reply.lines[1:]:
+            keyword, _, parameters = line.partition(" ")
+            self.extensions[keyword.upper()] = parameters
+
+    async def login(self, username: str, password: str) -> None:
+        mechanisms = self.extensions.get("AUTH", "").upper().split()
+        if "PLAIN" not in mechanisms and "LOGIN" in mechanisms:
+            await self.command("AUTH LOGIN", 334)
+            await self.command(base64.b64encode(username.encode()).decode(), 334)
+            await self.command(base64.b64encode(password.encode()).decode(), 235)
+            return
+        token = base64.b64encode(f"\0{username}\0{password}".encode()).decode()
+        await self.command(f"AUTH PLAIN {token}", 235)
+
+    async def send_mail(
+        self, sender: str, recipients: Sequence[str], data: bytes
+    ) -> Refused:
+        """Send `data`, a message from `message_data`, to `recipients`.
+
+        Returns the recipients the server refused, with its replies; if it
+        refused them all, nothing is sent. Raises SmtpError if it refused
+        the sender or the message.
+        """
+        self.sent_data = False
+        mail = f"MAIL FROM:<{sender}>"
+        if "SIZE" in self.extensions:
+            mail += f" SIZE={len(data)}"
+        if "8BITMIME" in self.extensions and not data.isascii():
+            mail += " BODY=8BITMIME"
+        commands = [mail, *(f"RCPT TO:<{email}>" for email in recipients), "DATA"]
+        if "PIPELINING" in self.extensions:
+            self.writer.write("".join(f"{text}\r\n" for text in commands).encode())
+            await self.writer.drain()
+            replies = [await self.reply() for _ in commands]
+        else:
+            replies = []
+            for text in commands:
+                if text == "DATA" and all(reply.code >= 400 for reply in replies[1:]):
+                    break
+                self.writer.write(text.encode() + b"\r\n")
+                await self.writer.drain()
+                replies.append(await self.reply())
+                if replies[0].code >= 400:
+                    break
+        refused = {
+            email: (reply.code, reply.text)
+            for email, reply in zip(recipients, replies[1:])
+            if reply.code >= 400
+        }
+        data_reply = replies[-1] if len(replies) == len(commands) else None
+        if data_reply is not None and data_reply.code == 354:
+            if len(refused) == len(recipients):
+                # Told to go ahead with no one to send to; send nothing.
+                data = b".\r\n"
+            self.sent_data = True
+            self.writer.write(data)
+            await self.writer.drain()
+            data_reply = await self.reply()
+            self.last_used = asyncio.get_running_loop().time()
+            if len(refused) < len(recipients) and data_reply.code // 100 != 2:
+                raise SmtpError(
+                    f"Message refused: {data_reply.code} {data_reply.text}",
+                    data_reply.code,
+                )
+            return refused
+        await self.command("RSET")
+        self.last_used = asyncio.get_running_loop().time()
+        if replies[0].code >= 400:
+            raise SmtpError(
+                f"Sender refused: {replies[0].code} {replies[0].text}",
+                replies[0].code,
+            )
+        if len(refused) < len(recipients) and data_reply is not None:
+            raise SmtpError(
+                f"DATA failed: {data_reply.code} {data_reply.text}", data_reply.code
+            )
+        return refused
+
+    async def quit(self) -> None:
+        try:
+            await asyncio.wait_for(self.command("QUIT"), TIMEOUT)
+        except Exception as e:
+            logger.debug(f"Error closing an SMTP connection: {e}")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.closed = True
+        self.writer.close()
+
+
+Connect = Callable[[Account], Awaitable[SmtpConnection]]
+
+
+class SmtpTransport:
+    """Sends outbox messages through the account's SMTP server.
+
+    Connections are opened as they are first needed, at most `size` at
+    once, and kept logged in between messages, so consecutive sends skip
+    the greeting, TLS and AUTH. `warm` opens one ahead of time, as when a
+    message is being written. A connection idle longer than IDLE_LIMIT is
+    closed rather than reused; one the server dropped anyway is replaced,
+    once, before the attempt counts as failed. Runs on the store thread.
+    """
+
+    def __init__(
+        self,
+        account: Account,
+        size: int = POOL_SIZE,
+        connect: Connect = SmtpConnection.open,
+    ) -> None:
+        self.account = account
+        self.size = size
+        self.connect = connect
+        self.slots = asyncio.Semaphore(size)
+        self.idle: List[SmtpConnection] = []
+
+    def take_idle(self) -> List[SmtpConnection]:
+        """The idle connections still fit to use, closing the rest."""
+        now = asyncio.get_running_loop().time()
+        fresh = []
+        for connection in self.idle:
+            if connection.closed or now - connection.last_used > IDLE_LIMIT:
+                connection.close()
+            else:
+                fresh.append(connection)
+        self.idle = []
+        return fresh
+
+    async def warm(self) -> None:
+        """Have a connection logged in and waiting, unless one already is."""
+        self.idle = self.take_idle()
+        if self.idle or self.slots.locked():
+            return
+        async with self.slots:
+            try:
+                self.idle.append(await self.connect(self.account))
+            except Exception as e:
+                logger.debug(f"Couldn't open an SMTP connection ahead: {e}")
+
+    async def send(self, mail: OutgoingMail) -> Refused:
+        data = await asyncio.to_thread(message_data, mail)
+        recipients = [member.email for member in mail.unsettled]
+        async with self.slots:
+            idle = self.take_idle()
+            connection = idle.pop() if idle else None
+            self.idle.extend(idle)
+            if connection is not None:
+                try:
+                    return await self.send_on(connection, mail, recipients, data)
+                except SmtpError:
+                    if not connection.closed or connection.sent_data:
+                        raise
+                    logger.debug("The SMTP server dropped an idle connection")
+            connection = await self.connect(self.account)
+            return await self.send_on(connection, mail, recipients, data)
+
+    async def send_on(
+        self,
+        connection: SmtpConnection,
+        mail: OutgoingMail,
+        recipients: List[str],
+        data: bytes,
+    ) -> Refused:
+        try:
+            refused = await connection.send_mail(
+                mail.message.sender.email, recipients, data
+            )
+        except SmtpError as e:
+            if not connection.closed:
+                self.idle.append(connection)
+            if e.code >= 500:
+                raise PermanentSendError(str(e)) from e
+            raise
+        except BaseException:
+            connection.close()
+            raise
+        self.idle.append(connection)
+        return refused
+
+    async def close(self) -> None:
+        idle, self.idle = self.idle, []
+        for connection in idle:
+            await connection.quit()
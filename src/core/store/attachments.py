@@ -0,0 +1,191 @@
+# src/core/store/attachments.py
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from src.core.logging import logger
+
+BLOB_DIRECTORY = "attachments"
+CHUNK_SIZE = 1 << 16
+# Blobs written or reused this recently are never collected: an import may
+# have stored the bytes and not yet committed the message that uses them.
+GRACE_SECONDS = 3600.0
+SWEEP_BATCH = 1000
+
+
+def get_blob_directory(database_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(database_path)), BLOB_DIRECTORY)
+
+
+@dataclass(frozen=True)
+class BlobStore:
+    """Attachment bytes on disk, stored once per distinct content.
+
+    Each blob is a file named by the SHA-256 of its bytes, so the same file
+    sent to ten chats is kept once. How many attachments use each blob is
+    counted in the database (`attachment_blob`, kept by triggers), and
+    `collect_garbage` removes the blobs nothing uses any more.
+
+    Only holds a path, so it can be passed to worker processes, which
+    stream parts straight into it while parsing.
+    """
+
+    root: str
+
+    @classmethod
+    def beside(cls, database_path: str) -> "BlobStore":
+        return cls(get_blob_directory(database_path))
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def open_blob(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), "rb")
+
+    def write(self, chunks: Iterable[bytes]) -> Tuple[str, int]:
+        """Store the bytes from `chunks` and return their digest and size.
+
+        The bytes are hashed as they are written to a temporary file, which
+        is then renamed into place, or dropped if the blob already exists.
+        """
+        temporary = os.path.join(self.root, "tmp")
+        os.makedirs(temporary, exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+        descriptor, temporary_path = tempfile.mkstemp(dir=temporary)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+            digest = hasher.hexdigest()
+            path = self.path(digest)
+            if os.path.exists(path):
+                # Reused; keep it safe from collection for a while.
+                os.utime(path)
+                os.remove(temporary_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return digest, size
+
+    def write_bytes(self, data: bytes) -> Tuple[str, int]:
+        return self.write([data])
+
+    def iter_blobs(self) -> Iterator[str]:
+        """Yield the digest of every blob on disk."""
+        for top in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            if len(top) != 2:
+                continue
+            for middle in sorted(os.listdir(os.path.join(self.root, top))):
+                yield from sorted(os.listdir(os.path.join(self.root, top, middle)))
+
+    def is_recent(self, digest: str, now: float, grace: float) -> bool:
+        try:
+            return now - os.path.getmtime(self.path(digest)) < grace
+        except FileNotFoundError:
+            return False
+
+    def remove(self, digest: str) -> None:
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+async def collect_garbage(blobs: BlobStore, grace: float = GRACE_SECONDS) -> int:
+    """Remove blobs that no attachment uses, and return how many were removed.
+
+    That is blobs whose count has dropped to zero, and files left on disk
+    by imports that stopped before storing their messages. Runs on the
+    store thread.
+    """
+    now = time.time()
+    removed = 0
+    async with in_transaction("default") as connection:
+        _, rows = await connection.execute_query(
+            "SELECT digest FROM attachment_blob WHERE refcount <= 0"
+        )
+        unused = [
+            row["digest"]
+            for row in rows
+            if not blobs.is_recent(row["digest"], now, grace)
+        ]
+        await connection.execute_query(
+            "DELETE FROM attachment_blob WHERE refcount <= 0 "
+            "AND digest IN (SELECT value FROM json_each(?))",
+            [json.dumps(unused)],
+        )
+        # Removed while the transaction holds the database, so no attachment
+        # can start using one of them in between.
+        for digest in unused:
+            blobs.remove(digest)
+        removed += len(unused)
+
+    connection = connections.get("default")
+    batch: List[str] = []
+
+    async def sweep(digests: List[str]) -> int:
+        _, rows = await connection.execute_query(
+            "SELECT digest FROM attachment_blob "
+            "WHERE digest IN (SELECT value FROM json_each(?))",
+            [json.dumps(digests)],
+        )
+        known = {row["digest"] for row in rows}
+        orphans = [
+            digest
+            for digest in digests
+            if digest not in known and not blobs.is_recent(digest, now, grace)
+        ]
+        for digest in orphans:
+            blobs.remove(digest)
+        return len(orphans)
+
+    for digest in blobs.iter_blobs():
+        batch.append(digest)
+        if len(batch) == SWEEP_BATCH:
+            removed += await sweep(batch)
+            batch = []
+    if batch:
+        removed += await sweep(batch)
+    return removed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from src.core.store.runner import StoreRunner
+
+    parser = argparse.ArgumentParser(
+        description="Remove attachment files that no message uses any more"
+    )
+    parser.add_argument("--database", help="Clean up this store instead")
+    parser.add_argument(
+        "--grace",
+        type=float,
+        default=GRACE_SECONDS,
+        help="Keep files written or reused in the last this many seconds",
+    )
+    args = parser.parse_args(argv)
+    store = StoreRunner(args.database)
+    try:
+        removed = store.call(collect_garbage(store.blobs, args.grace))
+    finally:
+        store.close()
+    logger.info(f"Removed {removed} unused attachment files")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+# src/core/store/bodies.py
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from src.core.store.deltas import StoreDelta
+from src.core.store.importer import ParsedMessage
+
+# Those of a chat's newest messages whose bodies are still to fetch, newest
+# first; the (chat, timestamp) index finds the newest.
+PENDING_IN_CHAT = """
+SELECT newest.id FROM (
+    SELECT id, timestamp FROM message WHERE chat_id = ?
+    ORDER BY timestamp DESC, id DESC LIMIT ?
+) AS newest
+WHERE EXISTS (SELECT 1 FROM pending_body WHERE message_id = newest.id)
+ORDER BY newest.timestamp DESC, newest.id DESC
+"""
+
+# Where pending messages are on the server, newest source first, since a
+# mailbox whose UIDVALIDITY changed is a new source for the same messages.
+LOCATE = """
+SELECT pending_body.message_id AS id, message.chat_id, import_progress.source,
+       mailbox_message.uid
+FROM pending_body
+JOIN message ON message.id = pending_body.message_id
+JOIN mailbox_message ON mailbox_message.message_id = pending_body.message_id
+JOIN import_progress ON import_progress.id = mailbox_message.source_id
+WHERE pending_body.message_id IN (SELECT value FROM json_each(?))
+ORDER BY mailbox_message.source_id DESC
+"""
+
+
+@dataclass
+class BodyLocation:
+    """Where to fetch a pending message's body from."""
+
+    message_id: int
+    chat_id: int
+    # The mailbox's import source, which names its UIDVALIDITY.
+    source: str
+    uid: int
+
+
+async def pending_in_chats(chat_ids: Iterable[int], newest: int) -> List[int]:
+    """The ids of pending messages among each chat's `newest` messages."""
+    connection = connections.get("default")
+    message_ids: List[int] = []
+    for chat_id in chat_ids:
+        _, rows = await connection.execute_query(PENDING_IN_CHAT, [chat_id, newest])
+        message_ids.extend(row["id"] for row in rows)
+    return message_ids
+
+
+async def pending_bodies(limit: int) -> List[int]:
+    """The ids of up to `limit` pending messages, the most recently stored
+    first."""
+    _, rows = await connections.get("default").execute_query(
+        "SELECT message_id FROM pending_body ORDER BY message_id DESC LIMIT ?",
+        [limit],
+    )
+    return [row["message_id"] for row in rows]
+
+
+async def locate_bodies(message_ids: Iterable[int]) -> List[BodyLocation]:
+    """Where the messages among `message_ids` that are still pending are."""
+    _, rows = await connections.get("default").execute_query(
+        LOCATE, [json.dumps(list(message_ids))]
+    )
+    locations: Dict[int, BodyLocation] = {}
+    for row in rows:
+        if row["id"] not in locations:
+            locations[row["id"]] = BodyLocation(
+                row["id"], row["chat_id"], row["source"], row["uid"]
+            )
+    return list(locations.values())
+
+
+async def fill_bodies(
+    bodies: List[Tuple[BodyLocation, ParsedMessage]], done: Iterable[int]
+) -> StoreDelta:
+    """Replace pending messages' previews with their fetched text and add
+    their attachments, then stop waiting on the messages in `done`, whether
+    or not their bodies could be had."""
+    delta = StoreDelta()
+    async with in_transaction("default") as connection:
+        # Leaving out any deleted since, or filled already.
+        _, rows = await connection.execute_query(
+            "SELECT message_id FROM pending_body "
+            "WHERE message_id IN (SELECT value FROM json_each(?))",
+            [json.dumps([location.message_id for location, _ in bodies])],
+        )
+        pending = {row["message_id"] for row in rows}
+        bodies = [body for body in bodies if body[0].message_id in pending]
+        if bodies:
+            await connection.execute_many(
+                "UPDATE message SET content = ? WHERE id = ?",
+                [[parsed.content, location.message_id] for location, parsed in bodies],
+            )
+        attachment_rows = [
+            [
+                location.message_id,
+                attachment.digest,
+                attachment.filename,
+                attachment.content_type,
+                attachment.size,
+            ]
+            for location, parsed in bodies
+            for attachment in parsed.attachments
+        ]
+        if attachment_rows:
+            await connection.execute_many(
+                "INSERT INTO attachment (message_id, digest, filename, "
+                "content_type, size) VALUES (?, ?, ?, ?, ?)",
+                attachment_rows,
+            )
+        await connection.execute_query(
+            "DELETE FROM pending_body "
+            "WHERE message_id IN (SELECT value FROM json_each(?))",
+            [json.dumps(list(done))],
+        )
+    for location, _ in bodies:
+        delta.fill(location.chat_id, location.message_id)
+    return delta
@@ -0,0 +1,78 @@
+# src/core/store/contacts.py
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from tortoise import connections
+
+from src.core.contacts import ContactDirectory
+from src.core.models.member import Member
+
+ContactActivity = Tuple[Member, int, Optional[datetime]]
+
+ACTIVITY = """
+SELECT member.email, member.name, member.pgp_key_id, member.is_pgp_verified,
+       coalesce(contact_activity.message_count, 0) AS message_count,
+       contact_activity.last_seen_at
+FROM member LEFT JOIN contact_activity ON contact_activity.member_id = member.id
+"""
+
+# Only the members of messages stored since the last load.
+CHANGED = """
+WHERE member.id IN (
+    SELECT sender_id FROM message WHERE id > ?
+    UNION
+    SELECT member_id FROM message_recipient WHERE message_id > ?
+)
+"""
+
+
+async def load_contacts(
+    after_message_id: int = 0,
+) -> Tuple[List[ContactActivity], int]:
+    """Every member with how many messages they are in and when the latest
+    was, for a `ContactDirectory`.
+
+    Given the message id returned last time, only the members of newer
+    messages are loaded. Runs on the store thread.
+    """
+    connection = connections.get("default")
+    _, rows = await connection.execute_query(
+        "SELECT coalesce(max(id), 0) AS latest FROM message"
+    )
+    latest = int(rows[0]["latest"])
+    if after_message_id:
+        _, rows = await connection.execute_query(
+            ACTIVITY + CHANGED, [after_message_id, after_message_id]
+        )
+    else:
+        _, rows = await connection.execute_query(ACTIVITY)
+    return [
+        (
+            Member.intern(
+                row["email"],
+                pgp_key_id=row["pgp_key_id"],
+                is_pgp_verified=bool(row["is_pgp_verified"]),
+                name=row["name"],
+            ),
+            row["message_count"],
+            (
+                datetime.fromisoformat(row["last_seen_at"])
+                if row["last_seen_at"]
+                else None
+            ),
+        )
+        for row in rows
+    ], latest
+
+
+async def load_directory() -> Tuple[ContactDirectory, int]:
+    """A directory of every contact, with the message id to load updates after.
+
+    The index is built on a worker thread, so neither the store nor the UI
+    waits on it.
+    """
+    activity, latest = await load_contacts()
+    directory = ContactDirectory()
+    await asyncio.to_thread(directory.update, activity)
+    return directory, latest
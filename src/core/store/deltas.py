@@ -0,0 +1,90 @@
+# src/core/store/deltas.py
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from src.core.models.message import Message, MessageStatus
+
+
+@dataclass
+class StoreDelta:
+    """Changes to stored messages, by chat, for the UI to catch up with."""
+
+    # New messages, in the order they were stored.
+    added: Dict[int, List[Message]] = field(default_factory=dict)
+    # Ids of messages that were deleted.
+    removed: Dict[int, Set[int]] = field(default_factory=dict)
+    # New statuses, by message id.
+    statuses: Dict[int, Dict[int, MessageStatus]] = field(default_factory=dict)
+    # Ids of messages whose bodies arrived after them, replacing a preview.
+    filled: Dict[int, Set[int]] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.statuses or self.filled)
+
+    @property
+    def chats(self) -> Set[int]:
+        """The chats whose summaries may have changed."""
+        return (
+            set(self.added) | set(self.removed) | set(self.statuses) | set(self.filled)
+        )
+
+    def add(self, chat_id: int, message: Message) -> None:
+        self.added.setdefault(chat_id, []).append(message)
+
+    def remove(self, chat_id: int, message_id: int) -> None:
+        self.removed.setdefault(chat_id, set()).add(message_id)
+        # One added since the last frame was never drawn, and mustn't be.
+        if chat_id in self.added:
+            self.added[chat_id] = [
+                message for message in self.added[chat_id] if message.id != message_id
+            ]
+        self.statuses.get(chat_id, {}).pop(message_id, None)
+        self.filled.get(chat_id, set()).discard(message_id)
+
+    def fill(self, chat_id: int, message_id: int) -> None:
+        self.filled.setdefault(chat_id, set()).add(message_id)
+
+    def set_status(self, chat_id: int, message_id: int, status: MessageStatus) -> None:
+        self.statuses.setdefault(chat_id, {})[message_id] = status
+
+    def merge(self, later: "StoreDelta") -> None:
+        """Fold in the changes that came after these."""
+        for chat_id, messages in later.added.items():
+            self.added.setdefault(chat_id, []).extend(messages)
+        for chat_id, message_ids in later.removed.items():
+            for message_id in message_ids:
+                self.remove(chat_id, message_id)
+        for chat_id, statuses in later.statuses.items():
+            self.statuses.setdefault(chat_id, {}).update(statuses)
+        for chat_id, message_ids in later.filled.items():
+            self.filled.setdefault(chat_id, set()).update(message_ids)
+
+
+class DeltaQueue:
+    """Hands store deltas from the store thread over to the Tk thread.
+
+    Deltas posted between two `take`s come out as one, so the UI redraws
+    once a frame however many messages arrived in it.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.pending = StoreDelta()
+        # How many deltas the next `take` folds together.
+        self.posted = 0
+
+    def post(self, delta: StoreDelta) -> None:
+        if not delta:
+            return
+        with self.lock:
+            self.pending.merge(delta)
+            self.posted += 1
+
+    def take(self) -> Optional[StoreDelta]:
+        """Everything posted since the last call, or None if nothing was."""
+        with self.lock:
+            if not self.posted:
+                return None
+            delta, self.pending, self.posted = self.pending, StoreDelta(), 0
+        return delta
@@ -0,0 +1,844 @@
+# src/core/store/importer.py
+import argparse
+import binascii
+import hashlib
+import html
+import json
+import mmap
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from email.errors import HeaderParseError
+from email.header import decode_header, make_header
+from email.message import Message as MailMessage
+from email.parser import BytesParser
+from email.policy import compat32
+from email.utils import getaddresses, parsedate_to_datetime
+from multiprocessing import get_context
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from src.core.logging import logger
+from src.core.models.attachment import Attachment
+from src.core.models.member import Member
+from src.core.models.message import EPOCH, Message, MessageStatus
+from src.core.store.attachments import BlobStore
+from src.core.store.deltas import StoreDelta
+from src.core.store.runner import StoreRunner
+from src.core.store.tables import ImportProgressRecord
+from src.core.store.threads import ThreadEntry, ThreadIndex, message_ids, next_id
+
+BATCH_SIZE = 1000
+# Base64 characters decoded at a time when streaming an attachment.
+BLOB_CHUNK = 1 << 16
+PROGRESS_INTERVAL = 2.0
+
+# A line starting "From " after a blank line starts the next message.
+MBOX_SEPARATOR = b"\n\nFrom "
+# mboxrd escapes "From " at the start of a body line as ">From ", and
+# ">From " as ">>From ", so taking one ">" off restores the original.
+MBOX_ESCAPED_FROM = re.compile(rb"^>(>*From )", re.MULTILINE)
+MAILDIR_INFO = ":2,"
+SCRIPT_OR_STYLE = re.compile(r"<(script|style)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+TAG = re.compile(r"<[^>]*>")
+BLANK_LINES = re.compile(r"\n\s*\n\s*")
+SPACES = re.compile(r"[ \t\r\f\v]+")
+
+# The default policy's header objects make parsing several times slower;
+# with compat32 only the few headers used here are decoded.
+PARSER = BytesParser(policy=compat32)
+
+# (email, name)
+Address = Tuple[str, str]
+
+FIND_MESSAGE_IDS = """
+SELECT message_id FROM message
+WHERE message_id IN (SELECT value FROM json_each(?)) AND message_id != ''
+"""
+
+FIND_MEMBERS = """
+SELECT id, email FROM member WHERE email IN (SELECT value FROM json_each(?))
+"""
+
+# Records the UID each stored message has in its mailbox. Message-IDs are only
+# indexed where not empty, so the query has to say so to use the index.
+MAP_UIDS = """
+INSERT OR REPLACE INTO mailbox_message (source_id, uid, message_id)
+SELECT import_progress.id, ?, message.id FROM import_progress, message
+WHERE import_progress.source = ? AND message.message_id = ?
+  AND message.message_id != ''
+"""
+
+# Records the UIDs fetched that MAP_UIDS couldn't map to a stored message.
+MARK_UNMAPPED = """
+INSERT OR IGNORE INTO unmapped_uid (source_id, uid)
+SELECT import_progress.id, fetched.value
+FROM import_progress, json_each(?) AS fetched
+WHERE import_progress.source = ?
+  AND NOT EXISTS (
+      SELECT 1 FROM mailbox_message
+      WHERE source_id = import_progress.id AND uid = fetched.value
+  )
+"""
+
+
+@dataclass
+class ParsedMessage:
+    """A message as read from a mailbox, before it is mapped onto the models."""
+
+    message_id: str
+    # Message-IDs of the messages it replies to, oldest first.
+    references: List[str]
+    sender: Address
+    # To and Cc, in order, without repeats.
+    recipients: List[Address]
+    subject: str
+    content: str
+    timestamp: datetime
+    seen: bool
+    # Already in the blob store; only their handles travel with the message.
+    attachments: List[Attachment] = field(default_factory=list)
+    # Its UID, when it was fetched from an IMAP mailbox.
+    uid: Optional[int] = None
+    # Only its header was fetched, and `content` is the start of its text;
+    # the rest, attachments too, is fetched later.
+    partial: bool = False
+
+
+@dataclass
+class Batch:
+    """Messages from one source, parsed and stored together."""
+
+    # An mbox file or Maildir folder.
+    source: str
+    # Where to resume once this batch is stored.
+    position: int
+    # (start, end) byte offsets of each message in an mbox...
+    spans: List[Tuple[int, int]] = field(default_factory=list)
+    # ...or the paths of the message files in a Maildir folder.
+    files: List[str] = field(default_factory=list)
+    # The UIDs an IMAP mailbox returned messages for, stored or not.
+    uids: List[int] = field(default_factory=list)
+
+
+@dataclass
+class ImportProgress:
+    source: str = ""
+    # Messages read from the sources this run, whatever became of them.
+    messages: int = 0
+    imported: int = 0
+    # Already in the store, from an earlier import or a repeat in the sources.
+    duplicates: int = 0
+    # Couldn't be parsed, or had no sender.
+    failed: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def add(self, batch: Batch, read: int, parsed: int, imported: int) -> None:
+        self.source = batch.source
+        self.messages += read
+        self.imported += imported
+        self.duplicates += parsed - imported
+        self.failed += read - parsed
+
+    @property
+    def rate(self) -> float:
+        """Messages read per second so far."""
+        elapsed = time.monotonic() - self.started
+        return self.messages / elapsed if elapsed > 0 else 0.0
+
+
+def html_to_text(text: str) -> str:
+    text = SCRIPT_OR_STYLE.sub("", text)
+    text = html.unescape(TAG.sub(" ", text))
+    return BLANK_LINES.sub("\n\n", SPACES.sub(" ", text)).strip()
+
+
+def is_attachment(part: MailMessage) -> bool:
+    """Whether a part is a file rather than the text of the message."""
+    return (
+        str(part.get("content-disposition", "")).lower().startswith("attachment")
+        or part.get_filename() is not None
+        or part.get_content_maintype() not in ("text", "multipart", "message")
+    )
+
+
+def body_part(message: MailMessage) -> Optional[MailMessage]:
+    """The first plain text part of a message, or its first HTML part."""
+    html_part = None
+    for part in message.walk():
+        if part.is_multipart() or is_attachment(part):
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain":
+            return part
+        if content_type == "text/html" and html_part is None:
+            html_part = part
+    return html_part
+
+
+def iter_payload(part: MailMessage) -> Iterator[bytes]:
+    """A part's decoded bytes in pieces, so an attachment is never held
+    decoded in full."""
+    payload = part.get_payload()
+    encoding = str(part.get("content-transfer-encoding", "")).strip().lower()
+    if encoding != "base64" or not isinstance(payload, str):
+        data = part.get_payload(decode=True)
+        if isinstance(data, bytes):
+            yield data
+        return
+    pending = ""
+    for start in range(0, len(payload), BLOB_CHUNK):
+        pending += "".join(payload[start : start + BLOB_CHUNK].split())
+        usable = len(pending) - len(pending) % 4
+        if usable:
+            yield binascii.a2b_base64(pending[:usable])
+            pending = pending[usable:]
+    if pending.rstrip("="):
+        yield binascii.a2b_base64(pending + "=" * (-len(pending) % 4))
+
+
+def store_attachments(message: MailMessage, blobs: BlobStore) -> List[Attachment]:
+    attachments = []
+    for part in message.walk():
+        if part.is_multipart() or not is_attachment(part):
+            continue
+        try:
+            digest, size = blobs.write(iter_payload(part))
+        except (binascii.Error, ValueError) as e:
+            logger.debug(f"Skipping an attachment that can't be decoded: {e}")
+            continue
+        attachments.append(
+            Attachment(
+                digest=digest,
+                filename=header_text(part.get_filename(""))[:255],
+                content_type=part.get_content_type(),
+                size=size,
+            )
+        )
+    return attachments
+
+
+def body_text(message: MailMessage) -> str:
+    """The text of a message, from its HTML part if it has no plain one."""
+    part = body_part(message)
+    if part is None:
+        return ""
+    payload = part.get_payload(decode=True)
+    if not isinstance(payload, bytes):
+        return ""
+    return decode_text(
+        payload, part.get_content_charset(), part.get_content_type() == "text/html"
+    )
+
+
+def decode_text(payload: bytes, charset: Optional[str], is_html: bool) -> str:
+    """A text part's decoded bytes as text, HTML tags and all taken out."""
+    # 8-bit text sent without a charset (or with a wrong one) is nearly
+    # always UTF-8.
+    for encoding in (charset, "utf-8"):
+        try:
+            text = payload.decode(encoding or "utf-8")
+            break
+        except (LookupError, UnicodeDecodeError):
+            continue
+    else:
+        text = payload.decode("latin-1")
+    text = text.replace("\r\n", "\n")
+    if is_html:
+        return html_to_text(text)
+    return text.strip()
+
+
+def header_text(value: object) -> str:
+    """A header value with any encoded words decoded and folding undone."""
+    text = str(value or "")
+    if not text.isascii():
+        # Raw 8-bit header bytes come through as surrogates.
+        text = text.encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+    if "=?" in text:
+        try:
+            text = str(make_header(decode_header(text)))
+        except (HeaderParseError, LookupError, UnicodeDecodeError):
+            pass
+    return " ".join(text.split())
+
+
+def to_local(timestamp: datetime) -> datetime:
+    """A naive local time, as the store keeps them."""
+    if timestamp.tzinfo is None:
+        return timestamp
+    try:
+        return timestamp.astimezone().replace(tzinfo=None)
+    except (OverflowError, OSError, ValueError):
+        return timestamp.replace(tzinfo=None)
+
+
+def header_addresses(message: MailMessage, *names: str) -> List[Address]:
+    values = [str(value) for name in names for value in message.get_all(name, [])]
+    addresses: Dict[str, str] = {}
+    for name, email in getaddresses(values):
+        email = header_text(email).lower()
+        if "@" in email and email not in addresses:
+            addresses[email] = header_text(name)
+    return list(addresses.items())
+
+
+def parse_message(
+    raw: bytes,
+    fallback_time: Optional[datetime],
+    seen: Optional[bool] = None,
+    blobs: Optional[BlobStore] = None,
+    headers_only: bool = False,
+) -> Optional[ParsedMessage]:
+    """Parse one message, or None if it has no usable sender.
+
+    `seen` comes from the mailbox; when it is None the mbox Status header
+    is used instead. Attachments are streamed into `blobs`, or skipped
+    without one. With `headers_only`, `raw` is just the header, and the
+    message is left without content.
+    """
+    message = PARSER.parsebytes(raw)
+    senders = header_addresses(message, "from") or header_addresses(message, "sender")
+    if not senders:
+        return None
+    try:
+        timestamp = parsedate_to_datetime(str(message["date"]))
+    except (TypeError, ValueError):
+        timestamp = fallback_time or EPOCH
+    message_id = next(iter(message_ids(str(message["message-id"] or ""))), "")
+    if not message_id:
+        # Still the same on the next import of the same bytes.
+        message_id = f"<{hashlib.sha1(raw).hexdigest()}@mailsocial.invalid>"
+    if seen is None:
+        seen = "R" in str(message["status"] or "")
+    references = message_ids(str(message["references"] or ""))
+    # In-Reply-To names the parent when References is missing or cut short.
+    parent = message_ids(str(message["in-reply-to"] or ""))[:1]
+    if parent and parent[0] not in references:
+        references += parent
+    return ParsedMessage(
+        message_id=message_id,
+        references=references,
+        sender=senders[0],
+        recipients=header_addresses(message, "to", "cc"),
+        subject=header_text(message["subject"]),
+        content="" if headers_only else body_text(message),
+        attachments=(
+            store_attachments(message, blobs) if blobs and not headers_only else []
+        ),
+        timestamp=to_local(timestamp),
+        seen=seen,
+    )
+
+
+def envelope_time(from_line: bytes) -> Optional[datetime]:
+    """The delivery time on an mbox "From sender Sat Jan  3 01:05:34 1996" line."""
+    words = from_line.decode("ascii", "replace").split()
+    try:
+        return datetime.strptime(" ".join(words[-5:]), "%a %b %d %H:%M:%S %Y")
+    except ValueError:
+        return None
+
+
+def parse_mbox_message(
+    data: bytes, blobs: Optional[BlobStore] = None
+) -> Optional[ParsedMessage]:
+    from_line, _, raw = data.partition(b"\n")
+    return parse_message(
+        MBOX_ESCAPED_FROM.sub(rb"\1", raw), envelope_time(from_line), blobs=blobs
+    )
+
+
+def parse_maildir_message(
+    path: str, blobs: Optional[BlobStore] = None
+) -> Optional[ParsedMessage]:
+    name = os.path.basename(path)
+    _, info, flags = name.partition(MAILDIR_INFO)
+    try:
+        # Unique names start with the delivery time.
+        fallback_time: Optional[datetime] = datetime.fromtimestamp(
+            int(name.split(".", 1)[0])
+        )
+    except (ValueError, OverflowError, OSError):
+        fallback_time = None
+    with open(path, "rb") as file:
+        raw = file.read()
+    return parse_message(raw, fallback_time, bool(info) and "S" in flags, blobs)
+
+
+def parse_batch(
+    batch: Batch, blobs: Optional[BlobStore] = None
+) -> List[Optional[ParsedMessage]]:
+    """Parse a batch of messages, with None for each one that can't be imported.
+
+    Runs in the worker processes, so it only reads the source itself.
+    """
+    parsed: List[Optional[ParsedMessage]] = []
+    if batch.files:
+        for path in batch.files:
+            try:
+                parsed.append(parse_maildir_message(path, blobs))
+            except Exception as e:
+                logger.debug(f"Error parsing {path}: {e}")
+                parsed.append(None)
+        return parsed
+    with (
+        open(batch.source, "rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data,
+    ):
+        for start, end in batch.spans:
+            try:
+                parsed.append(parse_mbox_message(data[start:end], blobs))
+            except Exception as e:
+                logger.debug(f"Error parsing {batch.source} at byte {start}: {e}")
+                parsed.append(None)
+    return parsed
+
+
+def is_maildir(path: str) -> bool:
+    return all(os.path.isdir(os.path.join(path, sub)) for sub in ("cur", "new"))
+
+
+def find_sources(paths: Iterable[str]) -> Iterator[str]:
+    """Yield every mbox file and Maildir folder (Maildir++ subfolders included)
+    under `paths`."""
+    for path in paths:
+        path = os.path.realpath(path)
+        if os.path.isfile(path):
+            yield path
+        elif is_maildir(path):
+            yield path
+            for name in sorted(os.listdir(path)):
+                folder = os.path.join(path, name)
+                if name.startswith(".") and is_maildir(folder):
+                    yield folder
+        elif os.path.isdir(path):
+            yield from find_sources(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if not name.startswith(".")
+            )
+        else:
+            logger.error(f"No mailbox found at {path}")
+
+
+def release_pages(data: mmap.mmap, start: int, end: int) -> None:
+    """Let the OS drop the pages of a mapping that have been scanned, so the
+    memory used doesn't grow with the size of the mbox."""
+    if hasattr(mmap, "MADV_DONTNEED"):
+        start -= start % mmap.PAGESIZE
+        data.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def iter_mbox_batches(path: str, position: int, batch_size: int) -> Iterator[Batch]:
+    """Split an mbox into batches of messages without reading it into memory."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with (
+        open(path, "rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data,
+    ):
+        if data[:5] != b"From ":
+            logger.error(f"{path} is not an mbox file")
+            return
+        if position > size or data[position : position + 5] not in (b"", b"From "):
+            # Rewritten since it was last imported; stored messages are skipped.
+            position = 0
+        spans: List[Tuple[int, int]] = []
+        start = position
+        while start < size:
+            separator = data.find(MBOX_SEPARATOR, start)
+            if separator < 0:
+                spans.append((start, size))
+                start = size
+            else:
+                spans.append((start, separator + 1))
+                start = separator + 2
+            if len(spans) == batch_size:
+                yield Batch(path, start, spans=spans)
+                release_pages(data, spans[0][0], start)
+                spans = []
+        if spans:
+            yield Batch(path, start, spans=spans)
+
+
+def iter_maildir_batches(
+    folder: str, position: int, batch_size: int
+) -> Iterator[Batch]:
+    """Batch a Maildir folder's messages in the order of their unique names.
+
+    Flags are left out of the order, since marking a message read renames it,
+    and new mail sorts last, since unique names start with the delivery time.
+    """
+    names = sorted(
+        (name.partition(MAILDIR_INFO)[0], os.path.join(folder, sub, name))
+        for sub in ("new", "cur")
+        for name in os.listdir(os.path.join(folder, sub))
+        if not name.startswith(".")
+    )
+    for start in range(position, len(names), batch_size):
+        chunk = names[start : start + batch_size]
+        yield Batch(folder, start + len(chunk), files=[path for _, path in chunk])
+
+
+def iter_batches(
+    sources: Iterable[str], positions: Dict[str, int], batch_size: int
+) -> Iterator[Batch]:
+    for source in sources:
+        position = positions.get(source, 0)
+        if os.path.isdir(source):
+            yield from iter_maildir_batches(source, position, batch_size)
+        else:
+            yield from iter_mbox_batches(source, position, batch_size)
+
+
+def parse_serially(
+    batches: Iterator[Batch], blobs: Optional[BlobStore] = None
+) -> Iterator[Tuple[Batch, List[Optional[ParsedMessage]]]]:
+    for batch in batches:
+        yield batch, parse_batch(batch, blobs)
+
+
+def parse_in_pool(
+    batches: Iterator[Batch], jobs: int, blobs: Optional[BlobStore] = None
+) -> Iterator[Tuple[Batch, List[Optional[ParsedMessage]]]]:
+    """Parse batches in a process pool, yielding them in their original order.
+
+    Only `jobs * 2` batches are in flight at once, so memory stays bounded
+    however large the mailbox. Workers are spawned rather than forked, as
+    the store runs on a thread of its own.
+    """
+    pending: Deque[Tuple[Batch, Future[List[Optional[ParsedMessage]]]]] = deque()
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=get_context("spawn")
+    ) as executor:
+        while True:
+            batch = next(batches, None)
+            if batch:
+                pending.append((batch, executor.submit(parse_batch, batch, blobs)))
+            if pending and (not batch or len(pending) >= jobs * 2):
+                done_batch, done = pending.popleft()
+                yield done_batch, done.result()
+            if not batch and not pending:
+                break
+
+
+class MailImporter:
+    """Stores parsed mail, a batch per transaction.
+
+    Messages are grouped into chats by conversation thread, and a chat's
+    members are the people in it other than the user, whose own addresses
+    are left out. Each batch is stored with the position to resume its
+    source from, so an interrupted import carries on where the last stored
+    batch ended.
+    """
+
+    def __init__(self, me: Iterable[str] = ()) -> None:
+        self.me = frozenset(email.lower() for email in me)
+        self.member_ids: Dict[str, int] = {}
+        self.threads = ThreadIndex()
+
+    async def positions(self) -> Dict[str, int]:
+        return {
+            record.source: record.position
+            for record in await ImportProgressRecord.all()
+        }
+
+    def to_message(self, parsed: ParsedMessage) -> Message:
+        sender = Member.intern(parsed.sender[0], name=parsed.sender[1])
+        return Message(
+            recipients=[
+                Member.intern(email, name=name) for email, name in parsed.recipients
+            ],
+            sender=sender,
+            content=parsed.content,
+            timestamp=parsed.timestamp,
+            # The user has read what they sent themselves.
+            status=(
+                MessageStatus.READ
+                if parsed.seen or sender.email in self.me
+                else MessageStatus.SENT
+            ),
+            subject=parsed.subject,
+            attachments=parsed.attachments,
+        )
+
+    def chat_members(self, message: Message) -> List[Member]:
+        members = {
+            member.email: member
+            for member in (message.sender, *message.recipients)
+            if member.email not in self.me
+        }
+        return list(members.values()) or [message.sender]
+
+    async def new_messages(
+        self, connection: BaseDBAsyncClient, parsed: List[ParsedMessage]
+    ) -> List[ParsedMessage]:
+        """Leave out messages that are already stored or repeated in the batch."""
+        _, rows = await connection.execute_query(
+            FIND_MESSAGE_IDS, [json.dumps([message.message_id for message in parsed])]
+        )
+        seen = {row["message_id"] for row in rows}
+        new = []
+        for message in parsed:
+            if message.message_id not in seen:
+                seen.add(message.message_id)
+                new.append(message)
+        return new
+
+    async def add_members(
+        self, connection: BaseDBAsyncClient, members: Iterable[Member]
+    ) -> None:
+        missing = {
+            member.email: member
+            for member in members
+            if member.email not in self.member_ids
+        }
+        if not missing:
+            return
+        await connection.execute_many(
+            "INSERT OR IGNORE INTO member (email, name, pgp_key_id, is_pgp_verified) "
+            "VALUES (?, ?, '', 0)",
+            [[member.email, member.name] for member in missing.values()],
+        )
+        _, rows = await connection.execute_query(
+            FIND_MEMBERS, [json.dumps(list(missing))]
+        )
+        self.member_ids.update((row["email"], row["id"]) for row in rows)
+
+    async def store(
+        self,
+        batch: Batch,
+        parsed: List[ParsedMessage],
+        delta: Optional[StoreDelta] = None,
+    ) -> int:
+        """Store a parsed batch and its source's new position; returns how many
+        messages were new. They are added to `delta`, if given, for the UI."""
+        async with in_transaction("default") as connection:
+            new = await self.new_messages(connection, parsed)
+            messages = [self.to_message(message) for message in new]
+            await self.add_members(
+                connection,
+                (
+                    member
+                    for message in messages
+                    for member in (message.sender, *message.recipients)
+                ),
+            )
+            chat_ids = await self.threads.assign(
+                connection,
+                [
+                    ThreadEntry(
+                        source.message_id,
+                        source.references,
+                        source.subject,
+                        self.chat_members(message),
+                    )
+                    for source, message in zip(new, messages)
+                ],
+                self.member_ids,
+            )
+
+            message_id = await next_id(connection, "message")
+            message_rows: List[List[object]] = []
+            recipient_rows: List[List[int]] = []
+            attachment_rows: List[List[object]] = []
+            pending_rows: List[List[int]] = []
+            for source, message, chat_id in zip(new, messages, chat_ids):
+                message.id = message_id
+                message_id += 1
+                message_rows.append(
+                    [
+                        message.id,
+                        chat_id,
+                        self.member_ids[message.sender.email],
+                        message.subject,
+                        source.message_id,
+                        message.content,
+                        str(message.timestamp),
+                        message.status.value,
+                    ]
+                )
+                recipient_rows.extend(
+                    [message.id, self.member_ids[member.email]]
+                    for member in message.recipients
+                )
+                attachment_rows.extend(
+                    [
+                        message.id,
+                        attachment.digest,
+                        attachment.filename,
+                        attachment.content_type,
+                        attachment.size,
+                    ]
+                    for attachment in message.attachments
+                )
+                if source.partial:
+                    pending_rows.append([message.id])
+            if message_rows:
+                await connection.execute_many(
+                    "INSERT INTO message (id, chat_id, sender_id, subject, message_id, "
+                    "content, timestamp, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    message_rows,
+                )
+            if recipient_rows:
+                await connection.execute_many(
+                    "INSERT INTO message_recipient (message_id, member_id) VALUES (?, ?)",
+                    recipient_rows,
+                )
+            if attachment_rows:
+                await connection.execute_many(
+                    "INSERT INTO attachment (message_id, digest, filename, "
+                    "content_type, size) VALUES (?, ?, ?, ?, ?)",
+                    attachment_rows,
+                )
+            if pending_rows:
+                await connection.execute_many(
+                    "INSERT INTO pending_body (message_id) VALUES (?)", pending_rows
+                )
+            await connection.execute_query(
+                "INSERT INTO import_progress (source, position) VALUES (?, ?) "
+                "ON CONFLICT (source) DO UPDATE SET position = excluded.position",
+                [batch.source, batch.position],
+            )
+            # Every fetched message, new or not, is now at its UID.
+            uid_rows = [
+                [message.uid, batch.source, message.message_id]
+                for message in parsed
+                if message.uid is not None
+            ]
+            if uid_rows:
+                await connection.execute_many(MAP_UIDS, uid_rows)
+            if batch.uids:
+                await connection.execute_query(
+                    MARK_UNMAPPED, [json.dumps(batch.uids), batch.source]
+                )
+        if delta is not None:
+            for message, chat_id in zip(messages, chat_ids):
+                delta.add(chat_id, message)
+        return len(messages)
+
+
+def import_mail(
+    store: StoreRunner,
+    paths: Iterable[str],
+    me: Iterable[str] = (),
+    jobs: int = 1,
+    batch_size: int = BATCH_SIZE,
+    on_progress: Optional[Callable[[ImportProgress], None]] = None,
+) -> ImportProgress:
+    """Import mbox files and Maildir trees into the store.
+
+    Each batch is parsed here (or in `jobs` processes) while the store
+    thread writes the one before. Call it off the Tk thread; `on_progress`
+    is called after every stored batch.
+    """
+    importer = MailImporter(me)
+    batches = iter_batches(
+        find_sources(paths), store.call(importer.positions()), batch_size
+    )
+    parsed_batches = (
+        parse_in_pool(batches, jobs, store.blobs)
+        if jobs > 1
+        else parse_serially(batches, store.blobs)
+    )
+    progress = ImportProgress()
+    # One batch is written at a time, in order, so a source's stored position
+    # never runs ahead of its stored messages; the next is parsed meanwhile.
+    writing: Optional[Tuple[Batch, int, int, "Future[int]"]] = None
+    for batch, parsed in parsed_batches:
+        if writing:
+            progress.add(*writing[:3], writing[3].result())
+            if on_progress:
+                on_progress(progress)
+        messages = [message for message in parsed if message is not None]
+        writing = (
+            batch,
+            len(parsed),
+            len(messages),
+            store.submit(importer.store(batch, messages)),
+        )
+    if writing:
+        progress.add(*writing[:3], writing[3].result())
+        if on_progress:
+            on_progress(progress)
+    return progress
+
+
+def log_progress(
+    interval: float = PROGRESS_INTERVAL,
+) -> Callable[[ImportProgress], None]:
+    last = time.monotonic()
+
+    def report(progress: ImportProgress) -> None:
+        nonlocal last
+        if time.monotonic() - last >= interval:
+            last = time.monotonic()
+            logger.info(
+                f"{progress.messages} messages read ({progress.rate:.0f}/s), "
+                f"{progress.imported} imported, now in {progress.source}"
+            )
+
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Import mbox files and Maildir folders into the message store"
+    )
+    parser.add_argument("sources", nargs="+", help="mbox files and Maildir folders")
+    parser.add_argument(
+        "--me",
+        action="append",
+        default=[],
+        metavar="EMAIL",
+        help="Your own address, left out of chats; can be given more than once",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of processes used to parse mail (0 for one per CPU)",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--database", help="Import into this store instead")
+    args = parser.parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+
+    store = StoreRunner(args.database)
+    try:
+        progress = import_mail(
+            store, args.sources, args.me, jobs, args.batch_size, log_progress()
+        )
+    except Exception as e:
+        logger.error(f"Import stopped: {e}; run it again to carry on")
+        return 1
+    finally:
+        store.close()
+    logger.info(
+        f"Read {progress.messages} messages ({progress.rate:.0f}/s): "
+        f"{progress.imported} imported, {progress.duplicates} already stored, "
+        f"{progress.failed} could not be read"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,173 @@
+# src/core/store/mailboxes.py
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from src.core.models.message import MessageStatus
+from src.core.store.deltas import StoreDelta
+
+MAPPED = """
+SELECT mailbox_message.uid, message.id, message.chat_id, message.status,
+       member.email AS sender
+FROM mailbox_message
+JOIN import_progress ON import_progress.id = mailbox_message.source_id
+JOIN message ON message.id = mailbox_message.message_id
+JOIN member ON member.id = message.sender_id
+WHERE import_progress.source = ?
+  AND mailbox_message.uid IN (SELECT value FROM json_each(?))
+"""
+
+# The UIDs fetched from a mailbox: those of its stored messages and those
+# that couldn't be stored.
+KNOWN = """
+SELECT uid FROM mailbox_message JOIN import_progress
+ON import_progress.id = mailbox_message.source_id WHERE import_progress.source = ?
+UNION ALL
+SELECT uid FROM unmapped_uid JOIN import_progress
+ON import_progress.id = unmapped_uid.source_id WHERE import_progress.source = ?
+"""
+
+# Messages that are in no mailbox any more.
+ORPHANS = """
+SELECT value AS id FROM json_each(?)
+WHERE NOT EXISTS (SELECT 1 FROM mailbox_message WHERE message_id = value)
+"""
+
+
+@dataclass
+class MailboxState:
+    """Where a mailbox was last synced to."""
+
+    source: str
+    uidvalidity: int
+    # Zero if the server had no CONDSTORE.
+    highestmodseq: int
+
+
+async def load_state(mailbox: str) -> Optional[MailboxState]:
+    _, rows = await connections.get("default").execute_query(
+        "SELECT import_progress.source, uidvalidity, highestmodseq "
+        "FROM mailbox_state JOIN import_progress "
+        "ON import_progress.id = mailbox_state.source_id WHERE mailbox = ?",
+        [mailbox],
+    )
+    if not rows:
+        return None
+    row = rows[0]
+    return MailboxState(row["source"], row["uidvalidity"], row["highestmodseq"])
+
+
+async def save_state(mailbox: str, state: MailboxState) -> None:
+    """Remember where a mailbox was synced to, once its source has progress."""
+    await connections.get("default").execute_query(
+        "INSERT OR REPLACE INTO mailbox_state "
+        "(mailbox, source_id, uidvalidity, highestmodseq) "
+        "SELECT ?, id, ?, ? FROM import_progress WHERE source = ?",
+        [mailbox, state.uidvalidity, state.highestmodseq, state.source],
+    )
+
+
+async def known_uids(source: str) -> List[int]:
+    """The UIDs of a mailbox's messages that were fetched, stored or not, in
+    ascending order."""
+    _, rows = await connections.get("default").execute_query(
+        f"SELECT uid FROM ({KNOWN}) ORDER BY uid", [source, source]
+    )
+    return [row["uid"] for row in rows]
+
+
+async def count_uids(source: str) -> int:
+    _, rows = await connections.get("default").execute_query(
+        f"SELECT count(*) AS count FROM ({KNOWN})", [source, source]
+    )
+    return int(rows[0]["count"])
+
+
+async def unread_uids(source: str) -> List[int]:
+    """The UIDs of a mailbox's stored messages that are unread."""
+    _, rows = await connections.get("default").execute_query(
+        "SELECT uid FROM mailbox_message "
+        "JOIN import_progress ON import_progress.id = mailbox_message.source_id "
+        "JOIN message ON message.id = mailbox_message.message_id "
+        "WHERE import_progress.source = ? AND message.status = ?",
+        [source, MessageStatus.SENT.value],
+    )
+    return [row["uid"] for row in rows]
+
+
+async def remove_uids(source: str, uids: Iterable[int]) -> StoreDelta:
+    """Forget that messages are in a mailbox, as when they were expunged.
+
+    A message that is in no other mailbox is deleted; mail that was
+    imported rather than synced is never in one, so it is left alone.
+    """
+    delta = StoreDelta()
+    uid_list = json.dumps(list(uids))
+    async with in_transaction("default") as connection:
+        await connection.execute_query(
+            "DELETE FROM unmapped_uid "
+            "WHERE source_id = (SELECT id FROM import_progress WHERE source = ?) "
+            "AND uid IN (SELECT value FROM json_each(?))",
+            [source, uid_list],
+        )
+        _, rows = await connection.execute_query(MAPPED, [source, uid_list])
+        if not rows:
+            return delta
+        await connection.execute_query(
+            "DELETE FROM mailbox_message "
+            "WHERE source_id = (SELECT id FROM import_progress WHERE source = ?) "
+            "AND uid IN (SELECT value FROM json_each(?))",
+            [source, json.dumps([row["uid"] for row in rows])],
+        )
+        _, orphans = await connection.execute_query(
+            ORPHANS, [json.dumps([row["id"] for row in rows])]
+        )
+        gone = {row["id"] for row in orphans}
+        if gone:
+            await connection.execute_query(
+                "DELETE FROM message WHERE id IN (SELECT value FROM json_each(?))",
+                [json.dumps(sorted(gone))],
+            )
+        for row in rows:
+            if row["id"] in gone:
+                delta.remove(row["chat_id"], row["id"])
+    return delta
+
+
+async def set_seen(source: str, seen: Dict[int, bool], me: Iterable[str]) -> StoreDelta:
+    """Mark messages read or unread by their UIDs, as their \\Seen flag says.
+
+    The user's own messages stay read.
+    """
+    me = frozenset(me)
+    delta = StoreDelta()
+    async with in_transaction("default") as connection:
+        _, rows = await connection.execute_query(
+            MAPPED, [source, json.dumps(list(seen))]
+        )
+        for row in rows:
+            status = (
+                MessageStatus.READ
+                if seen[row["uid"]] or row["sender"] in me
+                else MessageStatus.SENT
+            )
+            if row["status"] in (MessageStatus.READ.value, MessageStatus.SENT.value):
+                if row["status"] != status.value:
+                    delta.set_status(row["chat_id"], row["id"], status)
+        for status in (MessageStatus.READ, MessageStatus.SENT):
+            ids = [
+                message_id
+                for statuses in delta.statuses.values()
+                for message_id, new in statuses.items()
+                if new is status
+            ]
+            if ids:
+                await connection.execute_query(
+                    "UPDATE message SET status = ? "
+                    "WHERE id IN (SELECT value FROM json_each(?))",
+                    [status.value, json.dumps(ids)],
+                )
+    return delta
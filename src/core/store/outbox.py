@@ -0,0 +1,379 @@
+# src/core/store/outbox.py
+import asyncio
+import json
+import random
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from email.utils import make_msgid
+from typing import Dict, Iterable, List, Optional, Protocol, Tuple
+
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from src.core.logging import logger
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.repository import ChatRepository, to_message
+from src.core.store.runner import StoreRunner
+from src.core.store.tables import (
+    DeliveryRecord,
+    MessageRecord,
+    OutboxRecord,
+    OutboxState,
+)
+from src.core.store.threads import chat_title
+
+# How long the sender waits after a database error before trying again.
+ERROR_PAUSE = 5.0
+
+# The recipients a server refused, with its reply code and text for each,
+# as smtplib's sendmail returns them.
+Refused = Dict[str, Tuple[int, str]]
+
+
+class PermanentSendError(Exception):
+    """The server refused a message in a way that retrying won't change."""
+
+
+@dataclass
+class OutgoingMail:
+    """A queued message, claimed for one attempt at sending it."""
+
+    outbox_id: int
+    # The Message-ID header. It is fixed when the message is queued, so a
+    # message sent again after a crash is recognisably the same message.
+    message_id: str
+    message: Message
+    to: List[Member]
+    cc: List[Member]
+    bcc: List[Member]
+    # Including this one.
+    attempts: int
+    # Reply codes for the recipients earlier attempts settled, by address:
+    # those accepted, and those refused for good. They aren't sent to again.
+    settled: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def recipients(self) -> List[Member]:
+        return [*self.to, *self.cc, *self.bcc]
+
+    @property
+    def unsettled(self) -> List[Member]:
+        """The recipients this attempt sends to."""
+        return [
+            member for member in self.recipients if member.email not in self.settled
+        ]
+
+
+class Transport(Protocol):
+    async def send(self, mail: OutgoingMail) -> Optional[Refused]:
+        """Deliver a message to its unsettled recipients, returning those the
+        server refused, and raising PermanentSendError if it never can be."""
+
+
+@dataclass(frozen=True)
+class Backoff:
+    """How long to wait before each retry: exponential, capped, with jitter."""
+
+    first: float = 10.0
+    factor: float = 2.0
+    longest: float = 3600.0
+    max_attempts: int = 10
+    jitter: float = 0.1
+
+    def delay(self, attempts: int) -> float:
+        delay = min(self.first * self.factor ** (attempts - 1), self.longest)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+def message_domain(email: str) -> str:
+    return email.rpartition("@")[2] or "mailsocial.invalid"
+
+
+class Outbox:
+    """Messages waiting to be sent, kept in the `outbox` table.
+
+    A message is stored and queued in one transaction, so once `enqueue`
+    returns it survives the app being killed, and the UI only shows it
+    then. Each attempt at sending claims the row first (state `sending`).
+    A row still being sent when the app stopped is queued again, once, by
+    `recover`, and sent under the same Message-ID. Runs on the store thread.
+    """
+
+    def __init__(
+        self,
+        repository: Optional[ChatRepository] = None,
+        backoff: Backoff = Backoff(),
+    ) -> None:
+        self.repository = repository or ChatRepository()
+        self.backoff = backoff
+
+    async def enqueue(
+        self,
+        message: Message,
+        chat_id: Optional[int] = None,
+        cc: Iterable[Member] = (),
+        bcc: Iterable[Member] = (),
+    ) -> Message:
+        """Store a message to the people in its recipients (plus `cc` and
+        `bcc`) and queue it to be sent. Without `chat_id` a new chat is
+        started with everyone it goes to."""
+        cc, bcc = list(cc), list(bcc)
+        message.recipients = (*message.recipients, *cc, *bcc)
+        message.status = MessageStatus.OUTBOX
+        message_id = make_msgid(domain=message_domain(message.sender.email))
+        async with in_transaction("default") as connection:
+            if chat_id is None:
+                members = list(
+                    {
+                        member.email: member
+                        for member in message.recipients
+                        if member.email != message.sender.email
+                    }.values()
+                )
+                chat = await self.repository.add_chat(
+                    chat_title(message.subject, members), members
+                )
+                chat_id = chat.id
+            assert chat_id is not None
+            await self.repository.add_message(chat_id, message, message_id)
+            await OutboxRecord.create(
+                message_id=message.id,
+                cc=json.dumps([member.email for member in cc]),
+                bcc=json.dumps([member.email for member in bcc]),
+                next_attempt_at=datetime.now(),
+            )
+            # So replies are threaded into this chat when they arrive.
+            await connection.execute_query(
+                "INSERT OR IGNORE INTO thread_index (key, chat_id) VALUES (?, ?)",
+                [message_id, chat_id],
+            )
+        return message
+
+    async def recover(self) -> int:
+        """Queue again the messages that were being sent when the app stopped."""
+        return await OutboxRecord.filter(state=OutboxState.SENDING).update(
+            state=OutboxState.QUEUED, next_attempt_at=datetime.now()
+        )
+
+    async def claim(self, now: Optional[datetime] = None) -> Optional[OutgoingMail]:
+        """Take the next message that is due, or None if none are."""
+        async with in_transaction("default"):
+            record = (
+                await OutboxRecord.filter(
+                    state=OutboxState.QUEUED,
+                    next_attempt_at__lte=now or datetime.now(),
+                )
+                .order_by("next_attempt_at", "id")
+                .first()
+            )
+            if record is None:
+                return None
+            record.state = OutboxState.SENDING
+            record.attempts += 1
+            await record.save(update_fields=["state", "attempts"])
+        message_record = (
+            await MessageRecord.get(id=record.message_id)  # type: ignore[attr-defined]
+            .select_related("sender")
+            .prefetch_related("recipients", "attachments")
+        )
+        message = to_message(message_record, self.repository.blobs)
+        cc, bcc = set(json.loads(record.cc)), set(json.loads(record.bcc))
+        deliveries = await DeliveryRecord.filter(message_id=message_record.id)
+        return OutgoingMail(
+            outbox_id=record.id,
+            message_id=message_record.message_id,
+            message=message,
+            to=[
+                member
+                for member in message.recipients
+                if member.email not in cc and member.email not in bcc
+            ],
+            cc=[member for member in message.recipients if member.email in cc],
+            bcc=[member for member in message.recipients if member.email in bcc],
+            attempts=record.attempts,
+            settled={
+                delivery.email: delivery.code
+                for delivery in deliveries
+                if not 400 <= delivery.code < 500
+            },
+        )
+
+    async def settle(self, mail: OutgoingMail, refused: Refused) -> None:
+        """Record what the server said to each recipient of an attempt."""
+        await connections.get("default").execute_many(
+            "INSERT OR REPLACE INTO delivery (message_id, email, code, reply) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                [mail.message.id, member.email, *refused.get(member.email, (250, ""))]
+                for member in mail.unsettled
+            ],
+        )
+
+    async def complete(
+        self, mail: OutgoingMail, refused: Optional[Refused] = None
+    ) -> MessageStatus:
+        """Take a sent message out of the outbox. Its status is READ, or
+        PARTLY_SENT if the server refused some of its recipients for good."""
+        async with in_transaction("default"):
+            await self.settle(mail, refused or {})
+            await OutboxRecord.filter(id=mail.outbox_id).delete()
+            # The user has read what they sent themselves.
+            status = MessageStatus.READ
+            if await DeliveryRecord.filter(
+                message_id=mail.message.id, code__gte=500
+            ).exists():
+                status = MessageStatus.PARTLY_SENT
+            await self.repository.set_status(mail.message.id or 0, status)
+        return status
+
+    async def fail(
+        self, mail: OutgoingMail, error: str, permanent: bool = False
+    ) -> OutboxState:
+        """Record a failed attempt, queueing a retry unless it is time to give up."""
+        if permanent or mail.attempts >= self.backoff.max_attempts:
+            state = OutboxState.FAILED
+            next_attempt_at = datetime.now()
+        else:
+            state = OutboxState.QUEUED
+            next_attempt_at = datetime.now() + timedelta(
+                seconds=self.backoff.delay(mail.attempts)
+            )
+        await OutboxRecord.filter(id=mail.outbox_id).update(
+            state=state, next_attempt_at=next_attempt_at, last_error=error
+        )
+        return state
+
+    async def retry(self, message_id: int) -> bool:
+        """Queue a message that failed to send again, from its first attempt,
+        to everyone the server hasn't accepted it for."""
+        async with in_transaction("default"):
+            queued = await OutboxRecord.filter(
+                message_id=message_id, state=OutboxState.FAILED
+            ).update(
+                state=OutboxState.QUEUED, attempts=0, next_attempt_at=datetime.now()
+            )
+            if queued:
+                await DeliveryRecord.filter(
+                    message_id=message_id, code__gte=400
+                ).delete()
+        return bool(queued)
+
+    async def deliveries(self, message_id: int) -> Dict[str, Tuple[int, str]]:
+        """What the server last said to each recipient of a sent message,
+        with its code, by address; 250 means accepted."""
+        return {
+            delivery.email: (delivery.code, delivery.reply)
+            for delivery in await DeliveryRecord.filter(message_id=message_id)
+        }
+
+    async def next_due(self) -> Optional[datetime]:
+        _, rows = await connections.get("default").execute_query(
+            "SELECT min(next_attempt_at) AS due FROM outbox WHERE state = ?",
+            [OutboxState.QUEUED.value],
+        )
+        due = rows[0]["due"]
+        return datetime.fromisoformat(due) if due else None
+
+
+class OutboxSender:
+    """Drains the outbox in the background, on the store thread.
+
+    Started with the app, it first recovers whatever was being sent when
+    the app last stopped, then sends messages as they become due, sleeping
+    until the next retry or until `wake` says something was queued. Up to
+    `concurrency` messages are sent at once, as many as the transport has
+    connections for.
+    """
+
+    def __init__(
+        self,
+        store: StoreRunner,
+        transport: Transport,
+        outbox: Optional[Outbox] = None,
+        concurrency: int = 1,
+    ) -> None:
+        self.store = store
+        self.transport = transport
+        self.outbox = outbox or Outbox()
+        self.concurrency = concurrency
+        self.wakeup = asyncio.Event()
+        self.future: Optional["Future[None]"] = None
+
+    def start(self) -> None:
+        if self.future is None:
+            self.future = self.store.submit(self.run())
+
+    def wake(self) -> None:
+        self.store.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def stop(self) -> None:
+        """Stop sending. A message being sent is left to be recovered."""
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    async def run(self) -> None:
+        recovered = await self.outbox.recover()
+        if recovered:
+            logger.info(f"Sending {recovered} interrupted messages again")
+        while True:
+            try:
+                self.wakeup.clear()
+                await self.send_due()
+                due = await self.outbox.next_due()
+            except Exception as e:
+                logger.error(f"Error draining the outbox: {e}")
+                due = datetime.now() + timedelta(seconds=ERROR_PAUSE)
+            timeout = None
+            if due is not None:
+                timeout = max(0.0, (due - datetime.now()).total_seconds())
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def send_due(self) -> int:
+        """Try to send every message that is due; returns how many were sent."""
+        counts = await asyncio.gather(*(self.drain() for _ in range(self.concurrency)))
+        return sum(counts)
+
+    async def drain(self) -> int:
+        sent = 0
+        while mail := await self.outbox.claim():
+            sent += await self.send(mail)
+        return sent
+
+    async def send(self, mail: OutgoingMail) -> bool:
+        try:
+            # Nothing is left to send after a crash between settling every
+            # recipient and completing.
+            refused = await self.transport.send(mail) if mail.unsettled else None
+        except PermanentSendError as e:
+            logger.error(f"Could not send {mail.message_id}: {e}")
+            await self.outbox.fail(mail, str(e), permanent=True)
+            return False
+        except Exception as e:
+            state = await self.outbox.fail(mail, str(e))
+            logger.error(f"Error sending {mail.message_id} ({state.value}): {e}")
+            return False
+        refused = refused or {}
+        if refused:
+            logger.error(f"{mail.message_id} was refused for {sorted(refused)}")
+        # Refused for now, with 4xx, rather than for good.
+        deferred = any(code < 500 for code, _ in refused.values())
+        accepted = any(code < 400 for code in mail.settled.values()) or any(
+            member.email not in refused for member in mail.unsettled
+        )
+        if deferred or not accepted:
+            # Those accepted, or refused for good, are not sent to again.
+            await self.outbox.settle(mail, refused)
+            error = "; ".join(
+                f"{email}: {code} {text}" for email, (code, text) in refused.items()
+            )
+            await self.outbox.fail(mail, f"Refused for {error}", not deferred)
+            return False
+        await self.outbox.complete(mail, refused)
+        logger.info(f"Sent {mail.message_id}")
+        return True
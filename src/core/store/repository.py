@@ -0,0 +1,278 @@
+# src/core/store/repository.py
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+from tortoise import connections
+from tortoise.expressions import Q
+
+from src.core.models.attachment import Attachment
+from src.core.models.chat import Chat
+from src.core.models.chat_summary import ChatSummary, chat_initials
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.attachments import BlobStore
+from src.core.store.tables import (
+    AttachmentRecord,
+    ChatRecord,
+    MemberRecord,
+    MessageRecord,
+)
+
+DEFAULT_PAGE_SIZE = 50
+
+T = TypeVar("T")
+# Pages are keyed on (timestamp, id), newest first, so a page stays stable
+# while new messages arrive at the other end.
+Cursor = Tuple[datetime, int]
+
+
+@dataclass
+class Page(Generic[T]):
+    items: List[T] = field(default_factory=list)
+    # Pass back as `before` to get the next (older) page; None on the last page.
+    next_cursor: Optional[Cursor] = None
+
+
+def to_member(record: MemberRecord) -> Member:
+    return Member.intern(
+        email=record.email,
+        pgp_key_id=record.pgp_key_id,
+        is_pgp_verified=record.is_pgp_verified,
+        name=record.name,
+    )
+
+
+def to_attachment(record: AttachmentRecord, blobs: BlobStore) -> Attachment:
+    return Attachment(
+        digest=record.digest,
+        filename=record.filename,
+        content_type=record.content_type,
+        size=record.size,
+        source=blobs,
+    )
+
+
+def to_message(record: MessageRecord, blobs: BlobStore) -> Message:
+    return Message(
+        recipients=[to_member(member) for member in record.recipients],
+        sender=to_member(record.sender),
+        content=record.content,
+        timestamp=record.timestamp,
+        status=record.status,
+        id=record.id,
+        subject=record.subject,
+        attachments=[
+            to_attachment(attachment, blobs) for attachment in record.attachments
+        ],
+    )
+
+
+def to_summary(record: ChatRecord) -> ChatSummary:
+    return ChatSummary(
+        chat_id=record.id,
+        title=record.title,
+        initials=record.initials,
+        preview=record.preview,
+        last_message_at=record.last_message_at,
+        unread_count=record.unread_count,
+    )
+
+
+def before_cursor(time_field: str, before: Optional[Cursor]) -> Q:
+    if before is None:
+        return Q()
+    timestamp, record_id = before
+    older: Dict[str, Any] = {f"{time_field}__lt": timestamp}
+    tied: Dict[str, Any] = {time_field: timestamp, "id__lt": record_id}
+    return Q(**older) | Q(**tied)
+
+
+def chat_cursor(record: ChatRecord) -> Cursor:
+    assert record.last_message_at is not None
+    return record.last_message_at, record.id
+
+
+class ChatRepository:
+    """Async access to chats, members and messages in the store.
+
+    Nothing here returns a whole history: chats and messages come back in
+    pages, newest first, and a `Chat` only carries its latest message.
+    Chat summaries are kept up to date by the database as messages are
+    added, edited and deleted, so they are read straight off the chat rows.
+    """
+
+    @property
+    def blobs(self) -> BlobStore:
+        """Where the attachments of the store in use are kept."""
+        return BlobStore.beside(connections.get("default").filename)
+
+    async def get_member(self, member: Member) -> MemberRecord:
+        """Find a member by email, creating or refreshing its record."""
+        record, created = await MemberRecord.get_or_create(
+            email=member.email,
+            defaults={
+                "name": member.name,
+                "pgp_key_id": member.pgp_key_id,
+                "is_pgp_verified": member.is_pgp_verified,
+            },
+        )
+        if not created and (record.name, record.pgp_key_id, record.is_pgp_verified) != (
+            member.name,
+            member.pgp_key_id,
+            member.is_pgp_verified,
+        ):
+            record.name = member.name
+            record.pgp_key_id = member.pgp_key_id
+            record.is_pgp_verified = member.is_pgp_verified
+            await record.save()
+        return record
+
+    async def get_members(self, members: Iterable[Member]) -> List[MemberRecord]:
+        records: Dict[str, MemberRecord] = {}
+        for member in members:
+            if member.email not in records:
+                records[member.email] = await self.get_member(member)
+        return list(records.values())
+
+    async def add_chat(self, title: str, members: List[Member]) -> Chat:
+        record = await ChatRecord.create(
+            title=title, initials=chat_initials(title, members)
+        )
+        await record.members.add(*await self.get_members(members))
+        return Chat(title=title, members=list(members), messages=[], id=record.id)
+
+    async def add_message(
+        self, chat_id: int, message: Message, message_id: str = ""
+    ) -> Message:
+        sender = await self.get_member(message.sender)
+        record = await MessageRecord.create(
+            chat_id=chat_id,
+            sender=sender,
+            subject=message.subject,
+            message_id=message_id,
+            content=message.content,
+            timestamp=message.timestamp,
+            status=message.status,
+        )
+        if message.recipients:
+            await record.recipients.add(*await self.get_members(message.recipients))
+        if message.attachments:
+            await AttachmentRecord.bulk_create(
+                AttachmentRecord(
+                    message=record,
+                    digest=attachment.digest,
+                    filename=attachment.filename,
+                    content_type=attachment.content_type,
+                    size=attachment.size,
+                )
+                for attachment in message.attachments
+            )
+        message.id = record.id
+        return message
+
+    async def set_status(self, message_id: int, status: MessageStatus) -> None:
+        await MessageRecord.filter(id=message_id).update(status=status)
+
+    async def mark_read(self, chat_id: int) -> ChatSummary:
+        """Mark a chat's unread messages read and return its updated summary."""
+        record = await ChatRecord.get(id=chat_id)
+        if record.unread_count:
+            await MessageRecord.filter(
+                chat_id=chat_id, status=MessageStatus.SENT
+            ).update(status=MessageStatus.READ)
+            await record.refresh_from_db()
+        return to_summary(record)
+
+    async def get_summary(self, chat_id: int) -> ChatSummary:
+        return to_summary(await ChatRecord.get(id=chat_id))
+
+    async def get_summaries(self, chat_ids: Iterable[int]) -> List[ChatSummary]:
+        """Summaries of the chats that still exist among `chat_ids`."""
+        records = await ChatRecord.filter(id__in=list(chat_ids))
+        return [to_summary(record) for record in records]
+
+    async def page_summaries(
+        self, before: Optional[Cursor] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> Page[ChatSummary]:
+        """Get chat summaries by most recent activity, for the chat list."""
+        records = await self.page_chat_records(before, limit + 1)
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = chat_cursor(records[-1])
+        return Page([to_summary(record) for record in records], next_cursor)
+
+    async def page_chat_records(
+        self, before: Optional[Cursor], limit: int
+    ) -> List[ChatRecord]:
+        return (
+            await ChatRecord.filter(
+                Q(last_message_at__isnull=False)
+                & before_cursor("last_message_at", before)
+            )
+            .order_by("-last_message_at", "-id")
+            .limit(limit)
+        )
+
+    async def count_messages(
+        self, chat_id: Optional[int] = None, status: Optional[MessageStatus] = None
+    ) -> int:
+        query = MessageRecord.all()
+        if chat_id is not None:
+            query = query.filter(chat_id=chat_id)
+        if status is not None:
+            query = query.filter(status=status)
+        return await query.count()
+
+    async def count_chats(self) -> int:
+        return await ChatRecord.all().count()
+
+    async def page_messages(
+        self,
+        chat_id: int,
+        before: Optional[Cursor] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> Page[Message]:
+        """Get up to `limit` messages older than `before`, oldest first."""
+        records = (
+            await MessageRecord.filter(
+                Q(chat_id=chat_id) & before_cursor("timestamp", before)
+            )
+            .order_by("-timestamp", "-id")
+            .limit(limit + 1)
+            .select_related("sender")
+            .prefetch_related("recipients", "attachments")
+        )
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = (records[-1].timestamp, records[-1].id)
+        blobs = self.blobs
+        return Page(
+            [to_message(record, blobs) for record in reversed(records)], next_cursor
+        )
+
+    async def page_chats(
+        self, before: Optional[Cursor] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> Page[Chat]:
+        """Get chats by most recent activity, each with its latest message."""
+        records = await self.page_chat_records(before, limit + 1)
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = chat_cursor(records[-1])
+
+        await ChatRecord.fetch_for_list(records, "members")
+        chats = []
+        for record in records:
+            latest = await self.page_messages(record.id, limit=1)
+            chats.append(
+                Chat(
+                    title=record.title,
+                    members=[to_member(member) for member in record.members],
+                    messages=latest.items,
+                    id=record.id,
+                )
+            )
+        return Page(chats, next_cursor)
@@ -0,0 +1,96 @@
+# src/core/store/runner.py
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from appdirs import user_data_dir
+from tortoise.context import TortoiseContext
+
+from src.core.logging import logger
+from src.core.store.attachments import BlobStore
+from src.core.store.schema import prepare_schema
+
+T = TypeVar("T")
+
+
+def get_database_path() -> str:
+    """Get the path to the message store."""
+    return os.path.join(user_data_dir("mailsocial"), "mailsocial.sqlite3")
+
+
+class StoreRunner:
+    """Runs the async store on an event loop thread of its own.
+
+    Tk calls `submit` and gets a future back, so the UI thread never waits
+    on SQLite; `call` blocks and is meant for scripts and tests.
+    """
+
+    def __init__(self, database_path: Optional[str] = None) -> None:
+        self.database_path = database_path or get_database_path()
+        os.makedirs(os.path.dirname(self.database_path) or ".", exist_ok=True)
+        self.blobs = BlobStore.beside(self.database_path)
+        self.context = TortoiseContext()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="store", daemon=True
+        )
+        self.thread.start()
+        self.call(
+            self.context.init(
+                db_url=f"sqlite://{self.database_path}",
+                modules={"models": ["src.core.store.tables"]},
+                use_tz=False,
+            )
+        )
+        self.call(self.context.generate_schemas(safe=True))
+        self.call(prepare_schema())
+        logger.info(f"Message store opened at {self.database_path}")
+
+    async def in_context(self, coroutine: Awaitable[T]) -> T:
+        # Every submitted coroutine runs as a task with a copy of the context
+        # of its own, so the store's context is set there and left set: the
+        # context manager's exit resets a token shared by every task, which
+        # fails as soon as two requests overlap.
+        self.context.__enter__()
+        return await coroutine
+
+    def submit(self, coroutine: Awaitable[T]) -> "Future[T]":
+        return asyncio.run_coroutine_threadsafe(self.in_context(coroutine), self.loop)
+
+    def call(self, coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+        return self.submit(coroutine).result(timeout)
+
+    def close(self) -> None:
+        if not self.loop.is_running():
+            return
+        try:
+            self.call(self.context.close_connections(), timeout=10)
+        except Exception as e:
+            logger.error(f"Error closing the message store: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=10)
+        self.loop.close()
+
+
+def when_done(
+    widget: Any,
+    future: "Future[T]",
+    callback: Callable[[T], None],
+    interval_ms: int = 10,
+) -> None:
+    """Run `callback` with the future's result on the Tk thread once it is ready."""
+
+    def poll() -> None:
+        if not future.done():
+            widget.after(interval_ms, poll)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Store request failed: {e}")
+            return
+        callback(result)
+
+    poll()
@@ -0,0 +1,86 @@
+# src/core/store/sample.py
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.repository import ChatRepository
+
+SampleChat = Tuple[str, Member, List[Tuple[Member, str, MessageStatus]]]
+
+ME = Member("me@example.com", "789", True, "You")
+JOHN = Member("johndoe@example.com", "456", True, "John Doe")
+
+SAMPLE_CHATS: List[SampleChat] = [
+    (
+        "General",
+        Member("general@example.com", "123", True, "General"),
+        [
+            (
+                Member("general@example.com", "123", True, "General"),
+                "Welcome to the general chat!",
+                MessageStatus.DRAFT,
+            ),
+            (JOHN, "Got it, thanks!", MessageStatus.SENT),
+            (ME, "Hello everyone!", MessageStatus.READ),
+            (
+                Member("unknown@example.com", "000", True, "Unknown"),
+                "Who is this?",
+                MessageStatus.LOCAL_ONLY,
+            ),
+        ],
+    ),
+    (
+        "Work",
+        Member("work@example.com", "123", True, "Work"),
+        [
+            (
+                Member("work@example.com", "123", True, "Work"),
+                "Don't forget the meeting at 2 PM",
+                MessageStatus.DRAFT,
+            ),
+            (JOHN, "Got it, thanks!", MessageStatus.SENT),
+            (ME, "I'll be there!", MessageStatus.READ),
+        ],
+    ),
+    (
+        "Family",
+        Member("family@example.com", "123", True, "Family"),
+        [
+            (
+                Member("mom@example.com", "123", True, "Mom"),
+                "Are you coming for dinner?",
+                MessageStatus.DRAFT,
+            ),
+            (ME, "Yes, I'll be there at 7 PM.", MessageStatus.READ),
+        ],
+    ),
+    (
+        "Friends",
+        Member("friends@example.com", "123", True, "Friends"),
+        [
+            (
+                Member("friend@example.com", "123", True, "Friend"),
+                "Hey, want to grab coffee later?",
+                MessageStatus.DRAFT,
+            ),
+            (ME, "Sure, see you at 5!", MessageStatus.READ),
+        ],
+    ),
+]
+
+
+async def seed_sample_chats(repository: ChatRepository) -> None:
+    """Fill an empty store with the sample chats the UI used to hardcode."""
+    if await repository.count_chats():
+        return
+    timestamp = datetime.now() - timedelta(minutes=len(SAMPLE_CHATS) * 10)
+    # Added in reverse so the first sample chat is the most recently active.
+    for title, owner, messages in reversed(SAMPLE_CHATS):
+        chat = await repository.add_chat(title, [owner])
+        assert chat.id is not None
+        for sender, content, status in messages:
+            timestamp += timedelta(minutes=1)
+            await repository.add_message(
+                chat.id, Message([], sender, content, timestamp, status)
+            )
@@ -0,0 +1,435 @@
+# src/core/store/schema.py
+from typing import Dict, List, Tuple
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from src.core.logging import logger
+from src.core.models.chat_summary import chat_initials
+from src.core.models.member import Member
+from src.core.models.message import MessageStatus
+from src.core.store.tables import PREVIEW_LENGTH
+
+# Columns added after a table was first created, which `generate_schemas`
+# won't add to an existing database: (table, column, definition).
+ADDED_COLUMNS: List[Tuple[str, str, str]] = [
+    ("message", "subject", "TEXT NOT NULL DEFAULT ''"),
+    ("message", "message_id", "VARCHAR(998) NOT NULL DEFAULT ''"),
+    ("chat", "initials", "VARCHAR(8) NOT NULL DEFAULT ''"),
+    ("chat", "last_message_id", "INT"),
+    ("chat", "preview", f"VARCHAR({PREVIEW_LENGTH}) NOT NULL DEFAULT ''"),
+    ("chat", "unread_count", "INT NOT NULL DEFAULT 0"),
+]
+
+# Full-text index over message subjects, bodies and senders. It keeps its
+# own copy of the text (rowid = message.id) and triggers keep it in step
+# with every insert, edit and delete, so it never needs rebuilding.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE message_search USING fts5(
+    subject, content, sender_name, sender_email,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+CREATE TRIGGER message_search_insert AFTER INSERT ON message BEGIN
+    INSERT INTO message_search (rowid, subject, content, sender_name, sender_email)
+    SELECT new.id, new.subject, new.content, name, email
+    FROM member WHERE id = new.sender_id;
+END;
+
+CREATE TRIGGER message_search_update
+AFTER UPDATE OF subject, content, sender_id ON message BEGIN
+    UPDATE message_search
+    SET subject = new.subject,
+        content = new.content,
+        sender_name = (SELECT name FROM member WHERE id = new.sender_id),
+        sender_email = (SELECT email FROM member WHERE id = new.sender_id)
+    WHERE rowid = new.id;
+END;
+
+CREATE TRIGGER message_search_delete AFTER DELETE ON message BEGIN
+    DELETE FROM message_search WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER message_search_member_update
+AFTER UPDATE OF name, email ON member BEGIN
+    UPDATE message_search
+    SET sender_name = new.name, sender_email = new.email
+    WHERE rowid IN (SELECT id FROM message WHERE sender_id = new.id);
+END;
+"""
+
+
+def preview(column: str) -> str:
+    """SQL for the one-line preview of a message body in the chat list."""
+    return (
+        f"substr(replace(replace(trim({column}), char(13), ' '), char(10), ' '), "
+        f"1, {PREVIEW_LENGTH})"
+    )
+
+
+UNREAD = f"'{MessageStatus.SENT.value}'"
+
+# Keeps each chat's summary (latest message, preview and unread count) in
+# step with its messages, a row at a time, so the chat list never has to
+# aggregate over messages.
+SUMMARY_SCHEMA = f"""
+CREATE TRIGGER chat_summary_insert AFTER INSERT ON message BEGIN
+    UPDATE chat SET unread_count = unread_count + 1
+    WHERE id = new.chat_id AND new.status = {UNREAD};
+    UPDATE chat
+    SET last_message_id = new.id,
+        last_message_at = new.timestamp,
+        preview = {preview("new.content")}
+    WHERE id = new.chat_id
+      AND (last_message_at IS NULL
+           OR new.timestamp > last_message_at
+           OR (new.timestamp = last_message_at AND new.id > last_message_id));
+END;
+
+CREATE TRIGGER chat_summary_status AFTER UPDATE OF status ON message
+WHEN old.status IS NOT new.status BEGIN
+    UPDATE chat
+    SET unread_count = unread_count + (new.status = {UNREAD}) - (old.status = {UNREAD})
+    WHERE id = new.chat_id;
+END;
+
+CREATE TRIGGER chat_summary_content AFTER UPDATE OF content ON message BEGIN
+    UPDATE chat SET preview = {preview("new.content")}
+    WHERE id = new.chat_id AND last_message_id = new.id;
+END;
+
+CREATE TRIGGER chat_summary_delete AFTER DELETE ON message BEGIN
+    UPDATE chat SET unread_count = unread_count - 1
+    WHERE id = old.chat_id AND old.status = {UNREAD};
+END;
+
+CREATE TRIGGER chat_summary_delete_latest AFTER DELETE ON message
+WHEN old.id = (SELECT last_message_id FROM chat WHERE id = old.chat_id) BEGIN
+    UPDATE chat SET last_message_id = (
+        SELECT id FROM message WHERE chat_id = old.chat_id
+        ORDER BY timestamp DESC, id DESC LIMIT 1
+    )
+    WHERE id = old.chat_id;
+    UPDATE chat
+    SET last_message_at = (SELECT timestamp FROM message WHERE id = chat.last_message_id),
+        preview = coalesce(
+            (SELECT {preview("content")} FROM message WHERE id = chat.last_message_id), ''
+        )
+    WHERE id = old.chat_id;
+END;
+"""
+
+SUMMARY_BACKFILL = f"""
+UPDATE chat
+SET unread_count = (
+        SELECT count(*) FROM message
+        WHERE chat_id = chat.id AND status = {UNREAD}
+    ),
+    last_message_id = (
+        SELECT id FROM message WHERE chat_id = chat.id
+        ORDER BY timestamp DESC, id DESC LIMIT 1
+    );
+UPDATE chat
+SET last_message_at = (SELECT timestamp FROM message WHERE id = chat.last_message_id),
+    preview = coalesce(
+        (SELECT {preview("content")} FROM message WHERE id = chat.last_message_id), ''
+    );
+"""
+
+# Local messages have no Message-ID, so only the ones that do are unique.
+MESSAGE_ID_SCHEMA = """
+CREATE UNIQUE INDEX message_message_id ON message (message_id)
+WHERE message_id != '';
+"""
+
+# Moving a message to another chat, as when two threads turn out to be one
+# conversation, takes it out of one chat's summary and into the other's.
+MOVE_SCHEMA = f"""
+CREATE TRIGGER chat_summary_move AFTER UPDATE OF chat_id ON message
+WHEN old.chat_id IS NOT new.chat_id BEGIN
+    UPDATE chat SET unread_count = unread_count - 1
+    WHERE id = old.chat_id AND old.status = {UNREAD};
+    UPDATE chat SET unread_count = unread_count + 1
+    WHERE id = new.chat_id AND new.status = {UNREAD};
+    UPDATE chat
+    SET last_message_id = new.id,
+        last_message_at = new.timestamp,
+        preview = {preview("new.content")}
+    WHERE id = new.chat_id
+      AND (last_message_at IS NULL
+           OR new.timestamp > last_message_at
+           OR (new.timestamp = last_message_at AND new.id > last_message_id));
+END;
+
+CREATE TRIGGER chat_summary_move_latest AFTER UPDATE OF chat_id ON message
+WHEN old.chat_id IS NOT new.chat_id
+ AND old.id = (SELECT last_message_id FROM chat WHERE id = old.chat_id) BEGIN
+    UPDATE chat SET last_message_id = (
+        SELECT id FROM message WHERE chat_id = old.chat_id
+        ORDER BY timestamp DESC, id DESC LIMIT 1
+    )
+    WHERE id = old.chat_id;
+    UPDATE chat
+    SET last_message_at = (SELECT timestamp FROM message WHERE id = chat.last_message_id),
+        preview = coalesce(
+            (SELECT {preview("content")} FROM message WHERE id = chat.last_message_id), ''
+        )
+    WHERE id = old.chat_id;
+END;
+"""
+
+# Which chat each conversation thread went into, keyed by the Message-IDs
+# in it (including ones only seen in References, for replies that arrive
+# before what they reply to) and by its subject and participants.
+THREAD_SCHEMA = """
+CREATE TABLE thread_index (
+    key TEXT PRIMARY KEY NOT NULL,
+    chat_id INT NOT NULL REFERENCES chat (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX thread_index_chat ON thread_index (chat_id);
+"""
+
+THREAD_BACKFILL = """
+INSERT OR IGNORE INTO thread_index (key, chat_id)
+SELECT message_id, chat_id FROM message WHERE message_id != '';
+"""
+
+# How many attachments use each blob in the blob store, so the ones no
+# message needs any more can be found without scanning attachments.
+ATTACHMENT_SCHEMA = """
+CREATE TABLE attachment_blob (
+    digest VARCHAR(64) PRIMARY KEY NOT NULL,
+    size BIGINT NOT NULL,
+    refcount INT NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX attachment_blob_unused ON attachment_blob (refcount) WHERE refcount <= 0;
+
+CREATE TRIGGER attachment_blob_add AFTER INSERT ON attachment BEGIN
+    INSERT INTO attachment_blob (digest, size, refcount) VALUES (new.digest, new.size, 1)
+    ON CONFLICT (digest) DO UPDATE SET refcount = refcount + 1;
+END;
+
+CREATE TRIGGER attachment_blob_remove AFTER DELETE ON attachment BEGIN
+    UPDATE attachment_blob SET refcount = refcount - 1 WHERE digest = old.digest;
+END;
+"""
+
+ATTACHMENT_BACKFILL = """
+INSERT INTO attachment_blob (digest, size, refcount)
+SELECT digest, max(size), count(*) FROM attachment GROUP BY digest;
+"""
+
+# How many messages each member has sent or been sent, and the latest, for
+# ranking address suggestions. Only ever grows: someone the user has
+# written to before stays worth suggesting after the messages are deleted.
+CONTACT_SCHEMA = """
+CREATE TABLE contact_activity (
+    member_id INT PRIMARY KEY NOT NULL REFERENCES member (id) ON DELETE CASCADE,
+    message_count INT NOT NULL,
+    last_seen_at TIMESTAMP NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER contact_activity_sender AFTER INSERT ON message BEGIN
+    INSERT INTO contact_activity (member_id, message_count, last_seen_at)
+    VALUES (new.sender_id, 1, new.timestamp)
+    ON CONFLICT (member_id) DO UPDATE
+    SET message_count = message_count + 1,
+        last_seen_at = max(last_seen_at, excluded.last_seen_at);
+END;
+
+CREATE TRIGGER contact_activity_recipient AFTER INSERT ON message_recipient BEGIN
+    INSERT INTO contact_activity (member_id, message_count, last_seen_at)
+    SELECT new.member_id, 1, timestamp FROM message WHERE id = new.message_id
+    ON CONFLICT (member_id) DO UPDATE
+    SET message_count = message_count + 1,
+        last_seen_at = max(last_seen_at, excluded.last_seen_at);
+END;
+"""
+
+CONTACT_BACKFILL = """
+INSERT INTO contact_activity (member_id, message_count, last_seen_at)
+SELECT member_id, count(*), max(timestamp) FROM (
+    SELECT sender_id AS member_id, timestamp FROM message
+    UNION ALL
+    SELECT message_recipient.member_id, message.timestamp FROM message_recipient
+    JOIN message ON message.id = message_recipient.message_id
+) GROUP BY member_id;
+"""
+
+# Where each message synced over IMAP is on the server: its UID in each
+# mailbox it is in, under the mailbox's import source (which names its
+# UIDVALIDITY). The server reports expunges and flag changes by UID.
+MAILBOX_SCHEMA = """
+CREATE TABLE mailbox_message (
+    source_id INT NOT NULL REFERENCES import_progress (id) ON DELETE CASCADE,
+    uid INT NOT NULL,
+    message_id INT NOT NULL REFERENCES message (id) ON DELETE CASCADE,
+    PRIMARY KEY (source_id, uid)
+) WITHOUT ROWID;
+
+CREATE INDEX mailbox_message_message ON mailbox_message (message_id);
+"""
+
+# UIDs fetched from a mailbox whose messages couldn't be stored, unparseable
+# or without a Message-ID. A resync counts them among the UIDs known, so they
+# don't look like messages still to find.
+UNMAPPED_UID_SCHEMA = """
+CREATE TABLE unmapped_uid (
+    source_id INT NOT NULL REFERENCES import_progress (id) ON DELETE CASCADE,
+    uid INT NOT NULL,
+    PRIMARY KEY (source_id, uid)
+) WITHOUT ROWID;
+"""
+
+# Where each IMAP mailbox was last synced to, by its URL without the
+# UIDVALIDITY: the source (and so UIDVALIDITY) its UIDs belong to and the
+# server's HIGHESTMODSEQ then (RFC 7162), or 0 if it has none. Together with
+# mailbox_message, the UIDs known, this is all a resync needs.
+MAILBOX_STATE_SCHEMA = """
+CREATE TABLE mailbox_state (
+    mailbox TEXT NOT NULL PRIMARY KEY,
+    source_id INT NOT NULL REFERENCES import_progress (id) ON DELETE CASCADE,
+    uidvalidity INT NOT NULL,
+    highestmodseq INT NOT NULL DEFAULT 0
+);
+"""
+
+# Messages synced with only their header and the start of their text, whose
+# bodies and attachments are still on the IMAP server. The content stored for
+# them meanwhile is that preview.
+PENDING_BODY_SCHEMA = """
+CREATE TABLE pending_body (
+    message_id INT NOT NULL PRIMARY KEY REFERENCES message (id) ON DELETE CASCADE
+);
+"""
+
+SEARCH_BACKFILL = """
+INSERT INTO message_search (rowid, subject, content, sender_name, sender_email)
+SELECT message.id, message.subject, message.content, member.name, member.email
+FROM message JOIN member ON member.id = message.sender_id;
+"""
+
+# Schema kept up to date by triggers: (object whose absence means the schema
+# needs creating, log message, schema, backfill for existing rows).
+DERIVED_SCHEMAS = [
+    (
+        "message_search",
+        "Creating the message search index",
+        SEARCH_SCHEMA,
+        SEARCH_BACKFILL,
+    ),
+    (
+        "chat_summary_insert",
+        "Building chat summaries",
+        SUMMARY_SCHEMA,
+        SUMMARY_BACKFILL,
+    ),
+    (
+        "message_message_id",
+        "Indexing Message-IDs",
+        MESSAGE_ID_SCHEMA,
+        "",
+    ),
+    (
+        "chat_summary_move",
+        "Updating chat summaries",
+        MOVE_SCHEMA,
+        "",
+    ),
+    (
+        "thread_index",
+        "Indexing conversation threads",
+        THREAD_SCHEMA,
+        THREAD_BACKFILL,
+    ),
+    (
+        "attachment_blob",
+        "Counting attachment references",
+        ATTACHMENT_SCHEMA,
+        ATTACHMENT_BACKFILL,
+    ),
+    (
+        "contact_activity",
+        "Counting messages per contact",
+        CONTACT_SCHEMA,
+        CONTACT_BACKFILL,
+    ),
+    (
+        "mailbox_message",
+        "Mapping IMAP UIDs to messages",
+        MAILBOX_SCHEMA,
+        "",
+    ),
+    (
+        "mailbox_state",
+        "Keeping IMAP mailbox sync state",
+        MAILBOX_STATE_SCHEMA,
+        "",
+    ),
+    (
+        "pending_body",
+        "Keeping track of message bodies still to fetch",
+        PENDING_BODY_SCHEMA,
+        "",
+    ),
+    (
+        "unmapped_uid",
+        "Keeping track of IMAP messages that couldn't be stored",
+        UNMAPPED_UID_SCHEMA,
+        "",
+    ),
+]
+
+
+async def table_exists(connection: BaseDBAsyncClient, name: str) -> bool:
+    _, rows = await connection.execute_query(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", [name]
+    )
+    return bool(rows)
+
+
+async def add_missing_columns(connection: BaseDBAsyncClient) -> None:
+    for table, column, definition in ADDED_COLUMNS:
+        _, rows = await connection.execute_query(f"PRAGMA table_info({table})")
+        if column not in {row["name"] for row in rows}:
+            logger.info(f"Adding column {table}.{column}")
+            await connection.execute_script(
+                f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+            )
+
+
+async def fill_initials(connection: BaseDBAsyncClient) -> None:
+    _, rows = await connection.execute_query(
+        "SELECT chat.id, chat.title, member.email, member.name FROM chat "
+        "LEFT JOIN chat_member ON chat_member.chat_id = chat.id "
+        "LEFT JOIN member ON member.id = chat_member.member_id "
+        "WHERE chat.initials = '' ORDER BY chat.id, member.id"
+    )
+    chats: Dict[int, Tuple[str, List[Member]]] = {}
+    for row in rows:
+        _, members = chats.setdefault(row["id"], (row["title"], []))
+        if row["email"] is not None:
+            members.append(Member.intern(row["email"], name=row["name"]))
+    await connection.execute_many(
+        "UPDATE chat SET initials = ? WHERE id = ?",
+        [
+            [chat_initials(title, members), chat_id]
+            for chat_id, (title, members) in chats.items()
+        ],
+    )
+
+
+async def prepare_schema() -> None:
+    """Bring the parts of the schema the ORM doesn't manage up to date."""
+    connection = connections.get("default")
+    await add_missing_columns(connection)
+    for name, description, schema, backfill in DERIVED_SCHEMAS:
+        if not await table_exists(connection, name):
+            logger.info(description)
+            # In one transaction, so an interrupted backfill is retried next time.
+            await connection.execute_script(f"BEGIN;\n{schema}\n{backfill}\nCOMMIT;")
+            if name == "chat_summary_insert":
+                await fill_initials(connection)
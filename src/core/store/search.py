@@ -0,0 +1,166 @@
+# src/core/store/search.py
+import json
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+DEFAULT_PAGE_SIZE = 20
+# Only the newest matches are ranked. A common word or a short prefix can
+# match most of the mailbox, and scoring all of it is what makes a search
+# slow; recent mail is also what people are usually looking for.
+RANKED_CANDIDATES = 2000
+# How much a word found in each indexed column counts towards a hit's score.
+COLUMN_WEIGHTS = {
+    "subject": 4.0,
+    "content": 1.0,
+    "sender_name": 2.0,
+    "sender_email": 2.0,
+}
+SNIPPET_TOKENS = 12
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# The newest matches, which are the ones that get ranked.
+CANDIDATES_QUERY = """
+SELECT rowid FROM message_search WHERE message_search MATCH ?
+ORDER BY rowid DESC LIMIT ?
+"""
+
+# Matches from the oldest candidate on; the index skips straight there.
+COLUMN_QUERY = """
+SELECT rowid FROM message_search WHERE message_search MATCH ? AND rowid >= ?
+"""
+
+PAGE_QUERY = """
+SELECT message.id AS message_id, message.chat_id, chat.title AS chat_title,
+       member.name AS sender_name, member.email AS sender_email,
+       message.subject, message.content, message.timestamp
+FROM message
+JOIN chat ON chat.id = message.chat_id
+JOIN member ON member.id = message.sender_id
+WHERE message.id IN (SELECT value FROM json_each(?))
+"""
+
+
+@dataclass
+class SearchHit:
+    message_id: int
+    chat_id: int
+    chat_title: str
+    sender_name: str
+    sender_email: str
+    subject: str
+    timestamp: datetime
+    snippet: str
+
+
+@dataclass
+class SearchPage:
+    items: List[SearchHit] = field(default_factory=list)
+    next_offset: Optional[int] = None
+
+
+def match_prefix(token: str) -> str:
+    # Quoted, so FTS5 operators and punctuation are matched literally.
+    return f'"{token}"*'
+
+
+def make_snippet(texts: List[str], prefixes: Tuple[str, ...]) -> str:
+    """Cut a few words around the first word that starts with one of `prefixes`."""
+    for text in texts:
+        words = text.split()
+        for i, word in enumerate(words):
+            if any(
+                token.casefold().startswith(prefixes)
+                for token in TOKEN_PATTERN.findall(word)
+            ):
+                start = max(0, i - SNIPPET_TOKENS // 4)
+                end = start + SNIPPET_TOKENS
+                snippet = " ".join(words[start:end])
+                prefix = "…" if start > 0 else ""
+                suffix = "…" if end < len(words) else ""
+                return f"{prefix}{snippet}{suffix}"
+    words = texts[0].split()
+    suffix = "…" if len(words) > SNIPPET_TOKENS else ""
+    return " ".join(words[:SNIPPET_TOKENS]) + suffix
+
+
+def parse_timestamp(value: object) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+class MessageSearch:
+    """Ranked, paged full-text search over the message store.
+
+    Every word typed is matched as a prefix in the subject, body, sender
+    name and sender email. Hits are ranked like bm25 without its length
+    and frequency terms: each word scores its inverse document frequency
+    for every column it appears in, times the column's weight. The
+    statistics come from the newest `RANKED_CANDIDATES` matches only, as
+    FTS5's own bm25 reads every match of a common word to weigh it.
+    """
+
+    async def search(
+        self, text: str, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE
+    ) -> SearchPage:
+        tokens = TOKEN_PATTERN.findall(text)
+        if not tokens:
+            return SearchPage()
+        connection = connections.get("default")
+        match = " ".join(map(match_prefix, tokens))
+        # Paging past the candidates widens the window rather than running dry.
+        _, rows = await connection.execute_query(
+            CANDIDATES_QUERY, [match, max(RANKED_CANDIDATES, offset + limit + 1)]
+        )
+        candidates = [row[0] for row in rows]
+        scores = await self.score_candidates(connection, tokens, candidates)
+        ranked = sorted(candidates, key=lambda rowid: -scores[rowid])
+        page_ids = ranked[offset : offset + limit]
+        rows = await connection.execute_query_dict(PAGE_QUERY, [json.dumps(page_ids)])
+
+        prefixes = tuple(token.casefold() for token in tokens)
+        by_id = {row["message_id"]: row for row in rows}
+        hits = [
+            SearchHit(
+                message_id=row["message_id"],
+                chat_id=row["chat_id"],
+                chat_title=row["chat_title"],
+                sender_name=row["sender_name"],
+                sender_email=row["sender_email"],
+                subject=row["subject"],
+                timestamp=parse_timestamp(row["timestamp"]),
+                snippet=make_snippet([row["content"], row["subject"]], prefixes),
+            )
+            for row in (by_id[rowid] for rowid in page_ids if rowid in by_id)
+        ]
+        next_offset = offset + limit if len(ranked) > offset + limit else None
+        return SearchPage(hits, next_offset)
+
+    async def score_candidates(
+        self,
+        connection: BaseDBAsyncClient,
+        tokens: List[str],
+        candidates: List[int],
+    ) -> Dict[int, float]:
+        scores = dict.fromkeys(candidates, 0.0)
+        if not candidates:
+            return scores
+        oldest_id = candidates[-1]
+        for token in tokens:
+            found: Dict[int, float] = defaultdict(float)
+            for column, weight in COLUMN_WEIGHTS.items():
+                _, rows = await connection.execute_query(
+                    COLUMN_QUERY, [f"{column} : {match_prefix(token)}", oldest_id]
+                )
+                for row in rows:
+                    if row[0] in scores:
+                        found[row[0]] += weight
+            idf = math.log((len(scores) - len(found) + 0.5) / (len(found) + 0.5) + 1)
+            for rowid, weight in found.items():
+                scores[rowid] += idf * weight
+        return scores
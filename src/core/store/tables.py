@@ -0,0 +1,152 @@
+# src/core/store/tables.py
+from enum import Enum
+
+from tortoise import fields
+from tortoise.models import Model
+
+from src.core.models.message import MessageStatus
+
+PREVIEW_LENGTH = 120
+
+
+class MemberRecord(Model):
+    id = fields.IntField(primary_key=True)
+    email = fields.CharField(max_length=320, unique=True)
+    name = fields.CharField(max_length=255, default="")
+    pgp_key_id = fields.CharField(max_length=64, default="")
+    is_pgp_verified = fields.BooleanField(default=False)
+
+    class Meta:
+        table = "member"
+
+
+class ChatRecord(Model):
+    id = fields.IntField(primary_key=True)
+    title = fields.CharField(max_length=255)
+    members: fields.ManyToManyRelation[MemberRecord] = fields.ManyToManyField(
+        "models.MemberRecord",
+        related_name="chats",
+        through="chat_member",
+        forward_key="member_id",
+        backward_key="chat_id",
+    )
+    # A summary of the chat for the chat list, so it can be paged by activity
+    # without touching the message table. Triggers in `schema` keep the
+    # message-derived fields up to date as messages change.
+    initials = fields.CharField(max_length=8, default="")
+    last_message_id = fields.IntField(null=True)
+    last_message_at = fields.DatetimeField(null=True, db_index=True)
+    preview = fields.CharField(max_length=PREVIEW_LENGTH, default="")
+    unread_count = fields.IntField(default=0)
+
+    class Meta:
+        table = "chat"
+
+
+class MessageRecord(Model):
+    id = fields.IntField(primary_key=True)
+    chat: fields.ForeignKeyRelation[ChatRecord] = fields.ForeignKeyField(
+        "models.ChatRecord", related_name="messages"
+    )
+    sender: fields.ForeignKeyRelation[MemberRecord] = fields.ForeignKeyField(
+        "models.MemberRecord", related_name="sent_messages", on_delete=fields.RESTRICT
+    )
+    recipients: fields.ManyToManyRelation[MemberRecord] = fields.ManyToManyField(
+        "models.MemberRecord",
+        related_name="received_messages",
+        through="message_recipient",
+        forward_key="member_id",
+        backward_key="message_id",
+    )
+    subject = fields.TextField(default="")
+    # The Message-ID header of imported mail, so a message is only stored
+    # once however many times it is imported; empty for local messages.
+    message_id = fields.CharField(max_length=998, default="")
+    content = fields.TextField()
+    timestamp = fields.DatetimeField()
+    status = fields.CharEnumField(MessageStatus, max_length=16)
+    attachments: fields.ReverseRelation["AttachmentRecord"]
+
+    class Meta:
+        table = "message"
+        # (chat, timestamp) serves timeline pages; SQLite appends the rowid
+        # to every index entry, so ties on timestamp are ordered by id for free.
+        indexes = (("chat", "timestamp"), ("status",))
+
+
+class AttachmentRecord(Model):
+    id = fields.IntField(primary_key=True)
+    message: fields.ForeignKeyRelation[MessageRecord] = fields.ForeignKeyField(
+        "models.MessageRecord", related_name="attachments"
+    )
+    # The SHA-256 of the bytes, which are kept once in the blob store
+    # however many messages have them.
+    digest = fields.CharField(max_length=64, db_index=True)
+    filename = fields.CharField(max_length=255, default="")
+    content_type = fields.CharField(max_length=255, default="application/octet-stream")
+    size = fields.BigIntField()
+
+    class Meta:
+        table = "attachment"
+
+
+class ImportProgressRecord(Model):
+    id = fields.IntField(primary_key=True)
+    # An mbox file or Maildir folder, by its real path, or an IMAP mailbox
+    # by its URL.
+    source = fields.CharField(max_length=4096, unique=True)
+    # Where to carry on from: a byte offset into an mbox, how many of a
+    # Maildir folder's messages (in name order) have been stored, or the
+    # last UID stored from an IMAP mailbox.
+    position = fields.BigIntField(default=0)
+
+    class Meta:
+        table = "import_progress"
+
+
+class OutboxState(Enum):
+    QUEUED = "queued"
+    # Handed to the transport; if the app stops before it is done, the
+    # message is queued again when the outbox next starts.
+    SENDING = "sending"
+    # Given up on, after a permanent error or too many attempts.
+    FAILED = "failed"
+
+
+class OutboxRecord(Model):
+    """A message waiting to be sent. The row goes once the message is sent."""
+
+    id = fields.IntField(primary_key=True)
+    message: fields.OneToOneRelation[MessageRecord] = fields.OneToOneField(
+        "models.MessageRecord", related_name="outbox", on_delete=fields.CASCADE
+    )
+    # Which of the message's recipients are Cc'd and Bcc'd, as JSON lists of
+    # addresses; the rest are who it is to.
+    cc = fields.TextField(default="[]")
+    bcc = fields.TextField(default="[]")
+    state = fields.CharEnumField(OutboxState, max_length=16, default=OutboxState.QUEUED)
+    attempts = fields.IntField(default=0)
+    next_attempt_at = fields.DatetimeField(db_index=True)
+    last_error = fields.TextField(default="")
+
+    class Meta:
+        table = "outbox"
+
+
+class DeliveryRecord(Model):
+    """What the server said to one recipient of a message sent from the
+    outbox, as of the last attempt to send it to them."""
+
+    id = fields.IntField(primary_key=True)
+    message: fields.ForeignKeyRelation[MessageRecord] = fields.ForeignKeyField(
+        "models.MessageRecord", related_name="deliveries", on_delete=fields.CASCADE
+    )
+    email = fields.CharField(max_length=320)
+    # The RCPT reply's code: 250 when accepted, 4xx when to be tried again,
+    # 5xx when refused for good.
+    code = fields.IntField()
+    reply = fields.TextField(default="")
+
+    class Meta:
+        table = "delivery"
+        unique_together = (("message", "email"),)
@@ -0,0 +1,249 @@
+# src/core/store/threads.py
+import json
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from src.core.models.chat_summary import chat_initials
+from src.core.models.member import Member
+
+MAX_TITLE_NAMES = 3
+# Only a message's nearest ancestors are looked up. Any one of them is
+# enough to find the thread, and very long References headers would
+# otherwise make each message cost more than the last.
+MAX_REFERENCES = 20
+SUBJECT_KEY = "subject:"
+
+MESSAGE_ID = re.compile(r"<[^<>\s]+>")
+# "Re: ", "Fwd: ", "AW: ", "Re[2]: " and "[list-name] ", however many.
+REPLY_PREFIX = re.compile(
+    r"^(\s*((re|fwd?|aw|sv|vs|antw)(\[\d+\])?\s*:|\[[^\]]*\]))+\s*", re.IGNORECASE
+)
+
+FIND_KEYS = """
+SELECT key, chat_id FROM thread_index WHERE key IN (SELECT value FROM json_each(?))
+"""
+
+
+@dataclass
+class ThreadEntry:
+    """What threading needs to know about a new message."""
+
+    message_id: str
+    # Message-IDs of its ancestors, oldest first, so its parent is last.
+    references: List[str]
+    subject: str
+    # Who the chat is with, leaving out the user.
+    members: List[Member]
+
+
+def message_ids(text: str) -> List[str]:
+    return MESSAGE_ID.findall(text)
+
+
+def base_subject(subject: str) -> str:
+    """A subject without the reply, forward and list prefixes added to it."""
+    return " ".join(REPLY_PREFIX.sub("", subject).split())
+
+
+def subject_key(subject: str, members: Iterable[Member]) -> str:
+    """The key of a thread for messages that don't say what they reply to.
+
+    The same subject between the same people is taken to be the same
+    conversation. Messages without a subject fall back to grouping by
+    participants alone.
+    """
+    emails = sorted({member.email for member in members})
+    return f"{SUBJECT_KEY}{base_subject(subject).lower()}\x1f{','.join(emails)}"
+
+
+def chat_title(subject: str, members: List[Member]) -> str:
+    title = base_subject(subject)
+    if not title:
+        names = [member.name or member.email for member in members]
+        title = ", ".join(names[:MAX_TITLE_NAMES])
+        if len(names) > MAX_TITLE_NAMES:
+            title += f" and {len(names) - MAX_TITLE_NAMES} more"
+    return title[:255]
+
+
+async def next_id(connection: BaseDBAsyncClient, table: str) -> int:
+    _, rows = await connection.execute_query(
+        f"SELECT coalesce(max(id), 0) + 1 AS next_id FROM {table}"
+    )
+    return int(rows[0]["next_id"])
+
+
+class ThreadIndex:
+    """Groups messages into chats by conversation, JWZ style.
+
+    A message joins the thread of any message it refers to (In-Reply-To
+    and References), or that referred to it before it arrived. When one
+    message turns out to link two threads, they become one chat. Messages
+    that refer to nothing known join the thread with the same subject and
+    participants, or start a new chat.
+
+    Every Message-ID seen and every subject key is kept in the
+    `thread_index` table, so placing a message is a few indexed lookups
+    however large the mailbox, and nothing is ever re-threaded. When
+    threads merge, the smaller one moves into the larger.
+    """
+
+    async def assign(
+        self,
+        connection: BaseDBAsyncClient,
+        entries: List[ThreadEntry],
+        member_ids: Dict[str, int],
+    ) -> List[int]:
+        """Find or create the chat for each message, in a transaction the caller
+        holds; `member_ids` must have every member of the entries."""
+        keys = [
+            [entry.message_id, *reversed(entry.references[-MAX_REFERENCES:])]
+            for entry in entries
+        ]
+        subjects = [subject_key(entry.subject, entry.members) for entry in entries]
+        _, rows = await connection.execute_query(
+            FIND_KEYS,
+            [json.dumps(list({*subjects, *(key for ids in keys for key in ids)}))],
+        )
+        stored = {row["key"]: row["chat_id"] for row in rows}
+        found = dict(stored)
+
+        # Chats are merged in a union-find while the batch is threaded, and
+        # only created, moved and indexed once it is done.
+        parents: Dict[int, int] = {}
+
+        def find(chat_id: int) -> int:
+            root = chat_id
+            while parents.get(root, root) != root:
+                root = parents[root]
+            while chat_id != root:
+                parents[chat_id], chat_id = root, parents[chat_id]
+            return root
+
+        new_chats: Dict[int, Tuple[str, List[Member]]] = {}
+        chat_members: Dict[int, Set[str]] = {}
+        chat_ids: List[int] = []
+        next_chat: Optional[int] = None
+        for entry, ids, subject in zip(entries, keys, subjects):
+            linked = list(
+                dict.fromkeys(find(found[key]) for key in ids if key in found)
+            )
+            if linked:
+                chat_id = linked[0]
+                for other in linked[1:]:
+                    parents[other] = chat_id
+            elif subject in found:
+                chat_id = find(found[subject])
+            else:
+                if next_chat is None:
+                    next_chat = await next_id(connection, "chat")
+                chat_id, next_chat = next_chat, next_chat + 1
+                new_chats[chat_id] = (entry.subject, entry.members)
+            for key in (*ids, subject):
+                found[key] = chat_id
+            chat_members.setdefault(chat_id, set()).update(
+                member.email for member in entry.members
+            )
+            chat_ids.append(chat_id)
+
+        merged = set(parents) | set(parents.values())
+        targets = await self.merge_targets(connection, merged, find, new_chats)
+
+        def target(chat_id: int) -> int:
+            return targets.get(find(chat_id), find(chat_id))
+
+        await self.add_chats(
+            connection,
+            {
+                chat_id: details
+                for chat_id, details in new_chats.items()
+                if target(chat_id) == chat_id
+            },
+        )
+        for chat_id in sorted(merged):
+            if chat_id not in new_chats and target(chat_id) != chat_id:
+                await self.move_chat(connection, chat_id, target(chat_id))
+        await connection.execute_many(
+            "INSERT OR IGNORE INTO chat_member (chat_id, member_id) VALUES (?, ?)",
+            [
+                [target(chat_id), member_ids[email]]
+                for chat_id, emails in chat_members.items()
+                for email in emails
+            ],
+        )
+        await connection.execute_many(
+            "INSERT OR REPLACE INTO thread_index (key, chat_id) VALUES (?, ?)",
+            [
+                [key, target(chat_id)]
+                for key, chat_id in found.items()
+                if stored.get(key) != target(chat_id)
+            ],
+        )
+        return [target(chat_id) for chat_id in chat_ids]
+
+    async def merge_targets(
+        self,
+        connection: BaseDBAsyncClient,
+        merged: Set[int],
+        find: Callable[[int], int],
+        new_chats: Dict[int, Tuple[str, List[Member]]],
+    ) -> Dict[int, int]:
+        """Pick the chat each group of merged chats goes into, by group root.
+
+        Stored chats are kept over new ones, and the one with the most
+        messages over the rest, so the fewest messages move.
+        """
+        groups: Dict[int, List[int]] = {}
+        for chat_id in merged:
+            groups.setdefault(find(chat_id), []).append(chat_id)
+        stored = [chat_id for chat_id in merged if chat_id not in new_chats]
+        sizes: Dict[int, int] = {}
+        if stored:
+            _, rows = await connection.execute_query(
+                "SELECT chat_id, count(*) AS size FROM message "
+                "WHERE chat_id IN (SELECT value FROM json_each(?)) GROUP BY chat_id",
+                [json.dumps(stored)],
+            )
+            sizes = {row["chat_id"]: row["size"] for row in rows}
+        return {
+            root: min(
+                members,
+                key=lambda chat_id: (
+                    chat_id in new_chats,
+                    -sizes.get(chat_id, 0),
+                    chat_id,
+                ),
+            )
+            for root, members in groups.items()
+        }
+
+    async def add_chats(
+        self,
+        connection: BaseDBAsyncClient,
+        chats: Dict[int, Tuple[str, List[Member]]],
+    ) -> None:
+        rows = []
+        for chat_id, (subject, members) in chats.items():
+            title = chat_title(subject, members)
+            rows.append([chat_id, title, chat_initials(title, members)])
+        await connection.execute_many(
+            "INSERT INTO chat (id, title, initials, preview, unread_count) "
+            "VALUES (?, ?, ?, '', 0)",
+            rows,
+        )
+
+    async def move_chat(
+        self, connection: BaseDBAsyncClient, source: int, target: int
+    ) -> None:
+        """Move a chat's messages, members and thread keys into another chat."""
+        for query in (
+            "UPDATE message SET chat_id = ? WHERE chat_id = ?",
+            "UPDATE thread_index SET chat_id = ? WHERE chat_id = ?",
+            "INSERT OR IGNORE INTO chat_member (chat_id, member_id) "
+            "SELECT ?, member_id FROM chat_member WHERE chat_id = ?",
+        ):
+            await connection.execute_query(query, [target, source])
+        await connection.execute_query("DELETE FROM chat WHERE id = ?", [source])
@@ -0,0 +1,105 @@
+# src/core/store/timeline.py
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+from src.core.models.message import Message
+from src.core.store.repository import ChatRepository, Cursor
+
+CHUNK_SIZE = 50
+MAX_CHUNKS = 8
+
+
+@dataclass
+class Chunk:
+    # 0 is the newest chunk; each one after it is older.
+    index: int
+    # Oldest first, as they are shown.
+    messages: List[Message]
+    # Whether there is an older chunk to load after this one.
+    has_older: bool
+
+
+class Timeline:
+    """A chat's messages in fixed-size chunks, loaded newest first on demand.
+
+    Opening a chat only reads the newest chunk, however long its history.
+    The cursors where chunks start are remembered for every chunk seen, so
+    a chunk that was evicted can be read again exactly as it was. At most
+    `max_chunks` chunks are held, dropping the least recently used; the
+    newest is kept, since new messages are added to it.
+
+    The async methods run on the store thread, like the repository's.
+    """
+
+    def __init__(
+        self,
+        chat_id: int,
+        repository: ChatRepository,
+        chunk_size: int = CHUNK_SIZE,
+        max_chunks: int = MAX_CHUNKS,
+    ) -> None:
+        self.chat_id = chat_id
+        self.repository = repository
+        self.chunk_size = chunk_size
+        self.max_chunks = max(max_chunks, 1)
+        # The `before` cursor of each chunk found so far, newest first.
+        self.cursors: List[Optional[Cursor]] = [None]
+        self.chunks: "OrderedDict[int, Chunk]" = OrderedDict()
+        # Messages added before the newest chunk was read, for it to take in.
+        self.added: List[Message] = []
+
+    def has_chunk(self, index: int) -> bool:
+        return 0 <= index < len(self.cursors)
+
+    async def chunk(self, index: int) -> Chunk:
+        """Get chunk `index`, reading it from the store unless it is loaded."""
+        if index in self.chunks:
+            self.chunks.move_to_end(index)
+            return self.chunks[index]
+        if not self.has_chunk(index):
+            raise IndexError(f"chunk {index} of chat {self.chat_id} is not known yet")
+        page = await self.repository.page_messages(
+            self.chat_id, before=self.cursors[index], limit=self.chunk_size
+        )
+        if index == len(self.cursors) - 1 and page.next_cursor is not None:
+            self.cursors.append(page.next_cursor)
+        chunk = Chunk(index, page.items, page.next_cursor is not None)
+        if index == 0:
+            added, self.added = self.added, []
+            for message in added:
+                self.join_newest(chunk, message)
+        self.chunks[index] = chunk
+        self.evict()
+        return chunk
+
+    async def newest(self) -> Chunk:
+        return await self.chunk(0)
+
+    def evict(self) -> None:
+        while len(self.chunks) > self.max_chunks:
+            oldest_used = next(index for index in self.chunks if index != 0)
+            del self.chunks[oldest_used]
+
+    def add(self, message: Message) -> bool:
+        """Add a new message at the end of the timeline; returns whether the
+        newest chunk is loaded and didn't have it already."""
+        if 0 not in self.chunks:
+            self.added.append(message)
+            return False
+        return self.join_newest(self.chunks[0], message)
+
+    @staticmethod
+    def join_newest(chunk: Chunk, message: Message) -> bool:
+        # A chunk read after the message was stored has it already.
+        if message.id is not None and any(
+            known.id == message.id for known in chunk.messages
+        ):
+            return False
+        chunk.messages.append(message)
+        return True
+
+    @property
+    def latest(self) -> Optional[Message]:
+        newest = self.chunks.get(0)
+        return newest.messages[-1] if newest and newest.messages else None
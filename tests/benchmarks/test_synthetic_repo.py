@@ -0,0 +1,92 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from git import Repo
+
+from benchmarks.contributions import compare
+from benchmarks.synthetic_repo import generate_repo, signed_commit_counts
+from src.core import contributions
+from src.core.contributions import analyze_commits, get_final_contributors_list
+from src.core.keycache import DirectoryKeySource
+from tests.core.helpers import isolate_cache_dir
+
+
+class TestSyntheticRepo(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.repo = generate_repo(
+            os.path.join(cls.tmp.name, "synthetic"), 20, authors=3, signed_ratio=0.5
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_generates_valid_history(self):
+        subprocess.run(
+            ["git", "-C", self.repo.path, "fsck", "--strict"],
+            capture_output=True,
+            check=True,
+        )
+        signed, unsigned = signed_commit_counts(self.repo)
+        self.assertEqual(signed + unsigned, 20)
+        self.assertGreater(signed, 0)
+        self.assertGreater(unsigned, 0)
+
+    def test_reuses_matching_repo(self):
+        again = generate_repo(self.repo.root, 20, authors=3, signed_ratio=0.5)
+        self.assertEqual(
+            [a.fingerprint for a in again.authors],
+            [a.fingerprint for a in self.repo.authors],
+        )
+
+    def test_signed_commits_are_credited(self):
+        isolate_cache_dir(self, os.path.join(self.tmp.name, "cache"))
+        contributions.set_key_source(
+            DirectoryKeySource(contributions.get_gpg(), self.repo.keys_dir)
+        )
+        result = analyze_commits(Repo(self.repo.path), self.repo.path)
+        signed, unsigned = signed_commit_counts(self.repo)
+        self.assertEqual(len(result["outstanding_commits"]), unsigned)
+        emails = {
+            email
+            for contributor in get_final_contributors_list(result)
+            for email in contributor["emails"]
+        }
+        self.assertTrue(emails <= {a.email for a in self.repo.authors})
+        self.assertTrue(emails)
+
+
+class TestCompare(unittest.TestCase):
+    def test_flags_regressions_beyond_tolerance(self):
+        baseline = {
+            "cases": [
+                {
+                    "commits": 100,
+                    "signed_ratio": 0.5,
+                    "jobs": 1,
+                    "wall_time_s": 1.0,
+                    "commits_per_sec": 100.0,
+                    "subprocesses": 10,
+                    "peak_rss_kb": 1000,
+                }
+            ]
+        }
+        case = dict(
+            baseline["cases"][0],
+            wall_time_s=1.1,
+            commits_per_sec=50.0,
+            subprocesses=10,
+            peak_rss_kb=2000,
+        )
+        regressions = compare([case], baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("commits_per_sec", regressions[0])
+        self.assertIn("peak_rss_kb", regressions[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import unittest
+from typing import Dict, Optional
+from unittest import mock
+
+GIT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "Alice",
+    "GIT_AUTHOR_EMAIL": "alice@example.com",
+    "GIT_COMMITTER_NAME": "Alice",
+    "GIT_COMMITTER_EMAIL": "alice@example.com",
+    "GIT_AUTHOR_DATE": "1700000000 +0100",
+    "GIT_COMMITTER_DATE": "1700000000 +0100",
+}
+
+
+def git(repo_path: str, *args: str, env: Optional[Dict[str, str]] = None) -> str:
+    return subprocess.run(
+        ["git", "-C", repo_path, *args],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, **GIT_IDENTITY, **(env or {})),
+    ).stdout
+
+
+def init_repo(repo_path: str) -> None:
+    git(repo_path, "init", "-q", "-b", "main")
+    git(repo_path, "config", "commit.gpgsign", "false")
+
+
+def commit_file(
+    repo_path: str,
+    name: str,
+    content: str,
+    message: str,
+    signing_key: Optional[str] = None,
+    gnupg_home: Optional[str] = None,
+) -> str:
+    with open(os.path.join(repo_path, name), "a") as f:
+        f.write(content)
+    git(repo_path, "add", name)
+    sign_args = [f"--gpg-sign={signing_key}"] if signing_key else []
+    env = {"GNUPGHOME": gnupg_home} if gnupg_home else None
+    git(repo_path, "commit", "-q", *sign_args, "-m", message, env=env)
+    return git(repo_path, "rev-parse", "HEAD").strip()
+
+
+def make_signing_key(gnupg_home: str, name: str, email: str) -> str:
+    """Create a throwaway, passphrase-less signing key and return its fingerprint."""
+    os.makedirs(gnupg_home, mode=0o700, exist_ok=True)
+    subprocess.run(
+        ["gpg", "--homedir", gnupg_home, "--batch", "--passphrase", ""]
+        + ["--quick-gen-key", f"{name} <{email}>", "ed25519", "sign", "never"],
+        check=True,
+        capture_output=True,
+    )
+    listing = subprocess.run(
+        ["gpg", "--homedir", gnupg_home, "--with-colons", "--list-keys", email],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return next(
+        line.split(":")[9] for line in listing.splitlines() if line.startswith("fpr")
+    )
+
+
+def export_key(gnupg_home: str, fingerprint: str, path: str) -> None:
+    with open(path, "wb") as key_file:
+        key_file.write(
+            subprocess.run(
+                ["gpg", "--homedir", gnupg_home, "--armor", "--export", fingerprint],
+                check=True,
+                capture_output=True,
+            ).stdout
+        )
+
+
+def isolate_cache_dir(test: unittest.TestCase, cache_home: str) -> None:
+    """Point the mailsocial cache dir at `cache_home` for the duration of a test."""
+    from src.core import contributions
+
+    patcher = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": cache_home})
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    for name in ("gpg", "key_cache", "numstat_cache"):
+        test.addCleanup(setattr, contributions, name, None)
+        setattr(contributions, name, None)
@@ -0,0 +1,103 @@
+import base64
+import os
+import sqlite3
+import tempfile
+import unittest
+from email.message import Message as MailMessage
+
+from src.core.store.attachments import collect_garbage
+from src.core.store.importer import import_mail, iter_payload
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+
+ME = "me@example.com"
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 400
+
+
+def with_attachment(number, sender, data=PDF, filename="report.pdf"):
+    encoded = base64.encodebytes(data).decode()
+    return (
+        f"From {sender} Mon Jan  1 10:00:00 2024\n"
+        f"From: {sender}\nTo: {ME}\nSubject: Report {number}\n"
+        f"Message-ID: <{number}@example.com>\nMIME-Version: 1.0\n"
+        'Content-Type: multipart/mixed; boundary="b"\n\n'
+        "--b\nContent-Type: text/plain\n\nThe report is attached.\n"
+        f'--b\nContent-Type: application/pdf; name="{filename}"\n'
+        f'Content-Disposition: attachment; filename="{filename}"\n'
+        f"Content-Transfer-Encoding: base64\n\n{encoded}--b--\n\n"
+    ).encode()
+
+
+class TestAttachments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database_path)
+        self.mbox = os.path.join(self.tmp.name, "archive.mbox")
+        with open(self.mbox, "wb") as file:
+            file.write(with_attachment(1, "alice@example.com"))
+            file.write(with_attachment(2, "bob@example.com"))
+            file.write(with_attachment(3, "bob@example.com", b"other", "notes.txt"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def query(self, sql, *args):
+        with sqlite3.connect(self.database_path) as db:
+            return db.execute(sql, args).fetchall()
+
+    def blob_files(self):
+        return sorted(self.store.blobs.iter_blobs())
+
+    def test_same_file_is_stored_once(self):
+        import_mail(self.store, [self.mbox], me=[ME])
+        self.assertEqual(self.query("SELECT count(*) FROM attachment"), [(3,)])
+        counts = dict(self.query("SELECT size, refcount FROM attachment_blob"))
+        self.assertEqual(counts, {len(PDF): 2, 5: 1})
+        self.assertEqual(len(self.blob_files()), 2)
+
+    def test_messages_load_attachments_lazily(self):
+        import_mail(self.store, [self.mbox], me=[ME])
+        repository = ChatRepository()
+        chat_id = self.query(
+            "SELECT chat_id FROM message WHERE message_id = '<1@example.com>'"
+        )[0][0]
+        (message,) = self.store.call(repository.page_messages(chat_id)).items
+        self.assertEqual(message.content, "The report is attached.")
+        (attachment,) = message.attachments
+        self.assertEqual(attachment.filename, "report.pdf")
+        self.assertEqual(attachment.content_type, "application/pdf")
+        self.assertEqual(attachment.size, len(PDF))
+        self.assertEqual(attachment.read(), PDF)
+
+    def test_garbage_collection(self):
+        import_mail(self.store, [self.mbox], me=[ME])
+        orphan, _ = self.store.blobs.write_bytes(b"left by a failed import")
+        # Within the grace period nothing goes, however unused.
+        self.assertEqual(self.store.call(collect_garbage(self.store.blobs)), 0)
+
+        with sqlite3.connect(self.database_path) as db:
+            db.execute("PRAGMA foreign_keys = ON")
+            db.execute("DELETE FROM message WHERE message_id = '<3@example.com>'")
+            db.execute("DELETE FROM message WHERE message_id = '<1@example.com>'")
+        counts = dict(self.query("SELECT size, refcount FROM attachment_blob"))
+        self.assertEqual(counts, {len(PDF): 1, 5: 0})
+
+        removed = self.store.call(collect_garbage(self.store.blobs, grace=0))
+        self.assertEqual(removed, 2)
+        self.assertNotIn(orphan, self.blob_files())
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(self.query("SELECT size FROM attachment_blob"), [(len(PDF),)])
+
+    def test_streams_base64_payloads(self):
+        part = MailMessage()
+        part["Content-Transfer-Encoding"] = "base64"
+        part.set_payload(base64.encodebytes(PDF * 3).decode())
+        chunks = list(iter_payload(part))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), PDF * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
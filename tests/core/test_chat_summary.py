@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from src.core.models.chat_summary import chat_initials
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.repository import ChatRepository
+from src.core.store.outbox import Outbox
+from src.core.store.runner import StoreRunner
+from src.core.store.sample import ME, seed_sample_chats
+
+ALICE = Member("alice@example.com", "", False, "Alice Liddell")
+BOB = Member("bob@example.com", "", False, "Bob")
+START = datetime(2024, 1, 1)
+
+
+class TestChatSummary(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database_path)
+        self.chats = ChatRepository()
+        self.chat = self.store.call(self.chats.add_chat("Tea", [ALICE]))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def add(self, content, minutes, status=MessageStatus.SENT, chat_id=None):
+        message = Message(
+            [], ALICE, content, START + timedelta(minutes=minutes), status
+        )
+        return self.store.call(self.chats.add_message(chat_id or self.chat.id, message))
+
+    def summary(self):
+        return self.store.call(self.chats.get_summary(self.chat.id))
+
+    def execute(self, sql, *args):
+        with sqlite3.connect(self.database_path) as db:
+            db.execute(sql, args)
+
+    def test_follows_added_messages(self):
+        self.add("first", 1)
+        self.add("second\nline", 3, MessageStatus.READ)
+        self.add("late arrival", 2)
+
+        summary = self.summary()
+        self.assertEqual(summary.title, "Tea")
+        self.assertEqual(summary.initials, "AL")
+        self.assertEqual(summary.preview, "second line")
+        self.assertEqual(summary.last_message_at, START + timedelta(minutes=3))
+        self.assertEqual(summary.unread_count, 2)
+
+    def test_follows_status_changes(self):
+        first = self.add("first", 1)
+        self.add("second", 2)
+        self.store.call(self.chats.set_status(first.id, MessageStatus.READ))
+        self.assertEqual(self.summary().unread_count, 1)
+        self.store.call(self.chats.set_status(first.id, MessageStatus.SENT))
+        self.assertEqual(self.summary().unread_count, 2)
+
+        summary = self.store.call(self.chats.mark_read(self.chat.id))
+        self.assertEqual(summary.unread_count, 0)
+        self.assertEqual(
+            self.store.call(
+                self.chats.count_messages(self.chat.id, MessageStatus.SENT)
+            ),
+            0,
+        )
+
+    def test_outgoing_messages_are_not_unread(self):
+        outbox = Outbox(self.chats)
+        self.store.call(
+            outbox.enqueue(
+                Message([ALICE], ME, "hello", START, MessageStatus.DRAFT),
+                self.chat.id,
+            )
+        )
+        self.assertEqual(self.summary().unread_count, 0)
+        mail = self.store.call(outbox.claim())
+        self.store.call(outbox.complete(mail))
+        self.assertEqual(self.summary().unread_count, 0)
+
+    def test_sample_chats_have_no_unread_messages_from_the_user(self):
+        self.store.close()
+        self.store = StoreRunner(os.path.join(self.tmp.name, "sample.sqlite3"))
+        self.store.call(seed_sample_chats(self.chats))
+        summaries = self.store.call(self.chats.page_summaries()).items
+        self.assertEqual(
+            {summary.title: summary.unread_count for summary in summaries},
+            {"General": 1, "Work": 1, "Family": 0, "Friends": 0},
+        )
+
+    def test_follows_edits_and_deletes(self):
+        first = self.add("first", 1)
+        latest = self.add("latest", 2)
+        self.execute("UPDATE message SET content = 'edited' WHERE id = ?", latest.id)
+        self.assertEqual(self.summary().preview, "edited")
+
+        self.execute("DELETE FROM message WHERE id = ?", latest.id)
+        summary = self.summary()
+        self.assertEqual((summary.preview, summary.unread_count), ("first", 1))
+        self.assertEqual(summary.last_message_at, START + timedelta(minutes=1))
+
+        self.execute("DELETE FROM message WHERE id = ?", first.id)
+        summary = self.summary()
+        self.assertEqual((summary.preview, summary.last_message_at), ("", None))
+        self.assertEqual(summary.unread_count, 0)
+
+    def test_pages_summaries_by_activity(self):
+        other = self.store.call(self.chats.add_chat("Croquet", [ALICE, BOB]))
+        quiet = self.store.call(self.chats.add_chat("Quiet", [BOB]))
+        self.add("tea", 1)
+        self.add("croquet", 2, chat_id=other.id)
+
+        first = self.store.call(self.chats.page_summaries(limit=1))
+        rest = self.store.call(self.chats.page_summaries(before=first.next_cursor))
+        self.assertEqual([s.title for s in first.items], ["Croquet"])
+        self.assertEqual(first.items[0].initials, "AB")
+        self.assertEqual([s.title for s in rest.items], ["Tea"])
+        self.assertIsNone(rest.next_cursor)
+        self.assertEqual(self.store.call(self.chats.get_summary(quiet.id)).preview, "")
+
+    def test_rebuilds_summaries_for_an_existing_store(self):
+        self.add("first", 1)
+        self.add("second", 2, MessageStatus.READ)
+        self.store.close()
+        with sqlite3.connect(self.database_path) as db:
+            for trigger in ("insert", "status", "content", "delete", "delete_latest"):
+                db.execute(f"DROP TRIGGER chat_summary_{trigger}")
+            db.execute(
+                "UPDATE chat SET initials = '', preview = '', unread_count = 0, "
+                "last_message_id = NULL"
+            )
+
+        self.store = StoreRunner(self.database_path)
+        summary = self.summary()
+        self.assertEqual(
+            (summary.initials, summary.preview, summary.unread_count),
+            ("AL", "second", 1),
+        )
+
+
+class TestChatInitials(unittest.TestCase):
+    def test_initials(self):
+        self.assertEqual(chat_initials("Tea", [ALICE]), "AL")
+        self.assertEqual(chat_initials("Tea", [BOB, ALICE]), "BA")
+        self.assertEqual(chat_initials("tea", []), "T")
+        self.assertEqual(chat_initials("Tea", [Member.intern("x@y.z")]), "X")
+
+
+if __name__ == "__main__":
+    unittest.main()
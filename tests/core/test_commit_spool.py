@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from src.core.commit_spool import CommitSpool
+
+
+def commit_info(sha, message="unsigned\n"):
+    return {"hexsha": sha, "type": "commit", "message": message, "parents": "()"}
+
+
+class TestCommitSpool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.shas = [f"{i:040x}" for i in (7, 3, 11, 1)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_spool(self):
+        spool = CommitSpool.temporary(self.tmp.name)
+        for sha in self.shas:
+            spool.append(commit_info(sha, f"commit {sha}\n"))
+        return spool
+
+    def test_keeps_append_order_and_looks_up_by_sha(self):
+        spool = self.make_spool()
+        self.assertEqual(len(spool), 4)
+        self.assertEqual(list(spool), self.shas)
+        self.assertEqual([sha for sha, _ in spool.items()], self.shas)
+        self.assertEqual(spool[self.shas[2]]["message"], f"commit {self.shas[2]}\n")
+        self.assertNotIn("f" * 40, spool)
+        self.assertNotIn("not-a-sha", spool)
+
+    def test_lookup_sees_commits_appended_later(self):
+        spool = self.make_spool()
+        self.assertIn(self.shas[0], spool)
+        spool.append(commit_info("e" * 40))
+        self.assertEqual(spool["e" * 40]["hexsha"], "e" * 40)
+
+    def test_compares_like_a_dict(self):
+        spool = self.make_spool()
+        expected = {sha: commit_info(sha, f"commit {sha}\n") for sha in self.shas}
+        self.assertEqual(spool, expected)
+        self.assertEqual(CommitSpool.temporary(self.tmp.name), {})
+
+    def test_temporary_spool_is_removed_unless_persisted(self):
+        spool = self.make_spool()
+        dropped_path = spool.path
+        kept = self.make_spool()
+        kept_path = os.path.join(self.tmp.name, "kept.jsonl")
+        kept.persist(kept_path)
+        del spool, kept
+
+        self.assertFalse(os.path.exists(dropped_path))
+        self.assertEqual(list(CommitSpool(kept_path)), self.shas)
+
+    def test_extend_skips_known_commits(self):
+        spool = CommitSpool.temporary(self.tmp.name)
+        spool.append(commit_info(self.shas[1]))
+        spool.extend(self.make_spool().items(), skip=set(spool))
+        self.assertEqual(list(spool), [self.shas[1], self.shas[0], *self.shas[2:]])
+
+
+if __name__ == "__main__":
+    unittest.main()
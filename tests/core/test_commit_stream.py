@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from git import Repo
+
+from src.core.commit_stream import (
+    iter_commit_records,
+    parse_log_stream,
+    parse_raw_date,
+)
+from src.core.contributions import analyze_commits
+from tests.core.helpers import git, init_repo, isolate_cache_dir
+
+
+class TestCommitStream(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.tmp.name, "repo")
+        os.makedirs(self.repo_path)
+        isolate_cache_dir(self, os.path.join(self.tmp.name, "cache"))
+        init_repo(self.repo_path)
+        with open(os.path.join(self.repo_path, "a.txt"), "w") as f:
+            f.write("one\ntwo\n")
+        git(self.repo_path, "add", ".")
+        git(self.repo_path, "commit", "-q", "-m", "first\n\nbody line")
+        with open(os.path.join(self.repo_path, "a.txt"), "a") as f:
+            f.write("three\n")
+        with open(os.path.join(self.repo_path, "b.bin"), "wb") as f:
+            f.write(b"\x00\x01")
+        git(self.repo_path, "add", ".")
+        git(self.repo_path, "commit", "-q", "-m", "second")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_raw_date(self):
+        self.assertEqual(parse_raw_date("1700000000 +0100"), (1700000000, -3600))
+        self.assertEqual(parse_raw_date("1700000000 -0230"), (1700000000, 9000))
+
+    def test_records_match_history(self):
+        records = list(iter_commit_records(Repo(self.repo_path)))
+        self.assertEqual(len(records), 2)
+        second, first = records
+        self.assertEqual(second.summary, "second")
+        self.assertEqual(second.parents, [first.hexsha])
+        self.assertEqual(second.lines_added, 1)
+        self.assertIn((None, None, "b.bin"), second.numstat)
+        self.assertEqual(first.parents, [])
+        self.assertEqual(first.message.strip(), "first\n\nbody line")
+        self.assertEqual(first.lines_added, 2)
+        self.assertEqual(first.author_email, "alice@example.com")
+        self.assertEqual(first.author_tz_offset, -3600)
+        self.assertFalse(first.is_signed)
+
+    def test_stream_rejects_truncated_header(self):
+        with self.assertRaises(ValueError):
+            list(parse_log_stream(iter(["\x1eabc\x1f"])))
+
+    def test_unsigned_commits_are_outstanding(self):
+        repo = Repo(self.repo_path)
+        contributions = analyze_commits(repo, self.repo_path)
+        self.assertEqual(contributions["identities"], {})
+        self.assertEqual(
+            set(contributions["outstanding_commits"]),
+            {commit.hexsha for commit in repo.iter_commits()},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
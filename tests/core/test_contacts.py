@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from src.core.contacts import ContactDirectory, contact_keys
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.contacts import load_contacts
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+
+NOW = datetime(2024, 6, 1)
+JOSE = Member.intern("jose.garcia@example.com", name="José García")
+JOHN = Member.intern("john@example.com", name="John Smith")
+JOAN = Member.intern("joan@example.org", name="Joan Smith")
+JO = Member.intern("jo@example.net")
+
+
+class TestContactDirectory(unittest.TestCase):
+    def setUp(self):
+        self.directory = ContactDirectory()
+        self.directory.update(
+            [
+                (JOSE, 3, NOW - timedelta(days=400)),
+                (JOHN, 200, NOW - timedelta(days=60)),
+                (JOAN, 1, NOW - timedelta(days=1)),
+                (JO, 0, None),
+            ]
+        )
+
+    def search(self, text, **kwargs):
+        return [member.email for member in self.directory.search(text, **kwargs)]
+
+    def test_keys(self):
+        self.assertEqual(
+            contact_keys(JOSE),
+            ("jose.garcia@example.com", "jose", "garcia"),
+        )
+
+    def test_matches_prefixes_of_names_and_addresses(self):
+        self.assertEqual(self.search("gar"), [JOSE.email])
+        self.assertEqual(self.search("GARCÍA"), [JOSE.email])
+        self.assertEqual(self.search("john@ex"), [JOHN.email])
+        self.assertEqual(self.search("smith jo"), [JOHN.email, JOAN.email])
+        self.assertEqual(self.search("nobody"), [])
+        self.assertEqual(self.search("  "), [])
+
+    def test_ranks_by_frequency_and_recency(self):
+        # John's 200 messages outweigh Joan's being more recent.
+        self.assertEqual(
+            self.search("jo"), [JOHN.email, JOAN.email, JOSE.email, JO.email]
+        )
+        top_two = self.search("jo", limit=2, exclude=[JOHN.email])
+        self.assertEqual(top_two, [JOAN.email, JOSE.email])
+
+    def test_updates_incrementally(self):
+        self.directory.observe([JO, JO], NOW)
+        self.assertEqual(self.directory.get(JO.email).message_count, 1)
+        self.assertEqual(self.search("jo")[:2], [JOHN.email, JO.email])
+
+        renamed = Member.intern(JO.email, name="Jolene Parton")
+        self.directory.observe([renamed], NOW)
+        self.assertEqual(self.search("parton"), [JO.email])
+        # A later message without a name keeps the one it has.
+        self.directory.observe([Member.intern(JO.email)], NOW)
+        self.assertEqual(self.search("jolene"), [JO.email])
+
+        keys, owners = self.directory.keys, self.directory.owners
+        self.directory.rebuild()
+        self.assertEqual((keys, owners), (self.directory.keys, self.directory.owners))
+
+
+class TestContactActivity(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = StoreRunner(os.path.join(self.tmp.name, "store.sqlite3"))
+        self.repository = ChatRepository()
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def add(self, chat, sender, recipients, when):
+        message = Message(recipients, sender, "Hi", when, MessageStatus.READ)
+        self.store.call(self.repository.add_message(chat.id, message))
+
+    def test_loads_activity_incrementally(self):
+        chat = self.store.call(self.repository.add_chat("Plans", [JOHN, JOAN]))
+        self.add(chat, JOHN, [JOAN], NOW - timedelta(days=2))
+        self.add(chat, JOAN, [JOHN], NOW - timedelta(days=1))
+        activity, latest = self.store.call(load_contacts())
+        self.assertEqual(
+            sorted((member.email, count, when) for member, count, when in activity),
+            [
+                (JOAN.email, 2, NOW - timedelta(days=1)),
+                (JOHN.email, 2, NOW - timedelta(days=1)),
+            ],
+        )
+
+        self.add(chat, JOSE, [JOAN], NOW - timedelta(days=30))
+        activity, _ = self.store.call(load_contacts(latest))
+        self.assertEqual(
+            sorted((member.email, count, when) for member, count, when in activity),
+            [
+                (JOAN.email, 3, NOW - timedelta(days=1)),
+                (JOSE.email, 1, NOW - timedelta(days=30)),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,318 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import gnupg
+from git import Repo
+
+from src.core import contributions
+from src.core.commit_spool import CommitSpool
+from src.core.commit_stream import iter_commit_records
+from src.core.contributions import (
+    analyze_commits,
+    clone_or_pull_repo,
+    finalize_tally,
+    merge_tallies,
+)
+from src.core.numstat_cache import NumstatCache, fill_numstat
+from src.core.keycache import DirectoryKeySource, KeyCache
+from tests.core.helpers import (
+    commit_file,
+    export_key,
+    git,
+    init_repo,
+    isolate_cache_dir,
+    make_signing_key,
+)
+
+
+def identity(email: str, name: str, loc: int, timestamp: int) -> dict:
+    return {
+        "id": f"id-{name}-{timestamp}",
+        "email": email,
+        "name": name,
+        "pgp_key_id": "ABCD",
+        "github_username": None,
+        "verified": True,
+        "loc": loc,
+        "last_used_timestamp": timestamp,
+    }
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.tmp.name, "repo")
+        self.state_file = os.path.join(self.tmp.name, "state.json")
+        os.makedirs(self.repo_path)
+        isolate_cache_dir(self, os.path.join(self.tmp.name, "cache"))
+        init_repo(self.repo_path)
+        self.first = commit_file(self.repo_path, "a.txt", "one\n", "first")
+        self.second = commit_file(self.repo_path, "a.txt", "two\n", "second")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def analyze(self):
+        walked = []
+        original = contributions.walk_commits
+
+        def spy(repo, rev=None, jobs=1):
+            walked.append(rev)
+            return original(repo, rev, jobs)
+
+        with mock.patch.object(contributions, "walk_commits", spy):
+            result = analyze_commits(
+                Repo(self.repo_path), self.repo_path, self.state_file
+            )
+        return result, walked
+
+    def test_rerun_walks_only_new_commits(self):
+        self.analyze()
+        third = commit_file(self.repo_path, "a.txt", "three\n", "third")
+
+        result, walked = self.analyze()
+
+        self.assertEqual(walked, [f"{self.second}..{third}"])
+        self.assertEqual(
+            list(result["outstanding_commits"]), [third, self.second, self.first]
+        )
+        full = analyze_commits(Repo(self.repo_path), self.repo_path)
+        self.assertEqual(result, full)
+
+    def test_unchanged_tip_walks_nothing(self):
+        first_result, _ = self.analyze()
+        result, walked = self.analyze()
+        self.assertEqual(walked, [])
+        self.assertEqual(result, first_result)
+
+    def test_force_push_triggers_full_rebuild(self):
+        self.analyze()
+        git(self.repo_path, "reset", "-q", "--hard", self.first)
+        rewritten = commit_file(self.repo_path, "b.txt", "new\n", "rewritten")
+
+        result, walked = self.analyze()
+
+        self.assertEqual(walked, [rewritten])
+        self.assertEqual(list(result["outstanding_commits"]), [rewritten, self.first])
+
+    def spool(self, shas):
+        spool = CommitSpool.temporary(os.path.join(self.tmp.name, "spool"))
+        for sha in shas:
+            spool.append({"hexsha": sha})
+        return spool
+
+    def test_merge_tallies_prefers_newest_identity_details(self):
+        older = {
+            "identities": {
+                "a@example.com": identity("a@example.com", "Old A", 30, 100),
+                "b@example.com": identity("b@example.com", "B", 10, 90),
+            },
+            "outstanding_commits": self.spool(["a" * 40, "b" * 40]),
+            "total_loc": 40,
+        }
+        newer = {
+            "identities": {
+                "c@example.com": identity("c@example.com", "C", 5, 300),
+                "a@example.com": identity("a@example.com", "New A", 5, 200),
+            },
+            "outstanding_commits": self.spool(["c" * 40, "b" * 40]),
+            "total_loc": 10,
+        }
+
+        merged = merge_tallies(newer, older)
+
+        self.assertEqual(
+            list(merged["identities"]),
+            ["c@example.com", "a@example.com", "b@example.com"],
+        )
+        a = merged["identities"]["a@example.com"]
+        self.assertEqual(a["name"], "New A")
+        self.assertEqual(a["id"], "id-Old A-100")
+        self.assertEqual(a["loc"], 35)
+        self.assertEqual(
+            list(merged["outstanding_commits"]), ["c" * 40, "b" * 40, "a" * 40]
+        )
+
+        final = finalize_tally(merged)
+        self.assertAlmostEqual(
+            final["identities"]["a@example.com"]["contribution_percentage"], 70.0
+        )
+        self.assertNotIn("loc", final["identities"]["a@example.com"])
+
+
+class TestSignedAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.tmp.name, "repo")
+        self.signing_home = os.path.join(self.tmp.name, "signing")
+        keys_dir = os.path.join(self.tmp.name, "keys")
+        verify_home = os.path.join(self.tmp.name, "verify")
+        for path in (self.repo_path, keys_dir):
+            os.makedirs(path)
+        os.makedirs(verify_home, mode=0o700)
+        isolate_cache_dir(self, os.path.join(self.tmp.name, "cache"))
+        init_repo(self.repo_path)
+        self.fingerprint = make_signing_key(
+            self.signing_home, "Alice", "alice@example.com"
+        )
+        export_key(self.signing_home, self.fingerprint, os.path.join(keys_dir, "a.asc"))
+        contributions.gpg = gnupg.GPG(gnupghome=verify_home)
+        contributions.set_key_source(DirectoryKeySource(contributions.gpg, keys_dir))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_signed_commits_count_towards_identity(self):
+        commit_file(
+            self.repo_path,
+            "a.txt",
+            "one\ntwo\n",
+            "signed",
+            self.fingerprint,
+            self.signing_home,
+        )
+        unsigned = commit_file(self.repo_path, "b.txt", "three\n", "unsigned")
+
+        result = analyze_commits(Repo(self.repo_path), self.repo_path)
+
+        identity = result["identities"]["alice@example.com"]
+        self.assertEqual(identity["pgp_key_id"], self.fingerprint[-16:])
+        self.assertEqual(identity["contribution_percentage"], 100.0)
+        self.assertEqual(list(result["outstanding_commits"]), [unsigned])
+        self.assertEqual(contributions.get_key_cache().misses, 1)
+
+    def test_tampered_commits_are_rejected_before_the_key_is_known(self):
+        signed = commit_file(
+            self.repo_path,
+            "a.txt",
+            "one\ntwo\n",
+            "signed",
+            self.fingerprint,
+            self.signing_home,
+        )
+        # The same signature over a different message.
+        raw = git(self.repo_path, "cat-file", "commit", signed)
+        tampered_path = os.path.join(self.tmp.name, "tampered")
+        with open(tampered_path, "w") as f:
+            f.write(raw.replace("\nsigned\n", "\nforged\n"))
+        tampered = git(
+            self.repo_path, "hash-object", "-t", "commit", "-w", tampered_path
+        ).strip()
+        git(self.repo_path, "update-ref", "refs/heads/main", tampered)
+
+        result = analyze_commits(Repo(self.repo_path), self.repo_path)
+
+        self.assertEqual(result["identities"], {})
+        self.assertEqual(list(result["outstanding_commits"]), [tampered])
+
+    def test_addresses_in_diffs_are_ignored(self):
+        commit_file(
+            self.repo_path,
+            "AUTHORS",
+            "Mallory <mallory@example.com>\n",
+            "Add authors file",
+            self.fingerprint,
+            self.signing_home,
+        )
+
+        result = analyze_commits(Repo(self.repo_path), self.repo_path)
+
+        self.assertIn("alice@example.com", result["identities"])
+        self.assertEqual(result["outstanding_commits"], {})
+
+    def test_parallel_run_matches_serial_run(self):
+        for i in range(12):
+            commit_file(
+                self.repo_path,
+                "a.txt",
+                f"line {i}\n" * (i + 1),
+                f"commit {i}",
+                self.fingerprint if i % 3 else None,
+                self.signing_home,
+            )
+        repo = Repo(self.repo_path)
+
+        serial = analyze_commits(repo, self.repo_path)
+        with mock.patch.object(contributions, "VERIFY_BATCH_SIZE", 2):
+            parallel = analyze_commits(repo, self.repo_path, jobs=3)
+
+        self.assertEqual(
+            list(parallel["identities"].items()), list(serial["identities"].items())
+        )
+        self.assertEqual(
+            list(parallel["outstanding_commits"].items()),
+            list(serial["outstanding_commits"].items()),
+        )
+        self.assertEqual(len(serial["outstanding_commits"]), 4)
+
+    def test_parallel_run_saves_the_keys_workers_fetched(self):
+        cache_path = os.path.join(self.tmp.name, "keys.json")
+        source = contributions.get_key_cache().source
+        contributions.set_key_source(source, cache_path)
+        for i in range(6):
+            commit_file(
+                self.repo_path,
+                "a.txt",
+                f"line {i}\n",
+                f"commit {i}",
+                self.fingerprint,
+                self.signing_home,
+            )
+
+        with mock.patch.object(contributions, "VERIFY_BATCH_SIZE", 2):
+            analyze_commits(Repo(self.repo_path), self.repo_path, jobs=3)
+
+        saved = KeyCache(cache_path, source)
+        self.assertEqual(list(saved.entries), [self.fingerprint[-16:]])
+        self.assertTrue(saved.entries[self.fingerprint[-16:]].found)
+
+
+class TestPartialClone(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.work_path = os.path.join(self.tmp.name, "work")
+        self.origin_path = os.path.join(self.tmp.name, "origin.git")
+        self.clone_path = os.path.join(self.tmp.name, "cache", "repo-blob-none.git")
+        os.makedirs(self.work_path)
+        init_repo(self.work_path)
+        commit_file(self.work_path, "a.txt", "one\n", "first")
+        commit_file(self.work_path, "b.txt", "two\n", "second")
+        git(self.tmp.name, "clone", "-q", "--bare", self.work_path, self.origin_path)
+        git(self.origin_path, "config", "uploadpack.allowFilter", "true")
+        git(self.origin_path, "config", "uploadpack.allowAnySHA1InWant", "true")
+        git(self.work_path, "remote", "add", "origin", self.origin_path)
+        self.url = f"file://{self.origin_path}"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_blobless_clone_skips_blobs_and_fetches_updates(self):
+        repo = clone_or_pull_repo(self.url, self.clone_path, "blob:none")
+
+        self.assertTrue(repo.bare)
+        missing = git(
+            self.clone_path, "rev-list", "--objects", "--all", "--missing=print"
+        )
+        self.assertTrue(any(line.startswith("?") for line in missing.splitlines()))
+
+        third = commit_file(self.work_path, "a.txt", "three\n", "third")
+        git(self.work_path, "push", "-q", "origin", "main")
+        repo = clone_or_pull_repo(self.url, self.clone_path, "blob:none")
+        self.assertEqual(repo.head.commit.hexsha, third)
+
+    def test_diffs_work_on_a_blobless_clone(self):
+        repo = clone_or_pull_repo(self.url, self.clone_path, "blob:none")
+        expected = {
+            r.hexsha: r.numstat for r in iter_commit_records(Repo(self.work_path))
+        }
+
+        records = list(iter_commit_records(repo, numstat=False))
+        fill_numstat(repo, records, NumstatCache(None))
+
+        self.assertEqual({r.hexsha: r.numstat for r in records}, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.components.about import contributors
+from src.core.contributions import get_contributor_summary
+from src.core.contributions_file import (
+    CONTRIBUTIONS_FILE,
+    export_json,
+    open_contributions,
+    write_contributions,
+)
+
+
+def identity(email, name, key, percentage, timestamp):
+    return {
+        "id": f"id-{email}",
+        "email": email,
+        "name": name,
+        "pgp_key_id": key,
+        "github_username": None,
+        "verified": True,
+        "last_used_timestamp": timestamp,
+        "contribution_percentage": percentage,
+    }
+
+
+CONTRIBUTIONS = {
+    "identities": {
+        "a@example.com": identity("a@example.com", "A", "AAAA", 70.0, 100),
+        "a@work.example": identity("a@work.example", "A", "AAAA", 10.0, 300),
+        "b@example.com": identity("b@example.com", "B", "BBBB", 20.0, 200),
+    },
+    "outstanding_commits": {
+        "f" * 40: {"hexsha": "f" * 40, "message": "unsigned\n", "parents": ""}
+    },
+}
+
+
+class TestContributionsFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, CONTRIBUTIONS_FILE)
+        write_contributions(
+            self.path, CONTRIBUTIONS, get_contributor_summary(CONTRIBUTIONS)
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_header_holds_sorted_contributors(self):
+        contributions = open_contributions(self.path)
+        self.assertEqual(
+            [(c["name"], c["rank"]) for c in contributions.contributors],
+            [("A", "Lead Maintainer"), ("B", "Co-Maintainer")],
+        )
+        self.assertEqual(contributions.contributors[0]["last_used_timestamp"], 300)
+        self.assertEqual(contributions.outstanding_count, 1)
+        self.assertEqual(contributions.loaded, {})
+
+    def test_sections_load_on_demand(self):
+        contributions = open_contributions(self.path)
+        self.assertEqual(
+            contributions.outstanding_commits, CONTRIBUTIONS["outstanding_commits"]
+        )
+        self.assertEqual(list(contributions.loaded), ["outstanding_commits"])
+        self.assertEqual(contributions.identities, CONTRIBUTIONS["identities"])
+
+    def test_exports_json(self):
+        json_path = os.path.join(self.tmp.name, "contributions.json")
+        self.assertTrue(export_json(self.path, json_path))
+        with open(json_path) as file:
+            self.assertEqual(json.load(file), CONTRIBUTIONS)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as file:
+            file.write(b"{}")
+        self.assertIsNone(open_contributions(self.path))
+        self.assertIsNone(open_contributions(os.path.join(self.tmp.name, "missing")))
+
+    def test_about_window_reads_only_the_header(self):
+        with (
+            mock.patch.object(contributors, "ROOT_DIR", self.tmp.name),
+            mock.patch(
+                "src.core.contributions_file.ContributionsFile.read_section"
+            ) as read_section,
+        ):
+            result = contributors.get_contributors()
+        read_section.assert_not_called()
+        self.assertEqual([c["name"] for c in result], ["A", "B"])
+
+    def test_about_window_falls_back_to_json(self):
+        with open(os.path.join(self.tmp.name, ".contributions.json"), "w") as file:
+            json.dump(CONTRIBUTIONS, file)
+        os.remove(self.path)
+        with mock.patch.object(contributors, "ROOT_DIR", self.tmp.name):
+            result = contributors.get_contributors()
+        self.assertEqual([c["name"] for c in result], ["A", "B"])
+
+
+if __name__ == "__main__":
+    unittest.main()
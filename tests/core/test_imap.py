@@ -0,0 +1,526 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from benchmarks.imap_server import (
+    CAPABILITIES,
+    ME,
+    PASSWORD,
+    ImapServer,
+    fill_mailbox,
+)
+from src.core.account import Account
+from src.core.imap.bodies import OPEN_CHAT, VISIBLE, BACKFILL, BodyFetcher, BodyQueue
+from src.core.imap.client import ImapConnection
+from src.core.imap.pool import ConnectionPool
+from src.core.imap.push import PushMonitor
+from src.core.imap.protocol import (
+    fetch_items,
+    format_uid_set,
+    parse_internal_date,
+    parse_response,
+    parse_uid_set,
+    text_part,
+    tokenize,
+)
+from src.core.imap.sync import SyncEngine, mailbox_source
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.deltas import DeltaQueue, StoreDelta
+from src.core.store.runner import StoreRunner
+
+
+class TestProtocol(unittest.TestCase):
+    def test_parses_fetch_with_literal(self):
+        response = parse_response(
+            [b"* 12 FETCH (UID 40 FLAGS (\\Seen) BODY[] ", b" INTERNALDATE NIL)"],
+            [b"From: a@example.com\r\n\r\n(hi"],
+        )
+        self.assertEqual(
+            (response.tag, response.kind, response.number), ("*", "FETCH", 12)
+        )
+        items = fetch_items(response)
+        self.assertEqual(items["UID"], "40")
+        self.assertEqual(items["FLAGS"], ["\\Seen"])
+        self.assertEqual(items["BODY[]"], b"From: a@example.com\r\n\r\n(hi")
+        self.assertIsNone(items["INTERNALDATE"])
+
+    def test_parses_status_codes(self):
+        response = parse_response([b"* OK [UIDVALIDITY 7] UIDs valid"], [])
+        self.assertEqual(
+            (response.kind, response.code, response.text),
+            ("OK", "UIDVALIDITY 7", "UIDs valid"),
+        )
+        tagged = parse_response([b'A3 NO [TRYCREATE] "No" such mailbox'], [])
+        self.assertFalse(tagged.ok)
+
+    def test_uid_sets_and_dates(self):
+        self.assertEqual(format_uid_set([1, 2, 3, 5, 7, 8]), "1:3,5,7:8")
+        self.assertEqual(parse_uid_set("1:3,5,8:*", largest=9), [1, 2, 3, 5, 8, 9])
+        self.assertEqual(
+            parse_internal_date(" 7-Jul-2024 09:30:00 +0200"),
+            datetime(2024, 7, 7, 9, 30, tzinfo=timezone(timedelta(hours=2))),
+        )
+        self.assertIsNone(parse_internal_date("yesterday"))
+
+    def test_finds_text_part_in_body_structure(self):
+        (structure,) = tokenize(
+            [
+                b'((("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 24 1)'
+                b' "ALTERNATIVE")("TEXT" "PLAIN" ("NAME" "notes.txt") NIL NIL "7BIT"'
+                b' 40 2)("TEXT" "PLAIN" NIL NIL NIL "7BIT" 9 1 NIL ("ATTACHMENT" NIL))'
+                b' "MIXED")'
+            ],
+            [],
+        )
+        part = text_part(structure)
+        self.assertEqual(
+            (part.section, part.subtype, part.charset, part.encoding),
+            ("1.1", "html", "utf-8", "quoted-printable"),
+        )
+        (single,) = tokenize([b'("TEXT" "PLAIN" NIL NIL NIL "BASE64" 12 1)'], [])
+        self.assertEqual(text_part(single).section, "1")
+        (image,) = tokenize([b'("IMAGE" "PNG" NIL NIL NIL "BASE64" 12)'], [])
+        self.assertIsNone(text_part(image))
+
+
+class TestDeltaQueue(unittest.TestCase):
+    def test_delta_queue_folds_posts_together(self):
+        queue = DeltaQueue()
+        sender = Member.intern(email="a@example.com")
+        for number in range(500):
+            delta = StoreDelta()
+            message = Message(
+                [], sender, str(number), datetime.now(), MessageStatus.SENT, id=number
+            )
+            delta.add(number % 7, message)
+            queue.post(delta)
+        queue.post(StoreDelta())
+        self.assertEqual(queue.posted, 500)
+        delta = queue.take()
+        self.assertEqual(sum(len(added) for added in delta.added.values()), 500)
+        self.assertEqual(delta.chats, set(range(7)))
+        self.assertIsNone(queue.take())
+
+    def test_messages_removed_in_the_same_frame_are_not_added(self):
+        queue = DeltaQueue()
+        sender = Member.intern(email="a@example.com")
+        first = StoreDelta()
+        for number in (1, 2):
+            message = Message(
+                [], sender, str(number), datetime.now(), MessageStatus.SENT, id=number
+            )
+            first.add(7, message)
+        first.set_status(7, 1, MessageStatus.READ)
+        queue.post(first)
+        later = StoreDelta()
+        later.remove(7, 1)
+        queue.post(later)
+        delta = queue.take()
+        self.assertEqual([message.id for message in delta.added[7]], [2])
+        self.assertEqual(delta.statuses[7], {})
+        self.assertEqual(delta.removed[7], {1})
+
+
+class TestBodyQueue(unittest.TestCase):
+    def test_most_pressing_first(self):
+        queue = BodyQueue()
+        queue.add([1, 2, 3, 4], BACKFILL)
+        queue.add([10, 11], OPEN_CHAT)
+        queue.add([3, 12], VISIBLE)
+        queue.add([20, 21], OPEN_CHAT)
+        # The chat opened last, then the one before, then the rest.
+        self.assertEqual(queue.take(3), [20, 21, 10])
+        self.assertEqual(queue.take(10), [11])
+        self.assertEqual(queue.take(10), [3, 12])
+        # 3 moved up, so it isn't fetched twice.
+        self.assertEqual(queue.take(10), [1, 2, 4])
+        self.assertEqual((len(queue), queue.take(10)), (0, []))
+
+
+class ServerTestCase(unittest.TestCase):
+    capabilities = CAPABILITIES
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = ImapServer(capabilities=self.capabilities)
+        self.inbox = self.server.add_mailbox("INBOX")
+        self.archive = self.server.add_mailbox("Archive")
+        self.server.add_mailbox("[Gmail]", "\\Noselect")
+        fill_mailbox(self.inbox, 450)
+        fill_mailbox(self.archive, 120, first=450)
+        port = self.server.start_thread()
+        self.account = Account(
+            ME,
+            imap_host="127.0.0.1",
+            imap_port=port,
+            imap_username=ME,
+            imap_password=PASSWORD,
+            imap_security="none",
+        )
+        self.database = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database)
+        self.deltas = DeltaQueue()
+        self.engine = self.make_engine()
+
+    def tearDown(self):
+        self.store.call(self.engine.pool.close())
+        self.store.close()
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def make_engine(self):
+        return SyncEngine(
+            self.store,
+            self.account,
+            pool=ConnectionPool(self.account, size=2),
+            batch_size=50,
+            window=3,
+            on_delta=self.deltas.post,
+        )
+
+    def query(self, sql):
+        with sqlite3.connect(self.database) as connection:
+            return connection.execute(sql).fetchall()
+
+    def wait_until(self, condition, timeout=20.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out")
+            time.sleep(0.02)
+
+
+class TestSync(ServerTestCase):
+    def test_syncs_every_mailbox_in_batches(self):
+        progress = self.store.call(self.engine.sync())
+        self.assertEqual((progress.imported, progress.failed), (570, 0))
+        self.assertEqual(self.server.fetches, 9 + 3)
+        # The pool's two connections did all the work.
+        self.assertEqual(self.server.logins, 2)
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(570,)])
+        # Unseen mail stays unread, unless the user sent it.
+        unread = self.query("SELECT count(*) FROM message WHERE status = 'Sent'")
+        self.assertTrue(0 < unread[0][0] < 570 // 3)
+        self.assertEqual(
+            dict(self.query("SELECT source, position FROM import_progress")),
+            {
+                mailbox_source(self.account, "INBOX", 1): 450,
+                mailbox_source(self.account, "Archive", 1): 120,
+            },
+        )
+
+    def test_fetches_only_new_mail(self):
+        self.store.call(self.engine.sync())
+        fetches = self.server.fetches
+        self.server.call(lambda: fill_mailbox(self.inbox, 30, first=1000))
+        progress = self.store.call(self.engine.sync())
+        self.assertEqual((progress.messages, progress.imported), (30, 30))
+        self.assertEqual(self.server.fetches, fetches + 1)
+
+        # A fresh engine, as after a restart, carries on from the store.
+        self.store.call(self.engine.pool.close())
+        self.engine = self.make_engine()
+        self.assertEqual(self.store.call(self.engine.sync()).messages, 0)
+
+    def test_new_uidvalidity_refetches_without_duplicates(self):
+        self.store.call(self.engine.sync())
+        self.server.call(lambda: self.archive.reset(uidvalidity=2))
+        progress = self.store.call(self.engine.sync())
+        self.assertEqual((progress.messages, progress.imported), (120, 0))
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(570,)])
+
+    def test_pipelines_commands(self):
+        async def pipeline():
+            connection = await ImapConnection.open(self.account)
+            try:
+                await connection.examine("INBOX")
+                bodies = []
+                connection.handlers["FETCH"] = lambda response: bodies.append(
+                    fetch_items(response)["UID"]
+                )
+                commands = [
+                    connection.uid_fetch(range(first, first + 10), "(BODY.PEEK[])")
+                    for first in (1, 11, 21)
+                ]
+                await asyncio.gather(*(command.done for command in commands))
+                return bodies
+            finally:
+                await connection.logout()
+
+        uids = self.store.call(pipeline())
+        self.assertEqual(uids, [str(uid) for uid in range(1, 31)])
+
+    def test_bad_password_fails_the_sync(self):
+        self.server.password = "changed"
+        with self.assertRaises(Exception):
+            self.store.call(self.engine.sync())
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(0,)])
+
+
+class TestBodies(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        # Its text is in an HTML part nested in the first, with a PDF after.
+        self.inbox.append(
+            b"From: Contact 7 <contact7@example.com>\r\nTo: me@example.com\r\n"
+            b"Message-ID: <mixed@example.com>\r\n"
+            b'Content-Type: multipart/mixed; boundary="x"\r\n\r\n'
+            b'--x\r\nContent-Type: multipart/alternative; boundary="y"\r\n\r\n'
+            b"--y\r\nContent-Type: text/html; charset=utf-8\r\n"
+            b"Content-Transfer-Encoding: quoted-printable\r\n\r\n"
+            b"<p>Hi=20there =C3=A9</p>\r\n--y--\r\n"
+            b'--x\r\nContent-Type: application/pdf; name="a.pdf"\r\n'
+            b"Content-Transfer-Encoding: base64\r\n\r\nJVBERi0=\r\n--x--\r\n"
+        )
+        self.fetcher = BodyFetcher(self.engine, batch_size=20)
+
+    def tearDown(self):
+        self.fetcher.stop()
+        super().tearDown()
+
+    def pending(self, where="1"):
+        return self.query(
+            "SELECT count(*) FROM pending_body "
+            f"JOIN message ON message.id = pending_body.message_id WHERE {where}"
+        )[0][0]
+
+    def content(self, message_id):
+        return self.query(
+            f"SELECT content FROM message WHERE message_id = '{message_id}'"
+        )[0][0]
+
+    def test_headers_first_then_bodies_by_priority(self):
+        progress = self.store.call(self.engine.sync())
+        self.assertEqual((progress.imported, progress.failed), (571, 0))
+        self.assertEqual(self.server.bodies, 0)
+        self.assertEqual(self.pending(), 571)
+        # Previews come from the text part, wherever it is.
+        self.assertEqual(self.content("<mixed@example.com>"), "Hi there é")
+        self.assertTrue(self.content("<1@example.com>"))
+        self.assertEqual(self.query("SELECT count(*) FROM attachment"), [(0,)])
+
+        # As while a sync runs, so nothing is backfilled.
+        self.store.loop.call_soon_threadsafe(self.engine.idle.clear)
+        (chat_id,) = self.query(
+            "SELECT chat_id FROM message WHERE message_id = '<mixed@example.com>'"
+        )[0]
+        self.fetcher.start()
+        self.fetcher.want_chats([chat_id], OPEN_CHAT)
+        self.wait_until(lambda: not self.pending(f"chat_id = {chat_id}"))
+        self.assertEqual(self.pending(), 571 - self.server.bodies)
+        self.assertEqual(self.query("SELECT count(*) FROM attachment"), [(1,)])
+        self.assertIn(chat_id, self.deltas.take().filled)
+
+        self.store.loop.call_soon_threadsafe(self.engine.idle.set)
+        self.wait_until(lambda: not self.pending())
+        self.assertEqual(self.server.bodies, 571)
+        words = self.content("<1@example.com>").split()
+        self.assertTrue(20 <= len(words) <= 200)
+
+    def test_bodies_stay_pending_while_their_mailbox_cant_be_opened(self):
+        self.store.call(self.engine.sync())
+        self.server.call(lambda: self.server.mailboxes.pop("Archive"))
+        message_ids = [row[0] for row in self.query("SELECT id FROM message")]
+
+        async def fetch():
+            connection = await ImapConnection.open(self.account)
+            try:
+                return await self.fetcher.fetch(connection, message_ids)
+            finally:
+                connection.close()
+
+        self.assertTrue(self.store.call(fetch()))
+        self.assertEqual(self.server.bodies, 451)
+        archive = mailbox_source(self.account, "Archive", 1)
+        self.assertEqual(
+            self.pending(
+                "message.id IN (SELECT message_id FROM mailbox_message "
+                "JOIN import_progress ON import_progress.id = source_id "
+                f"WHERE source = '{archive}')"
+            ),
+            120,
+        )
+        self.assertEqual(self.pending(), 120)
+
+    def test_full_bodies(self):
+        self.engine.headers_first = False
+        self.store.call(self.engine.sync())
+        self.assertEqual(self.server.bodies, 571)
+        self.assertEqual(self.pending(), 0)
+        self.assertEqual(self.query("SELECT count(*) FROM attachment"), [(1,)])
+
+
+class TestResync(ServerTestCase):
+    # UID FETCH commands a resync takes: QRESYNC reports changes on EXAMINE.
+    flag_fetches = 0
+
+    def uid_of(self, status):
+        source = mailbox_source(self.account, "INBOX", 1)
+        rows = self.query(
+            "SELECT uid, message.id FROM mailbox_message "
+            "JOIN message ON message.id = mailbox_message.message_id "
+            "JOIN member ON member.id = message.sender_id "
+            f"WHERE status = '{status}' AND member.email != '{ME}' AND uid > 5 "
+            "AND source_id = (SELECT id FROM import_progress "
+            f"WHERE source = '{source}') ORDER BY uid"
+        )
+        return rows[0]
+
+    def test_resync_fetches_only_changes(self):
+        self.store.call(self.engine.sync())
+        read_uid, read_id = self.uid_of("Read")
+        unread_uid, unread_id = self.uid_of("Sent")
+
+        def change():
+            self.inbox.expunge(range(1, 6))
+            self.inbox.set_flags(read_uid, [])
+            self.inbox.set_flags(unread_uid, ["\\Seen"])
+
+        self.server.call(change)
+        # A cold start, as after a restart.
+        self.store.call(self.engine.pool.close())
+        self.engine = self.make_engine()
+        self.deltas.take()
+        fetches = self.server.fetches
+        self.assertEqual(self.store.call(self.engine.sync()).messages, 0)
+        self.assertEqual(self.server.fetches - fetches, self.flag_fetches)
+        delta = self.deltas.take()
+        self.assertEqual(sum(len(ids) for ids in delta.removed.values()), 5)
+        statuses = {
+            message_id: status
+            for chat in delta.statuses.values()
+            for message_id, status in chat.items()
+        }
+        self.assertEqual(
+            statuses, {read_id: MessageStatus.SENT, unread_id: MessageStatus.READ}
+        )
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(565,)])
+        modseq = self.inbox.highestmodseq if "CONDSTORE" in self.capabilities else 0
+        self.assertEqual(
+            self.query(
+                "SELECT uidvalidity, highestmodseq FROM mailbox_state "
+                "WHERE mailbox LIKE '%/INBOX'"
+            ),
+            [(1, modseq)],
+        )
+
+        # Nothing changed since, so there is nothing to do.
+        self.store.call(self.engine.sync())
+        self.assertEqual(self.server.fetches - fetches, self.flag_fetches)
+        self.assertIsNone(self.deltas.take())
+
+    def test_messages_that_cant_be_stored_count_as_known(self):
+        self.inbox.append(b"Subject: No Message-ID\r\n\r\nHello\r\n")
+        self.store.call(self.engine.sync())
+        self.assertEqual(self.query("SELECT count(*) FROM unmapped_uid"), [(1,)])
+        searches = []
+        uid_search = ImapConnection.uid_search
+
+        async def recording(connection, criteria):
+            searches.append(criteria)
+            return await uid_search(connection, criteria)
+
+        self.store.call(self.engine.pool.close())
+        self.engine = self.make_engine()
+        with mock.patch.object(ImapConnection, "uid_search", recording):
+            self.store.call(self.engine.sync())
+        self.assertNotIn("ALL", searches)
+
+        # Once expunged, it is forgotten.
+        self.server.call(lambda: self.inbox.expunge([self.inbox.uidnext - 1]))
+        self.store.call(self.engine.sync())
+        self.assertEqual(self.query("SELECT count(*) FROM unmapped_uid"), [(0,)])
+
+
+class TestResyncWithCondstore(TestResync):
+    capabilities = "IMAP4rev1 ESEARCH LITERAL+ CONDSTORE"
+    flag_fetches = 1
+
+
+class TestResyncWithoutCondstore(TestResync):
+    capabilities = "IMAP4rev1 ESEARCH LITERAL+"
+
+
+class TestPush(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store.call(self.engine.sync())
+        self.deltas.take()
+        self.monitor = PushMonitor(self.engine)
+        self.monitor.start()
+        self.wait_until(self.listening)
+
+    def tearDown(self):
+        self.monitor.stop()
+        super().tearDown()
+
+    def listening(self):
+        # INBOX is watched, and Archive with it through NOTIFY.
+        return any(
+            (client.idling or client.notify_selected) and "Archive" in client.notifying
+            for client in list(self.server.clients)
+        )
+
+    def take(self):
+        self.wait_until(lambda: self.deltas.posted)
+        # Anything else from the same burst would follow straight away.
+        time.sleep(0.3)
+        posted = self.deltas.posted
+        return posted, self.deltas.take()
+
+    def test_burst_of_new_mail_is_one_delta(self):
+        self.server.call(lambda: fill_mailbox(self.inbox, 500, first=5000))
+        posted, delta = self.take()
+        self.assertEqual(posted, 1)
+        self.assertEqual(sum(len(added) for added in delta.added.values()), 500)
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(1070,)])
+
+    def test_expunge_and_flag_changes(self):
+        source = mailbox_source(self.account, "INBOX", 1)
+        (uid, message_id), *_ = self.query(
+            "SELECT uid, message.id FROM mailbox_message "
+            "JOIN message ON message.id = mailbox_message.message_id "
+            "JOIN member ON member.id = message.sender_id "
+            f"WHERE status = 'Read' AND member.email != '{ME}' "
+            "AND source_id = (SELECT id FROM import_progress "
+            f"WHERE source = '{source}') ORDER BY uid"
+        )
+
+        def change():
+            self.inbox.expunge([1])
+            self.inbox.set_flags(uid, [])
+
+        self.server.call(change)
+        _, delta = self.take()
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(569,)])
+        self.assertEqual(len(delta.removed), 1)
+        self.assertIn({message_id: MessageStatus.SENT}, list(delta.statuses.values()))
+        self.assertEqual(
+            self.query(f"SELECT status FROM message WHERE id = {message_id}"),
+            [("Sent",)],
+        )
+
+    def test_other_mailboxes_are_watched_with_notify(self):
+        self.server.call(lambda: fill_mailbox(self.archive, 20, first=6000))
+        posted, delta = self.take()
+        self.assertEqual(posted, 1)
+        self.assertEqual(sum(len(added) for added in delta.added.values()), 20)
+
+        self.server.call(lambda: self.archive.expunge(range(1, 11)))
+        _, delta = self.take()
+        self.assertEqual(sum(len(ids) for ids in delta.removed.values()), 10)
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(580,)])
+
+
+class TestPushWithoutIdle(TestPush):
+    capabilities = "IMAP4rev1 ESEARCH LITERAL+ NOTIFY"
+
+
+if __name__ == "__main__":
+    unittest.main()
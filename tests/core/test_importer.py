@@ -0,0 +1,215 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+
+from src.core.models.message import MessageStatus
+from src.core.store.importer import import_mail, iter_mbox_batches, parse_batch
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+
+ME = "me@example.com"
+
+PLAIN = b"""From alice@example.com Mon Jan  1 10:00:00 2024
+From: Alice Liddell <alice@example.com>
+To: Me <me@example.com>
+Subject: =?utf-8?q?Caf=C3=A9?= tomorrow
+Date: Mon, 1 Jan 2024 10:00:00 +0000
+Message-ID: <1@example.com>
+Status: RO
+
+Shall we meet at the caf\xc3\xa9?
+>From the corner table you can see the river.
+
+"""
+
+HTML = b"""From bob@example.com Sun Dec 31 11:00:00 2023
+From: Bob <bob@example.com>
+To: me@example.com, Alice Liddell <alice@example.com>
+Subject: Plans
+Message-ID: <2@example.com>
+MIME-Version: 1.0
+Content-Type: multipart/alternative; boundary="b"
+
+--b
+Content-Type: text/html; charset=utf-8
+
+<p>Count me <b>in</b> &amp; bring cake</p>
+--b--
+
+"""
+
+REPLY = b"""From me@example.com Mon Jan  1 12:00:00 2024
+From: Me <me@example.com>
+To: Alice Liddell <alice@example.com>
+Subject: Re: Cafe tomorrow
+Date: Mon, 1 Jan 2024 12:00:00 +0000
+Message-ID: <3@example.com>
+In-Reply-To: <1@example.com>
+
+See you there.
+"""
+
+NO_SENDER = b"""From nobody Mon Jan  1 13:00:00 2024
+Subject: Who sent this?
+
+Nobody knows.
+
+"""
+
+
+def write(path, data):
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+def maildir_message(number, sender):
+    return (
+        f"From: {sender}\nTo: {ME}\nSubject: Note {number}\n"
+        f"Message-ID: <md{number}@example.com>\n\nNote number {number}\n"
+    ).encode()
+
+
+class TestImporter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database_path)
+        self.mbox = os.path.join(self.tmp.name, "archive.mbox")
+        write(self.mbox, PLAIN + HTML + NO_SENDER + REPLY)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def query(self, sql, *args):
+        with sqlite3.connect(self.database_path) as db:
+            return db.execute(sql, args).fetchall()
+
+    def make_maildir(self, count):
+        root = os.path.join(self.tmp.name, "Maildir")
+        for folder in (root, os.path.join(root, ".Archive")):
+            for sub in ("cur", "new", "tmp"):
+                os.makedirs(os.path.join(folder, sub))
+        for number in range(count):
+            folder = root if number % 2 else os.path.join(root, ".Archive")
+            name = f"{1700000000 + number}.M{number}P1.host"
+            if number % 3:
+                write(
+                    os.path.join(folder, "new", name),
+                    maildir_message(number, "carol@example.com"),
+                )
+            else:
+                name += ":2,S"
+                write(
+                    os.path.join(folder, "cur", name),
+                    maildir_message(number, "dave@example.com"),
+                )
+        return root
+
+    def test_splits_mbox_at_from_lines(self):
+        batches = list(iter_mbox_batches(self.mbox, 0, 3))
+        self.assertEqual([len(batch.spans) for batch in batches], [3, 1])
+        self.assertEqual(batches[-1].position, os.path.getsize(self.mbox))
+        parsed = parse_batch(batches[0])
+        plain, html, no_sender = parsed
+        self.assertIsNone(no_sender)
+        self.assertEqual(plain.subject, "Café tomorrow")
+        self.assertEqual(
+            plain.content,
+            "Shall we meet at the café?\nFrom the corner table you can see the river.",
+        )
+        self.assertTrue(plain.seen)
+        self.assertEqual(html.content, "Count me in & bring cake")
+        self.assertEqual(html.timestamp, datetime(2023, 12, 31, 11, 0))
+        self.assertFalse(html.seen)
+
+    def test_imports_messages_into_chats(self):
+        progress = import_mail(self.store, [self.mbox], me=[ME])
+        self.assertEqual((progress.messages, progress.imported), (4, 3))
+        self.assertEqual(progress.failed, 1)
+        chats = dict(
+            self.query(
+                "SELECT chat.title, count(message.id) FROM chat "
+                "JOIN message ON message.chat_id = chat.id GROUP BY chat.id"
+            )
+        )
+        # The reply to Alice joins her thread.
+        self.assertEqual(chats, {"Café tomorrow": 2, "Plans": 1})
+        summaries = self.store.call(ChatRepository().page_summaries()).items
+        self.assertEqual(
+            [(summary.title, summary.unread_count) for summary in summaries],
+            [("Café tomorrow", 0), ("Plans", 1)],
+        )
+        self.assertEqual(summaries[0].preview, "See you there.")
+        self.assertEqual(summaries[0].initials, "AL")
+        recipients = self.query(
+            "SELECT member.email FROM message_recipient "
+            "JOIN member ON member.id = message_recipient.member_id "
+            "JOIN message ON message.id = message_recipient.message_id "
+            "WHERE message.message_id = '<2@example.com>' ORDER BY member.email"
+        )
+        self.assertEqual(recipients, [("alice@example.com",), ("me@example.com",)])
+
+    def test_imports_maildir_with_flags(self):
+        root = self.make_maildir(12)
+        progress = import_mail(self.store, [root], me=[ME], batch_size=5)
+        self.assertEqual(progress.imported, 12)
+        statuses = dict(
+            self.query(
+                "SELECT member.email, group_concat(DISTINCT message.status) "
+                "FROM message JOIN member ON member.id = message.sender_id "
+                "GROUP BY member.email"
+            )
+        )
+        self.assertEqual(
+            statuses,
+            {
+                "carol@example.com": MessageStatus.SENT.value,
+                "dave@example.com": MessageStatus.READ.value,
+            },
+        )
+
+    def test_reimport_adds_nothing(self):
+        import_mail(self.store, [self.mbox], me=[ME])
+        # Copied elsewhere, the same mail is recognised by its Message-ID.
+        copy = os.path.join(self.tmp.name, "copy.mbox")
+        write(copy, PLAIN + HTML + NO_SENDER + REPLY)
+        progress = import_mail(self.store, [self.mbox, copy], me=[ME])
+        self.assertEqual(progress.messages, 4)
+        self.assertEqual((progress.imported, progress.duplicates), (0, 3))
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(3,)])
+
+    def test_resumes_after_interruption(self):
+        root = self.make_maildir(12)
+
+        def crash(progress):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            import_mail(
+                self.store, [root, self.mbox], me=[ME], batch_size=4, on_progress=crash
+            )
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(4,)])
+
+        progress = import_mail(self.store, [root, self.mbox], me=[ME], batch_size=4)
+        # Only what wasn't stored before is read again.
+        self.assertEqual(progress.messages, 12 - 4 + 4)
+        self.assertEqual(progress.duplicates, 0)
+        self.assertEqual(self.query("SELECT count(*) FROM message"), [(12 + 3,)])
+
+    def test_parses_in_a_process_pool(self):
+        root = self.make_maildir(30)
+        progress = import_mail(self.store, [root], me=[ME], jobs=2, batch_size=4)
+        self.assertEqual(progress.imported, 30)
+        self.assertEqual(
+            self.query(
+                "SELECT subject FROM message ORDER BY timestamp DESC, id DESC LIMIT 1"
+            ),
+            [("Note 29",)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
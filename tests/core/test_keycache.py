@@ -0,0 +1,130 @@
+import os
+import tempfile
+import unittest
+
+from types import SimpleNamespace
+from unittest import mock
+
+import gnupg
+
+from src.core.keycache import (
+    DirectoryKeySource,
+    KeyCache,
+    KeyserverSource,
+    KeySource,
+)
+from tests.core.helpers import export_key, make_signing_key
+
+
+class CountingSource(KeySource):
+    def __init__(self, keys):
+        self.keys = keys
+        self.calls = 0
+
+    def fetch_uids(self, key_id):
+        self.calls += 1
+        return self.keys.get(key_id)
+
+
+class TestKeyCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, "keys.json")
+        self.now = 1000.0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_cache(self, source):
+        return KeyCache(
+            self.cache_path, source, ttl=100, negative_ttl=10, clock=lambda: self.now
+        )
+
+    def test_hits_are_served_from_cache_until_expiry(self):
+        source = CountingSource({"ABCD": ["Bob <bob@example.com>"]})
+        cache = self.make_cache(source)
+
+        for _ in range(5):
+            self.assertEqual(cache.get_uids("abcd"), ["Bob <bob@example.com>"])
+        self.assertEqual(source.calls, 1)
+        self.assertEqual((cache.hits, cache.misses), (4, 1))
+
+        self.now += 101
+        cache.get_uids("ABCD")
+        self.assertEqual(source.calls, 2)
+
+    def test_missing_keys_are_cached_with_negative_ttl(self):
+        source = CountingSource({})
+        cache = self.make_cache(source)
+
+        self.assertIsNone(cache.get_uids("FFFF"))
+        self.assertIsNone(cache.get_uids("FFFF"))
+        self.assertEqual(source.calls, 1)
+
+        self.now += 11
+        cache.get_uids("FFFF")
+        self.assertEqual(source.calls, 2)
+
+    def test_cache_persists_across_instances(self):
+        self.make_cache(CountingSource({"ABCD": ["Bob <bob@example.com>"]})).get_uids(
+            "ABCD"
+        )
+        source = CountingSource({})
+        self.assertEqual(
+            self.make_cache(source).get_uids("ABCD"), ["Bob <bob@example.com>"]
+        )
+        self.assertEqual(source.calls, 0)
+
+    def test_saves_keep_what_other_caches_saved(self):
+        first = self.make_cache(CountingSource({"ABCD": ["Bob <bob@example.com>"]}))
+        second = self.make_cache(CountingSource({"EF01": ["Eve <eve@example.com>"]}))
+        first.get_uids("ABCD")
+        second.get_uids("EF01")
+
+        source = CountingSource({})
+        cache = self.make_cache(source)
+        self.assertEqual(cache.get_uids("ABCD"), ["Bob <bob@example.com>"])
+        self.assertEqual(cache.get_uids("EF01"), ["Eve <eve@example.com>"])
+        self.assertEqual(source.calls, 0)
+        self.assertEqual(os.listdir(self.tmp.name), ["keys.json"])
+
+    def test_directory_source_reads_exported_keys(self):
+        signing_home = os.path.join(self.tmp.name, "signing")
+        keys_dir = os.path.join(self.tmp.name, "keys")
+        verify_home = os.path.join(self.tmp.name, "verify")
+        os.makedirs(keys_dir)
+        os.makedirs(verify_home, mode=0o700)
+        fingerprint = make_signing_key(signing_home, "Bob", "bob@example.com")
+        export_key(signing_home, fingerprint, os.path.join(keys_dir, "bob.asc"))
+
+        source = DirectoryKeySource(gnupg.GPG(gnupghome=verify_home), keys_dir)
+
+        self.assertEqual(
+            source.fetch_uids(fingerprint[-16:]), ["Bob <bob@example.com>"]
+        )
+        self.assertIsNone(source.fetch_uids("0123456789ABCDEF"))
+
+    def test_keyserver_failures_are_not_cached_as_missing_keys(self):
+        gpg = mock.Mock()
+        gpg.list_keys.return_value = []
+        cache = self.make_cache(KeyserverSource(gpg, "keys.example.com"))
+
+        gpg.recv_keys.return_value = SimpleNamespace(
+            count=0,
+            stderr="[GNUPG:] FAILURE recv-keys 167772346\n"
+            "gpg: keyserver receive failed: No keyserver available\n",
+        )
+        self.assertIsNone(cache.get_uids("FFFF"))
+        self.assertEqual(cache.entries, {})
+
+        gpg.recv_keys.return_value = SimpleNamespace(
+            count=0,
+            stderr="[GNUPG:] FAILURE recv-keys 167772218\n"
+            "gpg: keyserver receive failed: No data\n",
+        )
+        self.assertIsNone(cache.get_uids("FFFF"))
+        self.assertFalse(cache.entries["FFFF"].found)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import dataclasses
+import unittest
+from datetime import datetime
+
+from src.core.models.chat import Chat
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+
+
+class TestMember(unittest.TestCase):
+    def test_intern_shares_one_member_per_address(self):
+        first = Member.intern("hatter@example.com", "", False, "Hatter")
+        second = Member.intern("hatter@example.com", "", False, "Hatter")
+        self.assertIs(first, second)
+
+        renamed = Member.intern("hatter@example.com", "", False, "Mad Hatter")
+        self.assertIsNot(renamed, first)
+        self.assertIs(
+            Member.intern("hatter@example.com", "", False, "Mad Hatter"), renamed
+        )
+        self.assertEqual(first.name, "Hatter")
+
+    def test_members_are_frozen_and_slotted(self):
+        member = Member("hare@example.com", "", False, "March Hare")
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            member.name = "Hare"  # type: ignore[misc]
+        self.assertFalse(hasattr(member, "__dict__"))
+        self.assertEqual(member, Member("hare@example.com", "", False, "March Hare"))
+
+
+class TestMessage(unittest.TestCase):
+    def test_timestamp_round_trips(self):
+        member = Member.intern("dormouse@example.com")
+        for timestamp in (
+            datetime(2024, 2, 29, 23, 59, 59, 999999),
+            datetime(1969, 7, 20, 20, 17, 40),
+        ):
+            message = Message([], member, "", timestamp, MessageStatus.SENT)
+            self.assertEqual(message.timestamp, timestamp)
+            self.assertIsInstance(message.micros, int)
+
+    def test_messages_are_compact(self):
+        member = Member.intern("dormouse@example.com")
+        message = Message(
+            [member], member, "tea", datetime(2024, 1, 1), MessageStatus.READ
+        )
+        empty = Message([], member, "tea", datetime(2024, 1, 1), MessageStatus.READ)
+        self.assertFalse(hasattr(message, "__dict__"))
+        self.assertEqual(message.recipients, (member,))
+        self.assertIs(empty.recipients, ())
+        self.assertNotEqual(message, empty)
+        self.assertEqual(
+            empty, Message((), member, "tea", datetime(2024, 1, 1), MessageStatus.READ)
+        )
+
+    def test_chats_are_slotted(self):
+        self.assertFalse(hasattr(Chat("Tea party", [], []), "__dict__"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from git import Repo
+
+from src.core.commit_stream import iter_commit_records
+from src.core.numstat_cache import NumstatCache, fill_numstat
+from tests.core.helpers import commit_file, git, init_repo
+
+
+class TestNumstatCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, "numstat.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_least_recently_used_pairs_are_evicted(self):
+        cache = NumstatCache(None, max_entries=2)
+        cache.put(("a", "b"), [(1, 0, "x")])
+        cache.put(("b", "c"), [(2, 0, "y")])
+        cache.get(("a", "b"))
+        cache.put(("c", "d"), [(3, 0, "z")])
+
+        self.assertIsNone(cache.get(("b", "c")))
+        self.assertEqual(cache.get(("a", "b")), [(1, 0, "x")])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertAlmostEqual(cache.hit_rate, 2 / 3)
+
+    def test_cache_persists(self):
+        cache = NumstatCache(self.cache_path)
+        cache.put(("a", "b"), [(1, None, "bin")])
+        cache.save()
+        self.assertEqual(
+            NumstatCache(self.cache_path).get(("a", "b")), [(1, None, "bin")]
+        )
+
+    def test_fill_numstat_matches_git_log(self):
+        repo_path = os.path.join(self.tmp.name, "repo")
+        os.makedirs(repo_path)
+        init_repo(repo_path)
+        commit_file(repo_path, "a.txt", "one\ntwo\n", "root")
+        git(repo_path, "checkout", "-q", "-b", "topic")
+        commit_file(repo_path, "b.txt", "topic\n", "topic")
+        git(repo_path, "checkout", "-q", "main")
+        commit_file(repo_path, "a.txt", "three\n", "main")
+        git(repo_path, "merge", "-q", "--no-ff", "-m", "merge", "topic")
+        repo = Repo(repo_path)
+
+        expected = {r.hexsha: r.numstat for r in iter_commit_records(repo)}
+        records = list(iter_commit_records(repo, numstat=False))
+        cache = NumstatCache(None)
+        fill_numstat(repo, records, cache)
+
+        self.assertEqual({r.hexsha: r.numstat for r in records}, expected)
+        self.assertEqual(cache.hits, 0)
+
+        rerun = list(iter_commit_records(repo, numstat=False))
+        fill_numstat(repo, rerun, cache)
+        self.assertEqual({r.hexsha: r.numstat for r in rerun}, expected)
+        self.assertEqual(cache.hits, len(rerun))
+
+
+if __name__ == "__main__":
+    unittest.main()
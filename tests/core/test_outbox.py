@@ -0,0 +1,200 @@
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.outbox import (
+    Backoff,
+    Outbox,
+    OutboxSender,
+    PermanentSendError,
+)
+from src.core.store.runner import StoreRunner
+from src.core.store.tables import OutboxState
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ME = Member.intern("me@example.com", name="Me")
+ALICE = Member.intern("alice@example.com", name="Alice")
+BOB = Member.intern("bob@example.com", name="Bob")
+CAROL = Member.intern("carol@example.com", name="Carol")
+
+
+def outgoing(number, to=(ALICE,)):
+    return Message(
+        recipients=list(to),
+        sender=ME,
+        content=f"Message {number}",
+        timestamp=datetime(2024, 1, 1, 10, number),
+        status=MessageStatus.DRAFT,
+        subject=f"Note {number}",
+    )
+
+
+class FileTransport:
+    """Stands in for a mail server: a message counts as delivered once its
+    Message-ID is on a line of `delivered`, as with SMTP once the server
+    has accepted the data. Sending a message with `hang_on` in it never
+    finishes."""
+
+    def __init__(self, directory, hang_on=None):
+        self.delivered = os.path.join(directory, "delivered")
+        self.started = os.path.join(directory, "started")
+        self.hang_on = hang_on
+
+    async def send(self, mail):
+        with open(self.started, "a") as file:
+            file.write(mail.message_id + "\n")
+        if self.hang_on and self.hang_on in mail.message.content:
+            time.sleep(3600)
+        with open(self.delivered, "a") as file:
+            file.write(mail.message_id + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class FlakyTransport:
+    def __init__(self, failures, error=OSError("Connection refused")):
+        self.failures = failures
+        self.error = error
+        self.sent = []
+
+    async def send(self, mail):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        self.sent.append(mail)
+
+
+def send_until_killed(database_path, directory, hang_on):
+    """Run in a child process that the test kills mid-send."""
+    store = StoreRunner(database_path)
+    sender = OutboxSender(store, FileTransport(directory, hang_on))
+    store.call(sender.run())
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database_path)
+        self.outbox = Outbox(backoff=Backoff(first=0, jitter=0, max_attempts=3))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def query(self, sql, *args):
+        with sqlite3.connect(self.database_path) as db:
+            return db.execute(sql, args).fetchall()
+
+    def enqueue(self, message, **kwargs):
+        return self.store.call(self.outbox.enqueue(message, **kwargs))
+
+    def test_enqueue_stores_the_message_and_its_recipients(self):
+        message = self.enqueue(outgoing(1), cc=[BOB], bcc=[CAROL])
+        self.assertEqual(message.status, MessageStatus.OUTBOX)
+        self.assertEqual(self.query("SELECT title FROM chat"), [("Note 1",)])
+        self.assertEqual(
+            self.query("SELECT status FROM message"), [(MessageStatus.OUTBOX.value,)]
+        )
+        mail = self.store.call(self.outbox.claim())
+        self.assertEqual(mail.message.content, "Message 1")
+        self.assertEqual((mail.to, mail.cc, mail.bcc), ([ALICE], [BOB], [CAROL]))
+        self.assertTrue(mail.message_id.endswith("@example.com>"))
+        # The row is claimed until the attempt is done.
+        self.assertIsNone(self.store.call(self.outbox.claim()))
+
+    def test_retries_with_backoff_then_gives_up(self):
+        self.enqueue(outgoing(1))
+        self.enqueue(outgoing(2))
+        transport = FlakyTransport(failures=2)
+        sender = OutboxSender(self.store, transport, self.outbox)
+        self.assertEqual(self.store.call(sender.send_due()), 2)
+        self.assertEqual(
+            [mail.message.content for mail in transport.sent],
+            ["Message 1", "Message 2"],
+        )
+        self.assertEqual(
+            self.query("SELECT status FROM message"),
+            [(MessageStatus.READ.value,)] * 2,
+        )
+        self.assertEqual(self.query("SELECT count(*) FROM outbox"), [(0,)])
+
+        self.enqueue(outgoing(3))
+        transport.failures = 5
+        self.assertEqual(self.store.call(sender.send_due()), 0)
+        self.assertEqual(
+            self.query("SELECT state, attempts, last_error FROM outbox"),
+            [(OutboxState.FAILED.value, 3, "Connection refused")],
+        )
+        message_id = self.query("SELECT message_id FROM outbox")[0][0]
+        self.assertTrue(self.store.call(self.outbox.retry(message_id)))
+        transport.failures = 0
+        self.assertEqual(self.store.call(sender.send_due()), 1)
+
+    def test_permanent_errors_are_not_retried(self):
+        self.enqueue(outgoing(1))
+        transport = FlakyTransport(failures=1, error=PermanentSendError("550"))
+        sender = OutboxSender(self.store, transport, self.outbox)
+        self.assertEqual(self.store.call(sender.send_due()), 0)
+        self.assertEqual(
+            self.query("SELECT state, attempts FROM outbox"),
+            [(OutboxState.FAILED.value, 1)],
+        )
+
+    def test_recovers_a_message_killed_mid_send_exactly_once(self):
+        for number in range(1, 6):
+            self.enqueue(outgoing(number))
+        self.store.close()
+
+        child = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from tests.core.test_outbox import send_until_killed; "
+                "send_until_killed(*sys.argv[1:])",
+                self.database_path,
+                self.tmp.name,
+                "Message 3",
+            ],
+            cwd=ROOT,
+        )
+        try:
+            started = os.path.join(self.tmp.name, "started")
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                if os.path.exists(started) and len(open(started).readlines()) == 3:
+                    break
+                time.sleep(0.05)
+            else:
+                self.fail("The sender never reached the third message")
+        finally:
+            child.send_signal(signal.SIGKILL)
+            child.wait()
+
+        self.assertEqual(
+            self.query("SELECT state, count(*) FROM outbox GROUP BY state"),
+            [(OutboxState.QUEUED.value, 2), (OutboxState.SENDING.value, 1)],
+        )
+        self.store = StoreRunner(self.database_path)
+        sender = OutboxSender(self.store, FileTransport(self.tmp.name), self.outbox)
+        self.assertEqual(self.store.call(self.outbox.recover()), 1)
+        self.assertEqual(self.store.call(self.outbox.recover()), 0)
+        self.assertEqual(self.store.call(sender.send_due()), 3)
+
+        with open(os.path.join(self.tmp.name, "delivered")) as file:
+            delivered = file.read().split()
+        queued = [row[0] for row in self.query("SELECT message_id FROM message")]
+        self.assertEqual(sorted(delivered), sorted(queued))
+        self.assertEqual(self.query("SELECT count(*) FROM outbox"), [(0,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
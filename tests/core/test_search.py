@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+from src.core.store.search import MessageSearch, make_snippet, match_prefix
+
+ALICE = Member("alice@example.com", "", False, "Alice Liddell")
+BOB = Member("bob@builder.example", "", False, "Bob")
+START = datetime(2024, 1, 1)
+
+
+class TestMessageSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database_path)
+        self.chats = ChatRepository()
+        self.search_index = MessageSearch()
+        self.chat = self.store.call(self.chats.add_chat("Garden", [ALICE, BOB]))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def add(self, sender, content, subject="", minutes=0):
+        return self.store.call(
+            self.chats.add_message(
+                self.chat.id,
+                Message(
+                    [],
+                    sender,
+                    content,
+                    START + timedelta(minutes=minutes),
+                    MessageStatus.SENT,
+                    subject=subject,
+                ),
+            )
+        )
+
+    def search(self, text, **kwargs):
+        return self.store.call(self.search_index.search(text, **kwargs))
+
+    def test_matches_prefixes_across_columns(self):
+        body = self.add(ALICE, "The roses are painted red")
+        subject = self.add(ALICE, "nothing here", subject="Rosebushes")
+        sender = self.add(BOB, "hello")
+
+        self.assertEqual(
+            {hit.message_id for hit in self.search("ros").items}, {body.id, subject.id}
+        )
+        self.assertEqual(
+            [hit.message_id for hit in self.search("build").items], [sender.id]
+        )
+        self.assertEqual(
+            [hit.message_id for hit in self.search("alice painted").items], [body.id]
+        )
+        hit = self.search("painted").items[0]
+        self.assertEqual((hit.chat_id, hit.chat_title), (self.chat.id, "Garden"))
+        self.assertIn("painted", hit.snippet)
+
+    def test_ranks_subject_matches_first(self):
+        body = self.add(ALICE, "a note about tea and more tea")
+        subject = self.add(ALICE, "see attached", subject="Tea")
+        self.assertEqual(
+            [hit.message_id for hit in self.search("tea").items], [subject.id, body.id]
+        )
+
+    def test_pages_results(self):
+        for i in range(5):
+            self.add(ALICE, f"croquet round {i}", minutes=i)
+        first = self.search("croquet", limit=2)
+        second = self.search("croquet", offset=first.next_offset, limit=2)
+        last = self.search("croquet", offset=second.next_offset, limit=2)
+        seen = [hit.message_id for page in (first, second, last) for hit in page.items]
+        self.assertEqual(len(set(seen)), 5)
+        self.assertIsNone(last.next_offset)
+
+    def test_pages_past_the_ranked_candidates(self):
+        for i in range(5):
+            self.add(ALICE, f"croquet round {i}", minutes=i)
+        with patch("src.core.store.search.RANKED_CANDIDATES", 2):
+            first = self.search("croquet", limit=3)
+            second = self.search("croquet", offset=first.next_offset, limit=3)
+        self.assertEqual(len(first.items) + len(second.items), 5)
+        self.assertIsNone(second.next_offset)
+
+    def test_index_follows_edits_and_deletes(self):
+        message = self.add(ALICE, "mock turtle soup")
+        with sqlite3.connect(self.database_path) as db:
+            db.execute(
+                "UPDATE message SET content = 'lobster quadrille' WHERE id = ?",
+                (message.id,),
+            )
+            db.execute(
+                "UPDATE member SET name = 'Alice Pleasance' WHERE email = ?",
+                (ALICE.email,),
+            )
+        self.assertEqual(self.search("turtle").items, [])
+        self.assertEqual(len(self.search("quadrille pleasance").items), 1)
+
+        with sqlite3.connect(self.database_path) as db:
+            db.execute("DELETE FROM message WHERE id = ?", (message.id,))
+        self.assertEqual(self.search("lobster").items, [])
+
+    def test_query_syntax_is_matched_literally(self):
+        self.add(ALICE, "tweedledum AND tweedledee")
+        self.assertEqual(match_prefix("OR"), '"OR"*')
+        self.assertEqual(len(self.search('tweedle" AND(').items), 1)
+        self.assertEqual(self.search("  ...  ").items, [])
+
+
+class TestMakeSnippet(unittest.TestCase):
+    def test_cuts_around_the_first_match(self):
+        words = " ".join(f"word{i}" for i in range(40))
+        self.assertEqual(
+            make_snippet([words + " Teapot", "Subject"], ("teap",)),
+            "…" + " ".join(f"word{i}" for i in range(37, 40)) + " Teapot",
+        )
+        self.assertEqual(make_snippet(["body", "Tea party"], ("par",)), "Tea party")
+        self.assertEqual(make_snippet(["no match here", ""], ("x",)), "no match here")
+
+
+class TestSearchBackfill(unittest.TestCase):
+    def test_existing_messages_are_indexed_when_the_index_is_created(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "store.sqlite3")
+            store = StoreRunner(path)
+            chats = ChatRepository()
+            chat = store.call(chats.add_chat("Old", [ALICE]))
+            store.call(
+                chats.add_message(
+                    chat.id,
+                    Message([], ALICE, "cheshire grin", START, MessageStatus.SENT),
+                )
+            )
+            store.close()
+            with sqlite3.connect(path) as db:
+                db.executescript(
+                    "DROP TABLE message_search;"
+                    "DROP TRIGGER IF EXISTS message_search_insert;"
+                    "DROP TRIGGER IF EXISTS message_search_update;"
+                    "DROP TRIGGER IF EXISTS message_search_delete;"
+                    "DROP TRIGGER IF EXISTS message_search_member_update;"
+                )
+
+            store = StoreRunner(path)
+            hits = store.call(MessageSearch().search("chesh")).items
+            store.close()
+            self.assertEqual([hit.chat_title for hit in hits], ["Old"])
+
+
+if __name__ == "__main__":
+    unittest.main()
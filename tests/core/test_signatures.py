@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import gnupg
+from git import Repo
+
+from src.core.signatures import (
+    iter_signatures,
+    parse_person,
+    read_raw_commit,
+    split_signature,
+    verify_signature,
+)
+from tests.core.helpers import commit_file, init_repo, make_signing_key
+
+
+class TestSignatures(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.tmp.name, "repo")
+        self.signing_home = os.path.join(self.tmp.name, "signing")
+        self.empty_home = os.path.join(self.tmp.name, "empty")
+        os.makedirs(self.repo_path)
+        os.makedirs(self.empty_home, mode=0o700)
+        init_repo(self.repo_path)
+        self.fingerprint = make_signing_key(
+            self.signing_home, "Alice", "alice@example.com"
+        )
+        self.signed = commit_file(
+            self.repo_path,
+            "a.txt",
+            "one\n",
+            "signed",
+            self.fingerprint,
+            self.signing_home,
+        )
+        self.unsigned = commit_file(self.repo_path, "a.txt", "two\n", "unsigned")
+        self.repo = Repo(self.repo_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_payload_matches_what_git_signed(self):
+        signature, payload = split_signature(read_raw_commit(self.repo, self.signed))
+        self.assertTrue(signature.startswith(b"-----BEGIN PGP SIGNATURE-----"))
+        self.assertNotIn(b"gpgsig", payload)
+        self.assertTrue(payload.endswith(b"\n\nsigned\n"))
+        self.assertEqual(
+            parse_person(payload, b"author"), ("Alice", "alice@example.com")
+        )
+
+    def test_unsigned_commit_has_no_signature(self):
+        signature, payload = split_signature(read_raw_commit(self.repo, self.unsigned))
+        self.assertIsNone(signature)
+        self.assertEqual(payload, read_raw_commit(self.repo, self.unsigned))
+
+    def test_verification_reports_key_with_and_without_keyring(self):
+        shas = [self.signed, self.unsigned]
+        with_key = dict(
+            iter_signatures(self.repo, gnupg.GPG(gnupghome=self.signing_home), shas)
+        )
+        without_key = dict(
+            iter_signatures(self.repo, gnupg.GPG(gnupghome=self.empty_home), shas)
+        )
+
+        self.assertEqual(with_key[self.signed].status, "G")
+        self.assertEqual(with_key[self.signed].key_id, self.fingerprint[-16:])
+        self.assertEqual(with_key[self.signed].signer, "Alice <alice@example.com>")
+        self.assertEqual(without_key[self.signed].status, "E")
+        self.assertEqual(without_key[self.signed].key_id, self.fingerprint[-16:])
+        self.assertFalse(with_key[self.unsigned].is_signed)
+
+    def test_tampered_payload_is_bad(self):
+        signature, payload = split_signature(read_raw_commit(self.repo, self.signed))
+        details = verify_signature(
+            gnupg.GPG(gnupghome=self.signing_home),
+            signature,
+            payload.replace(b"signed", b"forged"),
+        )
+        self.assertEqual(details.status, "B")
+
+
+if __name__ == "__main__":
+    unittest.main()
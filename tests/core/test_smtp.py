@@ -0,0 +1,173 @@
+import email
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+
+from benchmarks.smtp_server import ME, PASSWORD, SmtpServer
+from src.core.account import Account
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.smtp import SmtpTransport
+from src.core.store.outbox import Backoff, Outbox, OutboxSender
+from src.core.store.runner import StoreRunner
+from src.core.store.tables import OutboxState
+
+SENDER = Member.intern(ME, name="Me")
+ALICE = Member.intern("alice@example.com", name="Alice")
+BOB = Member.intern("bob@example.com", name="Bob")
+CAROL = Member.intern("carol@example.com", name="Carol")
+
+
+def outgoing(number, to=(ALICE,), content=None):
+    return Message(
+        recipients=list(to),
+        sender=SENDER,
+        content=content or f"Message {number}",
+        timestamp=datetime(2024, 1, 1, 10, number),
+        status=MessageStatus.DRAFT,
+        subject=f"Note {number}",
+    )
+
+
+class TestSmtpTransport(unittest.TestCase):
+    pipelining = True
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = SmtpServer(pipelining=self.pipelining)
+        port = self.server.start_thread()
+        self.account = Account(
+            ME,
+            smtp_host="127.0.0.1",
+            smtp_port=port,
+            smtp_username=ME,
+            smtp_password=PASSWORD,
+            smtp_security="none",
+        )
+        self.database_path = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database_path)
+        self.transport = SmtpTransport(self.account)
+        self.outbox = Outbox(backoff=Backoff(first=0, jitter=0, max_attempts=3))
+        self.sender = OutboxSender(
+            self.store, self.transport, self.outbox, concurrency=2
+        )
+
+    def tearDown(self):
+        self.store.call(self.transport.close())
+        self.store.close()
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def query(self, sql, *args):
+        with sqlite3.connect(self.database_path) as db:
+            return db.execute(sql, args).fetchall()
+
+    def enqueue(self, message, **kwargs):
+        return self.store.call(self.outbox.enqueue(message, **kwargs))
+
+    def test_sends_each_message_in_one_transaction_over_warm_connections(self):
+        self.store.call(self.transport.warm())
+        self.assertEqual(self.server.logins, 1)
+        self.enqueue(outgoing(1, to=[ALICE, BOB]), bcc=[CAROL])
+        for number in range(2, 6):
+            self.enqueue(outgoing(number, content=f"Message {number}\n.\n..dots"))
+        self.assertEqual(self.store.call(self.sender.send_due()), 5)
+
+        self.assertEqual(len(self.server.messages), 5)
+        # Two connections at most, each logged in once.
+        self.assertLessEqual(self.server.logins, 2)
+        first = next(
+            delivery
+            for delivery in self.server.messages
+            if len(delivery.recipients) > 1
+        )
+        self.assertEqual(
+            first.recipients,
+            ["alice@example.com", "bob@example.com", "carol@example.com"],
+        )
+        headers = email.message_from_bytes(first.data)
+        self.assertIsNone(headers["Bcc"])
+        self.assertNotIn("carol", first.data.decode())
+        # Lines starting with dots arrive as they were written.
+        self.assertEqual(
+            sum(
+                b"\r\n.\r\n..dots\r\n" in delivery.data
+                for delivery in self.server.messages
+            ),
+            4,
+        )
+        self.assertEqual(
+            self.query("SELECT DISTINCT status FROM message"),
+            [(MessageStatus.READ.value,)],
+        )
+
+    def test_reports_each_recipients_status(self):
+        self.server.refuse["bob@example.com"] = (550, "No such user")
+        self.server.refuse["carol@example.com"] = (451, "Try again later")
+        message = self.enqueue(outgoing(1, to=[ALICE, BOB, CAROL]))
+        self.assertEqual(self.store.call(self.sender.send_due()), 0)
+
+        # Carol was tried until the outbox gave up; Alice only once.
+        self.assertEqual(
+            [delivery.recipients for delivery in self.server.messages],
+            [["alice@example.com"]],
+        )
+        self.assertEqual(
+            self.store.call(self.outbox.deliveries(message.id)),
+            {
+                "alice@example.com": (250, ""),
+                "bob@example.com": (550, "No such user"),
+                "carol@example.com": (451, "Try again later"),
+            },
+        )
+        self.assertEqual(
+            self.query("SELECT state, attempts FROM outbox"),
+            [(OutboxState.FAILED.value, 3)],
+        )
+
+        # Retrying sends to everyone the server hasn't accepted it for.
+        del self.server.refuse["carol@example.com"]
+        self.assertTrue(self.store.call(self.outbox.retry(message.id)))
+        self.assertEqual(self.store.call(self.sender.send_due()), 1)
+        self.assertEqual(self.server.messages[-1].recipients, ["carol@example.com"])
+        self.assertEqual(
+            self.query("SELECT status FROM message"),
+            [(MessageStatus.PARTLY_SENT.value,)],
+        )
+        self.assertEqual(self.query("SELECT count(*) FROM outbox"), [(0,)])
+
+    def test_gives_up_when_every_recipient_is_refused(self):
+        self.server.refuse["alice@example.com"] = (550, "No such user")
+        self.enqueue(outgoing(1))
+        self.assertEqual(self.store.call(self.sender.send_due()), 0)
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(
+            self.query("SELECT state, attempts, last_error FROM outbox"),
+            [
+                (
+                    OutboxState.FAILED.value,
+                    1,
+                    "Refused for alice@example.com: 550 No such user",
+                )
+            ],
+        )
+
+    def test_replaces_a_connection_the_server_dropped(self):
+        self.enqueue(outgoing(1))
+        self.assertEqual(self.store.call(self.sender.send_due()), 1)
+        self.server.drop_clients()
+        self.enqueue(outgoing(2))
+        self.assertEqual(self.store.call(self.sender.send_due()), 1)
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(self.server.logins, 2)
+        self.assertEqual(self.query("SELECT count(*) FROM outbox"), [(0,)])
+
+
+class TestSmtpTransportWithoutPipelining(TestSmtpTransport):
+    pipelining = False
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+from src.core.store.sample import SAMPLE_CHATS, seed_sample_chats
+
+ALICE = Member("alice@example.com", "AAAA", True, "Alice")
+BOB = Member("bob@example.com", "", False, "Bob")
+START = datetime(2024, 1, 1, 12, 0)
+
+
+class TestChatRepository(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database_path)
+        self.chats = ChatRepository()
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def add_messages(self, chat_id, count, start=START, status=MessageStatus.SENT):
+        for i in range(count):
+            self.store.call(
+                self.chats.add_message(
+                    chat_id,
+                    Message(
+                        [BOB],
+                        ALICE,
+                        f"message {i}",
+                        start + timedelta(minutes=i),
+                        status,
+                    ),
+                )
+            )
+
+    def test_pages_messages_newest_first(self):
+        chat = self.store.call(self.chats.add_chat("Pages", [ALICE, BOB]))
+        self.add_messages(chat.id, 5)
+
+        first = self.store.call(self.chats.page_messages(chat.id, limit=2))
+        second = self.store.call(
+            self.chats.page_messages(chat.id, before=first.next_cursor, limit=2)
+        )
+        last = self.store.call(
+            self.chats.page_messages(chat.id, before=second.next_cursor, limit=2)
+        )
+
+        self.assertEqual([m.content for m in first.items], ["message 3", "message 4"])
+        self.assertEqual([m.content for m in second.items], ["message 1", "message 2"])
+        self.assertEqual([m.content for m in last.items], ["message 0"])
+        self.assertIsNone(last.next_cursor)
+        self.assertEqual(first.items[0].recipients, (BOB,))
+        self.assertEqual(first.items[0].sender, ALICE)
+        self.assertIs(first.items[0].sender, first.items[1].sender)
+
+    def test_pages_messages_with_equal_timestamps(self):
+        chat = self.store.call(self.chats.add_chat("Ties", [ALICE]))
+        for i in range(3):
+            self.store.call(
+                self.chats.add_message(
+                    chat.id, Message([], ALICE, f"tie {i}", START, MessageStatus.SENT)
+                )
+            )
+        seen = []
+        cursor = None
+        while True:
+            page = self.store.call(
+                self.chats.page_messages(chat.id, before=cursor, limit=1)
+            )
+            seen = [m.content for m in page.items] + seen
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, ["tie 0", "tie 1", "tie 2"])
+
+    def test_pages_chats_by_latest_activity(self):
+        quiet = self.store.call(self.chats.add_chat("Quiet", [ALICE]))
+        busy = self.store.call(self.chats.add_chat("Busy", [BOB]))
+        self.add_messages(quiet.id, 2)
+        self.add_messages(busy.id, 1, start=START + timedelta(days=1))
+
+        page = self.store.call(self.chats.page_chats(limit=1))
+        rest = self.store.call(self.chats.page_chats(before=page.next_cursor))
+
+        self.assertEqual([c.title for c in page.items], ["Busy"])
+        self.assertEqual([c.title for c in rest.items], ["Quiet"])
+        self.assertEqual([m.content for m in rest.items[0].messages], ["message 1"])
+        self.assertEqual(rest.items[0].members, [ALICE])
+
+    def test_status_updates_and_counts(self):
+        chat = self.store.call(self.chats.add_chat("Status", [ALICE]))
+        self.add_messages(chat.id, 3, status=MessageStatus.OUTBOX)
+        page = self.store.call(self.chats.page_messages(chat.id))
+        self.store.call(self.chats.set_status(page.items[0].id, MessageStatus.SENT))
+
+        self.assertEqual(
+            self.store.call(self.chats.count_messages(status=MessageStatus.OUTBOX)), 2
+        )
+        self.assertEqual(self.store.call(self.chats.count_messages(chat_id=chat.id)), 3)
+
+    def test_members_are_shared_between_chats(self):
+        self.store.call(self.chats.add_chat("One", [ALICE]))
+        self.store.call(self.chats.add_chat("Two", [ALICE, BOB]))
+        with sqlite3.connect(self.database_path) as db:
+            (members,) = db.execute("SELECT COUNT(*) FROM member").fetchone()
+        self.assertEqual(members, 2)
+
+    def test_indexes_cover_timeline_and_status_queries(self):
+        with sqlite3.connect(self.database_path) as db:
+            indexed = {
+                tuple(
+                    column
+                    for _, _, column in db.execute(f"PRAGMA index_info('{name}')")
+                )
+                for (name,) in db.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' "
+                    "AND tbl_name = 'message'"
+                )
+            }
+        self.assertIn(("chat_id", "timestamp"), indexed)
+        self.assertIn(("status",), indexed)
+
+    def test_sample_chats_are_seeded_once(self):
+        self.store.call(seed_sample_chats(self.chats))
+        self.store.call(seed_sample_chats(self.chats))
+        page = self.store.call(self.chats.page_chats())
+        self.assertEqual(
+            [c.title for c in page.items], [title for title, _, _ in SAMPLE_CHATS]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from src.core.models.member import Member
+from src.core.store.importer import Batch, MailImporter, ParsedMessage
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+from src.core.store.threads import base_subject, chat_title
+
+ME = ("me@example.com", "Me")
+ALICE = ("alice@example.com", "Alice Liddell")
+BOB = ("bob@example.com", "Bob")
+START = datetime(2024, 1, 1)
+
+
+def mail(number, references=(), subject="Picnic", sender=ALICE, to=(ME,), seen=False):
+    return ParsedMessage(
+        message_id=f"<{number}@example.com>",
+        references=[f"<{reference}@example.com>" for reference in references],
+        sender=sender,
+        recipients=list(to),
+        subject=subject,
+        content=f"Message {number}",
+        timestamp=START + timedelta(minutes=number),
+        seen=seen,
+    )
+
+
+class TestSubjects(unittest.TestCase):
+    def test_base_subject(self):
+        self.assertEqual(
+            base_subject("Re: Fwd: RE[2]: [team]  Picnic  plans"), "Picnic plans"
+        )
+        self.assertEqual(base_subject("Reading list"), "Reading list")
+
+    def test_chat_title(self):
+        alice = Member.intern(ALICE[0], name=ALICE[1])
+        self.assertEqual(chat_title("Re: Picnic", [alice]), "Picnic")
+        self.assertEqual(chat_title("Re:", [alice]), "Alice Liddell")
+
+
+class TestThreadIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.tmp.name, "store.sqlite3")
+        self.store = StoreRunner(self.database_path)
+        self.importer = MailImporter([ME[0]])
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def add(self, *messages):
+        self.store.call(self.importer.store(Batch("test", 0), list(messages)))
+
+    def query(self, sql, *args):
+        with sqlite3.connect(self.database_path) as db:
+            return db.execute(sql, args).fetchall()
+
+    def chats(self):
+        """The numbers of the messages in each chat."""
+        rows = self.query(
+            "SELECT chat_id, message_id FROM message ORDER BY chat_id, message_id"
+        )
+        chats = {}
+        for chat_id, message_id in rows:
+            chats.setdefault(chat_id, []).append(int(message_id[1:].split("@")[0]))
+        return sorted(chats.values())
+
+    def test_replies_join_their_thread(self):
+        self.add(mail(1), mail(2, subject="Something else"))
+        self.add(mail(3, [1], subject="Re: Picnic", sender=ME, to=[ALICE]))
+        self.add(mail(4, [1, 3], subject="Changed the subject"))
+        self.assertEqual(self.chats(), [[1, 3, 4], [2]])
+
+    def test_reply_before_its_parent(self):
+        # 3 replies to 2, which arrives later and replies to 1.
+        self.add(mail(1, subject="One"), mail(3, [2], subject="Three"))
+        self.assertEqual(self.chats(), [[1], [3]])
+        self.add(mail(2, [1], subject="Two"))
+        self.assertEqual(self.chats(), [[1, 2, 3]])
+        self.assertEqual(self.query("SELECT count(*) FROM chat"), [(1,)])
+
+    def test_threads_merged_within_a_batch(self):
+        self.add(
+            mail(3, [2], subject="Three"),
+            mail(1, subject="One"),
+            mail(2, [1], subject="Two"),
+        )
+        self.assertEqual(self.chats(), [[1, 2, 3]])
+        self.assertEqual(self.query("SELECT title FROM chat"), [("Three",)])
+
+    def test_merged_threads_keep_summaries(self):
+        self.add(mail(1, subject="One", seen=True), mail(2, subject="Two"))
+        self.add(mail(5, [1, 2], subject="Both", sender=BOB, to=[ME, ALICE]))
+        self.assertEqual(self.chats(), [[1, 2, 5]])
+        summaries = self.store.call(ChatRepository().page_summaries()).items
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0].unread_count, 2)
+        self.assertEqual(summaries[0].preview, "Message 5")
+        self.assertEqual(summaries[0].title, "One")
+        members = self.query(
+            "SELECT member.email FROM chat_member "
+            "JOIN member ON member.id = chat_member.member_id ORDER BY member.email"
+        )
+        self.assertEqual(members, [(ALICE[0],), (BOB[0],)])
+
+    def test_subject_and_participants_fallback(self):
+        self.add(mail(1, subject="Lunch"))
+        self.add(
+            mail(2, subject="Re: lunch", sender=ME, to=[ALICE]),
+            mail(3, subject="Lunch", sender=BOB),
+            mail(4, subject="", sender=BOB),
+            mail(5, subject="", sender=BOB),
+        )
+        self.assertEqual(self.chats(), [[1, 2], [3], [4, 5]])
+
+    def test_index_outlives_the_importer(self):
+        self.add(mail(1, subject="One"))
+        self.store.close()
+        self.store = StoreRunner(self.database_path)
+        self.importer = MailImporter([ME[0]])
+        self.add(mail(2, [1], subject="Two"))
+        self.assertEqual(self.chats(), [[1, 2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+from src.core.store.timeline import Timeline
+
+ALICE = Member("alice@example.com", "", False, "Alice")
+START = datetime(2024, 1, 1)
+
+
+class TestTimeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = StoreRunner(os.path.join(self.tmp.name, "store.sqlite3"))
+        self.chats = ChatRepository()
+        self.chat = self.store.call(self.chats.add_chat("Long", [ALICE]))
+        for i in range(23):
+            self.add_message(f"message {i}", i)
+        self.timeline = Timeline(self.chat.id, self.chats, chunk_size=5, max_chunks=3)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def add_message(self, content, minutes):
+        message = Message(
+            [], ALICE, content, START + timedelta(minutes=minutes), MessageStatus.SENT
+        )
+        return self.store.call(self.chats.add_message(self.chat.id, message))
+
+    def chunk(self, index):
+        return self.store.call(self.timeline.chunk(index))
+
+    def test_loads_newest_chunk_first(self):
+        newest = self.store.call(self.timeline.newest())
+        self.assertEqual(
+            [m.content for m in newest.messages],
+            [f"message {i}" for i in range(18, 23)],
+        )
+        self.assertTrue(newest.has_older)
+        self.assertFalse(self.timeline.has_chunk(2))
+        with self.assertRaises(IndexError):
+            self.chunk(2)
+
+    def test_older_chunks_cover_the_history_once(self):
+        chunks = [self.chunk(0)]
+        while chunks[-1].has_older:
+            chunks.append(self.chunk(chunks[-1].index + 1))
+        contents = [m.content for chunk in reversed(chunks) for m in chunk.messages]
+        self.assertEqual(contents, [f"message {i}" for i in range(23)])
+        self.assertEqual(len(chunks), 5)
+
+    def test_evicts_least_recently_used_but_keeps_newest(self):
+        for index in range(5):
+            self.chunk(index)
+        self.assertEqual(list(self.timeline.chunks), [0, 3, 4])
+
+        self.chunk(3)
+        reloaded = self.chunk(1)
+        self.assertEqual(list(self.timeline.chunks), [0, 3, 1])
+        self.assertEqual(
+            [m.content for m in reloaded.messages],
+            [f"message {i}" for i in range(13, 18)],
+        )
+
+    def test_new_messages_join_the_newest_chunk(self):
+        self.assertIsNone(self.timeline.latest)
+        self.chunk(0)
+        message = self.add_message("fresh", 100)
+        self.timeline.add(message)
+        self.assertIs(self.timeline.latest, message)
+        self.assertEqual(self.chunk(0).messages[-1], message)
+
+    def test_messages_added_while_scrolled_away_or_loading_are_kept(self):
+        # Added before the newest chunk is read: one the read finds stored,
+        # and one it was too early for.
+        stored = self.add_message("stored", 100)
+        self.assertFalse(self.timeline.add(stored))
+        pending = Message(
+            [], ALICE, "pending", START + timedelta(minutes=101), MessageStatus.SENT
+        )
+        self.timeline.add(pending)
+        self.assertEqual(
+            [m.content for m in self.chunk(0).messages[-2:]], ["stored", "pending"]
+        )
+
+        # Added while older chunks are in view.
+        for index in range(1, 5):
+            self.chunk(index)
+        message = self.add_message("fresh", 102)
+        self.assertTrue(self.timeline.add(message))
+        self.assertIs(self.chunk(0).messages[-1], message)
+
+
+if __name__ == "__main__":
+    unittest.main()
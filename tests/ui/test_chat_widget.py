@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import customtkinter as ctk
+
+from src.components.chat.widget import MAX_SHOWN_CHUNKS, ChatInterface
+from src.core.models.member import Member
+from src.core.models.message import Message, MessageStatus
+from src.core.store.deltas import StoreDelta
+from src.core.store.repository import ChatRepository
+from src.core.store.runner import StoreRunner
+from src.core.store.timeline import CHUNK_SIZE, Timeline
+from src.utils import get_theme_colors
+
+ALICE = Member("alice@example.com", "", False, "Alice")
+START = datetime(2024, 1, 1)
+
+
+class Host(ctk.CTk):
+    """Stands in for the app, which the chat widget asks for the store."""
+
+    def __init__(self, store: StoreRunner) -> None:
+        super().__init__()
+        self.store = store
+
+    def send_message(self) -> None:
+        pass
+
+
+@unittest.skipUnless(os.environ.get("DISPLAY"), "needs a display")
+class TestChatInterface(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = StoreRunner(os.path.join(self.tmp.name, "store.sqlite3"))
+        self.chats = ChatRepository()
+        self.chat = self.store.call(self.chats.add_chat("Long", [ALICE]))
+        for i in range((MAX_SHOWN_CHUNKS + 1) * CHUNK_SIZE + 1):
+            self.add_message(f"message {i}", i)
+        self.host = Host(self.store)
+        self.widget = ChatInterface(self.host, get_theme_colors("light"))
+        self.widget.grid(row=0, column=0, sticky="nsew")
+
+    def tearDown(self):
+        self.host.destroy()
+        self.store.close()
+        self.tmp.cleanup()
+
+    def add_message(self, content, minutes):
+        message = Message(
+            [], ALICE, content, START + timedelta(minutes=minutes), MessageStatus.SENT
+        )
+        return self.store.call(self.chats.add_message(self.chat.id, message))
+
+    def wait_until(self, condition, timeout=20.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out")
+            self.host.update()
+            time.sleep(0.01)
+
+    def show(self, index):
+        self.widget.load_chunk(index)
+        self.wait_until(lambda: index in self.widget.shown)
+
+    def test_new_mail_is_there_after_scrolling_back(self):
+        self.widget.display_chat(self.chat, Timeline(self.chat.id, self.chats))
+        self.wait_until(lambda: 0 in self.widget.shown)
+        # Scroll up far enough that the newest chunk is dropped from view.
+        for index in range(1, MAX_SHOWN_CHUNKS + 1):
+            self.show(index)
+        self.assertNotIn(0, self.widget.shown)
+
+        message = self.add_message("fresh", 10_000)
+        delta = StoreDelta()
+        delta.add(self.chat.id, message)
+        self.widget.apply_delta(delta)
+        self.assertNotIn(0, self.widget.chat_display.chunk_frames)
+
+        self.show(0)
+        self.assertEqual(self.widget.shown[0].messages[-1].content, "fresh")
+        frame = self.widget.chat_display.chunk_frames[0]
+        self.assertEqual(
+            sum(
+                widget.master is frame
+                for widget in self.widget.chat_display.message_widgets
+            ),
+            CHUNK_SIZE + 1,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()